@@ -0,0 +1,132 @@
+"""
+Benchmark for permessage-deflate compression of the messages sent to clients.
+
+Records the messages that a JSON player and a binary player are sent during a
+match, then compresses each stream the way a websocket connection does: one
+deflate stream per connection, flushed after every message. Reports, for each
+setting and range of message sizes, the bytes sent per message compared with
+sending it uncompressed and the CPU time spent compressing it, along with the
+memory each connection's compressor needs. Messages smaller than the setting's
+min_size are sent uncompressed (see compression.py).
+
+Usage:
+    python3 -m bench.compression
+"""
+
+import zlib
+from time import perf_counter
+
+from src.agent import Agent
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON
+from src.client_messages import ClientMessageSender
+from src.compression import CompressionSettings
+from src.game import Game
+from src.globals import TICKS_PER_SECOND
+
+TICKS = TICKS_PER_SECOND * 30
+# Upper bounds of the ranges of message sizes that results are grouped by
+SIZE_RANGES = [32, 64, 256, 1024, float("inf")]
+SETTINGS = [
+    CompressionSettings(level=1, window_bits=15, mem_level=8, min_size=0),
+    CompressionSettings(level=6, window_bits=15, mem_level=8, min_size=0),
+    CompressionSettings(level=9, window_bits=15, mem_level=8, min_size=0),
+    CompressionSettings(level=1, window_bits=12, mem_level=5, min_size=0),
+    CompressionSettings(level=6, window_bits=12, mem_level=5, min_size=0),
+    CompressionSettings(level=1, window_bits=9, mem_level=4, min_size=0),
+    CompressionSettings(level=1, window_bits=12, mem_level=5, min_size=32),
+    CompressionSettings(level=1, window_bits=12, mem_level=5, min_size=64),
+]
+
+
+class RecordingClient(ClientMessageSender):
+    """A player that records the messages it is sent."""
+
+    def __init__(self, frame_format):
+        self.frame_format = frame_format
+        self.on_receive_player_code = None
+        self.payloads = []
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.payloads.append(payload)
+
+
+class Spinner(Agent):
+    """Keeps turning and shooting so that frames are never empty."""
+
+    angle = 0
+
+    def run(self):
+        self.angle = (self.angle + 7) % 360
+        self.set_movement_speed(Agent.MAX_SPEED)
+        self.set_movement_direction(self.angle)
+        self.attack_ranged(self.angle)
+
+
+def record_messages():
+    """Returns the messages sent to a JSON player and to a binary player."""
+    clients = [RecordingClient(FORMAT_JSON), RecordingClient(FORMAT_BINARY)]
+    game = Game(clients, realtime=False)
+    for client in clients:
+        game.add_player_agent(client, Spinner, "Spinner")
+    game.prepare_to_start_simulation()
+    for _ in range(TICKS):
+        game.tick()
+    game.player_executor.close()
+    return {client.frame_format: client.payloads for client in clients}
+
+
+def get_size_range(size):
+    for i, upper_bound in enumerate(SIZE_RANGES):
+        if size < upper_bound:
+            return i
+
+
+def compress_stream(payloads, settings):
+    """Returns a list of (bytes, compressed bytes, seconds) of each size range
+    when the payloads are sent over one connection."""
+    results = [[0, 0, 0] for _ in SIZE_RANGES]
+    compressor = zlib.compressobj(settings.level, zlib.DEFLATED, -settings.window_bits, settings.mem_level)
+    for payload in payloads:
+        result = results[get_size_range(len(payload))]
+        result[0] += len(payload)
+        if len(payload) < settings.min_size:
+            result[1] += len(payload)
+            continue
+        start = perf_counter()
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        result[2] += perf_counter() - start
+        # The trailing 4 bytes of the flush are not sent
+        result[1] += len(data) - 4
+    return results
+
+
+def format_setting(settings):
+    return f"l{settings.level} w{settings.window_bits} m{settings.mem_level} min{settings.min_size}"
+
+
+def main():
+    streams = record_messages()
+    for frame_format, payloads in streams.items():
+        counts = [0] * len(SIZE_RANGES)
+        for payload in payloads:
+            counts[get_size_range(len(payload))] += 1
+        print(f"{frame_format} messages, {len(payloads)} in total")
+        ranges = [f"<{upper_bound}" for upper_bound in SIZE_RANGES[:-1]] + [f">={SIZE_RANGES[-2]}"]
+        print(f"{'setting':>20} {'memory KB':>10} " + " ".join(f"{size_range + f' ({count})':>20}" for size_range, count in zip(ranges, counts)) + f" {'total':>20}")
+        for settings in SETTINGS:
+            results = compress_stream(payloads, settings)
+            cells = []
+            for size, compressed, seconds in results + [[sum(column) for column in zip(*results)]]:
+                if size == 0:
+                    cells.append(f"{'-':>20}")
+                    continue
+                ratio = compressed / size
+                cells.append(f"{f'{ratio:.2f}x {seconds / size * 1e9:.0f}ns/B':>20}")
+            print(f"{format_setting(settings):>20} {settings.get_memory_per_connection() / 1024:>10.0f} " + " ".join(cells))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark comparing the JSON and binary formats for TICK_STATE messages.
+
+Measures the size of a full frame and the time to encode and decode it for a
+growing number of projectiles.
+
+Usage:
+    python3 -m bench.frame_encoding
+"""
+
+import json
+from timeit import timeit
+
+from src.agent_state import AgentState
+from src.binary_frame import decode_tick_state, encode_tick_state
+from src.message import Message
+from src.projectile_state import ProjectileState
+from src.vector2 import Vector2
+
+PROJECTILE_COUNTS = [0, 10, 100, 500]
+REPETITIONS = 200
+
+
+def make_states(num_projectiles):
+    agents = [
+        AgentState(0, Vector2(137.123456789, 350.987654321), Vector2(173.2050807, 100.0), 90, name="Agent1"),
+        AgentState(1, Vector2(887.55555555, 351.12121212), Vector2(-100.0, 0.5), 100, name="Agent2"),
+    ]
+    projectiles = [
+        ProjectileState(i + 2, Vector2(100 + i * 1.37, 200 + i * 0.71), Vector2.from_angle_magnitude(i * 13.3, 1000), i % 2)
+        for i in range(num_projectiles)
+    ]
+    return agents, projectiles
+
+
+def encode_json(agents, projectiles):
+    return Message(Message.TICK_STATE, {
+        "keyframe": True,
+        "agents": [agent.to_json_dict() for agent in agents],
+        "projectiles": [projectile.to_json_dict() for projectile in projectiles],
+        "destroyed": [],
+    }).to_json()
+
+
+def main():
+    print(f"{'projectiles':>12} {'json B':>8} {'binary B':>9} {'json enc us':>12} {'bin enc us':>11} {'json dec us':>12} {'bin dec us':>11}")
+    for num_projectiles in PROJECTILE_COUNTS:
+        agents, projectiles = make_states(num_projectiles)
+        json_payload = encode_json(agents, projectiles)
+        binary_payload = encode_tick_state(0, agents, projectiles, [], include_names=True)
+
+        json_encode = timeit(lambda: encode_json(agents, projectiles), number=REPETITIONS) / REPETITIONS
+        binary_encode = timeit(lambda: encode_tick_state(0, agents, projectiles, [], True), number=REPETITIONS) / REPETITIONS
+        json_decode = timeit(lambda: json.loads(json_payload), number=REPETITIONS) / REPETITIONS
+        binary_decode = timeit(lambda: decode_tick_state(binary_payload), number=REPETITIONS) / REPETITIONS
+
+        print(
+            f"{num_projectiles:>12} {len(json_payload):>8} {len(binary_payload):>9} "
+            f"{json_encode * 1e6:>12.1f} {binary_encode * 1e6:>11.1f} "
+            f"{json_decode * 1e6:>12.1f} {binary_decode * 1e6:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
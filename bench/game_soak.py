@@ -0,0 +1,163 @@
+"""
+Soak test of the game lifecycle.
+
+Plays thousands of short real-time matches through a GameServer, a number of
+them at the same time, and checks that the server's memory reaches a steady
+state. Every match goes through the matchmaking queue. Players raise an
+exception after MATCH_TICKS ticks, which ends the match. Every DISCONNECT_EVERY
+matches, a player disconnects while coding, and every DISCONNECT_EVERY matches
+another one disconnects while the game is running, so that both kinds of
+forfeit are exercised.
+
+Every REPORT_INTERVAL matches, reports the resident set size of the process,
+the number of Game objects that are still alive after a full garbage
+collection, and the sizes of the server's registries. Games that have been
+reaped should not stay alive, so the number of live games stays below the
+number of matches played at the same time, and the resident set size should
+stop growing once the allocator has warmed up. The matches being played still
+refer to their games, so live games can exceed the registered matches.
+
+Usage:
+    python3 -m bench.game_soak
+    python3 -m bench.game_soak --matches 5000 --concurrent 50
+    python3 -m bench.game_soak --matches 200 --isolate
+"""
+
+import argparse
+import gc
+import os
+import weakref
+
+import tornado.gen
+import tornado.ioloop
+
+from src.game import GAME_REAPED
+from src.gameserver import GameServer
+from src.headless import HeadlessClient
+
+# Ticks after which players end their match
+MATCH_TICKS = 10
+# Every this many matches, a player disconnects while coding, and another
+# player disconnects while running
+DISCONNECT_EVERY = 10
+# Matches between reports
+REPORT_INTERVAL = 500
+# Number of named players whose ratings the server records
+PLAYERS = 100
+
+SHORT_MATCH_CODE = f"""
+class ShortMatch(Agent):
+    def run(self):
+        self.ticks = getattr(self, "ticks", 0) + 1
+        if self.ticks > {MATCH_TICKS}:
+            raise RuntimeError("end of match")
+"""
+
+
+class SoakClient(HeadlessClient):
+    """A HeadlessClient with a player name."""
+
+    def __init__(self, player_id):
+        super().__init__()
+        self.player_id = player_id
+        # True once the client has been matched
+        self.matched = False
+
+    def send_start_game_message(self):
+        self.matched = True
+
+
+def get_rss():
+    """Returns the resident set size of this process in bytes."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class Soak():
+    """Plays matches on a GameServer and reports its memory."""
+
+    def __init__(self, num_matches, isolate_players):
+        self.game_server = GameServer(isolate_players=isolate_players)
+        self.num_matches = num_matches
+        self.started = 0
+        self.finished = 0
+        self.forfeits = 0
+        # Every game that has been created
+        self.games = weakref.WeakSet()
+        self.baseline_rss = None
+
+    async def play_matches(self):
+        """Plays matches until num_matches have been started."""
+        while self.started < self.num_matches:
+            match_number = self.started
+            self.started += 1
+            await self.play_match(match_number)
+            self.finished += 1
+            if self.finished % REPORT_INTERVAL == 0:
+                self.report()
+
+    async def play_match(self, match_number):
+        # The matchmaker may pair these clients with the clients of other
+        # matches that are being played at the same time
+        clients = [SoakClient(f"player-{(match_number + i) % PLAYERS}") for i in range(2)]
+        for client in clients:
+            self.game_server.enqueue(client)
+        while not all(client.matched for client in clients):
+            await tornado.gen.sleep(0.01)
+        # The game of a client is None if it has been reaped already
+        games = [self.game_server.client_games.get(client) for client in clients]
+        for game in games:
+            if game is not None:
+                self.games.add(game)
+
+        if match_number % DISCONNECT_EVERY == 0:
+            self.disconnect(clients[0])
+        for client in clients:
+            if client.on_receive_player_code is not None:
+                client.on_receive_player_code(client, SHORT_MATCH_CODE, "ShortMatch")
+        if match_number % DISCONNECT_EVERY == DISCONNECT_EVERY // 2:
+            await tornado.gen.sleep(0.05)
+            self.disconnect(clients[0])
+        while any(game is not None and game.state != GAME_REAPED for game in games):
+            await tornado.gen.sleep(0.01)
+
+    def disconnect(self, client):
+        if client in self.game_server.client_games:
+            self.forfeits += 1
+        self.game_server.disconnect(client)
+
+    def report(self):
+        gc.collect()
+        rss = get_rss()
+        if self.baseline_rss is None:
+            self.baseline_rss = rss
+        print(
+            f"{self.finished:>8} {rss / 2 ** 20:>8.1f} {(rss - self.baseline_rss) / 2 ** 20:>+11.1f} "
+            f"{len(self.games):>11} {len(self.game_server.matches):>8} {len(self.game_server.client_games):>13} "
+            f"{len(self.game_server.ratings.ratings):>8} {self.forfeits:>9}"
+        )
+
+
+async def run_soak(num_matches, concurrent, isolate_players):
+    soak = Soak(num_matches, isolate_players)
+    print(
+        f"{'matches':>8} {'rss MB':>8} {'growth MB':>11} {'live games':>11} {'matches':>8} "
+        f"{'client games':>13} {'ratings':>8} {'forfeits':>9}"
+    )
+    await tornado.gen.multi([soak.play_matches() for _ in range(concurrent)])
+    soak.game_server.match_callback.stop()
+    print(f"started {soak.game_server.games_started} games, reaped {soak.game_server.games_reaped}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=3000, help="Number of matches to play.")
+    parser.add_argument("--concurrent", type=int, default=20, help="Number of matches played at the same time.")
+    parser.add_argument("--isolate", action="store_true", help="Run player code in worker processes, as the server does by default.")
+    args = parser.parse_args()
+    io_loop = tornado.ioloop.IOLoop.current()
+    io_loop.run_sync(lambda: run_soak(args.matches, args.concurrent, args.isolate))
+
+
+if __name__ == "__main__":
+    main()
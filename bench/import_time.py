@@ -0,0 +1,57 @@
+"""
+Benchmark for the time and memory it takes to start the server and a headless
+worker.
+
+Each case runs in a fresh interpreter, which reports how long its imports took,
+its peak memory use and whether pygame was imported. pygame is only needed for
+debug rendering (GUI=1), so it should never be imported by these cases.
+
+Usage:
+    python3 -m bench.import_time
+"""
+
+import json
+import subprocess
+import sys
+
+REPEATS = 5
+
+# Code run by each case. It is timed from before its first import.
+CASES = [
+    ("server", "import src.server"),
+    ("headless worker (pymunk)", "from src.headless import run_match\nfrom src.game import Game\nGame([], realtime=False, physics_backend='pymunk')"),
+    ("headless worker (simple)", "from src.headless import run_match\nfrom src.game import Game\nGame([], realtime=False, physics_backend='simple')"),
+]
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<case>", "exec"))
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "pygame": "pygame" in sys.modules,
+}}))
+"""
+
+
+def run_case(code):
+    """Returns (best seconds, best peak memory in kB, whether pygame was
+    imported) over REPEATS fresh interpreters."""
+    runs = []
+    for _ in range(REPEATS):
+        output = subprocess.run([sys.executable, "-c", CHILD.format(code=code)], check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return min(run["seconds"] for run in runs), min(run["max_rss_kb"] for run in runs), any(run["pygame"] for run in runs)
+
+
+def main():
+    print(f"{'case':>26} {'import ms':>10} {'peak MB':>8} {'pygame':>7}")
+    for name, code in CASES:
+        seconds, max_rss_kb, pygame = run_case(code)
+        print(f"{name:>26} {seconds * 1e3:>10.1f} {max_rss_kb / 1024:>8.1f} {str(pygame):>7}")
+
+
+if __name__ == "__main__":
+    main()
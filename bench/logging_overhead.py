@@ -0,0 +1,72 @@
+"""
+Benchmark for the cost of logging in the collision handler.
+
+PhysicsEngine.begin_collision_handler used to print two lines with the reprs
+of both objects on every collision. It now logs a debug record that is only
+created when debug logging is on, and records are written by a separate
+thread. This benchmark calls the collision handler directly with debug
+logging off, with debug logging on, and with the old prints, all writing to
+os.devnull.
+
+Usage:
+    python3 -m bench.logging_overhead
+"""
+
+import os
+from contextlib import redirect_stdout
+from time import perf_counter
+from unittest.mock import MagicMock
+
+from src.agent_state import AgentState
+from src.log import configure_logging, stop_logging
+from src.obstacle import Obstacle
+from src.physics_engine import PhysicsEngine
+from src.vector2 import Vector2
+
+COLLISIONS = 20000
+
+
+def make_arbiter(pe):
+    """Returns an arbiter for a collision between an agent and an obstacle."""
+    agent_state = AgentState(1, Vector2(100, 100), Vector2(10, 0), 100)
+    obstacle = Obstacle(2, Vector2(200, 100), 50, 50)
+    pe.add_agent(agent_state)
+    pe.add_obstacle(obstacle)
+    arbiter = MagicMock()
+    arbiter.shapes = [list(pe.bodies[1].shapes)[0], list(pe.bodies[2].shapes)[0]]
+    return arbiter
+
+
+def run_benchmark(level, old_prints=False):
+    """Returns the seconds per call of the collision handler."""
+    with open(os.devnull, "w") as devnull:
+        configure_logging(level, devnull)
+        pe = PhysicsEngine()
+        arbiter = make_arbiter(pe)
+        data = {}
+        with redirect_stdout(devnull):
+            start = perf_counter()
+            for _ in range(COLLISIONS):
+                pe.begin_collision_handler(arbiter, pe.space, data)
+                if old_prints:
+                    object_state_1 = pe._get_object_state_from_body(arbiter.shapes[0].body)
+                    object_state_2 = pe._get_object_state_from_body(arbiter.shapes[1].body)
+                    print(f"Collision between object ids: {object_state_1.id} and {object_state_2.id}")
+                    print(f"Collision between object states: {object_state_1} and {object_state_2}")
+            elapsed = perf_counter() - start
+        stop_logging()
+    return elapsed / COLLISIONS
+
+
+def main():
+    print(f"{'logging':>20} {'us/collision':>13}")
+    for name, level, old_prints in [
+        ("debug off", "INFO", False),
+        ("debug on (queued)", "DEBUG", False),
+        ("old prints", "INFO", True),
+    ]:
+        print(f"{name:>20} {run_benchmark(level, old_prints) * 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for the cost of starting a match.
+
+Starting a match creates a Game, adds the map's obstacles and the agents to its
+physics engine and runs the first tick, which needs the grids of static
+objects used for projectile hits and scans. This benchmark compares games that
+share the cached compiled map from load_map with games that compile the map
+for themselves, which is what every match used to do.
+
+Usage:
+    python3 -m bench.match_start
+"""
+
+import json
+import os
+from time import perf_counter
+from unittest.mock import MagicMock
+
+from src.agent import Agent
+from src.game import Game
+from src.game_map import MAPS_DIRECTORY, DEFAULT_MAP, GameMap, load_map
+
+MATCHES = 300
+
+
+def start_match(game_map):
+    game = Game([], realtime=False, game_map=game_map)
+    game.agents = [[MagicMock(), Agent(game.gen_id(), game)], [MagicMock(), Agent(game.gen_id(), game)]]
+    game.prepare_to_start_simulation()
+    game.tick()
+
+
+def run_benchmark(shared):
+    """Returns the seconds per match start."""
+    with open(os.path.join(MAPS_DIRECTORY, DEFAULT_MAP + ".json")) as map_file:
+        map_data = json.load(map_file)
+    load_map()
+
+    start = perf_counter()
+    for _ in range(MATCHES):
+        start_match(load_map() if shared else GameMap.from_dict(map_data))
+    return (perf_counter() - start) / MATCHES
+
+
+def main():
+    compiled_per_match = run_benchmark(shared=False)
+    shared = run_benchmark(shared=True)
+    print(f"{'map':>20} {'us/match start':>15}")
+    print(f"{'compiled per match':>20} {compiled_per_match * 1e6:>15.1f}")
+    print(f"{'shared':>20} {shared * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
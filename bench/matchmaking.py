@@ -0,0 +1,160 @@
+"""
+Load test of the matchmaking queue.
+
+Simulates clients that join the queue at a steady rate with ratings spread
+around DEFAULT_RATING. Clients that have not been matched after a random wait
+leave the queue, and every matched client disconnects again later, which
+also removes it from the queue. Time is simulated and the matcher runs every
+MATCH_INTERVAL, as in GameServer.
+
+For each rate of arrivals, reports the CPU time per add and remove, the mean
+and longest matcher pass, the mean queue length, how long matched clients
+waited and the mean rating difference of matches. The same arrivals and
+departures are also replayed through the FIFO deque that GameServer used
+before Matchmaker. It pairs clients as soon as two are queued, regardless of
+rating, and its removals raise for clients that are no longer queued
+("errors").
+
+Usage:
+    python3 -m bench.matchmaking
+"""
+
+import heapq
+import random
+from collections import deque
+from time import perf_counter
+
+from src.matchmaking import DEFAULT_RATING, MATCH_INTERVAL, Matchmaker
+
+# Clients joining the queue per second
+RATES = [10, 100, 1000, 5000]
+# Simulated seconds
+DURATION = 30
+# Standard deviation of the ratings of clients
+RATING_SPREAD = 300
+# Mean seconds that clients wait in the queue before they give up
+MEAN_PATIENCE = 10
+
+
+def generate_events(rate):
+    """Returns a sorted list of (time, client, rating, leave time) of the
+    clients that join the queue."""
+    generator = random.Random(rate)
+    events = []
+    time = 0
+    client = 0
+    while time < DURATION:
+        time += generator.expovariate(rate)
+        rating = generator.gauss(DEFAULT_RATING, RATING_SPREAD)
+        events.append((time, client, rating, time + generator.expovariate(1 / MEAN_PATIENCE)))
+        client += 1
+    return events
+
+
+def run_matchmaker(events):
+    """Returns a dict of measurements of Matchmaker."""
+    matchmaker = Matchmaker()
+    # Heap of (time, client) of clients that leave or disconnect
+    departures = []
+    joined_at = {}
+    waits = []
+    add_time = remove_time = 0
+    removes = 0
+    pass_times = []
+    queue_length = 0
+    next_event = 0
+    steps = int(DURATION / MATCH_INTERVAL)
+    for step in range(1, steps + 1):
+        now = step * MATCH_INTERVAL
+        while next_event < len(events) and events[next_event][0] <= now:
+            time, client, rating, leave_time = events[next_event]
+            next_event += 1
+            start = perf_counter()
+            matchmaker.add(client, rating, now=time)
+            add_time += perf_counter() - start
+            joined_at[client] = time
+            heapq.heappush(departures, (leave_time, client))
+        while departures and departures[0][0] <= now:
+            _, client = heapq.heappop(departures)
+            start = perf_counter()
+            matchmaker.remove(client)
+            remove_time += perf_counter() - start
+            removes += 1
+        queue_length += len(matchmaker)
+        start = perf_counter()
+        pairs = matchmaker.match(now=now)
+        pass_times.append(perf_counter() - start)
+        for pair in pairs:
+            for client in pair:
+                waits.append(now - joined_at[client])
+    waits.sort()
+    return {
+        "add_us": add_time / max(next_event, 1) * 1e6,
+        "remove_us": remove_time / max(removes, 1) * 1e6,
+        "pass_ms": sum(pass_times) / len(pass_times) * 1e3,
+        "max_pass_ms": max(pass_times) * 1e3,
+        "queue": queue_length / steps,
+        "mean_wait": sum(waits) / max(len(waits), 1),
+        "p95_wait": waits[int(len(waits) * 0.95)] if waits else 0,
+        "rating_difference": matchmaker.stats.get_mean_rating_difference() or 0,
+        "matched": len(waits),
+        "errors": 0,
+    }
+
+
+def run_fifo(events):
+    """Returns a dict of measurements of the FIFO deque."""
+    queue = deque()
+    departures = []
+    add_time = remove_time = 0
+    removes = 0
+    errors = 0
+    matched = 0
+    for time, client, rating, leave_time in events:
+        while departures and departures[0][0] <= time:
+            _, departing = heapq.heappop(departures)
+            start = perf_counter()
+            try:
+                queue.remove(departing)
+            except ValueError:
+                errors += 1
+            remove_time += perf_counter() - start
+            removes += 1
+        start = perf_counter()
+        queue.appendleft(client)
+        if len(queue) >= 2:
+            queue.pop()
+            queue.pop()
+            matched += 2
+        add_time += perf_counter() - start
+        heapq.heappush(departures, (leave_time, client))
+    return {
+        "add_us": add_time / len(events) * 1e6,
+        "remove_us": remove_time / max(removes, 1) * 1e6,
+        "matched": matched,
+        "errors": errors,
+    }
+
+
+def main():
+    print(
+        f"{'queue':>10} {'rate/s':>7} {'clients':>8} {'add us':>7} {'remove us':>10} {'pass ms':>8} {'max pass ms':>12} "
+        f"{'queued':>7} {'wait s':>7} {'p95 wait s':>11} {'rating diff':>12} {'matched':>8} {'errors':>7}"
+    )
+    for rate in RATES:
+        events = generate_events(rate)
+        result = run_matchmaker(events)
+        print(
+            f"{'buckets':>10} {rate:>7} {len(events):>8} {result['add_us']:>7.1f} {result['remove_us']:>10.1f} "
+            f"{result['pass_ms']:>8.2f} {result['max_pass_ms']:>12.2f} {result['queue']:>7.1f} {result['mean_wait']:>7.2f} "
+            f"{result['p95_wait']:>11.2f} {result['rating_difference']:>12.1f} {result['matched']:>8} {result['errors']:>7}"
+        )
+        result = run_fifo(events)
+        print(
+            f"{'fifo':>10} {rate:>7} {len(events):>8} {result['add_us']:>7.1f} {result['remove_us']:>10.1f} "
+            f"{'-':>8} {'-':>12} {'-':>7} {'-':>7} {'-':>11} {'-':>12} {result['matched']:>8} {result['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
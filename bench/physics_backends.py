@@ -0,0 +1,108 @@
+"""
+Benchmark comparing the pymunk and simple physics backends.
+
+For each backend this benchmark reports:
+- the time to import it in a fresh interpreter,
+- the time per PhysicsEngine.step with agents driving around the default map,
+  bouncing off its walls and obstacles,
+- the time per headless match between the agents in test/agent_code, played
+  with several random seeds.
+It also reports how many of those matches had a different result with the
+simple backend than with the pymunk backend, which should be none.
+
+Usage:
+    python3 -m bench.physics_backends
+"""
+
+import glob
+import random
+import subprocess
+import sys
+from time import perf_counter
+
+from src.agent import Agent
+from src.agent_state import AgentState
+from src.globals import *
+from src.headless import run_match
+from src.physics_backend import PYMUNK_BACKEND, SIMPLE_BACKEND, create_physics_engine
+from src.tournament import load_entrant
+from src.vector2 import Vector2
+
+BACKENDS = {
+    PYMUNK_BACKEND: "src.physics_engine",
+    SIMPLE_BACKEND: "src.simple_physics_engine",
+}
+AGENT_COUNTS = [2, 8, 32]
+TICKS = TICKS_PER_SECOND * 20
+SEEDS = range(3)
+IMPORT_REPEATS = 5
+
+
+def time_import(module):
+    """Returns the seconds taken to import module in a new interpreter, less
+    the time taken to start the interpreter."""
+    def run(code):
+        best = None
+        for _ in range(IMPORT_REPEATS):
+            start = perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL)
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    return run(f"import {module}") - run("pass")
+
+
+def time_steps(backend, num_agents):
+    """Returns the seconds per step with num_agents agents that turn around
+    whenever they hit something."""
+    rng = random.Random(num_agents)
+    pe = create_physics_engine(backend)
+    pe.add_map_obstacles()
+
+    def on_collision(object_state_1, object_state_2, contact_point):
+        for object_state in (object_state_1, object_state_2):
+            if isinstance(object_state, AgentState):
+                object_state.velocity = Vector2.from_angle_magnitude(rng.random() * 360, Agent.MAX_SPEED)
+    pe.add_on_collision_callback(on_collision)
+
+    for i in range(num_agents):
+        position = Vector2(100 + (i % 8) * 110, 100 + (i // 8) * 130)
+        pe.add_agent(AgentState(i, position, Vector2.from_angle_magnitude(rng.random() * 360, Agent.MAX_SPEED), 100))
+
+    start = perf_counter()
+    for _ in range(TICKS):
+        pe.step(1 / TICKS_PER_SECOND)
+    return (perf_counter() - start) / TICKS
+
+
+def play_matches(backend):
+    """Returns (results of every match, seconds per match)."""
+    entrants = [load_entrant(path) for path in sorted(glob.glob("test/agent_code/*.py"))]
+    results = []
+    start = perf_counter()
+    for seed in SEEDS:
+        for entrant_1 in entrants:
+            for entrant_2 in entrants:
+                # Vary the agents that move randomly
+                code_1 = entrant_1.code.replace("random.seed(256)", f"random.seed({seed})")
+                code_2 = entrant_2.code.replace("random.seed(256)", f"random.seed({seed + 1})")
+                result = run_match((code_1, entrant_1.class_name), (code_2, entrant_2.class_name), physics_backend=backend)
+                results.append(result.to_json_dict())
+    return results, (perf_counter() - start) / len(results)
+
+
+def main():
+    print(f"{'backend':>8} {'import ms':>10}", *(f"{f'us/step {n} agents':>18}" for n in AGENT_COUNTS), f"{'ms/match':>9}")
+    match_results = {}
+    for backend, module in BACKENDS.items():
+        import_time = time_import(module)
+        step_times = [time_steps(backend, num_agents) for num_agents in AGENT_COUNTS]
+        match_results[backend], per_match = play_matches(backend)
+        print(f"{backend:>8} {import_time * 1e3:>10.1f}", *(f"{step_time * 1e6:>18.1f}" for step_time in step_times), f"{per_match * 1e3:>9.1f}")
+
+    different = sum(1 for pymunk_result, simple_result in zip(match_results[PYMUNK_BACKEND], match_results[SIMPLE_BACKEND]) if pymunk_result != simple_result)
+    print(f"matches with different results: {different}/{len(match_results[PYMUNK_BACKEND])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark for PhysicsEngine.step with a growing number of projectiles.
+
+Every step, a wave of projectiles is spawned on top of an obstacle and each one
+is removed from its collision callback, the same way Game handles projectile
+hits. Since object lookups in the collision handlers are constant time, the
+cost per collision should stay flat as the number of projectiles grows.
+
+Usage:
+    python3 -m bench.physics_step
+"""
+
+from time import perf_counter
+
+from src.globals import *
+from src.obstacle import Obstacle
+from src.physics_engine import PhysicsEngine
+from src.projectile_state import ProjectileState
+from src.vector2 import Vector2
+
+PROJECTILE_COUNTS = [1, 10, 100, 250, 500, 1000]
+STEPS = 30
+
+
+def run_benchmark(num_projectiles):
+    """Returns (seconds per step, seconds per collision) for num_projectiles
+    projectiles colliding each step.
+    """
+    pe = PhysicsEngine()
+    center = Vector2(PhysicsEngine.SPACE_WIDTH / 2, PhysicsEngine.SPACE_HEIGHT / 2)
+    pe.add_obstacle(Obstacle(0, center, 400, 400))
+
+    collisions = [0]
+
+    def callback(object_state_1, object_state_2, contact_point):
+        collisions[0] += 1
+        for object_state in (object_state_1, object_state_2):
+            if isinstance(object_state, ProjectileState):
+                pe.remove_object(object_state.id)
+
+    pe.add_on_collision_callback(callback)
+
+    next_id = 1
+    elapsed = 0
+    for _ in range(STEPS):
+        for i in range(num_projectiles):
+            position = Vector2(center.x - 150 + (i % 30) * 10, center.y - 150 + (i // 30) * 3)
+            # Use the projectile's own id as the attacker id so that projectiles
+            # are not filtered into the same collision group.
+            pe.add_projectile(ProjectileState(next_id, position, Vector2(1, 0), next_id))
+            next_id += 1
+        start = perf_counter()
+        pe.step(1 / TICKS_PER_SECOND)
+        elapsed += perf_counter() - start
+
+    per_step = elapsed / STEPS
+    per_collision = elapsed / max(collisions[0], 1)
+    return per_step, per_collision
+
+
+def main():
+    print(f"{'projectiles':>12} {'ms/step':>10} {'us/collision':>14}")
+    for num_projectiles in PROJECTILE_COUNTS:
+        per_step, per_collision = run_benchmark(num_projectiles)
+        print(f"{num_projectiles:>12} {per_step * 1e3:>10.3f} {per_collision * 1e6:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark for the per-object cost of PhysicsEngine.step outside of pymunk.
+
+PhysicsEngine.step copies velocities from object states into pymunk before
+stepping the space, copies positions back afterwards and moves projectiles,
+which do not have pymunk bodies. This benchmark times PhysicsEngine.step and a
+bare pymunk Space.step of the same space, so the difference is the time spent
+on object states, for a growing number of moving projectiles that never
+collide.
+
+Usage:
+    python3 -m bench.physics_sync
+"""
+
+from time import perf_counter
+
+from src.globals import *
+from src.physics_engine import PhysicsEngine
+from src.projectile_state import ProjectileState
+from src.vector2 import Vector2
+
+PROJECTILE_COUNTS = [1, 10, 100, 250, 500, 1000]
+STEPS = 100
+
+
+def run_benchmark(num_projectiles):
+    """Returns (seconds per PhysicsEngine.step, seconds per Space.step) with
+    num_projectiles projectiles in the space.
+    """
+    pe = PhysicsEngine()
+    for i in range(num_projectiles):
+        position = Vector2(100 + (i % 40) * 20, 100 + (i // 40) * 20)
+        # All projectiles share an attacker so they never collide with each
+        # other, and move slowly enough to stay away from the boundaries.
+        pe.add_projectile(ProjectileState(i + 1, position, Vector2(1, 1), 0))
+
+    dt = 1 / TICKS_PER_SECOND
+    start = perf_counter()
+    for _ in range(STEPS):
+        pe.step(dt)
+    per_step = (perf_counter() - start) / STEPS
+
+    start = perf_counter()
+    for _ in range(STEPS):
+        pe.space.step(dt)
+    per_space_step = (perf_counter() - start) / STEPS
+    return per_step, per_space_step
+
+
+def main():
+    print(f"{'projectiles':>12} {'ms/step':>10} {'ms/space step':>14} {'us sync/object':>15}")
+    for num_projectiles in PROJECTILE_COUNTS:
+        per_step, per_space_step = run_benchmark(num_projectiles)
+        sync = max(per_step - per_space_step, 0) / num_projectiles
+        print(f"{num_projectiles:>12} {per_step * 1e3:>10.3f} {per_space_step * 1e3:>14.3f} {sync * 1e6:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark for running player code in worker processes.
+
+Measures the time the game loop spends per tick when player code runs in the
+game's process and when it runs in worker processes, for well-behaved agents
+and for an agent whose run() takes longer than a whole tick.
+
+Usage:
+    python3 -m bench.player_isolation
+"""
+
+import os
+from time import perf_counter
+
+from src.game import Game
+from src.globals import *
+from src.headless import HeadlessClient
+
+TICKS = TICKS_PER_SECOND * 5
+SLOW_RUN_TIME = 0.1
+
+
+def load_agent_code(file_name):
+    path = os.path.join(os.path.dirname(__file__), "..", "test", "agent_code", file_name)
+    with open(path) as f:
+        return f.read()
+
+
+SLOW_CODE = f"""
+import time
+
+class Slow(Agent):
+    def run(self):
+        time.sleep({SLOW_RUN_TIME})
+"""
+
+
+def run_benchmark(players, isolate_players, ticks):
+    """Returns (mean, max) seconds spent in Game.tick."""
+    clients = [HeadlessClient(), HeadlessClient()]
+    game = Game(clients, realtime=False, isolate_players=isolate_players)
+    for client, (code, class_name) in zip(clients, players):
+        game.exec_player_code(client, code, class_name)
+    game.prepare_to_start_simulation()
+
+    times = []
+    for _ in range(ticks):
+        start = perf_counter()
+        game.tick()
+        times.append(perf_counter() - start)
+        if game.player_error:
+            break
+    game.player_executor.close()
+    return sum(times) / len(times), max(times)
+
+
+def main():
+    agents = [(load_agent_code("agent1.py"), "Agent1"), (load_agent_code("agent2.py"), "Agent2")]
+    slow = [(SLOW_CODE, "Slow"), (load_agent_code("agent2.py"), "Agent2")]
+    print(f"{'players':<10} {'executor':<8} {'mean tick ms':>13} {'max tick ms':>12}")
+    for name, players, ticks in [("normal", agents, TICKS), ("slow run", slow, TICKS_PER_SECOND)]:
+        for isolate_players in [False, True]:
+            mean, maximum = run_benchmark(players, isolate_players, ticks)
+            executor = "process" if isolate_players else "local"
+            print(f"{name:<10} {executor:<8} {mean * 1000:>13.2f} {maximum * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
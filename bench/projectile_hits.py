@@ -0,0 +1,76 @@
+"""
+Benchmark for projectile hits at different tick rates.
+
+Agents move across the arena while projectiles are fired through a row of thin
+walls and across the agents' paths. Since projectiles are swept along their
+whole path, every tick rate should report the same hits, while the CPU time per
+simulated second drops with the tick rate.
+
+Usage:
+    python3 -m bench.projectile_hits
+"""
+
+import random
+from time import perf_counter
+
+from src.agent import Agent
+from src.agent_state import AgentState
+from src.obstacle import Obstacle
+from src.physics_engine import PhysicsEngine
+from src.projectile_state import ProjectileState
+from src.vector2 import Vector2
+
+TICK_RATES = [60, 30, 15, 10, 5, 2]
+NUM_AGENTS = 10
+NUM_PROJECTILES = 500
+SIMULATED_SECONDS = 2
+
+
+def run_benchmark(ticks_per_second):
+    """Returns (number of agent hits, number of wall hits, seconds of CPU time
+    per simulated second) at ticks_per_second.
+    """
+    rng = random.Random(0)
+    pe = PhysicsEngine()
+    for i in range(4):
+        # Walls 2 pixels wide, much thinner than a projectile's step
+        pe.add_obstacle(Obstacle(-10 - i, Vector2(300 + 150 * i, 600), 100, 2))
+
+    next_id = 1
+    for i in range(NUM_AGENTS):
+        # Agents move in separate lanes so that they never touch each other or
+        # the walls, which would make their paths depend on the tick rate.
+        position = Vector2(150 + 80 * i, rng.uniform(100, 200))
+        pe.add_agent(AgentState(next_id, position, Vector2(0, rng.uniform(50, 150)), 100))
+        next_id += 1
+    for _ in range(NUM_PROJECTILES):
+        position = Vector2(rng.uniform(80, 120), rng.uniform(100, 650))
+        velocity = Vector2.from_angle_magnitude(rng.uniform(-10, 10), Agent.PROJECTILE_SPEED)
+        # An attacker id that no agent has, so every agent can be hit
+        pe.add_projectile(ProjectileState(next_id, position, velocity, 0))
+        next_id += 1
+
+    hits = {"agent": 0, "wall": 0}
+
+    def callback(projectile_state, object_state, contact_point):
+        hits["agent" if isinstance(object_state, AgentState) else "wall"] += 1
+        pe.remove_object(projectile_state.id)
+
+    pe.add_on_collision_callback(callback)
+
+    start = perf_counter()
+    for _ in range(ticks_per_second * SIMULATED_SECONDS):
+        pe.step(1 / ticks_per_second)
+    elapsed = perf_counter() - start
+    return hits["agent"], hits["wall"], elapsed / SIMULATED_SECONDS
+
+
+def main():
+    print(f"{'ticks/s':>8} {'agent hits':>11} {'wall hits':>10} {'ms/simulated s':>15}")
+    for ticks_per_second in TICK_RATES:
+        agent_hits, wall_hits, per_second = run_benchmark(ticks_per_second)
+        print(f"{ticks_per_second:>8} {agent_hits:>11} {wall_hits:>10} {per_second * 1e3:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark for agent scans per tick.
+
+Every tick, the game scans around each agent once for the scan callbacks, and
+player code may call Agent.get_agents_position any number of times. This
+benchmark compares running a pymunk point query for every scan
+(PhysicsEngine.scan_area) with the per-tick cache of PhysicsEngine.scan_agent,
+for a growing number of API calls per agent per tick.
+
+Usage:
+    python3 -m bench.scan_cache
+"""
+
+from time import perf_counter
+
+from src.agent import Agent
+from src.agent_state import AgentState
+from src.globals import *
+from src.obstacle import Obstacle
+from src.physics_engine import PhysicsEngine
+from src.vector2 import Vector2
+
+API_CALLS = [0, 1, 10, 100]
+TICKS = 300
+
+
+def run_benchmark(api_calls, cached):
+    """Returns the seconds per tick spent scanning with api_calls scans per
+    agent per tick on top of the game's own scan.
+    """
+    pe = PhysicsEngine()
+    for i, (x, y) in enumerate([(300, 200), (500, 350), (700, 500), (400, 550), (650, 150)]):
+        pe.add_obstacle(Obstacle(100 + i, Vector2(x, y), 50, 150))
+    agent_states = [
+        AgentState(1, Vector2(150, 350), Vector2(60, 10), 100),
+        AgentState(2, Vector2(900, 350), Vector2(-60, -10), 100),
+    ]
+    for agent_state in agent_states:
+        pe.add_agent(agent_state)
+
+    elapsed = 0
+    for _ in range(TICKS):
+        pe.step(1 / TICKS_PER_SECOND)
+        start = perf_counter()
+        for agent_state in agent_states:
+            for _ in range(api_calls + 1):
+                if cached:
+                    pe.scan_agent(agent_state, Agent.SCAN_DISTANCE)
+                else:
+                    pe.scan_area(agent_state.position, Agent.SCAN_DISTANCE)
+        elapsed += perf_counter() - start
+    return elapsed / TICKS
+
+
+def main():
+    print(f"{'api calls':>10} {'us/tick scan_area':>18} {'us/tick scan_agent':>19}")
+    for api_calls in API_CALLS:
+        uncached = run_benchmark(api_calls, cached=False)
+        cached = run_benchmark(api_calls, cached=True)
+        print(f"{api_calls:>10} {uncached * 1e6:>18.1f} {cached * 1e6:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
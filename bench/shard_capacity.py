@@ -0,0 +1,121 @@
+"""
+Benchmark for running many games at once with and without shards.
+
+Starts a number of concurrent Agent1 vs Agent2 games, either in this process or
+on a pool of shard processes, and measures how many TICK_STATE frames reach
+each client per second. A server that keeps up delivers TICKS_PER_SECOND
+frames per second to every client. Player code runs in the game's process so
+that the benchmark measures the cost of the games themselves.
+
+Usage:
+    python3 -m bench.shard_capacity
+    python3 -m bench.shard_capacity --shards 4 --games 50 100 200
+"""
+
+import argparse
+import multiprocessing
+import os
+
+import tornado.gen
+import tornado.ioloop
+
+from src.game import Game
+from src.globals import *
+from src.message import Message
+from src.shard import ShardPool
+
+DURATION = 5
+
+
+def load_agent_code(file_name):
+    path = os.path.join(os.path.dirname(__file__), "..", "test", "agent_code", file_name)
+    with open(path) as f:
+        return f.read()
+
+
+class CountingClient():
+    """Counts the TICK_STATE frames it receives."""
+
+    def __init__(self):
+        self.frame_format = "json"
+        self.on_receive_player_code = None
+        self.frames = 0
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        if Message.from_json(payload).type == Message.TICK_STATE:
+            self.frames += 1
+
+    def send_debug_message(self, message_contents):
+        pass
+
+    def send_start_game_message(self):
+        pass
+
+    def send_start_simulation_message(self):
+        pass
+
+    def send_python_error_message(self, error_str):
+        pass
+
+    def send_results(self, winner, tie, agents, error=False, forfeit=False):
+        pass
+
+
+async def run_benchmark(num_games, num_shards):
+    """Returns the mean number of frames per second received by each client."""
+    players = [(load_agent_code("agent1.py"), "Agent1"), (load_agent_code("agent2.py"), "Agent2")]
+    pool = ShardPool(num_shards, isolate_players=False) if num_shards > 0 else None
+    clients = []
+    for _ in range(num_games):
+        game_clients = [CountingClient(), CountingClient()]
+        clients += game_clients
+        if pool is not None:
+            game = pool.start_game(game_clients)
+        else:
+            game = Game(game_clients)
+        for client, (code, class_name) in zip(game_clients, players):
+            client.on_receive_player_code(client, code, class_name)
+
+    # Let the games start before measuring
+    await tornado.gen.sleep(1)
+    start_frames = sum(client.frames for client in clients)
+    await tornado.gen.sleep(DURATION)
+    frames = sum(client.frames for client in clients) - start_frames
+    if pool is not None:
+        pool.close()
+    return frames / len(clients) / DURATION
+
+
+def measure(connection, num_games, num_shards):
+    """Runs one benchmark and sends the result through connection. Every
+    benchmark runs in a fresh process so that games from earlier runs, which
+    keep running in the background, do not affect it."""
+    io_loop = tornado.ioloop.IOLoop.current()
+    connection.send(io_loop.run_sync(lambda: run_benchmark(num_games, num_shards)))
+
+
+def run_in_process(num_games, num_shards):
+    context = multiprocessing.get_context("spawn")
+    connection, child_connection = context.Pipe()
+    process = context.Process(target=measure, args=(child_connection, num_games, num_shards))
+    process.start()
+    result = connection.recv()
+    process.terminate()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=os.cpu_count(), help="Number of shards.")
+    parser.add_argument("--games", type=int, nargs="+", default=[10, 50, 100], help="Numbers of concurrent games.")
+    args = parser.parse_args()
+
+    print(f"{'games':>6} {'in-process fps':>15} {f'{args.shards} shards fps':>15}   (target {TICKS_PER_SECOND})")
+    for num_games in args.games:
+        in_process = run_in_process(num_games, 0)
+        sharded = run_in_process(num_games, args.shards)
+        print(f"{num_games:>6} {in_process:>15.1f} {sharded:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
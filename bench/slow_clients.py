@@ -0,0 +1,146 @@
+"""
+Benchmark for the memory the server uses for players on slow links.
+
+Plays a match between two agents that keep moving and shooting and sends its
+frames to a player whose link can only carry a given number of bytes per
+second. Compares the largest amount of data buffered for the player when every
+frame is written immediately, as before OutboundQueue was added, with the
+largest amount buffered by OutboundQueue, and reports the frames the player
+received and when it was disconnected for being too slow.
+
+The link and the clock of the OutboundQueue are simulated, so a long match
+runs in a few seconds.
+
+Usage:
+    python3 -m bench.slow_clients
+"""
+
+from collections import deque
+from concurrent.futures import Future
+from unittest.mock import patch
+
+from src.agent import Agent
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON
+from src.client_messages import ClientMessageSender
+from src.game import Game
+from src.globals import TICKS_PER_SECOND
+from src.outbound_queue import OutboundQueue
+
+# Bytes per second of the player's link in each case. None is an unlimited link
+# and 0 a link that stalled.
+BANDWIDTHS = [None, 16 * 1024, 4 * 1024, 1024, 0]
+TICKS = TICKS_PER_SECOND * 60
+
+
+class SimulatedLinkClient(ClientMessageSender):
+    """A player whose writes are flushed at the bandwidth of its link."""
+
+    def __init__(self, frame_format, bandwidth):
+        self.frame_format = frame_format
+        self.on_receive_player_code = None
+        self.bandwidth = bandwidth
+        self.outbound = OutboundQueue(self)
+        # Pairs (remaining bytes, future) of writes that were not flushed yet
+        self.link = deque()
+        self.buffered_bytes = 0
+        # Bytes that would be buffered if every message was written immediately
+        self.unbounded_bytes = 0
+        self.frames_received = 0
+        self.closed = False
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        self.unbounded_bytes += len(payload)
+        if frame is None:
+            self.outbound.send_message(payload, binary)
+        else:
+            self.outbound.send_frame(frame)
+
+    def write_encoded(self, payload, binary=False):
+        if self.closed:
+            return None
+        future = Future()
+        self.link.append([len(payload), future])
+        self.buffered_bytes += len(payload)
+        return future
+
+    def close(self, code=None, reason=None):
+        self.closed = True
+        self.link.clear()
+        self.buffered_bytes = 0
+
+    def transfer(self, seconds):
+        """Flushes the bytes that the link carries in the given time."""
+        budget = float("inf") if self.bandwidth is None else self.bandwidth * seconds
+        self.unbounded_bytes = max(0, self.unbounded_bytes - budget)
+        while self.link and budget > 0:
+            write = self.link[0]
+            sent = min(write[0], budget)
+            write[0] -= sent
+            budget -= sent
+            self.buffered_bytes -= sent
+            if write[0] == 0:
+                self.link.popleft()
+                self.frames_received += 1
+                write[1].set_result(None)
+
+
+class Spinner(Agent):
+    """Keeps turning and shooting so that frames are never empty."""
+
+    angle = 0
+
+    def run(self):
+        self.angle = (self.angle + 7) % 360
+        self.set_movement_speed(Agent.MAX_SPEED)
+        self.set_movement_direction(self.angle)
+        self.attack_ranged(self.angle)
+
+
+def run_case(frame_format, bandwidth):
+    """Returns (max unbounded bytes, max queued bytes, frames received, time of
+    the disconnect or None, stats) of the slow player."""
+    client = SimulatedLinkClient(frame_format, bandwidth)
+    opponent = SimulatedLinkClient(FORMAT_JSON, None)
+    game = Game([client, opponent], realtime=False)
+    game.add_player_agent(client, Spinner, "Spinner")
+    game.add_player_agent(opponent, Spinner, "Spinner")
+    game.prepare_to_start_simulation()
+
+    now = [0]
+    max_unbounded = 0
+    max_queued = 0
+    disconnect_time = None
+    with patch("src.outbound_queue.perf_counter", lambda: now[0]):
+        for i in range(TICKS):
+            now[0] = i / TICKS_PER_SECOND
+            game.tick()
+            max_unbounded = max(max_unbounded, client.unbounded_bytes)
+            outbound = client.outbound
+            waiting_frame = outbound.waiting_frame.json_payload if outbound.waiting_frame is not None else ""
+            max_queued = max(max_queued, client.buffered_bytes + outbound.queued_bytes + len(waiting_frame))
+            if client.closed and disconnect_time is None:
+                disconnect_time = now[0]
+            client.transfer(1 / TICKS_PER_SECOND)
+            opponent.transfer(1 / TICKS_PER_SECOND)
+    game.player_executor.close()
+    return max_unbounded, max_queued, client.frames_received, disconnect_time, client.outbound.stats
+
+
+def main():
+    print(
+        f"{'format':>7} {'KB/s':>6} {'unbounded KB':>13} {'queued KB':>10} {'received':>9} "
+        f"{'dropped':>8} {'resyncs':>8} {'closed at s':>12}"
+    )
+    for frame_format in [FORMAT_JSON, FORMAT_BINARY]:
+        for bandwidth in BANDWIDTHS:
+            max_unbounded, max_queued, received, disconnect_time, stats = run_case(frame_format, bandwidth)
+            kbps = "inf" if bandwidth is None else f"{bandwidth // 1024}"
+            closed = "-" if disconnect_time is None else f"{disconnect_time:.1f}"
+            print(
+                f"{frame_format:>7} {kbps:>6} {max_unbounded / 1024:>13.1f} {max_queued / 1024:>10.1f} {received:>9} "
+                f"{stats.frames_dropped:>8} {stats.resyncs:>8} {closed:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
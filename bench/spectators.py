@@ -0,0 +1,196 @@
+"""
+Benchmark for the cost of spectators to the game loop.
+
+Runs a match in real time on a websocket server and connects spectators to
+/watch/<match id>:
+- Fast spectators run in a separate process and read every frame, half of
+  them as JSON and half as binary frames.
+- Slow spectators complete the websocket handshake but never read. The server's
+  send buffers of their sockets are made small, as on a congested link, so the
+  server soon can not write to them.
+
+Reports the time per tick spent in Game.tick (which includes sending frames to
+players and the first batch of spectators), the server's CPU time per tick, the
+latest that any tick started, the frames sent and dropped by the match's
+BroadcastChannel and the largest amount of data that the server had buffered
+for spectators at once. Since slow spectators skip frames instead of queueing
+them, the buffered data stays bounded however long the match runs.
+
+Usage:
+    python3 -m bench.spectators
+"""
+
+import asyncio
+import multiprocessing
+import socket
+from time import perf_counter, process_time
+
+import tornado.httpserver
+import tornado.testing
+import tornado.web
+import tornado.websocket
+
+from src.agent import Agent
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON
+from src.client_messages import ClientMessageSender
+from src.game import Game
+from src.gameserver import GameServer
+from src.globals import TICKS_PER_SECOND
+from src.server import SpectatorConnection
+
+# (fast spectators, slow spectators) of each case
+CASES = [(0, 0), (100, 0), (500, 0), (400, 100)]
+TICKS = TICKS_PER_SECOND * 10
+# Send buffer size of the sockets of slow spectators
+SLOW_SEND_BUFFER = 4096
+
+
+class NullClient(ClientMessageSender):
+    """A player that discards every message."""
+
+    def __init__(self):
+        self.frame_format = FORMAT_JSON
+        self.on_receive_player_code = None
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        pass
+
+
+class Spinner(Agent):
+    """Keeps turning and shooting so that frames are never empty."""
+
+    angle = 0
+
+    def run(self):
+        self.angle = (self.angle + 7) % 360
+        self.set_movement_speed(Agent.MAX_SPEED)
+        self.set_movement_direction(self.angle)
+        self.attack_ranged(self.angle)
+
+
+def create_match(game_server):
+    clients = [NullClient(), NullClient()]
+    game = Game(clients, realtime=False)
+    for client in clients:
+        game.add_player_agent(client, Spinner, "Spinner")
+    game.prepare_to_start_simulation()
+    game_server.matches[str(game.match_id)] = game
+    return game
+
+
+def run_fast_spectators(port, match_id, count, connection):
+    """Entry point of the process of fast spectators. Sends the number of
+    spectators once they are connected and the mean number of frames each
+    received once the main process sends None."""
+    async def run():
+        received = [0]
+        def on_message(message):
+            if message is not None:
+                received[0] += 1
+        spectators = []
+        for i in range(count):
+            frame_format = FORMAT_BINARY if i % 2 else FORMAT_JSON
+            url = f"ws://127.0.0.1:{port}/watch/{match_id}?format={frame_format}"
+            spectators.append(await tornado.websocket.websocket_connect(url, on_message_callback=on_message))
+        connection.send(count)
+        while not connection.poll():
+            await asyncio.sleep(0.05)
+        connection.send(received[0] / max(count, 1))
+        for spectator in spectators:
+            spectator.close()
+    asyncio.run(run())
+
+
+def connect_slow_spectator(port, match_id):
+    """Returns a socket that completes the handshake and is never read."""
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+    sock.connect(("127.0.0.1", port))
+    sock.sendall((
+        f"GET /watch/{match_id}?format={FORMAT_BINARY} HTTP/1.1\r\n"
+        f"Host: 127.0.0.1:{port}\r\n"
+        "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+        "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n"
+    ).encode())
+    return sock
+
+
+def get_buffered_bytes(game):
+    """Returns the number of bytes the server has buffered for spectators."""
+    buffered = 0
+    for connection in game.spectators.subscriptions:
+        if connection.ws_connection is not None:
+            buffered += len(connection.ws_connection.stream._write_buffer)
+    return buffered
+
+
+async def run_case(port, game_server, num_fast, num_slow):
+    game = create_match(game_server)
+    context = multiprocessing.get_context("spawn")
+    connection, child_connection = context.Pipe()
+    process = context.Process(target=run_fast_spectators, args=(port, game.match_id, num_fast, child_connection))
+    process.start()
+    while not connection.poll():
+        await asyncio.sleep(0.05)
+    connection.recv()
+
+    slow = [connect_slow_spectator(port, game.match_id) for _ in range(num_slow)]
+    while len(game.spectators) < num_fast + num_slow:
+        await asyncio.sleep(0.01)
+    slow_ports = {sock.getsockname()[1] for sock in slow}
+    for spectator in game.spectators.subscriptions:
+        stream_socket = spectator.ws_connection.stream.socket
+        if stream_socket.getpeername()[1] in slow_ports:
+            stream_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SLOW_SEND_BUFFER)
+
+    tick_time = 0
+    max_lateness = 0
+    max_buffered = 0
+    start_cpu = process_time()
+    start = perf_counter()
+    for i in range(TICKS):
+        max_lateness = max(max_lateness, perf_counter() - (start + i / TICKS_PER_SECOND))
+        tick_start = perf_counter()
+        game.tick()
+        tick_time += perf_counter() - tick_start
+        max_buffered = max(max_buffered, get_buffered_bytes(game))
+        await asyncio.sleep(max(0, start + (i + 1) / TICKS_PER_SECOND - perf_counter()))
+    cpu_time = process_time() - start_cpu
+
+    connection.send(None)
+    frames_per_fast = connection.recv()
+    process.join()
+    stats = game.spectators.stats
+    game.spectators.close()
+    for sock in slow:
+        sock.close()
+    game.player_executor.close()
+    return tick_time / TICKS, cpu_time / TICKS, max_lateness, stats, max_buffered, frames_per_fast
+
+
+async def run():
+    sock, port = tornado.testing.bind_unused_port()
+    game_server = GameServer()
+    application = tornado.web.Application([(r"/watch/([^/]+)", SpectatorConnection, {"game_server": game_server})])
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets([sock])
+
+    print(
+        f"{'fast':>5} {'slow':>5} {'tick us':>8} {'cpu us/tick':>12} {'max late ms':>12} {'sent':>7} "
+        f"{'dropped':>8} {'resyncs':>8} {'max buffered KB':>16} {'frames/fast':>12}"
+    )
+    for num_fast, num_slow in CASES:
+        tick_time, cpu_time, max_lateness, stats, max_buffered, frames_per_fast = await run_case(port, game_server, num_fast, num_slow)
+        print(
+            f"{num_fast:>5} {num_slow:>5} {tick_time * 1e6:>8.0f} {cpu_time * 1e6:>12.0f} {max_lateness * 1e3:>12.1f} "
+            f"{stats.frames_sent:>7} {stats.frames_dropped:>8} {stats.resyncs:>8} {max_buffered / 1024:>16.1f} {frames_per_fast:>12.0f}"
+        )
+    server.stop()
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
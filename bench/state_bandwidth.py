@@ -0,0 +1,92 @@
+"""
+Benchmark for the size of TICK_STATE messages.
+
+Plays headless matches and compares the bytes sent per client with the default
+delta encoding against sending the full, unrounded state of every object every
+tick.
+
+Usage:
+    python3 -m bench.state_bandwidth
+"""
+
+import os
+
+from src.game import Game
+from src.globals import *
+from src.headless import HeadlessClient
+from src.message import Message
+from src.state_encoder import KEYFRAME_INTERVAL
+
+AGENT_CODE_DIR = os.path.join(os.path.dirname(__file__), "..", "test", "agent_code")
+# Agent that stands still and keeps shooting in a slowly rotating direction.
+TURRET_CODE = """
+class Turret(Agent):
+    angle = 0
+
+    def run(self):
+        self.angle += 7
+        self.attack_ranged(self.angle)
+"""
+
+MATCHES = [
+    ("agent1.py", "Agent1", "agent2.py", "Agent2"),
+    ("agent2.py", "Agent2", "agent3.py", "Agent3"),
+    (None, "Turret", None, "Turret"),
+]
+
+
+class CountingClient(HeadlessClient):
+    """Headless client that counts the bytes it is sent, along with the bytes
+    that full states would have taken.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.game = None
+        self.bytes_sent = 0
+        self.full_bytes = 0
+        self.messages_sent = 0
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        self.bytes_sent += len(payload)
+        self.messages_sent += 1
+        full_message = Message(Message.TICK_STATE, {
+            "agents": [agent[1].agent_state.to_json_dict() for agent in self.game.agents],
+            "projectiles": [projectile.to_json_dict() for projectile in self.game.projectiles.values()],
+            "destroyed": self.game.destroyed_objects,
+        })
+        self.full_bytes += len(full_message.to_json())
+
+
+def load_code(file_name):
+    if file_name is None:
+        return TURRET_CODE
+    with open(os.path.join(AGENT_CODE_DIR, file_name)) as f:
+        return f.read()
+
+
+def measure(match, keyframe_interval):
+    """Returns (full bytes per tick, sent bytes per tick, ticks) for one client
+    in a match.
+    """
+    file_1, class_1, file_2, class_2 = match
+    clients = [CountingClient(), CountingClient()]
+    game = Game(clients, realtime=False, keyframe_interval=keyframe_interval)
+    for client in clients:
+        client.game = game
+    game.exec_player_code(clients[0], load_code(file_1), class_1)
+    game.exec_player_code(clients[1], load_code(file_2), class_2)
+    game.run_headless(TICKS_PER_SECOND * 60)
+    client = clients[0]
+    return client.full_bytes / client.messages_sent, client.bytes_sent / client.messages_sent, game.tick_count
+
+
+def main():
+    print(f"{'match':<16} {'ticks':>6} {'full B/tick':>12} {'delta B/tick':>13} {'ratio':>7}")
+    for match in MATCHES:
+        full, delta, ticks = measure(match, KEYFRAME_INTERVAL)
+        print(f"{match[1] + ' v ' + match[3]:<16} {ticks:>6} {full:>12.1f} {delta:>13.1f} {full / delta:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
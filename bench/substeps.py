@@ -0,0 +1,66 @@
+"""
+Benchmark for the step policies of PhysicsEngine.
+
+Agents move at speeds from Agent.MAX_SPEED up to twenty times that towards a
+wall a few pixels thick. Agents that end up on the other side of the wall
+passed through it because pymunk only checks for collisions at the end of each
+substep. For each step policy this benchmark reports the number of agents that
+tunnelled, the mean number of substeps per tick and the CPU time per tick.
+
+Usage:
+    python3 -m bench.substeps
+"""
+
+from time import perf_counter
+
+from src.agent import Agent
+from src.agent_state import AgentState
+from src.globals import *
+from src.obstacle import Obstacle
+from src.physics_engine import PhysicsEngine
+from src.step_policy import AdaptiveStepPolicy, FixedStepPolicy
+from src.vector2 import Vector2
+
+POLICIES = [
+    ("fixed 1", FixedStepPolicy(1)),
+    ("fixed 2", FixedStepPolicy(2)),
+    ("fixed 4", FixedStepPolicy(4)),
+    ("fixed 8", FixedStepPolicy(8)),
+    ("adaptive", AdaptiveStepPolicy()),
+]
+NUM_AGENTS = 8
+WALL_X = 700
+WALL_THICKNESS = 4
+TICKS = TICKS_PER_SECOND
+
+
+def run_benchmark(step_policy):
+    """Returns (number of agents that passed through the wall, mean substeps
+    per tick, seconds per tick)."""
+    pe = PhysicsEngine(step_policy=step_policy)
+    pe.add_obstacle(Obstacle(-10, Vector2(WALL_X, 350), 600, WALL_THICKNESS))
+    agent_states = []
+    for i in range(NUM_AGENTS):
+        # Agents in separate lanes, each faster than the last
+        speed = Agent.MAX_SPEED * (1 + 19 * i / (NUM_AGENTS - 1))
+        agent_state = AgentState(i + 1, Vector2(100, 80 + 70 * i), Vector2(speed, 0), 100)
+        pe.add_agent(agent_state)
+        agent_states.append(agent_state)
+
+    start = perf_counter()
+    for _ in range(TICKS):
+        pe.step(1 / TICKS_PER_SECOND)
+    elapsed = perf_counter() - start
+    tunnelled = sum(1 for agent_state in agent_states if agent_state.position.x > WALL_X)
+    return tunnelled, pe.step_stats.get_mean_substeps(), elapsed / TICKS
+
+
+def main():
+    print(f"{'policy':>10} {'tunnelled':>10} {'substeps/tick':>14} {'us/tick':>10}")
+    for name, step_policy in POLICIES:
+        tunnelled, substeps, per_tick = run_benchmark(step_policy)
+        print(f"{name:>10} {f'{tunnelled}/{NUM_AGENTS}':>10} {substeps:>14.2f} {per_tick * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark for the real-time game loop when ticks are slow.
+
+Runs the TickScheduler for a few seconds with tick work that takes a growing
+fraction of the tick interval, plus an occasional stall. Compares the achieved
+simulation rate against the old loop, which slept a fixed interval after every
+tick.
+
+Usage:
+    python3 -m bench.tick_rate
+"""
+
+import asyncio
+from time import perf_counter, sleep
+
+from src.globals import *
+from src.tick_scheduler import TickScheduler
+
+DURATION = 3
+# Fraction of the tick interval spent doing tick work
+LOADS = [0, 0.25, 0.5, 0.9]
+# Every STALL_EVERY ticks, one tick takes STALL_TICKS tick intervals
+STALL_EVERY = 30
+STALL_TICKS = 3
+
+
+def make_tick(load, ticks):
+    interval = 1 / TICKS_PER_SECOND
+
+    def tick(broadcast=True):
+        ticks.append(broadcast)
+        if len(ticks) % STALL_EVERY == 0:
+            sleep(interval * STALL_TICKS)
+        else:
+            sleep(interval * load)
+    return tick
+
+
+async def run_fixed_sleep(tick):
+    """The game loop before TickScheduler."""
+    start = perf_counter()
+    while perf_counter() - start < DURATION:
+        tick()
+        await asyncio.sleep(1 / TICKS_PER_SECOND)
+
+
+async def run_scheduler(tick):
+    start = perf_counter()
+    scheduler = TickScheduler(lambda broadcast: tick(broadcast) or perf_counter() - start >= DURATION)
+    await scheduler.run()
+    return scheduler.stats
+
+
+def main():
+    print(f"{'load':>5} {'fixed sleep Hz':>15} {'scheduler Hz':>13} {'broadcast Hz':>13} {'mean lag ms':>12} {'max lag ms':>11}")
+    for load in LOADS:
+        ticks = []
+        asyncio.run(run_fixed_sleep(make_tick(load, ticks)))
+        fixed_rate = len(ticks) / DURATION
+
+        ticks = []
+        stats = asyncio.run(run_scheduler(make_tick(load, ticks)))
+        print(
+            f"{load:>5} {fixed_rate:>15.1f} {stats.ticks / DURATION:>13.1f} {stats.broadcasts / DURATION:>13.1f} "
+            f"{stats.get_mean_lag() * 1000:>12.2f} {stats.max_lag * 1000:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
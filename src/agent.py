@@ -88,7 +88,7 @@ class Agent:
             List of Vector2 objects representing positions.
         """
         positions = []
-        objects = self.game.physics.scan_area(self.get_position(), Agent.SCAN_DISTANCE)
+        objects = self.game.physics.scan_agent(self.agent_state, Agent.SCAN_DISTANCE)
         for object in objects:
             if not isinstance(object, AgentState) or object == self.agent_state:
                 continue
@@ -0,0 +1,167 @@
+"""
+Compact binary format for TICK_STATE messages.
+
+Clients can opt in to binary frames when they connect (see
+ServerToClientConnection.open). Every binary frame is a full snapshot of the
+tick, so binary clients never need deltas. JSON remains the default format.
+
+All values are little-endian. A frame is laid out as:
+
+    header:      frame type (uint8), flags (uint8), tick (uint32),
+                 number of agents (uint16), number of projectiles (uint16),
+                 number of destroyed objects (uint16)
+    agents:      id (int32), position x, position y, velocity x, velocity y (int16 each),
+                 angle (uint16), health (int16), shieldEnabled (uint8)
+                 followed by the name if FLAG_NAMES is set:
+                 name length (uint8), name (utf-8 bytes)
+    projectiles: id (int32), position x, position y, velocity x, velocity y (int16 each),
+                 angle (uint16), attackerId (int32)
+    destroyed:   id (int32), type (uint8, see DESTROYED_TYPES)
+
+Positions and velocities are stored in units of 1 / VECTOR_SCALE pixels.
+Angles are stored as fractions of a full turn in units of 1 / 65536.
+
+The JS decoder is in binaryframe.js.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR4 - UI.ConsistentState
+"""
+
+import struct
+
+# Formats that clients can choose when they connect.
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+FRAME_TICK_STATE = 1
+
+# Set in the header flags when agent names are included.
+FLAG_NAMES = 0b1
+
+VECTOR_SCALE = 8
+ANGLE_SCALE = 65536 / 360
+
+DESTROYED_TYPES = ["agent", "projectile"]
+
+HEADER = struct.Struct("<BBIHHH")
+AGENT = struct.Struct("<ihhhhHhB")
+PROJECTILE = struct.Struct("<ihhhhHi")
+DESTROYED = struct.Struct("<iB")
+
+INT16_MIN = -(2 ** 15)
+INT16_MAX = 2 ** 15 - 1
+
+
+def _quantize(value):
+    """Converts a position or velocity component to a fixed point int16."""
+    quantized = round(value * VECTOR_SCALE)
+    return min(max(quantized, INT16_MIN), INT16_MAX)
+
+
+def _quantize_angle(angle):
+    """Converts an angle in degrees to a uint16 fraction of a full turn."""
+    return round((angle % 360) * ANGLE_SCALE) & 0xFFFF
+
+
+def encode_tick_state(tick, agent_states, projectile_states, destroyed, include_names):
+    """Encodes the full state of a tick as a binary frame.
+
+    Arguments:
+        tick: number of the tick.
+        agent_states: list of AgentStates.
+        projectile_states: list of ProjectileStates.
+        destroyed: list of destroyed objects (see Message.DESTROY).
+        include_names: whether to include agent names.
+    Returns:
+        the frame as bytes.
+    """
+    flags = FLAG_NAMES if include_names else 0
+    parts = [HEADER.pack(FRAME_TICK_STATE, flags, tick, len(agent_states), len(projectile_states), len(destroyed))]
+
+    for agent_state in agent_states:
+        parts.append(AGENT.pack(
+            agent_state.id,
+            _quantize(agent_state.position.x),
+            _quantize(agent_state.position.y),
+            _quantize(agent_state.velocity.x),
+            _quantize(agent_state.velocity.y),
+            _quantize_angle(agent_state.angle),
+            agent_state.health,
+            agent_state.shieldEnabled
+        ))
+        if include_names:
+            name = (agent_state.name or "").encode("utf-8")[:255]
+            parts.append(struct.pack("<B", len(name)))
+            parts.append(name)
+
+    for projectile_state in projectile_states:
+        velocity = projectile_state.velocity
+        parts.append(PROJECTILE.pack(
+            projectile_state.id,
+            _quantize(projectile_state.position.x),
+            _quantize(projectile_state.position.y),
+            _quantize(velocity.x),
+            _quantize(velocity.y),
+            _quantize_angle(velocity.get_angle()),
+            projectile_state.attackerId
+        ))
+
+    for destroyed_object in destroyed:
+        parts.append(DESTROYED.pack(destroyed_object["id"], DESTROYED_TYPES.index(destroyed_object["type"])))
+
+    return b"".join(parts)
+
+
+def decode_tick_state(frame):
+    """Decodes a binary frame into the same structure as the data of a
+    TICK_STATE keyframe. Angles are returned in the range [0, 360).
+    """
+    frame_type, flags, tick, num_agents, num_projectiles, num_destroyed = HEADER.unpack_from(frame, 0)
+    if frame_type != FRAME_TICK_STATE:
+        raise ValueError(f"Unknown frame type {frame_type}")
+    offset = HEADER.size
+
+    agents = []
+    for _ in range(num_agents):
+        _id, x, y, vx, vy, angle, health, shield_enabled = AGENT.unpack_from(frame, offset)
+        offset += AGENT.size
+        agent = {
+            "id": _id,
+            "position": {"x": x / VECTOR_SCALE, "y": y / VECTOR_SCALE},
+            "velocity": {"x": vx / VECTOR_SCALE, "y": vy / VECTOR_SCALE},
+            "angle": angle / ANGLE_SCALE,
+            "health": health,
+            "shieldEnabled": bool(shield_enabled),
+        }
+        if flags & FLAG_NAMES:
+            length = frame[offset]
+            agent["name"] = bytes(frame[offset + 1:offset + 1 + length]).decode("utf-8")
+            offset += 1 + length
+        agents.append(agent)
+
+    projectiles = []
+    for _ in range(num_projectiles):
+        _id, x, y, vx, vy, angle, attacker_id = PROJECTILE.unpack_from(frame, offset)
+        offset += PROJECTILE.size
+        projectiles.append({
+            "id": _id,
+            "position": {"x": x / VECTOR_SCALE, "y": y / VECTOR_SCALE},
+            "velocity": {"x": vx / VECTOR_SCALE, "y": vy / VECTOR_SCALE},
+            "angle": angle / ANGLE_SCALE,
+            "attackerId": attacker_id,
+        })
+
+    destroyed = []
+    for _ in range(num_destroyed):
+        _id, object_type = DESTROYED.unpack_from(frame, offset)
+        offset += DESTROYED.size
+        destroyed.append({"id": _id, "type": DESTROYED_TYPES[object_type]})
+
+    return {
+        "keyframe": True,
+        "tick": tick,
+        "agents": agents,
+        "projectiles": projectiles,
+        "destroyed": destroyed,
+    }
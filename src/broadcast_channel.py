@@ -0,0 +1,138 @@
+"""
+Broadcasts the frames of one match to its spectators.
+
+Spectators only watch, so any number of them can be added to a match without
+touching the game's per-player send loop. Each TICK_STATE is published to the
+channel once, as a TickFrame, and every form of it is encoded at most once no
+matter how many spectators receive it.
+
+Every spectator has an OutboundQueue, so spectators that can not keep up skip
+frames instead of making the server buffer them, and are sent a keyframe when
+they catch up (see outbound_queue.py). New spectators are caught up the same
+way.
+
+Writing to a socket costs far more than encoding a frame once, so frames are
+written to at most FAN_OUT_BATCH spectators during the tick that publishes
+them. The rest are written in batches in later iterations of the IOLoop, so
+ticks of the game and i/o of other connections are not held up by a large
+audience. If the next frame is published before every spectator has been
+written to, the remaining spectators skip to it.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR4 - UI.ConsistentState
+"""
+
+from collections import deque
+
+import tornado.ioloop
+
+from src.outbound_queue import MAX_IN_FLIGHT_BYTES, OutboundQueue, OutboundStats
+
+# Maximum number of spectators written to in one iteration of the IOLoop
+FAN_OUT_BATCH = 50
+
+
+class BroadcastChannel():
+    """Sends the frames of a match to its spectators."""
+
+    def __init__(self, max_in_flight_bytes=MAX_IN_FLIGHT_BYTES):
+        """Constructor
+
+        Arguments:
+            max_in_flight_bytes: passed to the OutboundQueue of every
+                spectator.
+        """
+        self.max_in_flight_bytes = max_in_flight_bytes
+        # Dictionary mapping connections to their OutboundQueues
+        self.subscriptions = {}
+        # The last frame published, sent to spectators that are catching up
+        self.latest_frame = None
+        # Messages sent to spectators when they join, before any frame
+        self.replayed_messages = []
+        # Stats of the OutboundQueues of all spectators
+        self.stats = OutboundStats()
+        self.closed = False
+        # OutboundQueues that have not been sent the latest frame yet
+        self.fan_out_queue = deque()
+        # True if a batch of the fan out is scheduled on the IOLoop
+        self.fan_out_scheduled = False
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def add(self, connection):
+        """Adds a spectator.
+
+        Arguments:
+            connection: the spectator's connection (see OutboundQueue).
+        """
+        if self.closed:
+            connection.close()
+            return
+        queue = OutboundQueue(
+            connection, self.stats, max_in_flight_bytes=self.max_in_flight_bytes,
+            on_closed=lambda: self.remove(connection)
+        )
+        self.subscriptions[connection] = queue
+        for payload in self.replayed_messages:
+            queue.send_message(payload)
+        if self.latest_frame is not None:
+            queue.send_frame(self.latest_frame)
+
+    def remove(self, connection):
+        """Removes a spectator. Does nothing if it is not in the channel.
+
+        Spectators whose writes fail or that are closed for being too slow are
+        removed by their OutboundQueues.
+        """
+        self.subscriptions.pop(connection, None)
+
+    def publish_frame(self, frame):
+        """Sends a TickFrame to every spectator."""
+        self.latest_frame = frame
+        # Spectators that were not reached by the last fan out skip its frame
+        for queue in self.fan_out_queue:
+            queue.skip_frame()
+        self.fan_out_queue = deque(self.subscriptions.values())
+        self._send_batch()
+
+    def publish_message(self, payload, replay=False):
+        """Sends an encoded message to every spectator. Only for rare messages
+        that can not be skipped.
+
+        Arguments:
+            payload: the message encoded with Message.to_json.
+            replay: if True, the message is also sent to spectators that join
+                later, e.g. START_SIMULATION.
+        """
+        if replay:
+            self.replayed_messages.append(payload)
+        for queue in list(self.subscriptions.values()):
+            queue.send_message(payload)
+
+    def close(self):
+        """Closes the connections of all spectators."""
+        self.closed = True
+        self.fan_out_queue.clear()
+        queues = list(self.subscriptions.values())
+        self.subscriptions = {}
+        for queue in queues:
+            queue.connection.close()
+
+    def _fan_out(self):
+        """Called by the IOLoop to continue the fan out."""
+        self.fan_out_scheduled = False
+        self._send_batch()
+
+    def _send_batch(self):
+        """Sends the latest frame to the next FAN_OUT_BATCH queues in the fan
+        out queue and schedules the next batch."""
+        fan_out_queue = self.fan_out_queue
+        for _ in range(min(FAN_OUT_BATCH, len(fan_out_queue))):
+            queue = fan_out_queue.popleft()
+            if self.subscriptions.get(queue.connection) is queue:
+                queue.send_frame(self.latest_frame)
+        if fan_out_queue and not self.fan_out_scheduled:
+            self.fan_out_scheduled = True
+            tornado.ioloop.IOLoop.current().add_callback(self._fan_out)
@@ -0,0 +1,105 @@
+"""
+Messages that the server sends to a client.
+
+Shared by every kind of connection to a client, e.g. websocket connections and
+connections that are relayed from a game shard.
+
+This module is part of the implementation of the following requirement:
+FR4 - UI.ConsistentState
+"""
+
+from traceback import format_exception
+
+from src.message import Message
+
+
+class ClientMessageSender():
+    """Mixin that builds messages for a client and sends them with
+    send_encoded, which subclasses must implement.
+    """
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        """Send a message that has already been encoded with Message.to_json
+        or as a binary frame (see binary_frame.py).
+
+        Used to broadcast the same message to many clients while only
+        encoding it once.
+
+        Arguments:
+            payload: the encoded message.
+            binary: True if payload is a binary frame.
+            frame: the TickFrame that payload was taken from, if it is a
+                TICK_STATE. Connections that can not keep up may send another
+                form of it, or skip it (see OutboundQueue).
+        """
+        raise NotImplementedError
+
+    def send_message(self, message):
+        """Send a Message object.
+        """
+        self.send_encoded(message.to_json())
+
+    def send_debug_message(self, message_contents):
+        message = Message(
+            Message.DEBUG,
+            message_contents
+        )
+        self.send_message(message)
+
+    def send_start_game_message(self):
+        message = Message(
+            Message.START_GAME,
+            None
+        )
+        self.send_message(message)
+
+    def send_start_simulation_message(self):
+        message = Message(
+            Message.START_SIMULATION,
+            None
+        )
+        self.send_message(message)
+
+    def send_python_error(self, e_type, e_value, e_traceback):
+        error_str = format_exception(e_type, e_value, e_traceback)
+        error_str = "".join(error_str)
+        self.send_python_error_message(error_str)
+
+    def send_python_error_message(self, error_str):
+        """Sends an error from player code that has already been formatted,
+        e.g. by a worker process."""
+        message = Message(
+            Message.PYTHON_ERROR,
+            error_str
+        )
+        self.send_message(message)
+
+    def send_results(self, winner, tie, agents, error=False, forfeit=False):
+        self.send_message(results_message(winner, tie, agents, error, forfeit))
+
+
+def results_message(winner, tie, agents, error=False, forfeit=False):
+    """Returns the RESULTS message of a game.
+
+    Arguments:
+        winner: True if the recipient won, False if they lost and None if the
+            recipient did not play (e.g. a spectator).
+        tie: True if the game ended in a tie.
+        agents: the game's list of pairs [client, agent].
+        error: True if the game ended due to an error in player code.
+        forfeit: True if the game ended because a player left it.
+    """
+    return Message(Message.RESULTS, {
+        "winner": winner,
+        "tie": tie,
+        "error": error,
+        "forfeit": forfeit,
+        # Players that left before submitting code are missing
+        "players": [
+            {
+                "class_name": agent[1].agent_state.name,
+                "survival_time": agent[1].survival_time
+            }
+            for agent in agents
+        ]
+    })
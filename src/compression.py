@@ -0,0 +1,157 @@
+"""
+permessage-deflate compression of the websocket connections of the server.
+
+JSON TICK_STATE messages repeat the same keys and similar numbers every tick,
+so a deflate stream that is kept for the whole connection compresses them
+well. Compression costs CPU time for every message written and memory for
+every connection, so it can be tuned per deployment:
+- level: zlib compression level, from 1 (fastest) to 9 (smallest).
+- window_bits: base 2 logarithm of the size of the history that the server's
+  compressor refers back to, from 9 to 15. The client is told the size during
+  the handshake.
+- mem_level: zlib memory level, from 1 to 9.
+- min_size: messages shorter than this many bytes are sent uncompressed,
+  since deflate saves little or nothing on them.
+Compression is only used if the client offers it, which browsers do.
+
+tornado does not negotiate the size of the server's window or skip small
+messages, so connections use CompressedWebSocketProtocol, which extends
+tornado's WebSocketProtocol13. It overrides internals of that class, and this
+module raises ImportError if the installed tornado does not have them.
+
+The settings of a deployment can be chosen with the WEBSOCKET_COMPRESSION
+environment variable or the --compression option of the server, see
+parse_compression_settings. bench/compression.py compares settings.
+
+Part of the implementation of the following requirements:
+FR4 - UI.ConsistentState
+"""
+
+import os
+
+import tornado.websocket
+
+DEFAULT_LEVEL = 1
+DEFAULT_WINDOW_BITS = 12
+DEFAULT_MEM_LEVEL = 5
+DEFAULT_MIN_SIZE = 32
+
+# CompressedWebSocketProtocol relies on these to create the compressors and to
+# write uncompressed messages
+if not hasattr(tornado.websocket.WebSocketProtocol13, "_create_compressors"):
+    raise ImportError(f"websocket compression does not support tornado {tornado.version}")
+
+
+class CompressionSettings():
+    """Settings of permessage-deflate compression."""
+
+    def __init__(self, level=DEFAULT_LEVEL, window_bits=DEFAULT_WINDOW_BITS, mem_level=DEFAULT_MEM_LEVEL, min_size=DEFAULT_MIN_SIZE):
+        """Constructor
+
+        Arguments:
+            level: zlib compression level, from 1 to 9.
+            window_bits: size of the compressor's history, from 9 to 15.
+            mem_level: zlib memory level, from 1 to 9.
+            min_size: messages with fewer bytes are sent uncompressed.
+        Raises:
+            ValueError: if a setting is out of range.
+        """
+        if not 1 <= level <= 9:
+            raise ValueError(f"invalid compression level {level}")
+        # zlib does not support a window of 8 bits for raw deflate streams
+        if not 9 <= window_bits <= 15:
+            raise ValueError(f"invalid window bits {window_bits}")
+        if not 1 <= mem_level <= 9:
+            raise ValueError(f"invalid memory level {mem_level}")
+        if min_size < 0:
+            raise ValueError(f"invalid minimum size {min_size}")
+        self.level = level
+        self.window_bits = window_bits
+        self.mem_level = mem_level
+        self.min_size = min_size
+
+    def get_compression_options(self):
+        """Returns the options for WebSocketHandler.get_compression_options.
+        tornado reads compression_level and mem_level, and
+        CompressedWebSocketProtocol reads max_window_bits and min_size."""
+        return {
+            "compression_level": self.level,
+            "mem_level": self.mem_level,
+            "max_window_bits": self.window_bits,
+            "min_size": self.min_size,
+        }
+
+    def get_memory_per_connection(self):
+        """Returns the bytes that the compressor of each connection allocates,
+        according to the zlib documentation."""
+        return (1 << (self.window_bits + 2)) + (1 << (self.mem_level + 9))
+
+
+class CompressedWebSocketProtocol(tornado.websocket.WebSocketProtocol13):
+    """The websocket protocol of tornado, which also limits the size of the
+    server's window to max_window_bits and sends messages shorter than
+    min_size uncompressed, as given by the compression options."""
+
+    def _create_compressors(self, side, agreed_parameters, compression_options=None):
+        if side == "server" and compression_options is not None:
+            # The agreed parameters are echoed in the handshake response,
+            # which tells the client the size
+            limit_window_bits(agreed_parameters, compression_options["max_window_bits"])
+        super()._create_compressors(side, agreed_parameters, compression_options)
+
+    def write_message(self, message, binary=False):
+        compressor = self._compressor
+        if compressor is None or len(message) >= self._compression_options["min_size"]:
+            return super().write_message(message, binary=binary)
+        # Uncompressed messages are allowed by permessage-deflate and do not
+        # affect the compressor's history
+        self._compressor = None
+        try:
+            return super().write_message(message, binary=binary)
+        finally:
+            self._compressor = compressor
+
+
+def limit_window_bits(agreed_parameters, window_bits):
+    """Sets server_max_window_bits in the parameters of permessage-deflate
+    offered by a client to window_bits, unless it offered a smaller window.
+
+    Arguments:
+        agreed_parameters: dictionary of the parameters of the offer.
+        window_bits: largest size of the server's window.
+    """
+    offered = agreed_parameters.get("server_max_window_bits")
+    if offered is None or int(offered) > window_bits:
+        agreed_parameters["server_max_window_bits"] = str(window_bits)
+
+
+def parse_compression_settings(spec):
+    """Returns the compression settings described by spec, or None if
+    compression is disabled.
+
+    Arguments:
+        spec: "off", "on" for the default settings, or comma separated
+            <name>=<value> pairs overriding some of them, e.g.
+            "level=6,window_bits=15".
+    Raises:
+        ValueError: if spec is not valid.
+    """
+    spec = spec.strip()
+    if spec == "off":
+        return None
+    if spec == "on" or spec == "":
+        return CompressionSettings()
+    kwargs = {}
+    for setting in spec.split(","):
+        name, _, value = setting.partition("=")
+        name = name.strip()
+        if name not in ["level", "window_bits", "mem_level", "min_size"]:
+            raise ValueError(f"unknown compression setting {name!r}")
+        kwargs[name] = int(value)
+    return CompressionSettings(**kwargs)
+
+
+def get_default_compression_settings():
+    """Returns the settings set by the WEBSOCKET_COMPRESSION environment
+    variable, or the default settings if it is not set."""
+    return parse_compression_settings(os.environ.get("WEBSOCKET_COMPRESSION", ""))
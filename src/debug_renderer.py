@@ -0,0 +1,77 @@
+"""
+Debug rendering of a physics engine's objects in a pygame window.
+
+This module is a plugin: it is only imported by PhysicsBackend.init_renderer,
+which the game calls when the GUI environment variable is set. Importing
+pygame is slow and prints a banner, so servers, shards and headless workers
+never pay for it unless rendering is enabled.
+
+Objects are drawn from the state that every backend keeps (the map's
+boundaries, the static index, agents and projectiles), so any backend can be
+rendered.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+"""
+
+import os
+
+# pygame prints a banner when it is imported unless this is set
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+from src.globals import *
+
+BACKGROUND_COLOR = (220, 220, 220)
+OBSTACLE_COLOR = (90, 90, 90)
+AGENT_COLOR = (200, 60, 60)
+PROJECTILE_COLOR = (0, 0, 255)
+
+
+class DebugRenderer():
+    """Draws the objects of a physics engine in a pygame window."""
+
+    def __init__(self, physics):
+        """Constructor
+
+        Arguments:
+            physics: the PhysicsBackend to draw.
+        """
+        self.physics = physics
+        pygame.init()
+        size = physics.game_map.width, physics.game_map.height
+        self.screen = pygame.display.set_mode(size)
+
+    def render(self):
+        """Draws the current positions of all objects."""
+        physics = self.physics
+        self.screen.fill(BACKGROUND_COLOR)
+        for _, start, end, radius in physics.game_map.boundaries:
+            pygame.draw.line(self.screen, OBSTACLE_COLOR, start, end, int(2 * radius))
+        for left, bottom, right, top, radius, _ in physics.static_index.entries.values():
+            if not radius:
+                pygame.draw.rect(self.screen, OBSTACLE_COLOR, pygame.Rect(left, bottom, right - left, top - bottom))
+        agents = physics.dynamic_objects
+        for x, y in zip(agents.position_x, agents.position_y):
+            pygame.draw.circle(self.screen, AGENT_COLOR, (x, y), AGENT_RADIUS)
+        projectiles = physics.projectile_engine.projectiles
+        for x, y in zip(projectiles.position_x, projectiles.position_y):
+            pygame.draw.circle(self.screen, PROJECTILE_COLOR, (x, y), PROJECTILE_RADIUS)
+        pygame.display.update()
+
+
+def run_render_test(physics, time_increment=0.01):
+    """
+    Steps and renders a physics engine until the window is closed. This is for
+    debug purposes only.
+    """
+    renderer = DebugRenderer(physics)
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        renderer.render()
+        physics.step(time_increment)
+    pygame.quit()
@@ -13,7 +13,16 @@ FR13 - Movement.Speed
 from src.object_state import ObjectState
 
 class DynamicObjectState(ObjectState):
-    """Class containing properties that are common to moving objects."""
+    """Class containing properties that are common to moving objects.
+
+    Once the object has been added to a PhysicsEngine, its position and
+    velocity are views into the engine's DynamicObjectStore. Assigning a new
+    Vector2 to either of them copies its components into the store.
+    """
+
+    _position = None
+    _velocity = None
+    _attached = False
 
     def __init__(self, id, position, velocity):
         """Constructor
@@ -24,4 +33,36 @@ class DynamicObjectState(ObjectState):
             velocity: a vector2 object representing the object's initial velocity.
         """
         super().__init__(id, position)
-        self.velocity = velocity
\ No newline at end of file
+        self.velocity = velocity
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        if self._attached:
+            self._position.x = position.x
+            self._position.y = position.y
+        else:
+            self._position = position
+
+    @property
+    def velocity(self):
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, velocity):
+        if self._attached:
+            self._velocity.x = velocity.x
+            self._velocity.y = velocity.y
+        else:
+            self._velocity = velocity
+
+    def _attach(self, position, velocity):
+        """Replaces the position and velocity with views into a
+        DynamicObjectStore. Called by the store.
+        """
+        self._position = position
+        self._velocity = velocity
+        self._attached = True
@@ -0,0 +1,203 @@
+"""
+Array backed storage for the positions and velocities of moving objects.
+
+PhysicsEngine keeps the ids, positions and velocities of all agents and
+projectiles in flat arrays, one slot per object. The position and velocity of
+a DynamicObjectState that has been added to the physics engine are StoreVectors
+which read and write these arrays, so game logic and encoders use them exactly
+like any other Vector2.
+
+Syncing with pymunk only touches what changed:
+- Velocities are pushed to pymunk bodies only for objects whose velocity was
+  set since the last step.
+- Positions are copied back from pymunk in a single pass over the arrays.
+  Velocities are never copied back since pymunk only changes the velocity of
+  kinematic bodies when the collision handler stops them, which also updates
+  the store.
+
+Part of the implementation of the following requirements:
+FR10 - Agent.PositionState
+FR11 - Agent.Movement
+FR12 - Movement.Direction
+FR13 - Movement.Speed
+"""
+
+from array import array
+
+from src.vector2 import Vector2
+
+
+class StoreVector(Vector2):
+    """A Vector2 whose components are stored in a pair of arrays.
+
+    When the object that owns the vector is removed from its store, the vector
+    keeps its last value and becomes independent of the store.
+    """
+
+    def __init__(self, xs, ys, slot, dirty=None, object_id=None):
+        """Constructor
+
+        Arguments:
+            xs: array of x components.
+            ys: array of y components.
+            slot: index of this vector in xs and ys.
+            dirty (optional): set that object_id is added to whenever the
+                vector is changed.
+            object_id (optional): id of the object that owns the vector.
+        """
+        self._xs = xs
+        self._ys = ys
+        self._slot = slot
+        self._dirty = dirty
+        self._object_id = object_id
+
+    @property
+    def x(self):
+        return self._xs[self._slot]
+
+    @x.setter
+    def x(self, x):
+        self._xs[self._slot] = x
+        if self._dirty is not None:
+            self._dirty.add(self._object_id)
+
+    @property
+    def y(self):
+        return self._ys[self._slot]
+
+    @y.setter
+    def y(self, y):
+        self._ys[self._slot] = y
+        if self._dirty is not None:
+            self._dirty.add(self._object_id)
+
+    def _detach(self):
+        """Copies the vector out of the store."""
+        self._xs = array("d", [self.x])
+        self._ys = array("d", [self.y])
+        self._slot = 0
+        self._dirty = None
+
+
+class DynamicObjectStore():
+    """Positions and velocities of moving objects, stored as a struct of arrays.
+
+    Slots are kept dense: when an object is removed, the object in the last
+    slot is moved into its place.
+    """
+
+    def __init__(self, track_velocities=True):
+        """Constructor
+
+        Arguments:
+            track_velocities (optional): if False, changes to velocities are
+                not recorded for push_velocities. Used for objects that do not
+                have pymunk bodies.
+        """
+        self.track_velocities = track_velocities
+        self.ids = array("q")
+        self.position_x = array("d")
+        self.position_y = array("d")
+        self.velocity_x = array("d")
+        self.velocity_y = array("d")
+        # Object states, pymunk bodies and (position, velocity) StoreVector
+        # pairs, by slot
+        self.states = []
+        self.bodies = []
+        self.vectors = []
+        # Dictionary mapping object ids to slots
+        self.slots = {}
+        # Ids of objects whose velocity changed since the last push
+        self.dirty_velocities = set()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, object_id):
+        return object_id in self.slots
+
+    def add(self, object_state, body=None):
+        """Moves the position and velocity of object_state into the store.
+
+        Arguments:
+            object_state: a DynamicObjectState. Its position and velocity are
+                replaced by StoreVectors.
+            body (optional): the pymunk body of the object.
+        """
+        slot = len(self.ids)
+        self.ids.append(object_state.id)
+        self.position_x.append(object_state.position.x)
+        self.position_y.append(object_state.position.y)
+        self.velocity_x.append(object_state.velocity.x)
+        self.velocity_y.append(object_state.velocity.y)
+        self.states.append(object_state)
+        self.bodies.append(body)
+        self.slots[object_state.id] = slot
+
+        dirty = self.dirty_velocities if self.track_velocities else None
+        position = StoreVector(self.position_x, self.position_y, slot)
+        velocity = StoreVector(self.velocity_x, self.velocity_y, slot, dirty, object_state.id)
+        self.vectors.append((position, velocity))
+        object_state._attach(position, velocity)
+
+    def remove(self, object_id):
+        """Removes an object from the store. Its state keeps its last position
+        and velocity.
+
+        Returns:
+            True if the object was removed, False if it was not in the store.
+        """
+        slot = self.slots.pop(object_id, None)
+        if slot is None:
+            return False
+        self.dirty_velocities.discard(object_id)
+        for vector in self.vectors[slot]:
+            vector._detach()
+
+        last = len(self.ids) - 1
+        if slot != last:
+            # Fill the hole with the last object.
+            moved_id = self.ids[last]
+            self.ids[slot] = moved_id
+            self.position_x[slot] = self.position_x[last]
+            self.position_y[slot] = self.position_y[last]
+            self.velocity_x[slot] = self.velocity_x[last]
+            self.velocity_y[slot] = self.velocity_y[last]
+            self.states[slot] = self.states[last]
+            self.bodies[slot] = self.bodies[last]
+            self.vectors[slot] = self.vectors[last]
+            for vector in self.vectors[slot]:
+                vector._slot = slot
+            self.slots[moved_id] = slot
+
+        for values in (self.ids, self.position_x, self.position_y, self.velocity_x, self.velocity_y, self.states, self.bodies, self.vectors):
+            del values[last]
+        return True
+
+    def stop(self, object_id):
+        """Sets the velocity of an object to zero without marking it as
+        changed. Used when pymunk's copy of the velocity was already set to
+        zero. Ids that are not in the store are ignored.
+        """
+        slot = self.slots.get(object_id)
+        if slot is not None:
+            self.velocity_x[slot] = 0
+            self.velocity_y[slot] = 0
+
+    def push_velocities(self):
+        """Copies velocities that changed since the last push to pymunk."""
+        slots = self.slots
+        bodies = self.bodies
+        velocity_x = self.velocity_x
+        velocity_y = self.velocity_y
+        for object_id in self.dirty_velocities:
+            slot = slots[object_id]
+            bodies[slot].velocity = (velocity_x[slot], velocity_y[slot])
+        self.dirty_velocities.clear()
+
+    def pull_positions(self):
+        """Copies the positions of all bodies from pymunk."""
+        position_x = self.position_x
+        position_y = self.position_y
+        for slot, body in enumerate(self.bodies):
+            position_x[slot], position_y[slot] = body.position
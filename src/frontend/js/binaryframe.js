@@ -0,0 +1,101 @@
+/**
+ * Decodes binary TICK_STATE frames.
+ * See binary_frame.py for the layout of a frame.
+ *
+ * This module is part of the implementation of the following requirements:
+ * FR2 - UI.RunGame
+ * FR4 - UI.ConsistentState
+ */
+
+export const FORMAT_JSON = "json";
+export const FORMAT_BINARY = "binary";
+
+const FRAME_TICK_STATE = 1;
+const FLAG_NAMES = 0b1;
+const VECTOR_SCALE = 8;
+const ANGLE_SCALE = 65536 / 360;
+const DESTROYED_TYPES = ["agent", "projectile"];
+const HEADER_SIZE = 12;
+const AGENT_SIZE = 17;
+const PROJECTILE_SIZE = 18;
+const DESTROYED_SIZE = 5;
+
+const textDecoder = new TextDecoder();
+
+/**
+ * Reads a position or velocity vector stored as two int16 values.
+ */
+function readVector(view, offset) {
+  return {
+    x: view.getInt16(offset, true) / VECTOR_SCALE,
+    y: view.getInt16(offset + 2, true) / VECTOR_SCALE,
+  };
+}
+
+/**
+ * Decodes a binary frame into the same structure as the data of a TICK_STATE
+ * keyframe.
+ *
+ * @param {ArrayBuffer} buffer
+ */
+export function decodeTickState(buffer) {
+  const view = new DataView(buffer);
+  const frameType = view.getUint8(0);
+  if (frameType !== FRAME_TICK_STATE) {
+    throw new Error(`Unknown frame type ${frameType}`);
+  }
+  const flags = view.getUint8(1);
+  const tick = view.getUint32(2, true);
+  const numAgents = view.getUint16(6, true);
+  const numProjectiles = view.getUint16(8, true);
+  const numDestroyed = view.getUint16(10, true);
+  let offset = HEADER_SIZE;
+
+  const agents = [];
+  for (let i = 0; i < numAgents; i++) {
+    const agent = {
+      id: view.getInt32(offset, true),
+      position: readVector(view, offset + 4),
+      velocity: readVector(view, offset + 8),
+      angle: view.getUint16(offset + 12, true) / ANGLE_SCALE,
+      health: view.getInt16(offset + 14, true),
+      shieldEnabled: view.getUint8(offset + 16) !== 0,
+    };
+    offset += AGENT_SIZE;
+    if (flags & FLAG_NAMES) {
+      const length = view.getUint8(offset);
+      agent.name = textDecoder.decode(new Uint8Array(buffer, offset + 1, length));
+      offset += 1 + length;
+    }
+    agents.push(agent);
+  }
+
+  const projectiles = [];
+  for (let i = 0; i < numProjectiles; i++) {
+    projectiles.push({
+      id: view.getInt32(offset, true),
+      position: readVector(view, offset + 4),
+      velocity: readVector(view, offset + 8),
+      angle: view.getUint16(offset + 12, true) / ANGLE_SCALE,
+      attackerId: view.getInt32(offset + 14, true),
+    });
+    offset += PROJECTILE_SIZE;
+  }
+
+  const destroyed = [];
+  for (let i = 0; i < numDestroyed; i++) {
+    destroyed.push({
+      id: view.getInt32(offset, true),
+      type: DESTROYED_TYPES[view.getUint8(offset + 4)],
+    });
+    offset += DESTROYED_SIZE;
+  }
+
+  return {
+    keyframe: true,
+    tick: tick,
+    agents: agents,
+    projectiles: projectiles,
+    destroyed: destroyed,
+  };
+}
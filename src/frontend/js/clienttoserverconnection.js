@@ -1,4 +1,5 @@
 import Message from "./message.js";
+import { FORMAT_JSON, decodeTickState } from "./binaryframe.js";
 import {
   agents,
   agent0NameSet,
@@ -32,21 +33,45 @@ import {
  */
 export default class ClientToServerConnection {
   #websocket;
+  // Maps from object id to the latest state reconstructed from TICK_STATE
+  // messages. See state_encoder.py.
+  #agentStates = new Map();
+  #projectileStates = new Map();
+  // Time between ticks in seconds. Set by the first keyframe.
+  #dt = null;
 
-  constructor() {
-    const server_url =
+  /**
+   * @param {string} format Format of TICK_STATE messages to ask the server
+   *   for. Either FORMAT_JSON or FORMAT_BINARY.
+   * @param {?string} player Name that the player's rating is recorded under,
+   *   or null to play unrated.
+   */
+  constructor(format = FORMAT_JSON, player = null) {
+    let server_url =
       "ws://" +
       window.location.hostname +
       ":" +
       window.location.port +
-      "/websocket";
+      "/websocket?format=" +
+      encodeURIComponent(format);
+    if (player) {
+      server_url += "&player=" + encodeURIComponent(player);
+    }
     this.#websocket = new WebSocket(server_url);
+    // Receive binary frames as ArrayBuffers so they can be read with DataView
+    this.#websocket.binaryType = "arraybuffer";
     this.#websocket.onmessage = (msg) => {
       this.#onmessage(msg);
     };
   }
 
   #onmessage(message_str) {
+    if (message_str.data instanceof ArrayBuffer) {
+      // Only TICK_STATE messages are sent as binary frames
+      this.onReceiveTickState(decodeTickState(message_str.data));
+      return;
+    }
+
     let message = Message.fromJson(message_str.data);
 
     // TODO handle all message types
@@ -69,6 +94,9 @@ export default class ClientToServerConnection {
       case Message.PROJECTILE_STATES:
         this.onReceiveProjectileStates(message.data);
         break;
+      case Message.TICK_STATE:
+        this.onReceiveTickState(message.data);
+        break;
       case Message.DESTROY:
         console.log(message);
         this.onReceiveDestroy(message.data.id, message.data.type);
@@ -79,7 +107,8 @@ export default class ClientToServerConnection {
           message.data["winner"],
           message.data["tie"],
           message.data["players"],
-          message.data["error"]
+          message.data["error"],
+          message.data["forfeit"]
         );
         break;
       default:
@@ -120,6 +149,50 @@ export default class ClientToServerConnection {
     console.log("START_SIMULATION message received");
   }
 
+  /**
+   * Applies every change from one tick of the game at once so that agents,
+   * projectiles and destroyed objects are never rendered out of sync.
+   *
+   * Keyframes replace the full state. Other messages only contain the fields
+   * that changed and are merged into the previous state.
+   */
+  onReceiveTickState(tick_state) {
+    if (tick_state.keyframe) {
+      this.#dt = tick_state.dt;
+      // Binary keyframes only include agent names some of the time
+      for (const agent_state of tick_state.agents) {
+        const previous = this.#agentStates.get(agent_state.id);
+        if (agent_state.name === undefined && previous !== undefined) {
+          agent_state.name = previous.name;
+        }
+      }
+      const projectileStates = toStateMap(tick_state.projectiles);
+      // Remove any projectiles that the server no longer knows about
+      for (const id of this.#projectileStates.keys()) {
+        if (!projectileStates.has(id)) {
+          this.onReceiveDestroy(id, "projectile");
+        }
+      }
+      this.#agentStates = toStateMap(tick_state.agents);
+      this.#projectileStates = projectileStates;
+    } else if (this.#dt === null) {
+      // Deltas can't be applied until the first keyframe has arrived
+      return;
+    } else {
+      applyDelta(this.#agentStates, tick_state.agents ?? [], this.#dt);
+      applyDelta(this.#projectileStates, tick_state.projectiles ?? [], this.#dt);
+    }
+
+    this.onReceiveAgentStates(Array.from(this.#agentStates.values()));
+    this.onReceiveProjectileStates(Array.from(this.#projectileStates.values()));
+    for (const destroyed of tick_state.destroyed ?? []) {
+      if (destroyed.type === "projectile") {
+        this.#projectileStates.delete(destroyed.id);
+      }
+      this.onReceiveDestroy(destroyed.id, destroyed.type);
+    }
+  }
+
   onReceiveAgentStates(agent_states) {
     console.log(agent_states);
     console.log(agents);
@@ -189,7 +262,37 @@ export default class ClientToServerConnection {
     }
   }
 
-  onReceiveResults(winner, tie, player_results, error) {
+  onReceiveResults(winner, tie, player_results, error, forfeit) {
     console.log(player_results);
   }
 }
+
+/**
+ * Returns a Map from object id to state for a list of states.
+ */
+function toStateMap(states) {
+  return new Map(states.map((state) => [state.id, state]));
+}
+
+/**
+ * Merges a list of partial states into a Map of full states.
+ *
+ * Positions are first advanced by one tick using each object's velocity.
+ * This must match the prediction done by StateEncoder in state_encoder.py.
+ */
+function applyDelta(states, updates, dt) {
+  for (const state of states.values()) {
+    state.position = {
+      x: state.position.x + state.velocity.x * dt,
+      y: state.position.y + state.velocity.y * dt,
+    };
+  }
+  for (const update of updates) {
+    const state = states.get(update.id);
+    if (state === undefined) {
+      states.set(update.id, update);
+    } else {
+      Object.assign(state, update);
+    }
+  }
+}
@@ -438,8 +438,12 @@ export function updateProjectilePosition(projId, x, y) {
 
 export function destroyProjectile(projId) {
   let projectile = projectileMap.get(projId);
+  if (projectile === undefined) {
+    return;
+  }
   projectile.visible = false;
   app.stage.removeChild(projectile);
+  projectileMap.delete(projId);
 }
 
 export function setAgentPosition(agent, x, y) {
@@ -10,9 +10,15 @@
 
 import ClientToServerConnection from "./clienttoserverconnection.js";
 import Renderer from "./renderer.js";
+import { FORMAT_JSON } from "./binaryframe.js";
 
 function main() {
-    const conn = new ClientToServerConnection();
+    // Binary TICK_STATE frames can be requested by opening the page with ?format=binary
+    const params = new URLSearchParams(window.location.search);
+    const format = params.get("format") ?? FORMAT_JSON;
+    // Matches are rated under the name given with ?player=<name>
+    const player = params.get("player");
+    const conn = new ClientToServerConnection(format, player);
     const renderer = new Renderer(conn);
 }
 
@@ -18,6 +18,7 @@ export default class Message {
     static PROJECTILE_STATES = "projectile_states";
     static DESTROY = "destroy";
     static AGENT_STATES = "agent_states";
+    static TICK_STATE = "tick_state";
     static RESULTS = "results";
 
     constructor(type, data) {
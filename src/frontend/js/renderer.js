@@ -35,7 +35,7 @@ export default class Renderer {
 
         this.#server.onStartGame = () => { this.#onStartGame(); };
         this.#server.onStartSimulation = () => { this.#onStartSimulation(); };
-        this.#server.onReceiveResults = (winner, tie, player_results, error) => { this.#onReceiveResults(winner, tie, player_results, error); };
+        this.#server.onReceiveResults = (winner, tie, player_results, error, forfeit) => { this.#onReceiveResults(winner, tie, player_results, error, forfeit); };
 
         this.#queueScreen = document.getElementById("queueScreen");
         this.#codeInputScreen = document.getElementById("codeInputScreen");
@@ -69,11 +69,21 @@ export default class Renderer {
         initPixi();
     }
 
-    #onReceiveResults(winner, tie, player_results, error) {
+    #onReceiveResults(winner, tie, player_results, error, forfeit) {
         console.log("showing results!");
-        document.getElementsByTagName("canvas")[0].classList.add("hidden");
+        // Games that end before the simulation starts, e.g. because the
+        // opponent left while coding, have no canvas
+        const canvas = document.getElementsByTagName("canvas")[0];
+        if (canvas !== undefined) {
+            canvas.classList.add("hidden");
+        }
+        this.#codeInputScreen.classList.add("hidden");
+        this.#pythonErrorsArea.classList.add("hidden");
         this.#resultsScreen.classList.remove("hidden");
-        if (error) {
+        if (forfeit) {
+            this.#declareErrorArea.innerHTML = "Opponent forfeited."
+        }
+        else if (error) {
             this.#declareErrorArea.innerHTML = "Game ended due to error in player code."
         }
         if (tie) {
@@ -86,15 +96,22 @@ export default class Renderer {
             this.#declareWinnerArea.innerHTML = "You Lost, Better Luck Next Time!";
         }
         var results_text = ""
-        player_results.forEach(function(result) {
-            results_text += result["class_name"];
-            if (result["survival_time"] == null) {
-                results_text += " survived the entire game!" + "<br/>";
-            }
-            else {
-                results_text += " survived for " + result["survival_time"].toString() + " seconds<br/>";
-            }
-        });
+        // Agents only have survival times if the simulation has started
+        if (canvas !== undefined) {
+            player_results.forEach(function(result) {
+                results_text += result["class_name"];
+                if (result["survival_time"] == null) {
+                    results_text += " survived the entire game!" + "<br/>";
+                }
+                else {
+                    results_text += " survived for " + result["survival_time"].toString() + " seconds<br/>";
+                }
+            });
+        }
+        // Players that left before submitting code are not listed
+        if (player_results.length < 2) {
+            results_text += "A player left before submitting code.<br/>";
+        }
         this.#individualResultsArea.innerHTML = results_text;
     }
 }
\ No newline at end of file
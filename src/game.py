@@ -11,25 +11,43 @@ FR16 - Agent.Win
 FR17 - API
 '''
 
-import asyncio
-
 import tornado.ioloop
 
 from src.agent import Agent
-from src.physics_engine import PhysicsEngine
+from src.message import Message
+from src.physics_backend import create_physics_engine
+from src.player_executor import PLAYER_TIME_BUDGET, LocalPlayerExecutor, PlayerCodeError, ProcessPlayerExecutor
 from src.globals import *
 from src.projectile_state import ProjectileState
+from src.state_encoder import KEYFRAME_INTERVAL, StateEncoder
+from src.tick_scheduler import TickScheduler
 from src.agent_state import AgentState
+from src.binary_frame import FORMAT_BINARY, encode_tick_state
+from src.broadcast_channel import BroadcastChannel
+from src.client_messages import results_message
+from src.game_map import load_map
+from src.log import get_logger
 from src.obstacle import Obstacle
+from src.outbound_queue import TickFrame
 from src.vector2 import Vector2
+import itertools
 import os
-from time import time
 import sys
 
-PLAYABLE_AREA_X_MIN = 65
-PLAYABLE_AREA_X_MAX = 1024 - PLAYABLE_AREA_X_MIN
-PLAYABLE_AREA_Y_MIN = 25
-PLAYABLE_AREA_Y_MAX = 700 - PLAYABLE_AREA_Y_MIN
+# Ids of matches that are not given an id by their creator
+_match_ids = itertools.count(1)
+
+# States of a game, in the order they are reached:
+# The game has been created, but its players have not been told yet
+GAME_CREATED = "created"
+# The players have been sent START_GAME and are submitting code
+GAME_CODING = "coding"
+# The simulation has started
+GAME_RUNNING = "running"
+# The results have been sent
+GAME_FINISHED = "finished"
+# The game's resources have been released
+GAME_REAPED = "reaped"
 
 class Game():
     """Represents a single game.
@@ -37,24 +55,49 @@ class Game():
     In charge of game logic and detecting end condition.
     """
 
-    def __init__(self, clients):
+    def __init__(self, clients, realtime=True, keyframe_interval=KEYFRAME_INTERVAL, isolate_players=False, game_map=None, step_policy=None, match_id=None, physics_backend=None):
         """Constructor
 
         Args:
             clients: List of ServerToClientConnection instances.
+            realtime: If True, the game loop is started on the tornado i/o loop
+                once both players have submitted code. If False, the caller is
+                responsible for running the game (e.g. with run_headless).
+            keyframe_interval: number of ticks between TICK_STATE messages
+                that contain the full state of every object.
+            isolate_players: If True, player code runs in worker processes
+                with a time limit per tick (see ProcessPlayerExecutor).
+                Otherwise it runs in this process.
+            game_map: the GameMap to play on. Defaults to the default map.
+            step_policy: the step policy of the physics engine (see
+                PhysicsEngine).
+            match_id: id of the match added to log records. Defaults to a
+                number that is unique within this process.
+            physics_backend: name of the physics backend, e.g. "pymunk" or
+                "simple" (see create_physics_engine). Defaults to the
+                PHYSICS_BACKEND environment variable, or "pymunk".
         """
         self.clients = clients
+        self.realtime = realtime
+        self.match_id = match_id if match_id is not None else next(_match_ids)
+        self.log = get_logger(__name__, self.match_id)
         # List of pairs [client, agent]
         self.agents = []
         self.simulation_started = False
+        # One of the GAME_* states
+        self.state = GAME_CREATED
+        # Clients that left the game before it finished. They lose.
+        self.forfeited_clients = []
 
         self.next_id = 0
 
-        self.physics = PhysicsEngine()
+        self.game_map = game_map if game_map is not None else load_map()
+        self.physics = create_physics_engine(physics_backend, self.game_map, step_policy)
+        self.physics.log = get_logger(type(self.physics).__module__, self.match_id)
         self.physics.add_on_collision_callback(self.collision_callback)
         self.physics.add_on_separate_callback(self.separate_callback)
         self.debug_render = False
-        if "GUI" in os.environ and os.environ['GUI'] != "":
+        if realtime and "GUI" in os.environ and os.environ['GUI'] != "":
             self.debug_render = True
         if self.debug_render:
             self.physics.init_renderer()
@@ -64,62 +107,209 @@ class Game():
                 self.exec_player_code(client, code, class_name)
             client.on_receive_player_code = callback
 
-        self.projectiles = []
+        # Dictionary mapping projectile ids to ProjectileStates
+        self.projectiles = {}
+
+        # Workers of real-time games load player code in the background
+        self.load_asynchronously = realtime and isolate_players
+        # Dictionary mapping clients to the Futures of the agents that are
+        # being loaded for them
+        self.pending_loads = {}
+        if isolate_players:
+            # Games on the event loop must not wait for player code
+            self.player_executor = ProcessPlayerExecutor(self, time_budget=0 if realtime else PLAYER_TIME_BUDGET)
+        else:
+            self.player_executor = LocalPlayerExecutor(self)
+
+        self.state_encoder = StateEncoder(keyframe_interval)
 
-        self.game_start_time = None
+        # Objects destroyed since the last TICK_STATE message was sent.
+        # List of dicts {id: object id, type: "agent" or "projectile"}
+        self.destroyed_objects = []
+
+        # Number of ticks simulated so far and the corresponding simulated time
+        # in seconds. Simulated time advances by 1 / TICKS_PER_SECOND every
+        # tick regardless of how long the tick took in real time.
+        self.tick_count = 0
+        self.elapsed_time = 0
 
         # True if there was an error in player code.
         self.player_error = False
 
+        # Connections of spectators, who receive every message about the
+        # game's state but do not play (see BroadcastChannel). Can be replaced
+        # by other classes with an object that has the same publish and close
+        # methods.
+        self.spectators = BroadcastChannel()
+
+        # Called with this game once it has finished and results have been
+        # sent, either by the real-time game loop or because a client
+        # forfeited. Can be set by other classes.
+        self.on_game_end = None
+
+        # Runs the game loop in real time. Its stats show how far the game
+        # fell behind schedule.
+        self.tick_scheduler = TickScheduler(self.scheduled_tick)
+
+    def start_coding(self):
+        """Tells the clients that the game has started, so that they submit
+        their code."""
+        self.state = GAME_CODING
+        for client in self.clients:
+            client.send_start_game_message()
+
     async def run_game_loop(self):
         """Continuously steps physics engine and updates clients"""
         self.prepare_to_start_simulation()
-        self.game_start_time = time()
-
-        while True:
-            game_ended = self.tick()
-
-            if self.player_error:
-                tie = True
-                for agent in self.agents:
-                    if not agent[1].had_error:
-                        tie = False
-                for agent in self.agents:
-                    winner = False
-                    if not agent[1].had_error:
-                        winner = True
-                    agent[0].send_results(winner, tie, self.agents, error=True)
-                return
-
-            if game_ended:
-                tie = True
-                for agent in self.agents:
-                    if agent[1].get_health() > 0:
-                        tie = False
-                for agent in self.agents:
-                    winner = False
-                    if agent[1].get_health() > 0:
-                        winner = True
-                    agent[0].send_results(winner, tie, self.agents)
-                return
-            await asyncio.sleep(1 / TICKS_PER_SECOND)
-
-    def tick(self):
+        await self.tick_scheduler.run()
+        self.finish()
+
+    def forfeit(self, client):
+        """Ends the game because a client left it, e.g. by disconnecting.
+        The client loses. A running game ends at its next tick, and any other
+        game that has not finished ends immediately."""
+        if self.state in [GAME_FINISHED, GAME_REAPED] or client in self.forfeited_clients:
+            return
+        self.log.info("player forfeited")
+        self.forfeited_clients.append(client)
+        if self.state != GAME_RUNNING:
+            self.finish()
+
+    def finish(self):
+        """Sends the results, stops player code and calls on_game_end."""
+        self.state = GAME_FINISHED
+        self.send_results()
+        self.spectators.close()
+        self.player_executor.close()
+        if self.on_game_end is not None:
+            self.on_game_end(self)
+
+    def reap(self):
+        """Releases the resources of a finished game: its player code, its
+        agents and physics engine, and the callbacks of its clients. The game
+        can not be used afterwards."""
+        self.state = GAME_REAPED
+        self.player_executor.close()
+        for client in self.clients:
+            client.on_receive_player_code = None
+        self.pending_loads = {}
+        self.physics.close()
+        self.agents = []
+        self.projectiles = {}
+
+    def scheduled_tick(self, broadcast):
+        """Performs one tick for the tick scheduler.
+
+        Returns:
+            True if the game loop should stop.
+        """
+        game_ended = self.tick(broadcast)
+        if game_ended or self.player_error or self.forfeited_clients:
+            if not broadcast:
+                # Always show clients the final state of the game.
+                self.broadcast_tick_state()
+                self.destroyed_objects = []
+            return True
+        return False
+
+    def run_headless(self, max_ticks):
+        """Runs the game loop back-to-back without sleeping between ticks.
+
+        Args:
+            max_ticks: Maximum number of ticks to simulate before giving up.
+        Returns:
+            True if the game ended before max_ticks was reached.
+            False otherwise.
+        """
+        self.prepare_to_start_simulation()
+
+        try:
+            for _ in range(max_ticks):
+                game_ended = self.tick()
+                if game_ended or self.player_error:
+                    return True
+            return False
+        finally:
+            self.player_executor.close()
+
+    def get_results(self):
+        """Determines the outcome of the game from the current agent states.
+
+        Returns:
+            A dict of the form {
+                winners: list of bools in the same order as self.agents
+                tie: bool indicating whether the game ended in a tie
+                error: bool indicating whether the game ended due to an error in player code
+                forfeit: bool indicating whether the game ended because a client left
+            }
+        """
+        if self.forfeited_clients:
+            winners = [agent[0] not in self.forfeited_clients for agent in self.agents]
+        elif self.player_error:
+            winners = [not agent[1].had_error for agent in self.agents]
+        else:
+            winners = [agent[1].get_health() > 0 for agent in self.agents]
+        return {
+            "winners": winners,
+            "tie": not any(winners) or all(winners),
+            "error": self.player_error,
+            "forfeit": len(self.forfeited_clients) > 0,
+        }
+
+    def get_client_results(self):
+        """Returns a list of pairs (client, True if the client won), in the
+        same order as self.clients.
+
+        A game only finishes before both clients have an agent if one of them
+        forfeited, so clients without an agent win unless they forfeited.
+        """
+        results = self.get_results()
+        client_results = []
+        for client in self.clients:
+            agent_index = self.get_index_of_client_agent(client)
+            if agent_index is None:
+                winner = client not in self.forfeited_clients
+            else:
+                winner = results["winners"][agent_index]
+            client_results.append((client, winner))
+        return client_results
+
+    def send_results(self):
+        """Sends the results of the game to each client that is still in
+        it."""
+        results = self.get_results()
+        client_results = self.get_client_results()
+        winners = [winner for _, winner in client_results]
+        tie = not any(winners) or all(winners)
+        for client, winner in client_results:
+            if client not in self.forfeited_clients:
+                client.send_results(winner, tie, self.agents, error=results["error"], forfeit=results["forfeit"])
+        self.spectators.publish_message(results_message(None, tie, self.agents, error=results["error"], forfeit=results["forfeit"]).to_json())
+
+    def tick(self, broadcast=True):
         """Performs one iteration of game loop
 
+        Args:
+            broadcast: If False, the new state is not sent to clients. Objects
+                destroyed during the tick are sent with the next broadcast.
         Returns:
             True if game end condition has been reached.
             False otherwise.
         """
         game_ended = False
 
+        # apply the replies of player code that runs in other processes
+        self.player_executor.receive_replies()
+
         self.physics.step(1 / TICKS_PER_SECOND)
+        self.tick_count += 1
+        self.elapsed_time = self.tick_count / TICKS_PER_SECOND
         for agent in self.agents:
             self.run_player_defined_method(agent[1], lambda: agent[1]._tick(), agent[0])
 
         # determine if agents have scanned anything
         for agent in self.agents:
-            scanned_objects = self.physics.scan_area(agent[1].get_position(), Agent.SCAN_DISTANCE)
+            scanned_objects = self.physics.scan_agent(agent[1].agent_state, Agent.SCAN_DISTANCE)
             # call appropriate callback for each scanned object
             for object in scanned_objects:
                 if object == agent[1].agent_state:
@@ -128,62 +318,95 @@ class Game():
                     self.run_player_defined_method(agent[1], lambda: agent[1].on_enemy_scanned(object.position), agent[0])
                     agent[1]._clip_velocity()
                 elif isinstance(object, Obstacle):
-                    self.run_player_defined_method(agent[1], lambda: agent[1].on_obstacle_scanned(object.position), agent[0])
+                    # Map obstacles are shared by all games, so players get a copy of the position
+                    self.run_player_defined_method(agent[1], lambda: agent[1].on_obstacle_scanned(object.position.clone()), agent[0])
                     agent[1]._clip_velocity()
 
+        # send the tick to player code that runs in other processes
+        self.player_executor.run_tick()
+
         # check if an agent has been eliminated
         for agent in self.agents:
             if agent[1].get_health() != 0:
                 continue
             game_ended = True
-            agent[1].survival_time = time() - self.game_start_time
-            destroyed_id = agent[1].agent_state.id
-            for agent in self.agents:
-                agent[0].send_destroy_message(destroyed_id, "agent")
+            agent[1].survival_time = self.elapsed_time
+            self.destroy_object(agent[1].agent_state.id, "agent")
 
-        if self.debug_render:
-            self.physics.render_tick()
+        if broadcast:
+            if self.debug_render:
+                self.physics.render_tick()
 
-        # send updates to clients
-        for agent in self.agents:
-            #print(agent[1].agent_state.position)
-            agent[0].send_agent_states([agent[1].agent_state for agent in self.agents])
-            agent[0].send_projectile_states([projectile for projectile in self.projectiles])
+            # send updates to clients
+            self.broadcast_tick_state()
+            self.destroyed_objects = []
 
         return game_ended
 
-    def prepare_to_start_simulation(self):
-        """Does setup work that needs to be done after all agents are created but before game loop starts.
+    def broadcast(self, message):
+        """Sends a message to every client in the game.
 
-        - Sets starting positions of agents and obstacles.
-        - Initializes physics engine
+        The message is encoded once and the same payload is written to every
+        client, so the cost of serialization does not grow with the number of
+        clients.
         """
-        # TODO figure out what starting positions should be
-        self.agents[0][1]._set_position(Vector2(PLAYABLE_AREA_X_MIN + 72, 350))
-        self.agents[0][1].set_movement_direction(0)
-        self.agents[1][1]._set_position(Vector2(PLAYABLE_AREA_X_MAX - 72, 350))
-        self.agents[1][1].set_movement_direction(180)
+        payload = message.to_json()
+        for agent in self.agents:
+            agent[0].send_encoded(payload)
 
-        # TODO set obstacle positions and add to physics
+    def add_spectator(self, connection):
+        """Adds a connection that watches the game (see BroadcastChannel.add)."""
+        self.spectators.add(connection)
 
-        box_width = 50
+    def remove_spectator(self, connection):
+        self.spectators.remove(connection)
 
-        # left obstacles
-        init_x = PLAYABLE_AREA_X_MIN + 3 * box_width + 0.5 * box_width
-        init_y = PLAYABLE_AREA_Y_MIN + 2 * box_width + 1.5 * box_width
-        self.physics.add_obstacle(Obstacle(self.gen_id(), Vector2(init_x, init_y), 3 * box_width, box_width))
+    def broadcast_tick_state(self):
+        """Sends the TICK_STATE of the current tick to every client and
+        spectator.
 
-        # middle obstacles
-        init_x = (PLAYABLE_AREA_X_MAX + PLAYABLE_AREA_X_MIN) / 2
-        init_y = (PLAYABLE_AREA_Y_MAX + PLAYABLE_AREA_Y_MIN) / 2
-        self.physics.add_obstacle(Obstacle(self.gen_id(), Vector2(init_x, init_y), box_width, box_width))
-        self.physics.add_obstacle(Obstacle(self.gen_id(), Vector2(init_x - box_width, init_y - box_width), box_width, box_width))
-        self.physics.add_obstacle(Obstacle(self.gen_id(), Vector2(init_x + box_width, init_y + box_width), box_width, box_width))
+        The state is encoded at most once per form (see TickFrame): once as
+        JSON and, if any client asked for binary frames, once as a binary
+        frame. Keyframes for clients and spectators that skipped frames are
+        also encoded at most once.
+        """
+        agent_states = [agent[1].agent_state for agent in self.agents]
+        projectile_states = list(self.projectiles.values())
+        data = self.state_encoder.encode(agent_states, projectile_states, self.destroyed_objects)
+        json_payload = Message(Message.TICK_STATE, data).to_json()
+
+        # Other forms are encoded when they are first needed, which is before
+        # the next frame is encoded.
+        keyframe = data.get("keyframe", False)
+        destroyed = self.destroyed_objects
+        tick = self.tick_count
+        def encode_json_keyframe():
+            return Message(Message.TICK_STATE, self.state_encoder.get_keyframe(destroyed)).to_json()
+        def encode_binary(include_names):
+            # Send names as often as JSON keyframes
+            return encode_tick_state(tick, agent_states, projectile_states, destroyed, include_names=include_names or keyframe)
+        frame = TickFrame(json_payload, encode_json_keyframe, encode_binary, keyframe=keyframe)
 
-        # right obstacles
-        init_x = PLAYABLE_AREA_X_MAX - 3 * box_width - 0.5 * box_width
-        init_y = PLAYABLE_AREA_Y_MAX - 2 * box_width - 1.5 * box_width
-        self.physics.add_obstacle(Obstacle(self.gen_id(), Vector2(init_x, init_y), 3 * box_width, box_width))
+        for agent in self.agents:
+            client = agent[0]
+            if client.frame_format == FORMAT_BINARY:
+                client.send_encoded(frame.get_binary(include_names=False), binary=True, frame=frame)
+            else:
+                client.send_encoded(json_payload, frame=frame)
+
+        self.spectators.publish_frame(frame)
+
+    def prepare_to_start_simulation(self):
+        """Does setup work that needs to be done after all agents are created but before game loop starts.
+
+        - Sets starting positions of agents and obstacles.
+        - Initializes physics engine
+        """
+        for agent, ((x, y), direction) in zip(self.agents, self.game_map.spawn_points):
+            agent[1]._set_position(Vector2(x, y))
+            agent[1].set_movement_direction(direction)
+
+        self.physics.add_map_obstacles()
 
         for agent in self.agents:
             self.physics.add_agent(agent[1].agent_state)
@@ -193,13 +416,8 @@ class Game():
         if isinstance(object_state_1, ProjectileState) and isinstance(object_state_2, ProjectileState):
             # handle projectile-projectile collision
             # destroy both projectiles
-            self.physics.remove_object(object_state_1.id)
-            self.physics.remove_object(object_state_2.id)
-            if object_state_1 in self.projectiles: self.projectiles.remove(object_state_1)
-            if object_state_2 in self.projectiles: self.projectiles.remove(object_state_2)
-            for agent in self.agents:
-                    agent[0].send_destroy_message(object_state_1.id, "projectile")
-                    agent[0].send_destroy_message(object_state_2.id, "projectile")
+            self.destroy_projectile(object_state_1)
+            self.destroy_projectile(object_state_2)
         elif isinstance(object_state_1, AgentState) and isinstance(object_state_2, AgentState):
             pass
         elif isinstance(object_state_1, ProjectileState) or isinstance(object_state_2, ProjectileState):
@@ -219,10 +437,7 @@ class Game():
                     # callback
                     self.run_player_defined_method(agent, lambda: agent.on_damage_taken(), client)
                 # remove the projectile
-                self.physics.remove_object(projectile.id)
-                if projectile in self.projectiles: self.projectiles.remove(projectile)
-                for agent in self.agents:
-                    agent[0].send_destroy_message(projectile.id, "projectile")
+                self.destroy_projectile(projectile)
             else:
                 # handle projectile-obstacle collision
                 if isinstance(object_state_1, ProjectileState):
@@ -230,10 +445,7 @@ class Game():
                 else:
                     projectile = object_state_2
                 # remove the projectile
-                self.physics.remove_object(projectile.id)
-                if projectile in self.projectiles: self.projectiles.remove(projectile)
-                for agent in self.agents:
-                    agent[0].send_destroy_message(projectile.id, "projectile")
+                self.destroy_projectile(projectile)
         elif (isinstance(object_state_1, AgentState) or isinstance(object_state_2, AgentState)) and \
             (isinstance(object_state_1, Obstacle) or isinstance(object_state_2, Obstacle)):
                 # handle agent-obstacle collision
@@ -249,6 +461,27 @@ class Game():
                 agent._add_collision(obstacle, contact_point)
                 self.run_player_defined_method(agent, lambda: agent.on_obstacle_hit(), client)
 
+    def destroy_projectile(self, projectile):
+        """Removes a projectile from the game and notifies clients. Does
+        nothing if the projectile has already been destroyed."""
+        if not self.physics.remove_object(projectile.id):
+            return
+        self.projectiles.pop(projectile.id, None)
+        self.destroy_object(projectile.id, "projectile")
+
+    def destroy_object(self, object_id, object_type):
+        """Records that an object was destroyed. Clients are told about it in
+        the next TICK_STATE message.
+
+        Args:
+            object_id: id of the destroyed object.
+            object_type: "agent" or "projectile"
+        """
+        self.destroyed_objects.append({
+            "id": object_id,
+            "type": object_type
+        })
+
     def separate_callback(self, object_state_1, object_state_2):
         """Callback for when physics engine detects that two colliding objects have now separated."""
         if isinstance(object_state_1, AgentState) or isinstance(object_state_2, AgentState):
@@ -286,53 +519,102 @@ class Game():
             player_code: Code input from player as string.
             class_name: The name of the Agent subclass created by the player.
         Returns:
-            True on success. False otherwise
+            True on success. False otherwise. None if the code is loaded in
+            the background, in which case on_agent_loaded reports the outcome.
         """
+        if self.state in [GAME_FINISHED, GAME_REAPED]:
+            # The opponent forfeited while this client was coding
+            self.log.warning("ignoring code sent after the game ended")
+            return False
+
         if self.simulation_started:
             message = "ERROR: client sent code after simulation started."
-            print(message)
+            self.log.warning(message)
             client.send_debug_message(message)
             return
 
+        if self.load_asynchronously:
+            future = self.player_executor.load_agent(self.gen_id(), player_code, class_name)
+            self.pending_loads[client] = future
+            tornado.ioloop.IOLoop.current().add_future(future, lambda future: self.on_agent_loaded(client, future))
+            return None
+
         try:
-            # Compile in 'exec' mode since 'eval' mode doesn't allow class definitions.
-            code = compile(player_code, 'Player Code', 'exec')
-            # Make the Agent class in-scope to player code
-            player_globals = {'Agent': Agent}
-            exec(code, player_globals)
-            # Get the class object so we can instantiate it later.
-            # TODO what if both players have classes with the same name?
-            class_name = class_name.strip()
-            agent_class = eval(class_name, player_globals)
-
-            # Check if player has already submitted code and if so, replace
-            # agent instead of appending.
-            agent_instance = agent_class(self.gen_id(), self, name=class_name)
-            agent_index = self.get_index_of_client_agent(client)
-            if agent_index is not None:
-                self.agents[agent_index][1] = agent_instance
-                client.send_debug_message("Successfully updated Agent instance from player code")
-            else:
-                self.agents.append([client, agent_instance])
-                client.send_debug_message("Successfully created Agent instance from player code")
+            agent_instance = self.player_executor.create_agent(self.gen_id(), player_code, class_name)
+        except PlayerCodeError as e:
+            client.send_debug_message("Failed to create Agent instance from player code")
+            client.send_python_error_message(e.traceback)
+            return False
 
-            # Check if both clients have submitted valid code and if so, start the simulation.
-            if len(self.agents) == 2:
-                self.simulation_started = True
+        self.set_player_agent(client, agent_instance)
+        return True
 
-                for client in self.clients:
-                    client.send_start_simulation_message()
+    def on_agent_loaded(self, client, future):
+        """Assigns an agent that was loaded in the background to the client,
+        unless the client has sent newer code or the game has moved on."""
+        if future.cancelled():
+            # The game finished first
+            return
+        superseded = self.pending_loads.get(client) is not future
+        if not superseded:
+            del self.pending_loads[client]
+        try:
+            agent_instance = future.result()
+        except PlayerCodeError as e:
+            if not superseded:
+                client.send_debug_message("Failed to create Agent instance from player code")
+                client.send_python_error_message(e.traceback)
+            return
+        if superseded or self.simulation_started or self.state in [GAME_FINISHED, GAME_REAPED]:
+            self.player_executor.release_agent(agent_instance)
+            return
+        self.set_player_agent(client, agent_instance)
+
+    def add_player_agent(self, client, agent_class, class_name):
+        """Creates an instance of a player's Agent subclass and assigns it to
+        the client. Starts the simulation once both players have an agent.
+
+        Args:
+            client: ServerToClientConnection instance that owns the agent.
+            agent_class: The Agent subclass created by the player.
+            class_name: The name of the Agent subclass.
+        """
+        self.set_player_agent(client, agent_class(self.gen_id(), self, name=class_name))
 
+    def set_player_agent(self, client, agent_instance):
+        """Assigns an agent to the client. Starts the simulation once both
+        players have an agent.
+
+        Args:
+            client: ServerToClientConnection instance that owns the agent.
+            agent_instance: Instance of the player's Agent subclass, or its
+                stand-in created by the player executor.
+        """
+        # Check if player has already submitted code and if so, replace
+        # agent instead of appending.
+        agent_index = self.get_index_of_client_agent(client)
+        if agent_index is not None:
+            self.player_executor.release_agent(self.agents[agent_index][1])
+            self.agents[agent_index][1] = agent_instance
+            client.send_debug_message("Successfully updated Agent instance from player code")
+        else:
+            self.agents.append([client, agent_instance])
+            client.send_debug_message("Successfully created Agent instance from player code")
+
+        # Check if both clients have submitted valid code and if so, start the simulation.
+        if len(self.agents) == 2:
+            self.simulation_started = True
+            self.state = GAME_RUNNING
+            self.state_encoder.request_keyframe()
+
+            for client in self.clients:
+                client.send_start_simulation_message()
+            self.spectators.publish_message(Message(Message.START_SIMULATION, None).to_json(), replay=True)
+
+            if self.realtime:
                 # call run_game_loop at the next iteration of the i/o loop
                 tornado.ioloop.IOLoop.current().add_callback(self.run_game_loop)
 
-            return True
-        except Exception as e:
-            client.send_debug_message("Failed to create Agent instance from player code")
-            e_type, e_value, e_traceback = sys.exc_info()
-            client.send_python_error(e_type, e_value, e_traceback)
-            return False
-
     def get_index_of_client_agent(self, client):
         """
         Args:
@@ -368,7 +650,7 @@ class Game():
             attackerId
         )
 
-        self.projectiles.append(projectile_state)
+        self.projectiles[projectile_state.id] = projectile_state
 
         self.physics.add_projectile(projectile_state)
 
@@ -382,7 +664,7 @@ class Game():
         try:
             method()
         except Exception as e:
-            print(e)
+            self.log.info("player code of agent %s raised %r", agent.agent_state.id, e)
             e_type, e_value, e_traceback = sys.exc_info()
             client.send_python_error(e_type, e_value, e_traceback)
             agent.had_error = True
@@ -0,0 +1,121 @@
+"""
+Compiled game maps.
+
+A map describes the arena that games are played in: its size, the boundaries
+around it, the obstacles in it and where agents spawn. Maps are JSON files in
+src/maps, so new maps can be added without changing the game:
+
+    {
+        "width": 1074,
+        "height": 700,
+        "boundaries": [{"start": [0, 0], "end": [0, 700], "radius": 40}, ...],
+        "obstacles": [{"position": [240, 200], "width": 50, "height": 150}, ...],
+        "spawn_points": [{"position": [137, 350], "direction": 0}, ...]
+    }
+
+Compiling a map creates its Obstacles and the StaticIndexes used for
+projectile hits and scans, including the scan grids for Agent.SCAN_DISTANCE and
+for the collisions of the simple physics backend (AGENT_RADIUS).
+Compiled maps are cached by name and shared read only by every game played on
+them, so none of this is repeated when a game starts. Only the pymunk bodies
+are created per game, since pymunk bodies can only belong to one space.
+
+Part of the implementation of the following requirements:
+FR14 - Map.Walls
+"""
+
+import json
+import os
+
+from src.agent import Agent
+from src.globals import *
+from src.obstacle import Obstacle
+from src.static_index import StaticIndex
+from src.vector2 import Vector2
+
+MAPS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+DEFAULT_MAP = "default"
+
+# Dictionary mapping map names to compiled GameMaps
+_compiled_maps = {}
+
+
+class GameMap():
+    """The compiled, read only form of a map.
+
+    Boundaries and obstacles get negative ids, in the order they are listed,
+    so they never clash with the ids of agents and projectiles.
+    """
+
+    def __init__(self, width, height, boundaries, obstacles, spawn_points):
+        """Constructor
+
+        Arguments:
+            width: width of the arena in pixels.
+            height: height of the arena in pixels.
+            boundaries: list of ((x, y) start, (x, y) end, radius) tuples of the
+                rounded segments around the arena.
+            obstacles: list of ((x, y) center, width, height) tuples.
+            spawn_points: list of ((x, y) position, direction) tuples, one per
+                player.
+        """
+        self.width = width
+        self.height = height
+
+        # List of (obstacle, start, end, radius) tuples
+        self.boundaries = []
+        self.boundary_index = StaticIndex()
+        for start, end, radius in boundaries:
+            obstacle = Obstacle(-len(self.boundaries) - 1, Vector2(0, 0), 0, 0)
+            start = (start[0], start[1])
+            end = (end[0], end[1])
+            self.boundaries.append((obstacle, start, end, radius))
+            self.boundary_index.add(
+                obstacle,
+                min(start[0], end[0]),
+                min(start[1], end[1]),
+                max(start[0], end[0]),
+                max(start[1], end[1]),
+                radius
+            )
+
+        self.obstacles = []
+        self.static_index = self.boundary_index.copy()
+        for (x, y), obstacle_width, obstacle_height in obstacles:
+            obstacle_id = -len(self.boundaries) - len(self.obstacles) - 1
+            obstacle = Obstacle(obstacle_id, Vector2(x, y), obstacle_height, obstacle_width)
+            self.obstacles.append(obstacle)
+            self.static_index.add(obstacle, x - obstacle_width / 2, y - obstacle_height / 2, x + obstacle_width / 2, y + obstacle_height / 2)
+
+        # Games start with only the boundaries in their physics engine, so
+        # both sets of objects are indexed.
+        self.boundary_index.freeze([Agent.SCAN_DISTANCE, AGENT_RADIUS])
+        self.static_index.freeze([Agent.SCAN_DISTANCE, AGENT_RADIUS])
+
+        self.spawn_points = [((position[0], position[1]), direction) for position, direction in spawn_points]
+
+    @staticmethod
+    def from_dict(data):
+        """Compiles a map from its JSON description."""
+        return GameMap(
+            data["width"],
+            data["height"],
+            [(boundary["start"], boundary["end"], boundary["radius"]) for boundary in data.get("boundaries", [])],
+            [(obstacle["position"], obstacle["width"], obstacle["height"]) for obstacle in data.get("obstacles", [])],
+            [(spawn_point["position"], spawn_point["direction"]) for spawn_point in data.get("spawn_points", [])]
+        )
+
+
+def load_map(name=DEFAULT_MAP):
+    """Returns the compiled map src/maps/<name>.json, compiling it the first
+    time it is loaded.
+
+    Raises:
+        FileNotFoundError: if there is no map with that name.
+    """
+    game_map = _compiled_maps.get(name)
+    if game_map is None:
+        with open(os.path.join(MAPS_DIRECTORY, name + ".json")) as map_file:
+            game_map = GameMap.from_dict(json.load(map_file))
+        _compiled_maps[name] = game_map
+    return game_map
@@ -1,44 +1,150 @@
 """
 The game server that matches opponents and creates games.
 
+Queued clients are matched by rating (see matchmaking.py) every
+MATCH_INTERVAL, once the first client has joined the queue.
+
+The server keeps each game only until it has finished. A client that
+disconnects forfeits its game, which then ends at its next tick, or at once if
+the game has not started running. Finished games are reaped: they are removed
+from the server and release their player code processes, physics engine and
+agents, so the memory used by the server does not grow with the number of
+games it has played.
+
 Implements the following requirement:
 FR18 - Online.Matchmaking
 """
-from collections import deque
+import tornado.ioloop
 
 from src.game import Game
+from src.log import get_logger
+from src.matchmaking import MATCH_INTERVAL, Matchmaker, RatingTable
+from src.shard import ShardPool
+
+log = get_logger(__name__)
 
 
 class GameServer():
     """Manages client queue and starts and ends games.
     """
-    def __init__(self):
-        self.queue = deque()
-        self.games = deque()
+    def __init__(self, shards=0, isolate_players=True):
+        """Constructor
+
+        Arguments:
+            shards: number of worker processes to run games in. If 0, games
+                run in this process.
+            isolate_players: passed to every Game. Run player code in worker
+                processes so that slow player code cannot hold up other games
+                on the server.
+        """
+        self.isolate_players = isolate_players
+        self.matchmaker = Matchmaker()
+        self.ratings = RatingTable()
+        # Dict mapping player names to the queued or playing clients that
+        # use them
+        self.player_clients = {}
+        # Runs the matcher while the server is running
+        self.match_callback = None
+        # Dict mapping match ids (as strings) to games that have not ended, so
+        # that spectators can find them
+        self.matches = {}
+        # Dict mapping clients to the games they are playing
+        self.client_games = {}
+        # Numbers of games started and reaped
+        self.games_started = 0
+        self.games_reaped = 0
+        self.shard_pool = None
+        if shards > 0:
+            self.shard_pool = ShardPool(shards, isolate_players)
 
     def enqueue(self, client):
-        """Places a client in the queue.
+        """Places a client in the queue. If another client is using the
+        client's player name, the client plays unrated.
         """
-        self.queue.appendleft(client)
+        player_id = client.player_id
+        if player_id is not None:
+            if player_id in self.player_clients:
+                client.send_debug_message(f"Player {player_id} is already connected, your matches will not be rated.")
+                client.player_id = None
+            else:
+                self.player_clients[player_id] = client
+        self.matchmaker.add(client, self.ratings.get(client.player_id))
         client.send_debug_message("Entered matchmaking queue.")
 
-        if len(self.queue) >= 2:
-            clients = []
-            clients.append(self.queue.pop())
-            clients.append(self.queue.pop())
-            self.start_game(clients)
+        if self.match_callback is None:
+            self.match_callback = tornado.ioloop.PeriodicCallback(self.match_players, MATCH_INTERVAL * 1000)
+            self.match_callback.start()
 
     def remove_from_queue(self, client):
-        """Removes a client from the queue.
+        """Removes a client from the queue. Does nothing if the client is not
+        queued, e.g. because it is already in a game.
         """
-        self.queue.remove(client)
+        self.matchmaker.remove(client)
+
+    def disconnect(self, client):
+        """Called when a client has disconnected. Removes it from the queue,
+        or forfeits its game."""
+        self.remove_from_queue(client)
+        self.release_player_id(client)
+        game = self.client_games.pop(client, None)
+        if game is not None:
+            game.forfeit(client)
+
+    def release_player_id(self, client):
+        """Lets other clients use the player name of a client."""
+        if client.player_id is not None and self.player_clients.get(client.player_id) is client:
+            del self.player_clients[client.player_id]
+
+    def match_players(self):
+        """Starts games for the clients that the matchmaker pairs up."""
+        for clients in self.matchmaker.match():
+            self.start_game(list(clients))
 
     def start_game(self, clients):
         """Creates and starts a game with the given list of clients.
         """
-        print("Starting a new game")
+        game = None
+        if self.shard_pool is not None:
+            try:
+                game = self.shard_pool.start_game(clients)
+            except RuntimeError:
+                log.error("no shards are running, starting the match in the server process")
+        if game is None:
+            game = Game(clients, isolate_players=self.isolate_players)
+        self.matches[str(game.match_id)] = game
         for client in clients:
-            client.send_start_game_message()
+            self.client_games[client] = game
+        game.on_game_end = self.end_match
+        self.games_started += 1
+        log.info("started match %s", game.match_id)
+        game.start_coding()
+
+    def get_match(self, match_id):
+        """Returns the game with the given match id, or None if there is no
+        such game or it has ended."""
+        return self.matches.get(match_id)
+
+    def end_match(self, game):
+        """Called once a game has ended. Updates the ratings of its players
+        and reaps the game."""
+        results = game.get_client_results()
+        if len(results) == 2:
+            (client_1, winner_1), (client_2, winner_2) = results
+            if winner_1 == winner_2:
+                score_1 = 0.5
+            else:
+                score_1 = 1 if winner_1 else 0
+            self.ratings.record_match(client_1.player_id, client_2.player_id, score_1)
+        self.reap(game)
 
-        game = Game(clients)
-        self.games.appendleft(game)
\ No newline at end of file
+    def reap(self, game):
+        """Removes a finished game from the server and releases its
+        resources."""
+        self.matches.pop(str(game.match_id), None)
+        for client in game.clients:
+            if self.client_games.get(client) is game:
+                del self.client_games[client]
+            self.release_player_id(client)
+        game.reap()
+        self.games_reaped += 1
+        log.info("reaped match %s", game.match_id)
\ No newline at end of file
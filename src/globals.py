@@ -8,4 +8,5 @@ FR10 - Agent.PositionState
 '''
 
 TICKS_PER_SECOND = 30
-AGENT_RADIUS = 30
\ No newline at end of file
+AGENT_RADIUS = 30
+PROJECTILE_RADIUS = 5
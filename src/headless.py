@@ -0,0 +1,187 @@
+"""
+Runs games without a web server, real clients or real-time sleeping.
+
+Used to simulate many agent-vs-agent matches offline, e.g. for ranking and
+regression testing.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR15 - Agent.Elimination
+FR16 - Agent.Win
+"""
+
+from traceback import format_exception
+
+from src.binary_frame import FORMAT_JSON
+from src.game import Game
+from src.globals import *
+
+# Longest match that will be simulated, in ticks. Matches that reach this limit
+# are declared a tie.
+DEFAULT_MAX_TICKS = TICKS_PER_SECOND * 60 * 3
+
+
+class HeadlessClient():
+    """Stands in for a ServerToClientConnection when there is no real client.
+
+    Messages that only matter for rendering are dropped. Python errors and
+    results are recorded so that they can be inspected after the game.
+    """
+
+    def __init__(self):
+        # Callback which is set by Game
+        self.on_receive_player_code = None
+
+        # Formatted tracebacks of errors in player code
+        self.python_errors = []
+
+        # The data that would have been sent in a RESULTS message
+        self.results = None
+
+        self.frame_format = FORMAT_JSON
+
+    def send_debug_message(self, message_contents):
+        pass
+
+    def send_start_game_message(self):
+        pass
+
+    def send_start_simulation_message(self):
+        pass
+
+    def send_python_error(self, e_type, e_value, e_traceback):
+        error_str = "".join(format_exception(e_type, e_value, e_traceback))
+        self.send_python_error_message(error_str)
+
+    def send_python_error_message(self, error_str):
+        self.python_errors.append(error_str)
+
+    def send_results(self, winner, tie, agents, error=False, forfeit=False):
+        self.results = {
+            "winner": winner,
+            "tie": tie,
+            "error": error,
+            "forfeit": forfeit,
+        }
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        pass
+
+
+class MatchResult():
+    """The outcome of a headless match."""
+
+    def __init__(self, winner, tie, error, timed_out, ticks, class_names, survival_times, healths, python_errors):
+        """Constructor
+
+        Arguments:
+            winner: index (0 or 1) of the winning player or None if there is no single winner.
+            tie: bool indicating whether the match ended in a tie.
+            error: bool indicating whether the match ended due to an error in player code.
+            timed_out: bool indicating whether the match reached the tick limit.
+            ticks: number of ticks that were simulated.
+            class_names: list of the agent class names of each player.
+            survival_times: list of simulated survival times in seconds, or None for players that survived.
+            healths: list of each agent's health at the end of the match.
+            python_errors: list of lists of formatted tracebacks for each player.
+        """
+        self.winner = winner
+        self.tie = tie
+        self.error = error
+        self.timed_out = timed_out
+        self.ticks = ticks
+        self.class_names = class_names
+        self.survival_times = survival_times
+        self.healths = healths
+        self.python_errors = python_errors
+
+    def to_json_dict(self):
+        json_dict = {
+            'winner': self.winner,
+            'tie': self.tie,
+            'error': self.error,
+            'timed_out': self.timed_out,
+            'ticks': self.ticks,
+            'class_names': self.class_names,
+            'survival_times': self.survival_times,
+            'healths': self.healths,
+            'python_errors': self.python_errors,
+        }
+        return json_dict
+
+
+def run_match(player_1, player_2, max_ticks=DEFAULT_MAX_TICKS, physics_backend=None):
+    """Simulates a complete match between two agents as fast as possible.
+
+    Time in the match is simulated, so survival times are the same as they
+    would be in a real-time game.
+
+    Arguments:
+        player_1: an Agent subclass or a (code, class_name) tuple of player code.
+        player_2: an Agent subclass or a (code, class_name) tuple of player code.
+        max_ticks: maximum number of ticks to simulate. The match is declared a
+            tie if neither agent has been eliminated by then.
+        physics_backend: name of the physics backend (see
+            create_physics_engine). Defaults to the PHYSICS_BACKEND
+            environment variable.
+    Returns:
+        A MatchResult instance.
+    """
+    clients = [HeadlessClient(), HeadlessClient()]
+    game = Game(clients, realtime=False, physics_backend=physics_backend)
+
+    for client, player in zip(clients, [player_1, player_2]):
+        if isinstance(player, tuple):
+            code, class_name = player
+            game.exec_player_code(client, code, class_name)
+        else:
+            game.add_player_agent(client, player, player.__name__)
+
+    if not game.simulation_started:
+        # At least one player's code could not be loaded. That player forfeits.
+        loaded = [game.get_index_of_client_agent(client) is not None for client in clients]
+        return MatchResult(
+            winner=loaded.index(True) if loaded.count(True) == 1 else None,
+            tie=loaded.count(True) != 1,
+            error=True,
+            timed_out=False,
+            ticks=0,
+            class_names=[None if agent is None else agent[1].agent_state.name for agent in _agents_by_client(game, clients)],
+            survival_times=[None, None],
+            healths=[None, None],
+            python_errors=[client.python_errors for client in clients]
+        )
+
+    ended = game.run_headless(max_ticks)
+    game.send_results()
+    results = game.get_results()
+    winners = results["winners"]
+    tie = results["tie"]
+
+    winner = None
+    if not tie:
+        winner = winners.index(True)
+
+    agents = _agents_by_client(game, clients)
+    return MatchResult(
+        winner=winner,
+        tie=tie,
+        error=results["error"],
+        timed_out=not ended,
+        ticks=game.tick_count,
+        class_names=[agent[1].agent_state.name for agent in agents],
+        survival_times=[agent[1].survival_time for agent in agents],
+        healths=[agent[1].get_health() for agent in agents],
+        python_errors=[client.python_errors for client in clients]
+    )
+
+
+def _agents_by_client(game, clients):
+    """Returns the [client, agent] pair for each client in the order of clients.
+    The pair is None for clients without an agent.
+    """
+    pairs = []
+    for client in clients:
+        index = game.get_index_of_client_agent(client)
+        pairs.append(None if index is None else game.agents[index])
+    return pairs
@@ -0,0 +1,134 @@
+"""
+Logging for the server, its shards and games.
+
+Modules log through loggers from get_logger, which are children of the "src"
+logger. configure_logging sends their records through a QueueHandler to a
+QueueListener thread that does the actual writing, so the game loop never
+blocks on output. The level is set by the LOG_LEVEL environment variable
+(default INFO), and LOG_FORMAT=json writes one JSON object per line instead of
+text.
+
+Records logged by a game carry the id of its match, which get_logger adds when
+it is given a match_id.
+
+Debug messages on hot paths, such as collisions, are guarded with
+logger.isEnabledFor(logging.DEBUG) so they cost nothing unless debug logging
+is on. Until configure_logging is called, records at WARNING and above are
+written by Python's last resort handler and other records are dropped.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+ROOT_LOGGER_NAME = "src"
+DEFAULT_LOG_LEVEL = "INFO"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s match=%(match)s %(message)s"
+
+# The QueueListener of this process, set by configure_logging
+_listener = None
+
+
+class _MatchFilter(logging.Filter):
+    """Gives records that were not logged for a match a match attribute."""
+
+    def filter(self, record):
+        if not hasattr(record, "match"):
+            record.match = "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON objects."""
+
+    def format(self, record):
+        json_dict = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "match": record.match,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            json_dict["exception"] = self.formatException(record.exc_info)
+        return json.dumps(json_dict)
+
+
+class MatchLogger(logging.LoggerAdapter):
+    """A logger that adds the id of a match to every record."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+def get_logger(name, match_id=None):
+    """Returns the logger for a module.
+
+    Arguments:
+        name: name of the module, usually __name__.
+        match_id (optional): id of the match that the records belong to.
+    """
+    logger = logging.getLogger(name)
+    if match_id is None:
+        return logger
+    return MatchLogger(logger, {"match": match_id})
+
+
+def configure_logging(level=None, stream=None, log_format=None):
+    """Sends records of the "src" logger to stream through a queue. Calling it
+    again replaces the previous configuration.
+
+    Arguments:
+        level (optional): name of the lowest level to log. Defaults to the
+            LOG_LEVEL environment variable, or INFO.
+        stream (optional): stream to write to. Defaults to sys.stderr.
+        log_format (optional): "text" or "json". Defaults to the LOG_FORMAT
+            environment variable, or "text".
+    """
+    global _listener
+    stop_logging()
+
+    if level is None:
+        level = os.environ.get("LOG_LEVEL", DEFAULT_LOG_LEVEL)
+    if log_format is None:
+        log_format = os.environ.get("LOG_FORMAT", "text")
+
+    stream_handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    stream_handler.addFilter(_MatchFilter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level.upper())
+    root_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def stop_logging():
+    """Writes any queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Write queued records before the interpreter exits
+atexit.register(stop_logging)
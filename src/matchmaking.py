@@ -0,0 +1,248 @@
+"""
+Matches queued players with opponents of similar skill.
+
+Every player has an Elo rating, kept by a RatingTable and updated from the
+results of each match. Players are identified by the name they connect with
+(see ServerToClientConnection.open). Players without a name play at
+DEFAULT_RATING and their results are not recorded.
+
+Names are not authenticated, and ratings are kept in the memory of the server
+process, so they are best-effort: they are lost when the server restarts and
+are not shared between servers. So that a connection cannot play under the
+name of a player that is already queued or playing, GameServer only lets one
+connection at a time use a name, and the others play unrated.
+
+The Matchmaker keeps queued players in buckets of BUCKET_SIZE rating points.
+Each player accepts opponents within a search window around their own rating,
+which starts at INITIAL_WINDOW and widens by WINDOW_GROWTH every second they
+wait, up to MAX_WINDOW, so that players with unusual ratings are matched
+eventually. Two players are matched once each is within the other's window.
+
+GameServer calls Matchmaker.match every MATCH_INTERVAL. A pass goes through
+the queue from the longest waiting player and pairs each one with the closest
+acceptable bucket's longest waiting player, so it forms as many pairs as it
+can. Adding and cancelling an entry take constant time.
+
+Implements the following requirement:
+FR18 - Online.Matchmaking
+"""
+
+from time import perf_counter
+
+# Rating of players that have not played yet
+DEFAULT_RATING = 1500
+
+# Largest change in rating from one match
+K_FACTOR = 32
+
+# Rating points covered by each bucket of queued players
+BUCKET_SIZE = 100
+
+# Rating difference that players accept as soon as they join the queue
+INITIAL_WINDOW = 100
+
+# Rating points that a player's search window widens by every second
+WINDOW_GROWTH = 100
+
+# Widest search window
+MAX_WINDOW = 1000
+
+# Seconds between passes of the matcher
+MATCH_INTERVAL = 0.25
+
+
+def get_expected_score(rating, opponent_rating):
+    """Returns the expected score, from 0 to 1, of a player against an
+    opponent."""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+class RatingTable():
+    """Elo ratings of named players."""
+
+    def __init__(self, k_factor=K_FACTOR):
+        self.k_factor = k_factor
+        # Dictionary mapping player names to ratings
+        self.ratings = {}
+
+    def get(self, player):
+        """Returns the rating of a player, or DEFAULT_RATING if the player
+        has not played or is None."""
+        return self.ratings.get(player, DEFAULT_RATING)
+
+    def record_match(self, player_1, player_2, score_1):
+        """Updates the ratings of two players from the result of their match.
+
+        Arguments:
+            player_1: name of the first player, or None if unnamed.
+            player_2: name of the second player, or None if unnamed.
+            score_1: 1 if the first player won, 0 if it lost, 0.5 for a tie.
+        """
+        rating_1 = self.get(player_1)
+        rating_2 = self.get(player_2)
+        change = self.k_factor * (score_1 - get_expected_score(rating_1, rating_2))
+        if player_1 is not None:
+            self.ratings[player_1] = rating_1 + change
+        if player_2 is not None:
+            self.ratings[player_2] = rating_2 - change
+
+
+class QueueEntry():
+    """A player waiting in the Matchmaker's queue."""
+
+    def __init__(self, client, rating, enqueued_at):
+        self.client = client
+        self.rating = rating
+        self.enqueued_at = enqueued_at
+        self.bucket = int(rating // BUCKET_SIZE)
+
+    def get_window(self, now):
+        """Returns the largest rating difference the player accepts."""
+        return min(MAX_WINDOW, INITIAL_WINDOW + WINDOW_GROWTH * (now - self.enqueued_at))
+
+
+class MatchmakingStats():
+    """Statistics about the players matched by a Matchmaker."""
+
+    def __init__(self):
+        self.matches = 0
+        # Players that left the queue before they were matched
+        self.cancelled = 0
+        # Sums over all matched players
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+        # Sum of the rating differences of all matches
+        self.total_rating_difference = 0
+
+    def record_match(self, entry_1, entry_2, now):
+        self.matches += 1
+        for entry in [entry_1, entry_2]:
+            wait_time = now - entry.enqueued_at
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.total_rating_difference += abs(entry_1.rating - entry_2.rating)
+
+    def get_mean_wait_time(self):
+        if self.matches == 0:
+            return None
+        return self.total_wait_time / (2 * self.matches)
+
+    def get_mean_rating_difference(self):
+        if self.matches == 0:
+            return None
+        return self.total_rating_difference / self.matches
+
+    def to_json_dict(self):
+        json_dict = {
+            'matches': self.matches,
+            'cancelled': self.cancelled,
+            'mean_wait_time': self.get_mean_wait_time(),
+            'max_wait_time': self.max_wait_time,
+            'mean_rating_difference': self.get_mean_rating_difference(),
+        }
+        return json_dict
+
+
+class Matchmaker():
+    """Queue of players waiting for a match."""
+
+    def __init__(self):
+        # Dictionary mapping clients to their QueueEntries, in the order they
+        # joined
+        self.entries = {}
+        # Dictionary mapping bucket numbers to dictionaries mapping clients to
+        # the QueueEntries in the bucket, in the order they joined. Empty
+        # buckets are removed.
+        self.buckets = {}
+        self.stats = MatchmakingStats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, client):
+        return client in self.entries
+
+    def add(self, client, rating=DEFAULT_RATING, now=None):
+        """Places a client in the queue. Does nothing if it is already queued.
+
+        Arguments:
+            client: the client's connection.
+            rating: the client's rating.
+            now: the current time from perf_counter.
+        """
+        if client in self.entries:
+            return
+        if now is None:
+            now = perf_counter()
+        entry = QueueEntry(client, rating, now)
+        self.entries[client] = entry
+        self.buckets.setdefault(entry.bucket, {})[client] = entry
+
+    def remove(self, client):
+        """Removes a client from the queue.
+
+        Returns:
+            True if the client was queued, False if it was not, e.g. because
+            it has been matched already.
+        """
+        entry = self._remove_entry(client)
+        if entry is None:
+            return False
+        self.stats.cancelled += 1
+        return True
+
+    def match(self, now=None):
+        """Matches as many queued players as possible and removes them from
+        the queue.
+
+        Arguments:
+            now: the current time from perf_counter.
+        Returns:
+            A list of pairs of clients to start games for.
+        """
+        if now is None:
+            now = perf_counter()
+        pairs = []
+        for client, entry in list(self.entries.items()):
+            if self.entries.get(client) is not entry:
+                # Matched earlier in this pass
+                continue
+            opponent = self._find_opponent(entry, now)
+            if opponent is None:
+                continue
+            self._remove_entry(client)
+            self._remove_entry(opponent.client)
+            self.stats.record_match(entry, opponent, now)
+            pairs.append((client, opponent.client))
+        return pairs
+
+    def _find_opponent(self, entry, now):
+        """Returns the longest waiting entry in the closest bucket that is
+        within the search windows of both players, or None."""
+        window = entry.get_window(now)
+        max_offset = int(window // BUCKET_SIZE) + 1
+        for offset in range(max_offset + 1):
+            buckets = [entry.bucket] if offset == 0 else [entry.bucket - offset, entry.bucket + offset]
+            for bucket in buckets:
+                candidates = self.buckets.get(bucket)
+                if candidates is None:
+                    continue
+                for candidate in candidates.values():
+                    if candidate is entry:
+                        continue
+                    difference = abs(candidate.rating - entry.rating)
+                    if difference <= window and difference <= candidate.get_window(now):
+                        return candidate
+        return None
+
+    def _remove_entry(self, client):
+        """Removes a client's entry from the queue and returns it, or None if
+        it is not queued."""
+        entry = self.entries.pop(client, None)
+        if entry is None:
+            return None
+        bucket = self.buckets[entry.bucket]
+        del bucket[client]
+        if not bucket:
+            del self.buckets[entry.bucket]
+        return entry
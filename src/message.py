@@ -33,6 +33,21 @@ class Message():
     # data: a list of ProjectileStates
     PROJECTILE_STATES = "projectile_states"
 
+    # Send client everything that changed in one tick of the game in a single
+    # message. The game sends this instead of separate AGENT_STATES,
+    # PROJECTILE_STATES and DESTROY messages.
+    # Keyframes contain the full state of every object. Other messages only
+    # contain the fields that changed since the last message, along with the
+    # object's id, and leave out empty lists. See state_encoder.py.
+    # data: {
+    #     keyframe: true if this message contains full states. Only present in keyframes.
+    #     dt: time between ticks in seconds. Only present in keyframes.
+    #     agents: a list of AgentStates (or partial AgentStates)
+    #     projectiles: a list of ProjectileStates (or partial ProjectileStates)
+    #     destroyed: a list of objects in the same format as DESTROY messages
+    # }
+    TICK_STATE = "tick_state"
+
     # Send client the id of an object that was destroyed
     # data: {
     #     id: id of destroyed object
@@ -61,6 +76,7 @@ class Message():
     #     winner: bool indicating whether the client receiving this message won
     #     tie: bool indicating whether the game ended in a tie
     #     error: bool indicating whether the game ended due to an error in player code
+    #     forfeit: bool indicating whether the game ended because a player left
     #     players: {
     #        class_name: name of the class submitted by the player
     #        survival_time: float survival time in seconds or None if the player survived the entire game
@@ -0,0 +1,273 @@
+"""
+Flow control for the messages that the server writes to one connection.
+
+tornado's write_message never blocks. Everything written to a client that
+reads slower than the game produces frames is buffered in the server, for as
+long as the match lasts. An OutboundQueue instead keeps track of the bytes that
+have been written but not yet flushed to the socket ("in flight"). Once
+MAX_IN_FLIGHT_BYTES are in flight, further messages wait in the queue until
+writes finish:
+- Messages that must arrive (results, errors, debug messages) are kept in
+  order.
+- Only the newest TICK_STATE frame is kept. A waiting frame is replaced when
+  the next one arrives, so a slow client skips frames instead of falling
+  further behind.
+A connection that still has messages waiting after MAX_BEHIND_TIME, or whose
+waiting messages exceed MAX_QUEUED_BYTES, is closed. Memory per connection is
+therefore bounded by roughly MAX_IN_FLIGHT_BYTES + MAX_QUEUED_BYTES plus one
+frame.
+
+Frames are passed as TickFrames, which can produce every form of a tick's
+state. JSON frames are deltas (see state_encoder.py), so a client that skipped
+one is sent a keyframe next. Binary frames are full snapshots, so any of them
+can be sent, but a client that has never received the names of agents is sent
+a frame that includes them.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR4 - UI.ConsistentState
+"""
+
+from collections import deque
+from time import perf_counter
+
+from src.binary_frame import FORMAT_BINARY
+
+# Bytes that can be written to a connection before its writes have finished
+MAX_IN_FLIGHT_BYTES = 32 * 1024
+
+# Bytes of messages that can wait to be written before the connection is closed
+MAX_QUEUED_BYTES = 256 * 1024
+
+# Seconds that messages can wait to be written before the connection is closed
+MAX_BEHIND_TIME = 10
+
+# Close code and reason sent to connections that can not keep up
+TOO_SLOW_CLOSE_CODE = 4008
+TOO_SLOW_CLOSE_REASON = "too slow"
+
+
+class TickFrame():
+    """The TICK_STATE of one tick, in every form that a connection may need.
+
+    Each form is encoded when it is first needed and then reused.
+    """
+
+    def __init__(self, json_payload, encode_json_keyframe, encode_binary, keyframe=False):
+        """Constructor
+
+        Arguments:
+            json_payload: the encoded TICK_STATE message sent to clients that
+                received every earlier frame.
+            encode_json_keyframe: function returning an encoded TICK_STATE
+                message containing a keyframe of the same state. It may return
+                None if no keyframe can be encoded, e.g. to ask for a keyframe
+                in a later frame instead.
+            encode_binary: function returning the state as a binary frame. It
+                is called with include_names.
+            keyframe: True if json_payload is a keyframe.
+        """
+        self.json_payload = json_payload
+        self.keyframe = keyframe
+        self._encode_json_keyframe = encode_json_keyframe
+        self._encode_binary = encode_binary
+        self._json_keyframe = None
+        # Dictionary mapping include_names to binary frames
+        self._binary = {}
+
+    def get_json_keyframe(self):
+        if self.keyframe:
+            return self.json_payload
+        if self._json_keyframe is None:
+            self._json_keyframe = self._encode_json_keyframe()
+        return self._json_keyframe
+
+    def get_binary(self, include_names):
+        binary = self._binary.get(include_names)
+        if binary is None:
+            binary = self._encode_binary(include_names)
+            self._binary[include_names] = binary
+        return binary
+
+
+class OutboundStats():
+    """Counts the frames that one or more OutboundQueues sent and skipped."""
+
+    def __init__(self):
+        # Frames written to connections
+        self.frames_sent = 0
+        # Frames skipped because the connection could not keep up
+        self.frames_dropped = 0
+        # Keyframes and frames with names sent to bring connections back in
+        # sync
+        self.resyncs = 0
+        # Connections closed because they could not keep up
+        self.disconnects = 0
+
+    def to_json_dict(self):
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "resyncs": self.resyncs,
+            "disconnects": self.disconnects,
+        }
+
+
+class OutboundQueue():
+    """Writes messages to one connection without letting unflushed data grow
+    without bound."""
+
+    def __init__(self, connection, stats=None, max_in_flight_bytes=MAX_IN_FLIGHT_BYTES, max_queued_bytes=MAX_QUEUED_BYTES, max_behind_time=MAX_BEHIND_TIME, on_closed=None):
+        """Constructor
+
+        Arguments:
+            connection: the connection to write to. It needs a frame_format,
+                a close(code, reason) method and a write_encoded(payload,
+                binary) method, which returns a future that is done once the
+                payload has been flushed, or None if it was flushed
+                immediately or the connection is closed.
+            stats: the OutboundStats to count frames in. Defaults to new
+                stats for this queue.
+            max_in_flight_bytes: see MAX_IN_FLIGHT_BYTES.
+            max_queued_bytes: see MAX_QUEUED_BYTES.
+            max_behind_time: see MAX_BEHIND_TIME.
+            on_closed: function called without arguments once the queue stops
+                writing, because a write failed or the connection was too
+                slow.
+        """
+        self.connection = connection
+        self.stats = stats if stats is not None else OutboundStats()
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.max_queued_bytes = max_queued_bytes
+        self.max_behind_time = max_behind_time
+        self.on_closed = on_closed
+        self.in_flight_bytes = 0
+        # Messages waiting to be written, in order. Either pairs (payload,
+        # binary) or the waiting TickFrame.
+        self.waiting = deque()
+        # Bytes of the messages in waiting, not counting the frame
+        self.queued_bytes = 0
+        # The TickFrame in waiting, if any
+        self.waiting_frame = None
+        # True once the connection has the full state. Binary connections
+        # also have the names of agents by then.
+        self.synced = False
+        # Time since which messages have been waiting, or None
+        self.behind_since = None
+        self.closed = False
+
+    def send_message(self, payload, binary=False):
+        """Writes a message that must not be skipped."""
+        if self.closed:
+            return
+        self.waiting.append((payload, binary))
+        self.queued_bytes += len(payload)
+        self._flush()
+
+    def send_frame(self, frame):
+        """Writes a TickFrame, or replaces the waiting frame with it."""
+        if self.closed:
+            return
+        if self.waiting_frame is not None:
+            self.waiting.remove(self.waiting_frame)
+            self.skip_frame()
+        self.waiting_frame = frame
+        self.waiting.append(frame)
+        self._flush()
+
+    def skip_frame(self):
+        """Records that a frame was not sent to the connection."""
+        if self.connection.frame_format != FORMAT_BINARY:
+            # The deltas that follow can't be applied without this one
+            self.synced = False
+        self.stats.frames_dropped += 1
+
+    def _flush(self):
+        """Writes waiting messages until too many bytes are in flight and
+        closes the connection if it has fallen too far behind."""
+        waiting = self.waiting
+        while waiting and self.in_flight_bytes < self.max_in_flight_bytes:
+            item = waiting.popleft()
+            if item is self.waiting_frame:
+                self.waiting_frame = None
+                payload, binary = self._encode_frame(item)
+                if payload is None:
+                    continue
+            else:
+                payload, binary = item
+                self.queued_bytes -= len(payload)
+            self._write(payload, binary)
+            if self.closed:
+                return
+
+        if not waiting:
+            self.behind_since = None
+        elif self.behind_since is None:
+            self.behind_since = perf_counter()
+        elif perf_counter() - self.behind_since > self.max_behind_time:
+            self._close_too_slow()
+            return
+        if self.queued_bytes > self.max_queued_bytes:
+            self._close_too_slow()
+
+    def _encode_frame(self, frame):
+        """Returns (payload, binary) for a frame, or (None, None) if it has to
+        be skipped."""
+        if self.connection.frame_format == FORMAT_BINARY:
+            payload = frame.get_binary(include_names=not self.synced)
+            binary = True
+        elif self.synced:
+            payload = frame.json_payload
+            binary = False
+        else:
+            payload = frame.get_json_keyframe()
+            binary = False
+            if payload is None:
+                self.stats.frames_dropped += 1
+                return None, None
+        if not self.synced and not frame.keyframe:
+            self.stats.resyncs += 1
+        self.synced = True
+        self.stats.frames_sent += 1
+        return payload, binary
+
+    def _write(self, payload, binary):
+        future = self.connection.write_encoded(payload, binary)
+        if future is None:
+            return
+        size = len(payload)
+        if future.done():
+            self._check_written(future)
+        else:
+            self.in_flight_bytes += size
+            future.add_done_callback(lambda future: self._on_written(size, future))
+
+    def _on_written(self, size, future):
+        """Called once a write has been flushed. Writes finish in order."""
+        self.in_flight_bytes -= size
+        if self._check_written(future) and self.waiting:
+            self._flush()
+
+    def _check_written(self, future):
+        """Returns False and stops writing if a write failed."""
+        if future.cancelled() or future.exception() is not None:
+            # The connection was closed while writing
+            self._stop()
+            return False
+        return not self.closed
+
+    def _close_too_slow(self):
+        self.stats.disconnects += 1
+        self._stop()
+        self.connection.close(TOO_SLOW_CLOSE_CODE, TOO_SLOW_CLOSE_REASON)
+
+    def _stop(self):
+        """Discards waiting messages and stops writing."""
+        if self.closed:
+            return
+        self.closed = True
+        self.waiting.clear()
+        self.waiting_frame = None
+        self.queued_bytes = 0
+        if self.on_closed is not None:
+            self.on_closed()
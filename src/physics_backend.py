@@ -0,0 +1,418 @@
+"""
+The interface between the game and its physics engine.
+
+The game only needs kinematic circles (agents), axis-aligned boxes and rounded
+boundary segments (obstacles) and projectiles. PhysicsBackend implements
+everything that does not depend on how agents are moved and how their
+collisions are found: the object index, projectiles, the static index of the
+map, scans and step policies. A backend implements the rest:
+- add_agent(agent_state)
+- _add_obstacle_body(obstacle): called for every obstacle, including the
+  obstacles of the map.
+- _remove_body(object_id): forgets an agent or obstacle.
+- _substep(time_increment): moves agents, calls the collision callbacks and
+  moves projectiles with self._step_projectiles.
+
+Collision callbacks are called with (object_state_1, object_state_2,
+contact_point) when two objects start touching, and separate callbacks with
+(object_state_1, object_state_2) when they stop touching. Agents that touch an
+agent or an obstacle are stopped before the callback is called.
+
+Two backends are available and can be chosen per game with
+create_physics_engine:
+- "pymunk": PhysicsEngine, which uses pymunk.
+- "simple": SimplePhysicsEngine, which only uses Python and matches the
+  pymunk backend's outcomes.
+
+Backends are imported when they are first created, so games that use the
+simple backend never import pymunk or pygame.
+
+Part of the implementation of the following requirements:
+FR8 - Agent.RangedAttack
+FR10 - Agent.PositionState
+FR11 - Agent.Movement
+FR14 - Map.Walls
+"""
+
+import os
+
+from src.agent_state import AgentState
+from src.dynamic_object_store import DynamicObjectStore
+from src.game_map import load_map
+from src.globals import *
+from src.log import get_logger
+from src.projectile_engine import ProjectileEngine
+from src.step_policy import StepStats, get_default_step_policy
+
+PYMUNK_BACKEND = "pymunk"
+SIMPLE_BACKEND = "simple"
+DEFAULT_BACKEND = PYMUNK_BACKEND
+
+
+class PhysicsBackend():
+    """Tracks the positions and velocities of objects over time and reports
+    their collisions."""
+
+    def __init__(self, game_map=None, step_policy=None):
+        """Constructor
+
+        Arguments:
+            game_map (optional): the GameMap whose boundaries are added to the
+                space. Its obstacles are added by add_map_obstacles. Defaults to
+                the default map.
+            step_policy (optional): decides how many substeps each call to step
+                takes, e.g. a FixedStepPolicy or an AdaptiveStepPolicy.
+                Defaults to the policy set by the PHYSICS_STEP_POLICY
+                environment variable.
+        """
+        self.game_map = game_map if game_map is not None else load_map()
+        # Can be replaced with a logger for a match by the game
+        self.log = get_logger(type(self).__module__)
+        self.step_policy = step_policy if step_policy is not None else get_default_step_policy()
+        # Number of substeps taken by each step
+        self.step_stats = StepStats()
+
+        # Called when objects start and stop touching
+        self.collision_callback = None
+        self.separate_callback = None
+
+        # The DebugRenderer, created by init_renderer
+        self.renderer = None
+
+        # Dictionary mapping object ids to their object states
+        self.object_states = {}
+        # Positions and velocities of agents
+        self.dynamic_objects = DynamicObjectStore()
+
+        # Rectangles of obstacles and boundaries, used by scans and
+        # projectiles. Shared with the map until obstacles that are not part
+        # of the map are added or removed.
+        self.static_index = self.game_map.boundary_index
+
+        # Projectiles are moved without the backend
+        self.projectile_engine = ProjectileEngine(self.static_index)
+
+        # Results of scan_agent for the current positions.
+        # Dictionary mapping scan distances to dictionaries mapping agent ids to
+        # the objects they scanned. Cleared whenever objects move or are added
+        # or removed.
+        self.scan_cache = {}
+
+    def add_on_collision_callback(self, callback):
+        """
+        Sets the function that is called when two objects collide.
+        """
+        self.collision_callback = callback
+
+    def add_on_separate_callback(self, callback):
+        """
+        Sets the function that is called when two colliding objects separate.
+        """
+        self.separate_callback = callback
+
+    def init_renderer(self):
+        """Initialize the debug renderer. This is for debug purposes only.
+
+        The renderer is a plugin that imports pygame, so it is only imported
+        here.
+        """
+        from src.debug_renderer import DebugRenderer
+        self.renderer = DebugRenderer(self)
+
+    def render_tick(self):
+        """Update the debug render. This should be called in the game loop."""
+        self.renderer.render()
+
+    def close(self):
+        """Forgets all objects and callbacks once the game has finished. The
+        backend can not be used afterwards."""
+        self.collision_callback = None
+        self.separate_callback = None
+        self.renderer = None
+        self.object_states = {}
+        self.dynamic_objects = DynamicObjectStore()
+        self.projectile_engine = None
+        self.scan_cache = {}
+
+    def add_agent(self, agent_state):
+        """
+        Adds an agent.
+
+        Args:
+            agent_state: AgentState object that will be used to determine the initial position and velocity of the agent.
+        Raises:
+            ValueError: if an object with the same id has already been added.
+        """
+        raise NotImplementedError
+
+    def add_obstacle(self, obstacle):
+        """
+        Adds an obstacle.
+
+        Args:
+            obstacle: an Obstacle object that will be used to determine the position and shape of the obstacle
+        """
+        self._add_obstacle_body(obstacle)
+        self._get_mutable_static_index().add(
+            obstacle,
+            obstacle.position.x - obstacle.width/2,
+            obstacle.position.y - obstacle.height/2,
+            obstacle.position.x + obstacle.width/2,
+            obstacle.position.y + obstacle.height/2
+        )
+
+    def add_map_obstacles(self):
+        """
+        Adds the obstacles of the map.
+
+        If no other obstacles have been added, the map's precomputed index is
+        used as is.
+        """
+        for obstacle in self.game_map.obstacles:
+            self._add_obstacle_body(obstacle)
+        if self.static_index is self.game_map.boundary_index:
+            self._set_static_index(self.game_map.static_index)
+        else:
+            static_index = self._get_mutable_static_index()
+            for object_id, entry in self.game_map.static_index.entries.items():
+                if object_id not in static_index:
+                    static_index.add(entry[5], *entry[:5])
+
+    def _add_obstacle_body(self, obstacle):
+        """
+        Adds the backend's representation of an obstacle.
+        """
+        raise NotImplementedError
+
+    def _get_mutable_static_index(self):
+        """
+        Returns self.static_index, copying it first if it is shared.
+        """
+        if self.static_index.frozen:
+            self._set_static_index(self.static_index.copy())
+        return self.static_index
+
+    def _set_static_index(self, static_index):
+        self.static_index = static_index
+        self.projectile_engine.static_index = static_index
+        self.scan_cache.clear()
+
+    def add_projectile(self, projectile_state):
+        """
+        Adds a projectile. Projectiles are moved by the ProjectileEngine.
+
+        Args:
+            projectile_state: a ProjectileState object that will be used to determine the initial position and velocity
+        """
+        if projectile_state.id in self.object_states:
+            raise ValueError(f"Duplicate id {projectile_state.id} found")
+        self.object_states[projectile_state.id] = projectile_state
+        self.projectile_engine.add_projectile(projectile_state)
+
+    def remove_object(self, object_id):
+        """
+        Removes an object.
+
+        The object is forgotten immediately, so it is ignored by collisions and
+        scans for the rest of the current step.
+
+        Args:
+            object_id: the id of the object to be removed
+
+        returns:
+            True: if the object was removed.
+            False: if an object with the provided id was not found.
+        """
+        if self.projectile_engine.remove_projectile(object_id):
+            self.object_states.pop(object_id, None)
+            return True
+
+        if not self._remove_body(object_id):
+            return False
+        if object_id in self.static_index:
+            self._get_mutable_static_index().remove(object_id)
+        self.scan_cache.clear()
+        self.object_states.pop(object_id, None)
+        self.dynamic_objects.remove(object_id)
+        return True
+
+    def _remove_body(self, object_id):
+        """
+        Removes the backend's representation of an agent or obstacle.
+
+        Returns:
+            True if the object was removed, False if it was not found.
+        """
+        raise NotImplementedError
+
+    def step(self, time_increment):
+        """
+        Advances all objects forward by the provided time increment. Object positions will be updated based on their current velocities.
+        Updates the positions of all dynamic object states. Collision callbacks may be called during the step.
+
+        The step is divided into the number of equal substeps chosen by
+        self.step_policy.
+
+        Args:
+            time_increment: the amount of time to advance all objects
+        """
+        substeps = self.step_policy.get_substeps(self, time_increment)
+        self.step_stats.record_step(substeps)
+        for _ in range(substeps):
+            self._substep(time_increment / substeps)
+
+    def _substep(self, time_increment):
+        """
+        Advances every object by time_increment.
+        """
+        raise NotImplementedError
+
+    def _get_agent_positions(self):
+        """
+        Returns a dictionary mapping agent ids to their (x, y) positions.
+        """
+        return dict(zip(
+            self.dynamic_objects.ids,
+            zip(self.dynamic_objects.position_x, self.dynamic_objects.position_y)
+        ))
+
+    def _step_projectiles(self, time_increment, agent_start_positions):
+        """
+        Moves projectiles once agents have moved.
+
+        Projectiles are swept against obstacles and moving agents, so hits do
+        not depend on the length of the step.
+
+        Args:
+            agent_start_positions: the result of _get_agent_positions before
+                agents moved.
+        """
+        self.scan_cache.clear()
+        self.projectile_engine.step(time_increment, self.dynamic_objects, self._on_projectile_hit, agent_start_positions)
+
+    def _on_projectile_hit(self, projectile_state, object_state, contact_point):
+        """
+        Called by the ProjectileEngine when a projectile hits an object.
+        """
+        # Ignore objects removed by earlier callbacks in the same step
+        if object_state.id not in self.object_states:
+            return
+        if self.collision_callback is not None:
+            self.collision_callback(projectile_state, object_state, contact_point)
+
+    def get_smallest_collider_size(self):
+        """
+        Returns the diameter of agents or the thickness of the thinnest
+        obstacle, whichever is smaller.
+        """
+        return min(2 * AGENT_RADIUS, self.static_index.get_min_thickness())
+
+    def _get_object_state_from_id(self, id):
+        """
+        Returns the object_state with the corresponding id. Returns None if an object with the passed in id cannot be found.
+        """
+        return self.object_states.get(id)
+
+    def scan_area(self, position, distance):
+        """
+        Locates all objects within a specified distance of a given position.
+
+        Arguments:
+            position: A Vector2 object specifiying the point around which to search for objects.
+            distance: A float specifiying the maximum distance away from the point to search for objects.
+
+        Returns: a list containing the object_state for each object that was located. If no objects were located the list will be empty.
+        """
+        agents = self.dynamic_objects
+        reach = distance + AGENT_RADIUS
+        reach_squared = reach * reach
+        hits = []
+        for x, y, agent_state in zip(agents.position_x, agents.position_y, agents.states):
+            offset_x = x - position.x
+            offset_y = y - position.y
+            if offset_x * offset_x + offset_y * offset_y <= reach_squared:
+                hits.append(agent_state)
+        hits.extend(self.static_index.scan(position.x, position.y, distance))
+        hits.extend(self.projectile_engine.scan_area(position, distance))
+        return hits
+
+    def scan_agent(self, agent_state, distance):
+        """
+        Locates the agents and obstacles within a specified distance of an agent.
+
+        The first scan after objects have moved finds the neighbours of every
+        agent in a single pass and caches them, so further scans in the same
+        tick, e.g. by the game's scan callbacks and by player code, do not
+        search again. Unlike scan_area, projectiles are not included.
+
+        Arguments:
+            agent_state: the AgentState of an agent that has been added.
+            distance: A float specifiying the maximum distance away from the agent to search for objects.
+
+        Returns: a list containing the object_state for each object that was located, including agent_state itself. The list is empty if the agent has not been added.
+        """
+        neighbours = self.scan_cache.get(distance)
+        if neighbours is None:
+            neighbours = self._scan_all_agents(distance)
+            self.scan_cache[distance] = neighbours
+        return neighbours.get(agent_state.id, [])
+
+    def _scan_all_agents(self, distance):
+        """
+        Returns a dictionary mapping the id of every agent to the agents and
+        obstacles within distance of it, using the same distance as pymunk's
+        point queries.
+        """
+        agents = self.dynamic_objects
+        ids = agents.ids
+        position_x = agents.position_x
+        position_y = agents.position_y
+        states = agents.states
+        neighbours = {agent_id: [] for agent_id in ids}
+
+        # Agents see each other when the distance to the other agent's circle
+        # is within the scan distance. This is symmetric, so each pair is only
+        # checked once.
+        reach = distance + AGENT_RADIUS
+        reach_squared = reach * reach
+        for i in range(len(ids)):
+            x = position_x[i]
+            y = position_y[i]
+            neighbours[ids[i]].append(states[i])
+            for j in range(i + 1, len(ids)):
+                offset_x = position_x[j] - x
+                offset_y = position_y[j] - y
+                if offset_x * offset_x + offset_y * offset_y <= reach_squared:
+                    neighbours[ids[i]].append(states[j])
+                    neighbours[ids[j]].append(states[i])
+
+        for i in range(len(ids)):
+            neighbours[ids[i]].extend(self.static_index.scan(position_x[i], position_y[i], distance))
+        return neighbours
+
+
+def get_default_backend():
+    """Returns the name of the backend set by the PHYSICS_BACKEND environment
+    variable, or DEFAULT_BACKEND if it is not set."""
+    return os.environ.get("PHYSICS_BACKEND", "") or DEFAULT_BACKEND
+
+
+def create_physics_engine(backend=None, game_map=None, step_policy=None):
+    """Creates a physics engine, importing its backend if needed.
+
+    Arguments:
+        backend (optional): PYMUNK_BACKEND or SIMPLE_BACKEND. Defaults to
+            get_default_backend().
+        game_map, step_policy (optional): passed to the engine.
+    Raises:
+        ValueError: if backend is not the name of a backend.
+    """
+    if backend is None:
+        backend = get_default_backend()
+    if backend == PYMUNK_BACKEND:
+        from src.physics_engine import PhysicsEngine
+        return PhysicsEngine(game_map, step_policy)
+    if backend == SIMPLE_BACKEND:
+        from src.simple_physics_engine import SimplePhysicsEngine
+        return SimplePhysicsEngine(game_map, step_policy)
+    raise ValueError(f"Unknown physics backend {backend}")
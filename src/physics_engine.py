@@ -1,4 +1,6 @@
 """
+The pymunk physics backend.
+
 The PhysicsEngine class is part of the implementation of the following requirements:
 
 FR8 - Agent.RangedAttack
@@ -9,17 +11,18 @@ FR13 - Movement.Speed
 FR14 - Map.Walls
 """
 
+import logging
+
 import pymunk
-import pymunk.pygame_util
-import pygame
 import pymunk.vec2d
 from src.globals import *
 from src.agent_state import AgentState
 from src.obstacle import Obstacle
+from src.physics_backend import PhysicsBackend
 from src.projectile_state import ProjectileState
 from src.vector2 import Vector2
 
-class PhysicsEngine:
+class PhysicsEngine(PhysicsBackend):
     """
     A wrapper around the pymunk physics engine. Tracks the positions and velocities of objects over time. Handles collisions between objects.
     """
@@ -27,7 +30,20 @@ class PhysicsEngine:
     SPACE_WIDTH = 1074
     SPACE_HEIGHT = 700
 
-    def __init__(self) -> None:
+    def __init__(self, game_map=None, step_policy=None) -> None:
+        """Constructor
+
+        Arguments:
+            game_map (optional): the GameMap whose boundaries are added to the
+                space. Its obstacles are added by add_map_obstacles. Defaults to
+                the default map.
+            step_policy (optional): decides how many substeps each call to step
+                takes, e.g. a FixedStepPolicy or an AdaptiveStepPolicy.
+                Defaults to the policy set by the PHYSICS_STEP_POLICY
+                environment variable.
+        """
+        super().__init__(game_map, step_policy)
+
         # Create space for bodies
         self.space = pymunk.Space()
         # Gravity will not be present by default
@@ -39,15 +55,33 @@ class PhysicsEngine:
         self.collision_handler.begin = self.begin_collision_handler
         self.collision_handler.separate = self.separate_collision_handler
 
-        # Object state classes that will be continuously updated
-        self.object_states = []
-
         # Dictionary mapping object ids to their pymunk bodies
         self.bodies = {}
 
+        # Reverse index so that collision handlers and scans can find object
+        # states in constant time.
+        # Dictionary mapping pymunk bodies to their object states
+        self.body_to_state = {}
+
+        # Bodies of objects that have been removed but are still in the pymunk
+        # space. They are removed from the space after the current step.
+        self.removed_bodies = []
+
         # add game boundaries to the physics space
         self.set_boundaries()
 
+    def close(self):
+        """Also releases the pymunk space, whose collision handler refers
+        back to this engine."""
+        super().close()
+        self.collision_handler.begin = None
+        self.collision_handler.separate = None
+        self.collision_handler = None
+        self.space = None
+        self.bodies = {}
+        self.body_to_state = {}
+        self.removed_bodies = []
+
     def begin_collision_handler(self, arbiter, space, data):
         """
         Called when two objects collide for the first time.
@@ -60,28 +94,26 @@ class PhysicsEngine:
             True if the collision should be processed normally.
             False if the collision should be ignored.
         """
-        object_id_1 = self._get_body_id(arbiter.shapes[0].body)
-        object_id_2 = self._get_body_id(arbiter.shapes[1].body)
-
-        if object_id_1 is None or object_id_2 is None:
-            return False
+        object_state_1 = self._get_object_state_from_body(arbiter.shapes[0].body)
+        object_state_2 = self._get_object_state_from_body(arbiter.shapes[1].body)
 
-        object_state_1 = self._get_object_state_from_id(object_id_1)
-        object_state_2 = self._get_object_state_from_id(object_id_2)
-        
         if object_state_1 is None or object_state_2 is None:
             return False
+        object_id_1 = object_state_1.id
+        object_id_2 = object_state_2.id
 
         if (not (isinstance(object_state_1, ProjectileState) and isinstance(object_state_2, AgentState))) \
             and (not (isinstance(object_state_1, AgentState) and isinstance(object_state_2, ProjectileState))):
             # stop the objects from moving
             arbiter.shapes[0].body.velocity = (0, 0)
             arbiter.shapes[1].body.velocity = (0, 0)
-        print(f"Collision between object ids: {object_id_1} and {object_id_2}")
-        print(f"Collision between object states: {object_state_1} and {object_state_2}")
+            self.dynamic_objects.stop(object_id_1)
+            self.dynamic_objects.stop(object_id_2)
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("collision between %s and %s", object_state_1, object_state_2)
         # call the optional callback function
-        if "collision_callback" in data:
-            data["collision_callback"](object_state_1, object_state_2, arbiter.contact_point_set.points[0].point_a)
+        if self.collision_callback is not None:
+            self.collision_callback(object_state_1, object_state_2, arbiter.contact_point_set.points[0].point_a)
         return True
 
     def separate_collision_handler(self, arbiter, space, data):
@@ -96,67 +128,12 @@ class PhysicsEngine:
             True if the collision should be processed normally.
             False if the collision should be ignored.
         """
-        object_id_1 = self._get_body_id(arbiter.shapes[0].body)
-        object_id_2 = self._get_body_id(arbiter.shapes[1].body)
-        object_state_1 = self._get_object_state_from_id(object_id_1)
-        object_state_2 = self._get_object_state_from_id(object_id_2)
-        if "separate_callback" in data:
-            data["separate_callback"](object_state_1, object_state_2)
+        object_state_1 = self._get_object_state_from_body(arbiter.shapes[0].body)
+        object_state_2 = self._get_object_state_from_body(arbiter.shapes[1].body)
+        if self.separate_callback is not None:
+            self.separate_callback(object_state_1, object_state_2)
         return True
 
-    def add_on_collision_callback(self, callback):
-        """
-        Adds a callback function that will be called in "begin_collision_handler".
-        """
-        self.collision_handler.data["collision_callback"] = callback
-
-    def add_on_separate_callback(self, callback):
-        """
-        Adds a callback function that will be called in "separate_collision_handler".
-        """
-        self.collision_handler.data["separate_callback"] = callback
-
-    def init_renderer(self):
-        """Initialize the pygame renderer. This is for debug purposes only"""
-        # use pygame for testing
-        pygame.init()
-        size = PhysicsEngine.SPACE_WIDTH, PhysicsEngine.SPACE_HEIGHT
-        self.screen = pygame.display.set_mode(size)
-        self.draw_options = pymunk.pygame_util.DrawOptions(self.screen)
-
-    def render_tick(self):
-        """Update the pygame render. This should be called in the game loop."""
-        GRAY = (220, 220, 220)
-        self.screen.fill(GRAY)
-        self.space.debug_draw(self.draw_options)
-        pygame.display.update()
-
-    def run_render_test(self):
-        """
-        Renders the current space using pygame. This is for debug purposes only.
-        """
-        # use pygame for testing
-        GRAY = (220, 220, 220)
-        pygame.init()
-        size = PhysicsEngine.SPACE_WIDTH, PhysicsEngine.SPACE_HEIGHT
-        screen = pygame.display.set_mode(size)
-        draw_options = pymunk.pygame_util.DrawOptions(screen)
-
-        running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-
-            self.screen.fill(GRAY)
-            self.space.debug_draw(draw_options)
-            pygame.display.update()
-
-            # step forward in time
-            self.space.step(0.01)
-
-        pygame.quit()
-
     def create_circle(self, center, radius):
         """
         Adds a body with a circle shape to the space.
@@ -193,24 +170,19 @@ class PhysicsEngine:
 
         if agent_state.id in self.bodies:
             raise ValueError(f"Duplicate id {agent_state.id} found")
-        self.bodies[agent_state.id] = agent_body
-        self.object_states.append(agent_state)
-        print(f"added agent {agent_state.id}")
+        self._index_object(agent_state, agent_body)
+        self.log.debug("added agent %s", agent_state.id)
 
-    def add_obstacle(self, obstacle):
+    def _add_obstacle_body(self, obstacle):
         """
-        Adds an obstacle to the physics space.
-
-        Args:
-            obstacle: an Obstacle object that will be used to determine the position and shape of the obstacle
+        Adds the pymunk body and shape of an obstacle to the space.
         """
         obstacle_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.STATIC)
         obstacle_body.position = (obstacle.position.x, obstacle.position.y)
 
         if obstacle.id in self.bodies:
             raise ValueError(f"Duplicate id {obstacle.id} found")
-        self.bodies[obstacle.id] = obstacle_body
-        self.object_states.append(obstacle)
+        self._index_object(obstacle, obstacle_body)
 
         self.space.add(obstacle_body)
 
@@ -225,105 +197,79 @@ class PhysicsEngine:
         rect.collision_type = PhysicsEngine.COLLISION_TYPE_1
         self.space.add(rect)
 
-    def add_projectile(self, projectile_state):
+    def _remove_body(self, object_id):
         """
-        Adds a projectile to the physics space.
-
-        Args:
-            projectile_state: a ProjectileState object that will be used to determine the initial position and velocity
+        Forgets the body of an object. The body is only removed from the
+        pymunk space once the current step has finished.
         """
-        projectile_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.KINEMATIC)
-        projectile_body.position = (projectile_state.position.x, projectile_state.position.y)
-        projectile_body.velocity = (projectile_state.velocity.x, projectile_state.velocity.y)
-
-        # TODO: Make the shape(s) for the projectile match the projectile sprite. The shape(s) will be the hitbox for the sprite.
-        circle = pymunk.Circle(projectile_body, radius=5)
-        circle.elasticity = 0
-        circle.collision_type = PhysicsEngine.COLLISION_TYPE_1
-        circle.filter = pymunk.ShapeFilter(
-            # Ignore collisions between an agent and its own projectile
-            group=self._id_to_collision_group(projectile_state.attackerId),
-            categories=0b1,
-            # Ignore collisions between any 2 projectiles
-            mask=pymunk.ShapeFilter.ALL_MASKS() ^ 0b1
-        )
+        body = self.bodies.pop(object_id, None)
+        if body is None:
+            return False
+        self.body_to_state.pop(body, None)
+        self.removed_bodies.append(body)
+        return True
 
-        if projectile_state.id in self.bodies:
-            raise ValueError(f"Duplicate id {projectile_state.id} found")
-        self.bodies[projectile_state.id] = projectile_body
-        self.object_states.append(projectile_state)
+    def _remove_bodies(self):
+        """
+        Removes the bodies of removed objects from the pymunk space.
+        """
+        for body in self.removed_bodies:
+            # remove all shapes attached to the body
+            for shape in body.shapes:
+                self.space.remove(shape)
 
-        self.space.add(projectile_body, circle)
+            # remove the body itself
+            self.space.remove(body)
+        self.removed_bodies = []
 
-    def remove_object(self, object_id):
+    def _substep(self, time_increment):
+        """
+        Advances every object by time_increment with a single pymunk step.
         """
-        Removes the object from the physics space.
+        self._remove_bodies()
 
-        Args:
-            object_id: the id of the object to be removed
+        # Remember where agents start so that projectiles can be tested against
+        # their movement during the step
+        agent_start_positions = self._get_agent_positions()
 
-        returns:
-            True: if the object was removed.
-            False: if an object with the provided id was not found.
-        """
-        if object_id not in self.bodies:
-            return False
-        body = self.bodies.pop(object_id)
+        # Update velocity of objects such as agents that may have been
+        # updated by game logic (e.g. a call to Agent.set_movement_speed)
+        self.dynamic_objects.push_velocities()
 
-        # remove all shapes attached to the body
-        for shape in body.shapes:
-            self.space.remove(shape)
+        self.space.step(time_increment)
 
-        # remove the body itself
-        self.space.remove(body)
+        # Objects removed by collision callbacks are no longer in
+        # dynamic_objects.
+        self._remove_bodies()
 
-        return True
+        self.dynamic_objects.pull_positions()
+        self._step_projectiles(time_increment, agent_start_positions)
 
-    def step(self, time_increment):
+    def _index_object(self, object_state, body):
         """
-        Advances the physics space forward by the provided time increment. Object positions will be updated based on their current velocities.
-        Updates all dynamic object states. Collision callbacks may be called during the step.
-
-        Args:
-            time_increment: the amount of time to advance all objects in the physics space
+        Records an object and its pymunk body in all of the lookup tables.
         """
-        for object_state in self.object_states:
-            if object_state.id not in self.bodies:
-                self.object_states.remove(object_state)
-                continue
-            # Update velocity of objects such as agents that may have been
-            # updated by game logic (e.g. a call to Agent.set_movement_speed)
-            if not isinstance(object_state, Obstacle):
-                object_body = self.bodies[object_state.id]
-                object_body.velocity = (object_state.velocity.x, object_state.velocity.y)
-
-        self.space.step(time_increment)
-
-        for object_state in self.object_states:
-            if object_state.id not in self.bodies:
-                self.object_states.remove(object_state)
-                continue
-            object_body = self.bodies[object_state.id]
-            object_state.position.x = object_body.position[0]
-            object_state.position.y = object_body.position[1]
-            if not isinstance(object_state, Obstacle):
-                object_state.velocity.x = object_body.velocity[0]
-                object_state.velocity.y = object_body.velocity[1]
+        self.bodies[object_state.id] = body
+        self.scan_cache.clear()
+        self.body_to_state[body] = object_state
+        self.object_states[object_state.id] = object_state
+        if not isinstance(object_state, Obstacle):
+            self.dynamic_objects.add(object_state, body)
 
     def _get_body_id(self, body):
         """
         Returns the object_state id that corresponds to the pymunk body. If the body cannot be found returns None.
         """
-        for id in self.bodies:
-            if self.bodies[id] == body:
-                return id
-        return None
+        object_state = self.body_to_state.get(body)
+        if object_state is None:
+            return None
+        return object_state.id
 
-    def _get_object_state_from_id(self, id):
+    def _get_object_state_from_body(self, body):
         """
-        Returns the object_state with the corresponding id. Returns None if an object with the passed in id cannot be found.
+        Returns the object_state that corresponds to the pymunk body. Returns None if the body cannot be found.
         """
-        return next((object_state for object_state in self.object_states if object_state.id == id), None)
+        return self.body_to_state.get(body)
 
     def _id_to_collision_group(self, _id):
         """Converts an ObjectState id value to a group to use with
@@ -348,46 +294,23 @@ class PhysicsEngine:
         query = self.space.point_query([position.x, position.y], distance, pymunk.ShapeFilter())
         hits = []
         for hit in query:
-            id = self._get_body_id(hit.shape.body)
-            object = self._get_object_state_from_id(id)
-            hits.append(object)
+            object = self._get_object_state_from_body(hit.shape.body)
+            # Skip removed objects that are still in the space
+            if object is not None:
+                hits.append(object)
+        hits.extend(self.projectile_engine.scan_area(position, distance))
         return hits
 
     def set_boundaries(self):
         """
         Initializes the boundaries of the game as obstacles in the physics space.
         """
-        left_boundary_obstacle = Obstacle(-1, Vector2(0, 0), 0, 0)
-        left_boundary_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.STATIC)
-        self.bodies[-1] = left_boundary_body
-        self.object_states.append(left_boundary_obstacle)
-        left_boundary_segment = pymunk.Segment(left_boundary_body, (0, 0), (0, PhysicsEngine.SPACE_HEIGHT), 40)
-        left_boundary_segment.collision_type = PhysicsEngine.COLLISION_TYPE_1
-        self.space.add(left_boundary_body, left_boundary_segment)
-
-        right_boundary_obstacle = Obstacle(-2, Vector2(0, 0), 0, 0)
-        right_boundary_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.STATIC)
-        self.bodies[-2] = right_boundary_body
-        self.object_states.append(right_boundary_obstacle)
-        right_boundary_segment = pymunk.Segment(right_boundary_body, (PhysicsEngine.SPACE_WIDTH, 0), (PhysicsEngine.SPACE_WIDTH, PhysicsEngine.SPACE_HEIGHT), 100)
-        right_boundary_segment.collision_type = PhysicsEngine.COLLISION_TYPE_1
-        self.space.add(right_boundary_body, right_boundary_segment)
-
-        upper_boundary_obstacle = Obstacle(-3, Vector2(0, 0), 0, 0)
-        upper_boundary_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.STATIC)
-        self.bodies[-3] = upper_boundary_body
-        self.object_states.append(upper_boundary_obstacle)
-        upper_boundary_segment = pymunk.Segment(upper_boundary_body, (0, PhysicsEngine.SPACE_HEIGHT), (PhysicsEngine.SPACE_WIDTH, PhysicsEngine.SPACE_HEIGHT), 20)
-        upper_boundary_segment.collision_type = PhysicsEngine.COLLISION_TYPE_1
-        self.space.add(upper_boundary_body, upper_boundary_segment)
-
-        lower_boundary_obstacle = Obstacle(-4, Vector2(0, 0), 0, 0)
-        lower_boundary_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.STATIC)
-        self.bodies[-4] = lower_boundary_body
-        self.object_states.append(lower_boundary_obstacle)
-        lower_boundary_segment = pymunk.Segment(lower_boundary_body, (0, 0), (PhysicsEngine.SPACE_WIDTH, 0), 40)
-        lower_boundary_segment.collision_type = PhysicsEngine.COLLISION_TYPE_1
-        self.space.add(lower_boundary_body, lower_boundary_segment)
+        for boundary_obstacle, start, end, radius in self.game_map.boundaries:
+            boundary_body = pymunk.Body(mass=0, moment=0, body_type=pymunk.Body.STATIC)
+            self._index_object(boundary_obstacle, boundary_body)
+            boundary_segment = pymunk.Segment(boundary_body, start, end, radius)
+            boundary_segment.collision_type = PhysicsEngine.COLLISION_TYPE_1
+            self.space.add(boundary_body, boundary_segment)
 
 
 if __name__ == '__main__':
@@ -430,7 +353,8 @@ if __name__ == '__main__':
         print("callback!")
 
     pe.add_on_collision_callback(callback)
-    pe.run_render_test()
+    from src.debug_renderer import run_render_test
+    run_render_test(pe)
 
     # categories can be used to ignore some collisions, like an agent and their own bullet
     '''circle2.filter = pymunk.ShapeFilter(categories=0b1)
@@ -0,0 +1,625 @@
+"""
+Runs player code either in the game's own process or in worker processes.
+
+LocalPlayerExecutor runs player code directly on the game loop. It is used for
+headless matches and tests, where a slow agent only slows down its own match.
+
+ProcessPlayerExecutor runs each player's agent in its own worker process so
+that an expensive or infinite loop in player code cannot freeze the server. The
+game keeps a RemoteAgent in place of the player's agent. RemoteAgent owns the
+authoritative AgentState and records the calls that the game makes into player
+code during a tick (callbacks, _tick and _clip_velocity). Once per tick, the
+recorded events are sent to the worker along with a compact snapshot of the
+state that the player API can see. The worker replays the events on the real
+player Agent and replies with the agent's new velocity, angle, shield state and
+any attacks.
+
+Games that run on the server's event loop never wait for workers. Each tick
+first applies the replies that have arrived since the previous tick, and then
+sends the new requests, so a worker has until the next tick to reply. Games
+that do not run in real time (e.g. headless matches) instead wait at most
+time_budget seconds per tick for the replies. A worker that has not replied by
+the next tick is skipped: its agent keeps its current velocity, its run() and
+timers are not ticked, and its reply is applied whenever it arrives. A player
+that is skipped for more than max_skipped_ticks ticks in a row forfeits.
+
+Starting a worker takes far longer than a tick, so a WorkerPool keeps a few
+workers started in the background, waiting for player code. Real-time games
+load player code with load_agent, which returns a Future instead of waiting
+for the worker on the event loop. Workers are not reused after a game, since
+player code can change the state of its interpreter.
+
+Part of the implementation of the following requirements:
+FR6 - Python.Interpret
+FR17 - API
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+from collections import deque
+from datetime import timedelta
+from multiprocessing.connection import wait
+from time import perf_counter
+from traceback import format_exc
+
+import tornado.concurrent
+import tornado.gen
+import tornado.ioloop
+import tornado.util
+
+from src.agent import Agent
+from src.agent_state import AgentState
+from src.globals import *
+from src.vector2 import Vector2
+
+# Maximum time in seconds that games that do not run in real time wait for
+# player code each tick
+PLAYER_TIME_BUDGET = 0.01
+
+# Number of consecutive ticks a player can be skipped before forfeiting
+MAX_SKIPPED_TICKS = TICKS_PER_SECOND
+
+# Maximum time in seconds to wait for a worker to load player code
+LOAD_TIMEOUT = 5
+
+# Number of idle workers that a WorkerPool keeps started
+WORKER_POOL_SIZE = 4
+
+
+class PlayerCodeError(Exception):
+    """Raised when player code cannot be loaded.
+
+    Attributes:
+        traceback: the error formatted as a traceback string.
+    """
+
+    def __init__(self, traceback):
+        super().__init__(traceback)
+        self.traceback = traceback
+
+
+def load_agent_class(player_code, class_name):
+    """Executes player code and returns the Agent subclass named class_name.
+
+    Raises:
+        PlayerCodeError if the code cannot be executed or does not define
+        the class.
+    """
+    try:
+        # Compile in 'exec' mode since 'eval' mode doesn't allow class definitions.
+        code = compile(player_code, 'Player Code', 'exec')
+        # Make the Agent class in-scope to player code
+        player_globals = {'Agent': Agent}
+        exec(code, player_globals)
+        # Get the class object so we can instantiate it later.
+        # TODO what if both players have classes with the same name?
+        return eval(class_name.strip(), player_globals)
+    except Exception as e:
+        raise PlayerCodeError(format_exc()) from e
+
+
+class LocalPlayerExecutor():
+    """Runs player code in the game's process."""
+
+    def __init__(self, game):
+        self.game = game
+
+    def create_agent(self, agent_id, player_code, class_name):
+        """Loads player code and returns an instance of the player's Agent
+        subclass.
+
+        Raises:
+            PlayerCodeError if the code cannot be loaded.
+        """
+        agent_class = load_agent_class(player_code, class_name)
+        try:
+            return agent_class(agent_id, self.game, name=class_name.strip())
+        except Exception as e:
+            raise PlayerCodeError(format_exc()) from e
+
+    def receive_replies(self):
+        """Player code runs during the tick, so there is nothing to do."""
+        pass
+
+    def run_tick(self):
+        """Player code has already run during the tick, so there is nothing to
+        do."""
+        pass
+
+    def release_agent(self, agent):
+        pass
+
+    def close(self):
+        pass
+
+
+class RemoteAgent(Agent):
+    """Stands in for a player's agent that runs in a worker process."""
+
+    def __init__(self, id, game, name, process, connection):
+        """Constructor
+
+        Arguments:
+            id: unique int id of the agent.
+            game: the Game that the agent belongs to.
+            name: the player's class name.
+            process: the worker process running the player's code.
+            connection: the game's end of a pipe to the worker.
+        """
+        super().__init__(id, game, name=name)
+        self.process = process
+        self.connection = connection
+        # Calls into player code that have not been sent to the worker yet.
+        # List of tuples (method name, args)
+        self.events = []
+        # True while the worker is processing a request
+        self.busy = False
+        # Number of consecutive ticks that the worker has not replied in time
+        self.skipped_ticks = 0
+
+    def _tick(self):
+        # Skipped ticks do not run player code or count down timers.
+        if not self.busy:
+            self.events.append(("_tick", ()))
+
+    def _clip_velocity(self):
+        self.events.append(("_clip_velocity", ()))
+
+    def on_enemy_scanned(self, enemy_position):
+        self.events.append(("on_enemy_scanned", (enemy_position.x, enemy_position.y)))
+
+    def on_obstacle_scanned(self, obstacle_position):
+        self.events.append(("on_obstacle_scanned", (obstacle_position.x, obstacle_position.y)))
+
+    def on_damage_taken(self):
+        self.events.append(("on_damage_taken", ()))
+
+    def on_obstacle_hit(self):
+        self.events.append(("on_obstacle_hit", ()))
+
+    def _send_request(self):
+        """Sends recorded events and a snapshot of the state visible to the
+        player to the worker."""
+        state = self.agent_state
+        scanned_ids = [
+            scanned.id for scanned in self.game.physics.scan_agent(state, Agent.SCAN_DISTANCE)
+            if isinstance(scanned, AgentState)
+        ]
+        request = {
+            "agents": [_pack_agent_state(agent[1].agent_state) for agent in self.game.get_agents()],
+            "id": state.id,
+            "scanned": scanned_ids,
+            "collisions": [(point.x, point.y) for point in self.collisions.values()],
+            "events": self.events,
+        }
+        self.events = []
+        self.connection.send(request)
+        self.busy = True
+
+    def _receive_reply(self):
+        """Applies the worker's reply to the authoritative agent state.
+
+        Returns:
+            the formatted error if player code raised an exception, else None.
+        """
+        reply = self.connection.recv()
+        self.busy = False
+        self.skipped_ticks = 0
+        if reply["error"] is not None:
+            return reply["error"]
+
+        state = self.agent_state
+        state.velocity = Vector2(*reply["velocity"])
+        state.angle = reply["angle"]
+        state.shieldEnabled = reply["shieldEnabled"]
+        for direction in reply["attacks"]:
+            self.game.create_projectile(state.position.clone(), direction, state.id)
+        return None
+
+    def _close(self):
+        _stop_worker(self.process, self.connection)
+
+
+class WorkerPool():
+    """Worker processes that have been started and wait for player code.
+
+    Starting a process takes several milliseconds, so workers are started by
+    a background thread rather than on the event loop.
+    """
+
+    def __init__(self, size=WORKER_POOL_SIZE):
+        """Constructor
+
+        Arguments:
+            size: number of idle workers to keep.
+        """
+        self.size = size
+        # Spawn workers instead of forking so they don't inherit the server's
+        # sockets and event loop.
+        self.context = multiprocessing.get_context("spawn")
+        # Pairs (process, connection) of idle workers, oldest first. Appended
+        # to by the thread.
+        self.idle = deque()
+        self.thread = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker-pool")
+
+    def acquire(self):
+        """Returns a pair (process, the game's end of a pipe to it) of an idle
+        worker, or of a new worker if none is idle. Workers are started in the
+        background to replace it."""
+        worker = self._pop_idle()
+        if worker is None:
+            worker = self._start_worker()
+        self.fill()
+        return worker
+
+    async def acquire_async(self):
+        """Like acquire, but waits for the thread to start a worker if none is
+        idle."""
+        worker = self._pop_idle()
+        while worker is None:
+            # The worker joins the idle workers even if the caller is
+            # cancelled meanwhile.
+            await asyncio.shield(asyncio.wrap_future(self.thread.submit(self._fill, 1)))
+            worker = self._pop_idle()
+        self.fill()
+        return worker
+
+    def fill(self):
+        """Starts workers in the background until size workers are idle."""
+        if len(self.idle) < self.size:
+            self.thread.submit(self._fill, self.size)
+
+    def _pop_idle(self):
+        while self.idle:
+            process, connection = self.idle.popleft()
+            if process.is_alive():
+                return process, connection
+            connection.close()
+        return None
+
+    def _fill(self, count):
+        """Starts workers until count workers are idle. Runs in the thread."""
+        while len(self.idle) < count:
+            self.idle.append(self._start_worker())
+
+    def _start_worker(self):
+        connection, worker_connection = self.context.Pipe()
+        process = self.context.Process(target=run_worker, args=(worker_connection,), daemon=True)
+        process.start()
+        worker_connection.close()
+        return process, connection
+
+    def close(self):
+        """Stops the idle workers."""
+        self.thread.shutdown()
+        while self.idle:
+            process, connection = self.idle.popleft()
+            _stop_worker(process, connection)
+
+
+# The WorkerPool of this process, created by get_worker_pool
+_worker_pool = None
+
+
+def get_worker_pool():
+    """Returns the WorkerPool shared by the games of this process."""
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = WorkerPool()
+    return _worker_pool
+
+
+async def _wait_readable(connection, timeout):
+    """Waits on the event loop until a connection can be read from.
+
+    Returns:
+        False if timeout seconds passed first, else True.
+    """
+    io_loop = tornado.ioloop.IOLoop.current()
+    readable = tornado.concurrent.Future()
+    io_loop.add_handler(connection.fileno(), lambda fd, events: readable.done() or readable.set_result(True), tornado.ioloop.IOLoop.READ)
+    try:
+        return await tornado.gen.with_timeout(timedelta(seconds=timeout), readable)
+    except tornado.util.TimeoutError:
+        return False
+    finally:
+        io_loop.remove_handler(connection.fileno())
+
+
+def _stop_worker(process, connection):
+    try:
+        connection.send(None)
+    except (BrokenPipeError, OSError):
+        pass
+    connection.close()
+    process.join(timeout=0.1)
+    if process.is_alive():
+        process.terminate()
+
+
+class ProcessPlayerExecutor():
+    """Runs each player's code in a separate worker process."""
+
+    def __init__(self, game, time_budget=PLAYER_TIME_BUDGET, max_skipped_ticks=MAX_SKIPPED_TICKS, pool=None):
+        """Constructor
+
+        Arguments:
+            game: the Game whose players are run.
+            time_budget: maximum time in seconds to wait for player code each
+                tick. If 0, run_tick never waits and replies are applied by
+                the next tick's receive_replies. Games on the server's event
+                loop must use 0.
+            max_skipped_ticks: number of consecutive ticks a player can be
+                skipped before forfeiting.
+            pool (optional): the WorkerPool to take workers from. Defaults to
+                the pool of this process.
+        """
+        self.game = game
+        self.time_budget = time_budget
+        self.max_skipped_ticks = max_skipped_ticks
+        self.pool = pool if pool is not None else get_worker_pool()
+        self.agents = []
+        # Futures of the agents that are being loaded by load_agent
+        self.loading = set()
+
+    def _send_player_code(self, agent, player_code):
+        try:
+            agent.connection.send((agent.agent_state.id, player_code, agent.agent_state.name))
+        except (BrokenPipeError, OSError):
+            # Reported when the reply is read
+            pass
+
+    def _receive_load_reply(self, agent):
+        """Returns the error of a worker that has replied to its player code,
+        or None."""
+        try:
+            return agent.connection.recv()["error"]
+        except EOFError:
+            return "PlayerCodeError: worker process exited while loading player code\n"
+
+    def create_agent(self, agent_id, player_code, class_name):
+        """Loads the player's code in a worker and returns a RemoteAgent for
+        it. Waits for the worker, so it must not be used by games that run on
+        the server's event loop (see load_agent).
+
+        Raises:
+            PlayerCodeError if the code cannot be loaded.
+        """
+        process, connection = self.pool.acquire()
+        agent = RemoteAgent(agent_id, self.game, class_name.strip(), process, connection)
+        self._send_player_code(agent, player_code)
+        error = f"PlayerCodeError: loading player code took longer than {LOAD_TIMEOUT} seconds\n"
+        if connection.poll(LOAD_TIMEOUT):
+            error = self._receive_load_reply(agent)
+        if error is not None:
+            agent._close()
+            raise PlayerCodeError(error)
+
+        self.agents.append(agent)
+        return agent
+
+    def load_agent(self, agent_id, player_code, class_name):
+        """Starts loading the player's code in a worker without waiting for
+        it.
+
+        Returns:
+            a Future that resolves to a RemoteAgent, or fails with
+            PlayerCodeError if the code cannot be loaded. It is cancelled if
+            the executor is closed first.
+        """
+        future = asyncio.ensure_future(self._load_agent(agent_id, player_code, class_name.strip()))
+        self.loading.add(future)
+        future.add_done_callback(self.loading.discard)
+        return future
+
+    async def _load_agent(self, agent_id, player_code, class_name):
+        process, connection = await self.pool.acquire_async()
+        agent = RemoteAgent(agent_id, self.game, class_name, process, connection)
+        loaded = False
+        try:
+            self._send_player_code(agent, player_code)
+            if not await _wait_readable(connection, LOAD_TIMEOUT):
+                raise PlayerCodeError(f"PlayerCodeError: loading player code took longer than {LOAD_TIMEOUT} seconds\n")
+            error = self._receive_load_reply(agent)
+            if error is not None:
+                raise PlayerCodeError(error)
+            loaded = True
+        finally:
+            if not loaded:
+                agent._close()
+        self.agents.append(agent)
+        return agent
+
+    def receive_replies(self):
+        """Applies the replies that workers have sent since the previous tick.
+        Called at the start of every tick. Workers that have not replied yet
+        are skipped this tick."""
+        for agent in list(self.agents):
+            if agent.busy and agent.connection.poll():
+                self._receive(agent)
+            if not agent.busy or agent not in self.agents:
+                continue
+            agent.skipped_ticks += 1
+            if agent.skipped_ticks > self.max_skipped_ticks:
+                self._forfeit(agent, f"TimeoutError: {agent.agent_state.name} exceeded the time limit for "
+                    f"{agent.skipped_ticks} ticks in a row\n")
+
+    def run_tick(self):
+        """Sends this tick's events to every worker that is not busy, and
+        waits for their replies for at most time_budget seconds."""
+        deadline = perf_counter() + self.time_budget
+        for agent in list(self.agents):
+            if agent.busy:
+                continue
+            try:
+                agent._send_request()
+            except (BrokenPipeError, OSError):
+                self._forfeit(agent, "PlayerCodeError: worker process exited unexpectedly\n")
+        if self.time_budget <= 0:
+            return
+
+        waiting = {agent.connection: agent for agent in self.agents if agent.busy}
+        while waiting:
+            timeout = deadline - perf_counter()
+            if timeout <= 0:
+                break
+            for connection in wait(list(waiting), timeout):
+                self._receive(waiting.pop(connection))
+
+    def _receive(self, agent):
+        try:
+            error = agent._receive_reply()
+        except EOFError:
+            error = "PlayerCodeError: worker process exited unexpectedly\n"
+        if error is not None:
+            self._forfeit(agent, error)
+
+    def _forfeit(self, agent, error):
+        """Ends the game in favour of the opponent of agent."""
+        self.release_agent(agent)
+        client = self.game.get_client_from_state(agent.agent_state)
+        if client is not None:
+            client.send_python_error_message(error)
+        agent.had_error = True
+        self.game.player_error = True
+
+    def release_agent(self, agent):
+        """Stops the worker of an agent that is no longer in the game."""
+        if agent in self.agents:
+            self.agents.remove(agent)
+            agent._close()
+
+    def close(self):
+        """Stops all workers and cancels the agents that are loading."""
+        for agent in list(self.agents):
+            self.release_agent(agent)
+        for future in list(self.loading):
+            future.cancel()
+
+
+def _pack_agent_state(agent_state):
+    """Returns the parts of an AgentState that are visible to player code as a
+    tuple."""
+    return (
+        agent_state.id,
+        agent_state.position.x,
+        agent_state.position.y,
+        agent_state.velocity.x,
+        agent_state.velocity.y,
+        agent_state.angle,
+        agent_state.health,
+        agent_state.shieldEnabled,
+    )
+
+
+class WorkerGame():
+    """Provides the parts of the Game interface that Agent uses, inside a
+    worker process."""
+
+    def __init__(self):
+        self.physics = self
+        self.agent = None
+        # Current snapshot of agent states received from the game
+        self.agent_states = {}
+        # Ids of agents scanned by self.agent this tick
+        self.scanned_ids = []
+        # Directions of attacks made by self.agent this tick
+        self.attacks = []
+
+    def scan_agent(self, agent_state, distance):
+        return [self.agent_states[_id] for _id in self.scanned_ids]
+
+    def get_agents(self):
+        return [[None, AgentView(agent_state)] for agent_state in self.agent_states.values()]
+
+    def create_projectile(self, position, direction, attackerId):
+        self.attacks.append(direction)
+
+    def run_tick(self, request):
+        """Replays the events of one tick on the player's agent.
+
+        Returns:
+            the reply to send to the game.
+        """
+        self.agent_states = {}
+        for _id, x, y, vx, vy, angle, health, shield_enabled in request["agents"]:
+            agent_state = AgentState(_id, Vector2(x, y), Vector2(vx, vy), health, shield_enabled)
+            agent_state.angle = angle
+            self.agent_states[_id] = agent_state
+        self.scanned_ids = request["scanned"]
+        self.attacks = []
+
+        # Copy the authoritative state into the player's agent.
+        state = self.agent.agent_state
+        snapshot = self.agent_states[request["id"]]
+        state.position = snapshot.position
+        state.velocity = snapshot.velocity
+        state.angle = snapshot.angle
+        state.health = snapshot.health
+        state.shieldEnabled = snapshot.shieldEnabled
+        self.agent_states[request["id"]] = state
+        self.agent.collisions = {i: Vector2(x, y) for i, (x, y) in enumerate(request["collisions"])}
+
+        try:
+            for method_name, args in request["events"]:
+                if method_name in ("on_enemy_scanned", "on_obstacle_scanned"):
+                    args = (Vector2(*args),)
+                getattr(self.agent, method_name)(*args)
+        except Exception:
+            return {"error": format_exc()}
+
+        return {
+            "error": None,
+            "velocity": (state.velocity.x, state.velocity.y),
+            "angle": state.angle,
+            "shieldEnabled": state.shieldEnabled,
+            "attacks": self.attacks,
+        }
+
+
+class AgentView():
+    """What player code can see of another agent through Game.get_agents."""
+
+    def __init__(self, agent_state):
+        self.agent_state = agent_state
+
+
+def run_worker(connection):
+    """Entry point of a worker process. Waits for player code as a tuple
+    (agent id, player code, class name), loads it and then runs requests from
+    the game until the game closes the connection.
+    """
+    try:
+        load_request = connection.recv()
+    except EOFError:
+        return
+    if load_request is None:
+        return
+    agent_id, player_code, class_name = load_request
+
+    game = WorkerGame()
+    try:
+        agent_class = load_agent_class(player_code, class_name)
+        game.agent = agent_class(agent_id, game, name=class_name)
+    except PlayerCodeError as e:
+        connection.send({"error": e.traceback})
+        return
+    except Exception:
+        connection.send({"error": format_exc()})
+        return
+    connection.send({"error": None})
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        reply = game.run_tick(request)
+        try:
+            connection.send(reply)
+        except (BrokenPipeError, OSError):
+            # The game stopped waiting for this worker
+            return
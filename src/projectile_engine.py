@@ -0,0 +1,288 @@
+"""
+Moves projectiles and detects their hits without pymunk.
+
+Projectiles move in straight lines at a constant velocity, so they do not need
+pymunk bodies. ProjectileEngine keeps their positions and velocities in a
+DynamicObjectStore. Every step, it sweeps each projectile along the segment it
+travels and tests the segment against:
+- the rectangles of obstacles and game boundaries, grown by PROJECTILE_RADIUS.
+- the circles of agents, grown by PROJECTILE_RADIUS. Agents move in a straight
+  line during a step, so the segment is tested in the agent's frame of
+  reference, which gives the exact time of impact.
+
+Since hits are found along the whole path travelled in a step, fast projectiles
+do not tunnel through thin obstacles or moving agents and hits do not depend on
+the length of the step. A projectile reports at most one hit per step, which is
+the first object along its path. Hits of all projectiles are reported in the
+order in which they happen during the step. Projectiles never hit other projectiles or the agent that fired them.
+If the hit callback does not remove the projectile, the engine behaves like the
+pymunk collision handler. A projectile that hits an obstacle stops at the point
+of impact. A projectile that hits an agent keeps moving. In both cases it does
+not report the same object again until it stops overlapping it.
+
+Part of the implementation of the following requirements:
+FR8 - Agent.RangedAttack
+FR14 - Map.Walls
+"""
+
+from math import sqrt
+
+from src.dynamic_object_store import DynamicObjectStore
+from src.globals import *
+from src.obstacle import Obstacle
+from src.static_index import CELL_SIZE, StaticIndex
+from src.vector2 import Vector2
+
+
+def _box_hit_time(x, y, dx, dy, box):
+    """Returns the fraction of the segment from (x, y) to (x + dx, y + dy) at
+    which the segment enters box, 0 if (x, y) is inside box, or None if the
+    segment misses box.
+
+    Arguments:
+        box: (left, bottom, right, top) tuple.
+    """
+    left, bottom, right, top = box
+    t_enter = 0.0
+    t_exit = 1.0
+    if dx == 0:
+        if x < left or x > right:
+            return None
+    else:
+        t_1 = (left - x) / dx
+        t_2 = (right - x) / dx
+        if t_1 > t_2:
+            t_1, t_2 = t_2, t_1
+        t_enter = max(t_enter, t_1)
+        t_exit = min(t_exit, t_2)
+        if t_enter > t_exit:
+            return None
+    if dy == 0:
+        if y < bottom or y > top:
+            return None
+    else:
+        t_1 = (bottom - y) / dy
+        t_2 = (top - y) / dy
+        if t_1 > t_2:
+            t_1, t_2 = t_2, t_1
+        t_enter = max(t_enter, t_1)
+        t_exit = min(t_exit, t_2)
+        if t_enter > t_exit:
+            return None
+    return t_enter
+
+
+def _circle_hit_time(x, y, dx, dy, center_x, center_y, radius):
+    """Returns the fraction of the segment from (x, y) to (x + dx, y + dy) at
+    which the segment enters a circle, 0 if (x, y) is inside the circle, or None
+    if the segment misses the circle.
+    """
+    offset_x = x - center_x
+    offset_y = y - center_y
+    c = offset_x * offset_x + offset_y * offset_y - radius * radius
+    if c <= 0:
+        return 0.0
+    a = dx * dx + dy * dy
+    b = offset_x * dx + offset_y * dy
+    if a == 0 or b >= 0:
+        # Not moving, or moving away from the circle
+        return None
+    discriminant = b * b - a * c
+    if discriminant < 0:
+        return None
+    t = (-b - sqrt(discriminant)) / a
+    if t > 1:
+        return None
+    return t
+
+
+class ProjectileEngine():
+    """Moves projectiles and finds what they hit."""
+
+    def __init__(self, static_index=None):
+        """Constructor
+
+        Arguments:
+            static_index (optional): StaticIndex of the obstacles that stop
+                projectiles. Can be replaced at any time.
+        """
+        self.projectiles = DynamicObjectStore(track_velocities=False)
+        self.static_index = static_index if static_index is not None else StaticIndex()
+        # Dictionary mapping ids of projectiles that hit an object and were not
+        # removed to the object, for as long as they overlap it
+        self.touching = {}
+
+    def __len__(self):
+        return len(self.projectiles)
+
+    def __contains__(self, projectile_id):
+        return projectile_id in self.projectiles
+
+    def add_projectile(self, projectile_state):
+        self.projectiles.add(projectile_state)
+
+    def remove_projectile(self, projectile_id):
+        """Returns True if the projectile was removed, False if it was not
+        found."""
+        self.touching.pop(projectile_id, None)
+        return self.projectiles.remove(projectile_id)
+
+    def step(self, time_increment, agents, on_hit, agent_start_positions=None):
+        """
+        Moves every projectile by its velocity and reports the objects that
+        projectiles hit on the way.
+
+        Args:
+            time_increment: the amount of time to advance projectiles.
+            agents: DynamicObjectStore of the agents that projectiles can hit.
+            on_hit: called with (projectile_state, object_state, contact_point)
+                for every hit, once all projectiles have moved. It may remove
+                projectiles.
+            agent_start_positions (optional): dictionary mapping agent ids to
+                their (x, y) positions at the start of the step. Agents that
+                are not included are treated as if they did not move.
+        """
+        store = self.projectiles
+        position_x = store.position_x
+        position_y = store.position_y
+        velocity_x = store.velocity_x
+        velocity_y = store.velocity_y
+        states = store.states
+        cells = self.static_index.get_projectile_cells()
+        agent_radius = AGENT_RADIUS + PROJECTILE_RADIUS
+        if agent_start_positions is None:
+            agent_start_positions = {}
+        # List of (id, start x, start y, movement x, movement y, bounding box of
+        # the swept circle, state) for each agent
+        agent_circles = []
+        for agent_id, end_x, end_y, agent_state in zip(agents.ids, agents.position_x, agents.position_y, agents.states):
+            start_x, start_y = agent_start_positions.get(agent_id, (end_x, end_y))
+            agent_circles.append((
+                agent_id,
+                start_x,
+                start_y,
+                end_x - start_x,
+                end_y - start_y,
+                min(start_x, end_x) - agent_radius,
+                min(start_y, end_y) - agent_radius,
+                max(start_x, end_x) + agent_radius,
+                max(start_y, end_y) + agent_radius,
+                agent_state
+            ))
+        touching = self.touching
+
+        # List of (time, projectile_state, object_state, x, y, stopped) for each
+        # hit
+        hits = []
+        for slot in range(len(store)):
+            x = position_x[slot]
+            y = position_y[slot]
+            dx = velocity_x[slot] * time_increment
+            dy = velocity_y[slot] * time_increment
+            end_x = x + dx
+            end_y = y + dy
+            projectile_state = states[slot]
+            ignored = touching.get(projectile_state.id) if touching else None
+
+            # Bounding box of the segment
+            if dx < 0:
+                left, right = end_x, x
+            else:
+                left, right = x, end_x
+            if dy < 0:
+                bottom, top = end_y, y
+            else:
+                bottom, top = y, end_y
+
+            # Only test boxes in the grid cells covered by the segment
+            first_column = int(left // CELL_SIZE)
+            last_column = int(right // CELL_SIZE)
+            first_row = int(bottom // CELL_SIZE)
+            last_row = int(top // CELL_SIZE)
+            if first_column == last_column and first_row == last_row:
+                nearby_boxes = cells.get((first_column, first_row), ())
+            else:
+                nearby_boxes = [
+                    entry
+                    for column in range(first_column, last_column + 1)
+                    for row in range(first_row, last_row + 1)
+                    for entry in cells.get((column, row), ())
+                ]
+
+            hit_time = None
+            target = None
+            stopped = False
+            for box, obstacle in nearby_boxes:
+                if obstacle is ignored:
+                    continue
+                t = _box_hit_time(x, y, dx, dy, box)
+                if t is not None and (hit_time is None or t < hit_time):
+                    hit_time, target, stopped = t, obstacle, True
+
+            attacker_id = projectile_state.attackerId
+            for agent_id, agent_x, agent_y, move_x, move_y, agent_left, agent_bottom, agent_right, agent_top, agent_state in agent_circles:
+                if agent_right < left or agent_left > right or agent_top < bottom or agent_bottom > top:
+                    continue
+                if agent_id == attacker_id or agent_state is ignored:
+                    continue
+                # Sweep the projectile relative to the moving agent
+                t = _circle_hit_time(x, y, dx - move_x, dy - move_y, agent_x, agent_y, agent_radius)
+                if t is not None and (hit_time is None or t < hit_time):
+                    hit_time, target, stopped = t, agent_state, False
+
+            if target is not None:
+                hits.append((hit_time, projectile_state, target, x + dx * hit_time, y + dy * hit_time, stopped))
+            position_x[slot] = end_x
+            position_y[slot] = end_y
+
+        if touching:
+            self._update_touching(agents)
+
+        # Report hits in the order they happened. The sort is stable, so hits at
+        # the same time keep their order.
+        hits.sort(key=lambda hit: hit[0])
+        for _, projectile_state, target, x, y, stopped in hits:
+            # Skip projectiles removed by the callback of an earlier hit.
+            if projectile_state.id not in store:
+                continue
+            if stopped:
+                projectile_state.position.x = x
+                projectile_state.position.y = y
+                projectile_state.velocity.x = 0
+                projectile_state.velocity.y = 0
+            touching[projectile_state.id] = target
+            on_hit(projectile_state, target, Vector2(x, y))
+
+    def _update_touching(self, agents):
+        """Forgets objects that projectiles no longer overlap."""
+        agent_radius = AGENT_RADIUS + PROJECTILE_RADIUS
+        for projectile_id, object_state in list(self.touching.items()):
+            slot = self.projectiles.slots[projectile_id]
+            x = self.projectiles.position_x[slot]
+            y = self.projectiles.position_y[slot]
+            if isinstance(object_state, Obstacle):
+                entry = self.static_index.get_projectile_boxes().get(object_state.id)
+                overlapping = entry is not None and _box_hit_time(x, y, 0, 0, entry[0]) is not None
+            elif object_state.id in agents:
+                agent_slot = agents.slots[object_state.id]
+                overlapping = _circle_hit_time(x, y, 0, 0, agents.position_x[agent_slot], agents.position_y[agent_slot], agent_radius) is not None
+            else:
+                overlapping = False
+            if not overlapping:
+                del self.touching[projectile_id]
+
+    def scan_area(self, position, distance):
+        """Returns the ProjectileStates of all projectiles within distance of
+        position."""
+        store = self.projectiles
+        position_x = store.position_x
+        position_y = store.position_y
+        reach = distance + PROJECTILE_RADIUS
+        reach_squared = reach * reach
+        hits = []
+        for slot in range(len(store)):
+            offset_x = position_x[slot] - position.x
+            offset_y = position_y[slot] - position.y
+            if offset_x * offset_x + offset_y * offset_y <= reach_squared:
+                hits.append(store.states[slot])
+        return hits
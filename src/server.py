@@ -8,29 +8,86 @@ FR4 - UI.ConsistentState
 import argparse
 import mimetypes
 import os
-from traceback import format_exception
 import tornado.ioloop
 import tornado.web
 import tornado.websocket
 
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON
+from src.client_messages import ClientMessageSender
+from src.compression import CompressedWebSocketProtocol, get_default_compression_settings, parse_compression_settings
 from src.gameserver import GameServer
+from src.log import configure_logging, get_logger
 from src.message import Message
+from src.outbound_queue import OutboundQueue
 
+log = get_logger(__name__)
 
-class ServerToClientConnection(tornado.websocket.WebSocketHandler):
-    """Represents a connection from the server to a single client.
 
-    Abstracts away websocket details.
+class WebSocketConnection(tornado.websocket.WebSocketHandler):
+    """Base class of the websocket connections of the server.
+
+    Messages are compressed with permessage-deflate if the client supports it
+    (see compression.py).
     """
-    def initialize(self, game_server):
+    def initialize(self, game_server, compression=None):
         # Get reference to game server
         self.game_server = game_server
 
+        # CompressionSettings, or None if messages are not compressed
+        self.compression = compression
+
+    def get_compression_options(self):
+        if self.compression is None:
+            return None
+        return self.compression.get_compression_options()
+
+    def get_websocket_protocol(self):
+        protocol = super().get_websocket_protocol()
+        if protocol is None or self.compression is None:
+            return protocol
+        return CompressedWebSocketProtocol(self, False, protocol.params)
+
+    def write_encoded(self, payload, binary=False):
+        """Returns a future that is done once the payload has been written,
+        or None if the connection is closed."""
+        try:
+            return self.write_message(payload, binary=binary)
+        except tornado.websocket.WebSocketClosedError:
+            return None
+
+
+class ServerToClientConnection(ClientMessageSender, WebSocketConnection):
+    """Represents a connection from the server to a single client.
+
+    Abstracts away websocket details.
+    """
+    def initialize(self, game_server, compression=None):
+        super().initialize(game_server, compression)
+
         # Callback which can be set by other classes
         self.on_receive_player_code = None
 
+        # Format of TICK_STATE messages. Either FORMAT_JSON or FORMAT_BINARY.
+        self.frame_format = FORMAT_JSON
+
+        # Name that the player's rating is recorded under, or None
+        self.player_id = None
+
+        # Bounds the data buffered for the client
+        self.outbound = OutboundQueue(self)
+
     def open(self, **kwargs):
-        print("New ServerToClientConnection")
+        log.debug("new connection from %s", self.request.remote_ip)
+
+        # Clients can ask for binary TICK_STATE frames by connecting to
+        # /websocket?format=binary
+        frame_format = self.get_query_argument("format", FORMAT_JSON)
+        if frame_format in [FORMAT_JSON, FORMAT_BINARY]:
+            self.frame_format = frame_format
+
+        # Players are matched by the rating of the name they connect with,
+        # e.g. /websocket?player=alice
+        self.player_id = self.get_query_argument("player", None) or None
 
         self.send_debug_message("hello from server")
 
@@ -42,68 +99,21 @@ class ServerToClientConnection(tornado.websocket.WebSocketHandler):
         message_type = message.type
 
         if message_type == Message.DEBUG:
-            print(message.data)
-        if message_type == Message.PLAYER_CODE:
+            log.debug("debug message from client: %s", message.data)
+        elif message_type == Message.PLAYER_CODE:
             self.handle_player_code_message(message)
         else:
-            print(f"ERROR: unhandled message type: {message.type}")
+            log.warning("unhandled message type: %s", message.type)
 
     def on_close(self):
-        print("ServerToClientConnection closed")
-        self.game_server.remove_from_queue(self)
-
-    def send_message(self, message):
-        """Send a Message object.
-        """
-        self.write_message(message.to_json())
-
-    def send_debug_message(self, message_contents):
-        message = Message(
-            Message.DEBUG,
-            message_contents
-        )
-        self.send_message(message)
-
-    def send_start_game_message(self):
-        message = Message(
-            Message.START_GAME,
-            None
-        )
-        self.send_message(message)
-
-    def send_start_simulation_message(self):
-        message = Message(
-            Message.START_SIMULATION,
-            None
-        )
-        self.send_message(message)
-
-    def send_python_error(self, e_type, e_value, e_traceback):
-        error_str = format_exception(e_type, e_value, e_traceback)
-        error_str = "".join(error_str)
-        message = Message(
-            Message.PYTHON_ERROR,
-            error_str
-        )
-        self.send_message(message)
-
-    def send_results(self, winner, tie, agents, error=False):
-        message = Message(Message.RESULTS, {
-            "winner": winner,
-            "tie": tie,
-            "error": error,
-            "players": [
-                {
-                    "class_name": type(agents[0][1]).__name__,
-                    "survival_time": agents[0][1].survival_time
-                },
-                {
-                    "class_name": type(agents[1][1]).__name__,
-                    "survival_time": agents[1][1].survival_time
-                }
-            ]
-        })
-        self.send_message(message)
+        log.debug("connection closed")
+        self.game_server.disconnect(self)
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        if frame is None:
+            self.outbound.send_message(payload, binary=binary)
+        else:
+            self.outbound.send_frame(frame)
 
     def handle_player_code_message(self, message):
         code = message.data["code"]
@@ -111,20 +121,45 @@ class ServerToClientConnection(tornado.websocket.WebSocketHandler):
         if self.on_receive_player_code is not None:
             self.on_receive_player_code(self, code, class_name)
 
-    def send_agent_states(self, agent_states):
-        message = Message(Message.AGENT_STATES, agent_states)
-        self.write_message(message.to_json())
 
-    def send_projectile_states(self, projectile_states):
-        message = Message(Message.PROJECTILE_STATES, projectile_states)
-        self.write_message(message.to_json())
+class SpectatorConnection(ClientMessageSender, WebSocketConnection):
+    """A connection from a client that watches a match.
+
+    Spectators receive the same messages as players, except that they never
+    send player code. Messages are written by the match's BroadcastChannel.
+    """
+    def initialize(self, game_server, compression=None):
+        super().initialize(game_server, compression)
+        self.game = None
+
+        # Format of TICK_STATE messages. Either FORMAT_JSON or FORMAT_BINARY.
+        self.frame_format = FORMAT_JSON
+
+    def open(self, match_id):
+        # Spectators can ask for binary TICK_STATE frames by connecting to
+        # /watch/<match id>?format=binary
+        frame_format = self.get_query_argument("format", FORMAT_JSON)
+        if frame_format in [FORMAT_JSON, FORMAT_BINARY]:
+            self.frame_format = frame_format
+
+        self.game = self.game_server.get_match(match_id)
+        if self.game is None:
+            self.close(4004, "unknown match")
+            return
+        log.debug("new spectator of match %s from %s", match_id, self.request.remote_ip)
+        self.send_start_game_message()
+        self.game.add_spectator(self)
+
+    def on_message(self, message_str):
+        log.warning("ignoring message from spectator")
+
+    def on_close(self):
+        if self.game is not None:
+            self.game.remove_spectator(self)
 
-    def send_destroy_message(self, object_id, object_type):
-        message = Message(Message.DESTROY, {
-            "id": object_id,
-            "type": object_type
-        })
-        self.write_message(message.to_json())
+    def send_encoded(self, payload, binary=False, frame=None):
+        # Only used before the spectator is added to the channel
+        self.write_encoded(payload, binary)
 
 
 def fix_mime_types():
@@ -143,8 +178,21 @@ def fix_mime_types():
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("port", type=int, help="Port for server to listen on.")
+    parser.add_argument("--shards", type=int, default=0, help="Number of processes to run games in. By default, games run in the server process.")
+    parser.add_argument(
+        "--compression",
+        help='Websocket compression: "off", "on" or settings such as "level=6,window_bits=15". '
+        "Defaults to the WEBSOCKET_COMPRESSION environment variable, or on.",
+    )
     args = parser.parse_args()
     port = args.port
+    try:
+        if args.compression is None:
+            compression = get_default_compression_settings()
+        else:
+            compression = parse_compression_settings(args.compression)
+    except ValueError as e:
+        parser.error(str(e))
 
     # If running on heroku, get the port from the PORT env var
     # https://stackoverflow.com/questions/27899666/what-port-to-use-on-heroku-python-app
@@ -152,9 +200,10 @@ def main():
     if ON_HEROKU:
         port = int(os.environ.get("PORT", 17995))
 
+    configure_logging()
     fix_mime_types()
 
-    game_server = GameServer()
+    game_server = GameServer(shards=args.shards)
 
     application = tornado.web.Application([
         (
@@ -162,7 +211,13 @@ def main():
             # This will create a new instance of ServerToClientConnection for each client.
             r"/websocket",
             ServerToClientConnection,
-            {"game_server": game_server},
+            {"game_server": game_server, "compression": compression},
+        ),
+        (
+            # Handle spectators of a match at the url /watch/<match id>.
+            r"/watch/([^/]+)",
+            SpectatorConnection,
+            {"game_server": game_server, "compression": compression},
         ),
         (
             # Handle http requests at the root url.
@@ -173,7 +228,7 @@ def main():
         ),
     ])
     application.listen(port)
-    print(f"Server running on port {port}")
+    log.info("server running on port %s", port)
     tornado.ioloop.IOLoop.current().start()
 
 
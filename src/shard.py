@@ -0,0 +1,535 @@
+"""
+Runs games in a pool of worker processes ("shards").
+
+Each shard is a separate Python process with its own tornado IOLoop, so the
+number of games the server can run at the same time scales with the number of
+CPU cores. Websockets stay in the main server process. Messages from clients
+are forwarded to the shard that runs their game, and every message a game sends
+to a client is relayed back to the main process already encoded, where it is
+written to the client's websocket unchanged.
+
+Every shard reports its load to the main process every LOAD_REPORT_INTERVAL
+seconds. New games are placed on the shard with the lowest estimated load.
+
+Clients that can not keep up skip TICK_STATE frames (see OutboundQueue). SEND
+messages therefore say whether their payload is a TICK_STATE, and if so
+whether it is a keyframe, rather than None. A JSON client that skipped a frame
+can only be sent deltas again after a keyframe, so the main process asks the
+shard for one with KEYFRAME.
+
+Spectators also stay in the main process. Each ShardedGame has its own
+BroadcastChannel. While it has spectators, the shard relays every frame of the
+game in all the forms that spectators may need, and the channel fans them out.
+
+A client that disconnects forfeits its game with FORFEIT. The shard reaps
+every game once it has sent GAME_ENDED, and the main process reaps the
+ShardedGame when GameServer does.
+
+If a shard process exits, the main process notices when the pipe to it breaks,
+either while reading from it or while sending a command. All games of the
+shard then end with an error, so that their players get results and the games
+are reaped. No further commands are sent to the shard.
+
+Commands sent from the main process to a shard:
+    (START_GAME, game id, list of client frame formats)
+    (PLAYER_CODE, game id, client index, code, class name)
+    (WATCH, game id, whether the game has spectators)
+    (KEYFRAME, game id)
+    (FORFEIT, game id, client index)
+    None to stop the shard
+
+Messages sent from a shard to the main process:
+    (SEND, game id, client index, payload, binary, keyframe)
+    (SPECTATE_FRAME, game id, JSON payload, JSON keyframe, binary frame with names)
+    (SPECTATE_MESSAGE, game id, payload, replay)
+    (GAME_ENDED, game id, list with whether each client won)
+    (LOAD, number of games, fraction of the last interval spent running ticks)
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR18 - Online.Matchmaking
+"""
+
+import atexit
+import multiprocessing
+from time import perf_counter
+
+import tornado.ioloop
+
+from src.broadcast_channel import BroadcastChannel
+from src.client_messages import ClientMessageSender, results_message
+from src.game import GAME_CODING, GAME_CREATED, GAME_FINISHED, GAME_REAPED, Game
+from src.log import configure_logging, get_logger
+from src.outbound_queue import TickFrame
+
+log = get_logger(__name__)
+
+START_GAME = "start_game"
+PLAYER_CODE = "player_code"
+WATCH = "watch"
+KEYFRAME = "keyframe"
+FORFEIT = "forfeit"
+SEND = "send"
+SPECTATE_FRAME = "spectate_frame"
+SPECTATE_MESSAGE = "spectate_message"
+GAME_ENDED = "game_ended"
+LOAD = "load"
+
+# Seconds between load reports from each shard
+LOAD_REPORT_INTERVAL = 1
+
+# Assumed fraction of a core used by one game until a shard has reported the
+# load of its games
+DEFAULT_GAME_LOAD = 0.02
+
+
+class ShardedGame():
+    """Stands in for a Game that runs in a shard, in the main process."""
+
+    def __init__(self, shard, game_id, clients):
+        """Constructor
+
+        Arguments:
+            shard: the Shard that runs the game.
+            game_id: id of the game, unique within the ShardPool.
+            clients: list of ServerToClientConnection instances.
+        """
+        self.shard = shard
+        self.game_id = game_id
+        self.match_id = game_id
+        self.clients = clients
+        # Spectators of the game in the main process
+        self.spectators = BroadcastChannel()
+        # True if the shard has been asked to relay frames for spectators
+        self.watched = False
+        # True if the shard has been asked for a keyframe that has not been
+        # relayed yet
+        self.keyframe_requested = False
+        # One of the GAME_* states of Game. The shard does not report when
+        # the game starts running, so it stays GAME_CODING until it ends.
+        self.state = GAME_CREATED
+        # Whether each client won, or None if the game ended with an error.
+        # Set once the game has ended.
+        self.winners = [None] * len(clients)
+        # Clients that left the game, which are not sent its results
+        self.forfeited_clients = []
+        # Called with this game once the game has ended. Can be set by other
+        # classes.
+        self.on_game_end = None
+
+        for client in self.clients:
+            client.on_receive_player_code = self.forward_player_code
+
+    def start_coding(self):
+        """Tells the clients that the game has started, like
+        Game.start_coding."""
+        self.state = GAME_CODING
+        for client in self.clients:
+            client.send_start_game_message()
+
+    def forward_player_code(self, client, code, class_name):
+        self.shard.send((PLAYER_CODE, self.game_id, self.clients.index(client), code, class_name))
+
+    def forfeit(self, client):
+        """Ends the game because a client left it, like Game.forfeit."""
+        if self.state in [GAME_FINISHED, GAME_REAPED]:
+            return
+        self.forfeited_clients.append(client)
+        # Aborts the game if the shard has exited
+        self.shard.send((FORFEIT, self.game_id, self.clients.index(client)))
+
+    def abort(self):
+        """Ends the game with an error because its shard has exited. The
+        players are told that the game ended with an error, and nobody
+        wins."""
+        if self.state in [GAME_FINISHED, GAME_REAPED]:
+            return
+        for client in self.clients:
+            if client not in self.forfeited_clients:
+                client.send_debug_message("ERROR: the server process running this game stopped.")
+                client.send_results(False, True, [], error=True)
+        self.spectators.publish_message(results_message(None, True, [], error=True).to_json())
+        self.finish([None] * len(self.clients))
+
+    def finish(self, winners):
+        """Records the results sent by the shard and calls on_game_end."""
+        self.state = GAME_FINISHED
+        self.winners = winners
+        self.spectators.close()
+        if self.on_game_end is not None:
+            self.on_game_end(self)
+
+    def reap(self):
+        """Forgets the clients' callbacks once the game has finished."""
+        self.state = GAME_REAPED
+        for client in self.clients:
+            client.on_receive_player_code = None
+
+    def get_client_results(self):
+        """Returns pairs (client, True if the client won), like
+        Game.get_client_results."""
+        return [(client, winner) for client, winner in zip(self.clients, self.winners) if winner is not None]
+
+    def create_relayed_frame(self, payload, binary, keyframe):
+        """Returns a TickFrame for a TICK_STATE relayed from the shard."""
+        if keyframe:
+            self.keyframe_requested = False
+        return TickFrame(
+            None if binary else payload,
+            self.request_keyframe,
+            # Binary frames are full snapshots
+            lambda include_names: payload,
+            keyframe=keyframe
+        )
+
+    def request_keyframe(self):
+        """Asks the shard to make a following frame a keyframe. Returns None,
+        since no keyframe is available yet."""
+        if not self.keyframe_requested:
+            self.keyframe_requested = True
+            self.shard.send((KEYFRAME, self.game_id))
+        return None
+
+    def add_spectator(self, connection):
+        """Adds a connection that watches the game (see BroadcastChannel.add)."""
+        self.spectators.add(connection)
+        if len(self.spectators) > 0 and not self.watched:
+            self.watched = True
+            self.shard.send((WATCH, self.game_id, True))
+
+    def remove_spectator(self, connection):
+        self.spectators.remove(connection)
+        if len(self.spectators) == 0 and self.watched:
+            self.watched = False
+            # Frames stop until the game is watched again, so the last one
+            # would be out of date for the next spectator.
+            self.spectators.latest_frame = None
+            self.shard.send((WATCH, self.game_id, False))
+
+
+class Shard():
+    """The main process's handle to one shard process."""
+
+    def __init__(self, process, connection):
+        """Constructor
+
+        Arguments:
+            process: the shard process.
+            connection: the main process's end of a pipe to the shard.
+        """
+        self.process = process
+        self.connection = connection
+        self.alive = True
+        # Dict mapping game ids to ShardedGames running on this shard
+        self.games = {}
+        # Load from the last report
+        self.reported_games = 0
+        self.busy = 0
+
+    def get_load(self):
+        """Returns the estimated fraction of a core used by the shard,
+        including games that were placed after the last load report."""
+        if self.reported_games > 0:
+            game_load = self.busy / self.reported_games
+        else:
+            game_load = DEFAULT_GAME_LOAD
+        return self.busy + max(0, len(self.games) - self.reported_games) * game_load
+
+    def send(self, command):
+        """Sends a command to the shard.
+
+        Returns:
+            False if the shard has exited, in which case its games have been
+            aborted. True otherwise.
+        """
+        if not self.alive:
+            return False
+        try:
+            self.connection.send(command)
+        except (BrokenPipeError, OSError):
+            self.on_exit()
+            return False
+        return True
+
+    def on_readable(self, fd, events):
+        """Handles messages from the shard. Called by the IOLoop."""
+        try:
+            while self.alive and self.connection.poll():
+                self.handle_message(self.connection.recv())
+        except (EOFError, OSError):
+            self.on_exit()
+
+    def on_exit(self):
+        """Called once the shard process has exited. Aborts its games."""
+        if not self.alive:
+            return
+        log.error("shard %s exited", self.process.name)
+        self.alive = False
+        tornado.ioloop.IOLoop.current().remove_handler(self.connection.fileno())
+        games = list(self.games.values())
+        self.games = {}
+        for game in games:
+            game.abort()
+
+    def handle_message(self, message):
+        message_type = message[0]
+        if message_type == SEND:
+            _, game_id, client_index, payload, binary, keyframe = message
+            game = self.games.get(game_id)
+            if game is None:
+                return
+            client = game.clients[client_index]
+            if keyframe is None:
+                client.send_encoded(payload, binary=binary)
+            else:
+                client.send_encoded(payload, binary=binary, frame=game.create_relayed_frame(payload, binary, keyframe))
+        elif message_type == SPECTATE_FRAME:
+            _, game_id, json_payload, json_keyframe, binary = message
+            game = self.games.get(game_id)
+            if game is None:
+                return
+            # The binary frame always has names, which every binary spectator
+            # can use.
+            game.spectators.publish_frame(TickFrame(json_payload, lambda: json_keyframe, lambda include_names: binary))
+        elif message_type == SPECTATE_MESSAGE:
+            _, game_id, payload, replay = message
+            game = self.games.get(game_id)
+            if game is None:
+                return
+            game.spectators.publish_message(payload, replay=replay)
+        elif message_type == GAME_ENDED:
+            _, game_id, winners = message
+            game = self.games.pop(game_id, None)
+            if game is None:
+                return
+            game.finish(winners)
+        elif message_type == LOAD:
+            _, self.reported_games, self.busy = message
+
+    def close(self):
+        if self.alive:
+            self.alive = False
+            tornado.ioloop.IOLoop.current().remove_handler(self.connection.fileno())
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+class ShardPool():
+    """Starts shard processes and places games on them."""
+
+    def __init__(self, num_shards, isolate_players=True):
+        """Constructor
+
+        Must be called on the IOLoop that serves the websockets.
+
+        Arguments:
+            num_shards: number of shard processes to start.
+            isolate_players: passed to every Game created by the shards.
+        """
+        # Spawn shards instead of forking so they don't inherit the server's
+        # sockets and event loop.
+        context = multiprocessing.get_context("spawn")
+        io_loop = tornado.ioloop.IOLoop.current()
+        self.shards = []
+        for i in range(num_shards):
+            connection, shard_connection = context.Pipe()
+            # Shards are not daemons since they start processes for player code.
+            process = context.Process(target=run_shard, args=(shard_connection, isolate_players), name=f"shard-{i}")
+            process.start()
+            shard_connection.close()
+            shard = Shard(process, connection)
+            io_loop.add_handler(connection.fileno(), shard.on_readable, tornado.ioloop.IOLoop.READ)
+            self.shards.append(shard)
+        self.next_game_id = 0
+        # Stop the shards before multiprocessing waits for them to exit.
+        atexit.register(self.close)
+
+    def choose_shard(self):
+        """Returns the live shard with the lowest estimated load."""
+        shards = [shard for shard in self.shards if shard.alive]
+        if not shards:
+            raise RuntimeError("No shards are running")
+        return min(shards, key=lambda shard: (shard.get_load(), len(shard.games)))
+
+    def start_game(self, clients):
+        """Creates a game for the clients on the least loaded shard.
+
+        Returns:
+            the ShardedGame.
+        Raises:
+            RuntimeError if no shards are running.
+        """
+        while True:
+            shard = self.choose_shard()
+            game_id = self.next_game_id
+            self.next_game_id += 1
+            if shard.send((START_GAME, game_id, [client.frame_format for client in clients])):
+                break
+        game = ShardedGame(shard, game_id, clients)
+        shard.games[game_id] = game
+        return game
+
+    def close(self):
+        """Stops all shards."""
+        atexit.unregister(self.close)
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+
+class RelayClient(ClientMessageSender):
+    """Stands in for a ServerToClientConnection inside a shard. Messages are
+    relayed to the main process."""
+
+    def __init__(self, connection, game_id, client_index, frame_format):
+        """Constructor
+
+        Arguments:
+            connection: the shard's end of the pipe to the main process.
+            game_id: id of the client's game.
+            client_index: index of the client in the game's list of clients.
+            frame_format: format of TICK_STATE messages for the client.
+        """
+        self.connection = connection
+        self.game_id = game_id
+        self.client_index = client_index
+        self.frame_format = frame_format
+        # Callback which is set by Game
+        self.on_receive_player_code = None
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        keyframe = None if frame is None else frame.keyframe
+        self.connection.send((SEND, self.game_id, self.client_index, payload, binary, keyframe))
+
+
+class SpectatorRelay():
+    """Stands in for a Game's BroadcastChannel inside a shard. Messages for
+    spectators are relayed to the main process, and frames only while the
+    game has spectators there."""
+
+    def __init__(self, connection, game_id):
+        """Constructor
+
+        Arguments:
+            connection: the shard's end of the pipe to the main process.
+            game_id: id of the game.
+        """
+        self.connection = connection
+        self.game_id = game_id
+        # Set by WATCH commands
+        self.watched = False
+
+    def publish_frame(self, frame):
+        if self.watched:
+            self.connection.send((SPECTATE_FRAME, self.game_id, frame.json_payload, frame.get_json_keyframe(), frame.get_binary(include_names=True)))
+
+    def publish_message(self, payload, replay=False):
+        # Messages are rare, so they are relayed even if nobody is watching
+        # yet. The main process replays them to spectators that join later.
+        self.connection.send((SPECTATE_MESSAGE, self.game_id, payload, replay))
+
+    def close(self):
+        # Spectators are disconnected once the main process receives
+        # GAME_ENDED.
+        pass
+
+
+class ShardWorker():
+    """Runs the games of one shard, inside the shard process."""
+
+    def __init__(self, connection, isolate_players=True):
+        """Constructor
+
+        Arguments:
+            connection: the shard's end of the pipe to the main process.
+            isolate_players: passed to every Game created by the shard.
+        """
+        self.connection = connection
+        self.isolate_players = isolate_players
+        # Dict mapping game ids to Games
+        self.games = {}
+        # Busy time of games that have ended
+        self.ended_busy_time = 0
+        # Total busy time and time of the last load report
+        self.reported_busy_time = 0
+        self.last_report_time = perf_counter()
+
+    def on_readable(self, fd, events):
+        """Handles commands from the main process. Called by the IOLoop."""
+        try:
+            while self.connection.poll():
+                command = self.connection.recv()
+                if command is None:
+                    tornado.ioloop.IOLoop.current().stop()
+                    return
+                self.handle_command(command)
+        except (EOFError, OSError):
+            # The main process has exited.
+            tornado.ioloop.IOLoop.current().stop()
+
+    def handle_command(self, command):
+        command_type = command[0]
+        if command_type == START_GAME:
+            _, game_id, frame_formats = command
+            clients = [
+                RelayClient(self.connection, game_id, i, frame_format)
+                for i, frame_format in enumerate(frame_formats)
+            ]
+            game = Game(clients, isolate_players=self.isolate_players, match_id=game_id)
+            game.spectators = SpectatorRelay(self.connection, game_id)
+            game.on_game_end = lambda game: self.end_game(game_id)
+            self.games[game_id] = game
+        elif command_type == PLAYER_CODE:
+            _, game_id, client_index, code, class_name = command
+            game = self.games.get(game_id)
+            if game is None:
+                return
+            client = game.clients[client_index]
+            client.on_receive_player_code(client, code, class_name)
+        elif command_type == KEYFRAME:
+            game = self.games.get(command[1])
+            if game is not None:
+                game.state_encoder.request_keyframe()
+        elif command_type == WATCH:
+            _, game_id, watched = command
+            game = self.games.get(game_id)
+            if game is not None:
+                game.spectators.watched = watched
+        elif command_type == FORFEIT:
+            _, game_id, client_index = command
+            game = self.games.get(game_id)
+            if game is not None:
+                game.forfeit(game.clients[client_index])
+
+    def end_game(self, game_id):
+        game = self.games.pop(game_id)
+        self.ended_busy_time += game.tick_scheduler.stats.busy_time
+        winners = [None] * len(game.clients)
+        for client, winner in game.get_client_results():
+            winners[client.client_index] = winner
+        self.connection.send((GAME_ENDED, game_id, winners))
+        game.reap()
+
+    def report_load(self):
+        now = perf_counter()
+        busy_time = self.ended_busy_time + sum(game.tick_scheduler.stats.busy_time for game in self.games.values())
+        busy = (busy_time - self.reported_busy_time) / (now - self.last_report_time)
+        self.reported_busy_time = busy_time
+        self.last_report_time = now
+        self.connection.send((LOAD, len(self.games), busy))
+
+
+def run_shard(connection, isolate_players):
+    """Entry point of a shard process."""
+    configure_logging()
+    io_loop = tornado.ioloop.IOLoop.current()
+    worker = ShardWorker(connection, isolate_players)
+    io_loop.add_handler(connection.fileno(), worker.on_readable, tornado.ioloop.IOLoop.READ)
+    tornado.ioloop.PeriodicCallback(worker.report_load, LOAD_REPORT_INTERVAL * 1000).start()
+    io_loop.start()
@@ -0,0 +1,299 @@
+"""
+A physics backend written in Python only.
+
+Agents are kinematic circles: they move at their velocity and are never pushed
+by collisions. Obstacles are axis-aligned boxes and boundaries are rounded
+segments, which are all stored in the StaticIndex. Every substep, agents are
+moved and then tested against each other and against the obstacles near them,
+the same way pymunk steps kinematic bodies:
+- Collision callbacks are called for pairs of objects that start touching, with
+  the contact point on the surface of the first agent. Both objects are stopped
+  first. While callbacks run, object states still have the positions from the
+  start of the substep.
+- Separate callbacks are called for pairs that stop touching.
+- Agents touch boxes when the distance between them is at most AGENT_RADIUS,
+  and touch other agents and boundaries when it is strictly less than the sum
+  of their radii, which is how pymunk treats exact contact.
+Contact points are the same as pymunk's, but callbacks for collisions that
+start in the same substep may be called in a different order.
+
+It does not import pymunk or pygame, so it can run where they are not
+installed. It imports somewhat faster than the pymunk backend, but its steps
+take longer (see bench/physics_backends.py).
+
+Part of the implementation of the following requirements:
+FR10 - Agent.PositionState
+FR11 - Agent.Movement
+FR14 - Map.Walls
+"""
+
+import logging
+import sys
+from math import sqrt
+
+from src.dynamic_object_store import DynamicObjectStore
+from src.globals import *
+from src.physics_backend import PhysicsBackend
+from src.static_index import CELL_SIZE
+from src.vector2 import Vector2
+
+# Smallest positive double, added by chipmunk to avoid dividing by zero
+_FLOAT_MIN = sys.float_info.min
+
+
+class SimplePhysicsEngine(PhysicsBackend):
+    """Moves agents and finds their collisions without pymunk."""
+
+    def __init__(self, game_map=None, step_policy=None):
+        """Constructor
+
+        Arguments:
+            game_map, step_policy (optional): see PhysicsBackend.
+        """
+        super().__init__(game_map, step_policy)
+        # There are no bodies to push velocities to
+        self.dynamic_objects = DynamicObjectStore(track_velocities=False)
+        # Dictionary mapping (id, id) pairs of objects that are touching to
+        # None, in the order they started touching
+        self.contacts = {}
+        # Dictionary mapping ids of boundaries to the (start, end) of their
+        # segments
+        self.boundary_segments = {}
+        for boundary_obstacle, start, end, _ in self.game_map.boundaries:
+            self.object_states[boundary_obstacle.id] = boundary_obstacle
+            self.boundary_segments[boundary_obstacle.id] = (start, end)
+
+    def add_agent(self, agent_state):
+        if agent_state.id in self.object_states:
+            raise ValueError(f"Duplicate id {agent_state.id} found")
+        self.object_states[agent_state.id] = agent_state
+        self.dynamic_objects.add(agent_state)
+        self.scan_cache.clear()
+        self.log.debug("added agent %s", agent_state.id)
+
+    def _add_obstacle_body(self, obstacle):
+        if obstacle.id in self.object_states:
+            raise ValueError(f"Duplicate id {obstacle.id} found")
+        self.object_states[obstacle.id] = obstacle
+
+    def _remove_body(self, object_id):
+        object_state = self.object_states.get(object_id)
+        if object_state is None or object_id in self.projectile_engine:
+            return False
+        for pair in [pair for pair in self.contacts if object_id in pair]:
+            del self.contacts[pair]
+        return True
+
+    def _substep(self, time_increment):
+        agents = self.dynamic_objects
+        agent_start_positions = self._get_agent_positions()
+        ids = list(agents.ids)
+        states = list(agents.states)
+        end_x = [x + velocity_x * time_increment for x, velocity_x in zip(agents.position_x, agents.velocity_x)]
+        end_y = [y + velocity_y * time_increment for y, velocity_y in zip(agents.position_y, agents.velocity_y)]
+
+        # Dictionary mapping pairs of ids of touching objects to (first object,
+        # second object, contact point) at the end of the substep
+        touching = self._find_contacts(ids, states, end_x, end_y)
+
+        for pair, (object_state_1, object_state_2, contact_point) in touching.items():
+            if pair in self.contacts:
+                continue
+            # Skip objects removed by earlier callbacks
+            if object_state_1.id not in self.object_states or object_state_2.id not in self.object_states:
+                continue
+            self.contacts[pair] = None
+            # stop the objects from moving
+            agents.stop(object_state_1.id)
+            agents.stop(object_state_2.id)
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("collision between %s and %s", object_state_1, object_state_2)
+            if self.collision_callback is not None:
+                self.collision_callback(object_state_1, object_state_2, contact_point)
+
+        for pair in [pair for pair in self.contacts if pair not in touching]:
+            del self.contacts[pair]
+            if self.separate_callback is not None:
+                self.separate_callback(self.object_states.get(pair[0]), self.object_states.get(pair[1]))
+
+        # Callbacks may have removed agents, which moves them between slots
+        slots = agents.slots
+        for agent_id, x, y in zip(ids, end_x, end_y):
+            slot = slots.get(agent_id)
+            if slot is not None:
+                agents.position_x[slot] = x
+                agents.position_y[slot] = y
+        self._step_projectiles(time_increment, agent_start_positions)
+
+    def _find_contacts(self, ids, states, xs, ys):
+        """Returns a dictionary mapping (agent id, object id) pairs to
+        (agent state, object state, contact point) for every agent that
+        touches another agent or an obstacle at the given positions."""
+        touching = {}
+
+        # Sweep over agents in order of x, so that each agent is only tested
+        # against the agents less than two radii to its right
+        contact_distance = 2 * AGENT_RADIUS
+        contact_distance_squared = contact_distance * contact_distance
+        order = sorted(range(len(ids)), key=xs.__getitem__)
+        for k, i in enumerate(order):
+            x = xs[i]
+            y = ys[i]
+            for j in order[k + 1:]:
+                offset_x = xs[j] - x
+                if offset_x >= contact_distance:
+                    break
+                offset_y = ys[j] - y
+                distance_squared = offset_x * offset_x + offset_y * offset_y
+                if distance_squared < contact_distance_squared:
+                    # Agents that were added first come first, so that pairs
+                    # keep the same key while they touch
+                    if i < j:
+                        touching[(ids[i], ids[j])] = (states[i], states[j], _get_circle_contact(x, y, offset_x, offset_y, distance_squared))
+                    else:
+                        touching[(ids[j], ids[i])] = (states[j], states[i], _get_circle_contact(xs[j], ys[j], -offset_x, -offset_y, distance_squared))
+
+        cells = self.static_index.get_scan_cells(AGENT_RADIUS)
+        for i in range(len(ids)):
+            x = xs[i]
+            y = ys[i]
+            for left, bottom, right, top, radius, obstacle in cells.get((int(x // CELL_SIZE), int(y // CELL_SIZE)), ()):
+                if radius:
+                    start, end = self.boundary_segments[obstacle.id]
+                    contact_point = _collide_segment(x, y, start, end, radius)
+                # Shapes are only collided when their bounding boxes overlap
+                elif x - AGENT_RADIUS > right or x + AGENT_RADIUS < left or y - AGENT_RADIUS > top or y + AGENT_RADIUS < bottom:
+                    continue
+                else:
+                    contact_point = _collide_box(x, y, left, bottom, right, top)
+                if contact_point is not None:
+                    touching[(ids[i], obstacle.id)] = (states[i], obstacle, contact_point)
+        return touching
+
+
+# The functions below repeat the arithmetic of chipmunk, the library underneath
+# pymunk, operation for operation. Players' code compares contact points with
+# their agent's position (see Agent._clip_velocity), so contact points must be
+# the same as the pymunk backend's down to the last bit for games to play out
+# the same way.
+
+def _get_circle_contact(x, y, offset_x, offset_y, distance_squared):
+    """Returns the point on the surface of the agent at (x, y) in the
+    direction of (offset_x, offset_y)."""
+    distance = sqrt(distance_squared)
+    if distance:
+        normal_x = offset_x * (1 / distance)
+        normal_y = offset_y * (1 / distance)
+    else:
+        normal_x = 1.0
+        normal_y = 0.0
+    return Vector2(x + normal_x * AGENT_RADIUS, y + normal_y * AGENT_RADIUS)
+
+
+def _collide_segment(x, y, start, end, radius):
+    """Returns the contact point of the agent at (x, y) with a rounded
+    segment, or None if they do not touch."""
+    start_x, start_y = start
+    segment_x = end[0] - start_x
+    segment_y = end[1] - start_y
+    t = (segment_x * (x - start_x) + segment_y * (y - start_y)) / (segment_x * segment_x + segment_y * segment_y)
+    t = min(max(t, 0.0), 1.0)
+    offset_x = (start_x + segment_x * t) - x
+    offset_y = (start_y + segment_y * t) - y
+    distance_squared = offset_x * offset_x + offset_y * offset_y
+    reach = AGENT_RADIUS + radius
+    if distance_squared >= reach * reach:
+        return None
+    return _get_circle_contact(x, y, offset_x, offset_y, distance_squared)
+
+
+def _collide_box(x, y, left, bottom, right, top):
+    """Returns the contact point of the agent at (x, y) with a box whose
+    bounding box overlaps the agent's, or None if they do not touch.
+
+    pymunk finds the closest points of a circle and a polygon with GJK, which
+    ends on the edge of the box facing the centre of the circle, or on a
+    corner. If the centre is inside the box, EPA ends on the edge closest to
+    the centre instead, and the contact point is on the far side of the
+    circle.
+    """
+    if left < x < right and bottom < y < top:
+        edge = _get_closest_inner_edge(x, y, left, bottom, right, top)
+        if edge is None:
+            return Vector2(x, y)
+    else:
+        edge = _get_facing_edge(x, y, left, bottom, right, top)
+    x0, y0, x1, y1, sign_x, sign_y = edge
+
+    # Closest point of the edge to the centre, interpolated with t in [-1, 1]
+    delta_x = x1 - x0
+    delta_y = y1 - y0
+    t = -min(max((delta_x * (x0 + x1) + delta_y * (y0 + y1)) / (delta_x * delta_x + delta_y * delta_y + _FLOAT_MIN), -1.0), 1.0)
+    half_t = 0.5 * t
+    closest_x = x0 * (0.5 - half_t) + x1 * (0.5 + half_t)
+    closest_y = y0 * (0.5 - half_t) + y1 * (0.5 + half_t)
+    # The centre, interpolated the same way
+    centre_x = x * (0.5 - half_t) + x * (0.5 + half_t)
+    centre_y = y * (0.5 - half_t) + y * (0.5 + half_t)
+
+    # Normal of the edge, pointing into the box
+    length = sqrt(delta_x * delta_x + delta_y * delta_y)
+    normal_x = sign_x * abs(delta_y) * (1 / (length + _FLOAT_MIN))
+    normal_y = sign_y * abs(delta_x) * (1 / (length + _FLOAT_MIN))
+    distance = normal_x * closest_x + normal_y * closest_y
+    if not (distance <= 0 or -1 < t < 1):
+        # The closest point is a corner
+        distance = sqrt(closest_x * closest_x + closest_y * closest_y)
+        normal_x = closest_x * (1 / (distance + _FLOAT_MIN))
+        normal_y = closest_y * (1 / (distance + _FLOAT_MIN))
+    if distance > AGENT_RADIUS:
+        return None
+    return Vector2(centre_x + normal_x * AGENT_RADIUS, centre_y + normal_y * AGENT_RADIUS)
+
+
+def _get_facing_edge(x, y, left, bottom, right, top):
+    """Returns the ends of the edge of a box that GJK ends on for (x, y),
+    which is outside the box or on its edge, relative to (x, y), and the signs
+    of the normal pointing towards the edge, as (x0, y0, x1, y1, sign_x,
+    sign_y). Near a corner, this is the edge that ends at the corner when the
+    box is walked counterclockwise.
+    """
+    bottom_edge = (left - x, bottom - y, right - x, bottom - y, 1, 1)
+    right_edge = (right - x, bottom - y, right - x, top - y, -1, 1)
+    top_edge = (left - x, top - y, right - x, top - y, 1, -1)
+    left_edge = (left - x, bottom - y, left - x, top - y, 1, 1)
+    if y <= bottom:
+        if x <= left:
+            return left_edge
+        return bottom_edge
+    if y >= top:
+        if x >= right:
+            return right_edge
+        return top_edge
+    if x <= left:
+        return left_edge
+    return right_edge
+
+
+def _get_closest_inner_edge(x, y, left, bottom, right, top):
+    """Returns the ends of the edge of a box closest to (x, y), which is inside
+    the box, relative to (x, y), and the signs of the normal pointing away
+    from the edge, as (x0, y0, x1, y1, sign_x, sign_y). Returns None if no
+    single edge is closest, e.g. at the centre of a square box.
+    """
+    # Edges in counterclockwise order. Like EPA, an edge that is as close as
+    # the edge before it is chosen over that edge.
+    edges = [
+        (y - bottom, (left - x, bottom - y, right - x, bottom - y, 1, 1)),
+        (right - x, (right - x, bottom - y, right - x, top - y, -1, 1)),
+        (top - y, (left - x, top - y, right - x, top - y, 1, -1)),
+        (x - left, (left - x, bottom - y, left - x, top - y, 1, 1)),
+    ]
+    closest_distance = min(distance for distance, _ in edges)
+    closest = [
+        edge for i, (distance, edge) in enumerate(edges)
+        if distance == closest_distance and edges[(i + 1) % 4][0] != closest_distance
+    ]
+    if len(closest) != 1:
+        return None
+    return closest[0]
@@ -0,0 +1,243 @@
+"""
+Delta encoding for TICK_STATE messages.
+
+Most of an object's state does not change between ticks. Names and projectile
+velocities never change and agents spend most of the game moving in a straight
+line. Instead of sending every field of every object every tick, the encoder
+sends:
+
+- A keyframe containing the full state of every object when the simulation
+  starts and then every keyframe_interval ticks.
+- In between keyframes, only the fields that changed, keyed by object id.
+  Changes to velocity and angle smaller than VELOCITY_TOLERANCE and
+  ANGLE_TOLERANCE are not sent. Lists with no changes and the keyframe flag
+  are left out.
+
+Positions are dead reckoned. Both the encoder and the client advance the last
+known position of every object by its last known velocity each tick. A new
+position is only sent when the real position has drifted more than
+POSITION_TOLERANCE from the predicted one, so objects moving in a straight line
+cost nothing after they are created.
+
+StateDecoder implements the same reconstruction as the JS client
+(see clienttoserverconnection.js).
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR4 - UI.ConsistentState
+"""
+
+from src.globals import *
+
+# Number of ticks between keyframes
+KEYFRAME_INTERVAL = TICKS_PER_SECOND * 5
+
+# Number of decimal places that floats are rounded to before they are sent
+FLOAT_PRECISION = 2
+
+# Maximum distance in pixels between an object's real position and the position
+# predicted by the client before a new position is sent
+POSITION_TOLERANCE = 0.5
+
+# Smallest change in velocity (in pixels per second) that is sent to clients.
+# Smaller changes are covered by sending positions when prediction drifts.
+VELOCITY_TOLERANCE = 2
+
+# Smallest change in angle (in degrees) that is sent to clients
+ANGLE_TOLERANCE = 1
+
+# Keys of TICK_STATE data that contain lists of object states
+OBJECT_KEYS = ["agents", "projectiles"]
+
+
+def _round_floats(value):
+    """Rounds all floats in a json dict to FLOAT_PRECISION decimal places."""
+    if isinstance(value, float):
+        return round(value, FLOAT_PRECISION)
+    if isinstance(value, dict):
+        return {key: _round_floats(item) for key, item in value.items()}
+    return value
+
+
+def _distance(vector_1, vector_2):
+    """Returns the distance between two json dict vectors."""
+    x = vector_1["x"] - vector_2["x"]
+    y = vector_1["y"] - vector_2["y"]
+    return (x * x + y * y) ** 0.5
+
+
+def _advance(state, dt):
+    """Moves the position of a json dict state by its velocity for one tick.
+
+    This must perform the exact same floating point operations as the client so
+    that both sides predict identical positions.
+    """
+    position = state["position"]
+    velocity = state["velocity"]
+    state["position"] = {
+        "x": position["x"] + velocity["x"] * dt,
+        "y": position["y"] + velocity["y"] * dt,
+    }
+
+
+class StateEncoder():
+    """Turns the object states of each tick into keyframes and deltas.
+
+    Keeps a mirror of the state that clients have reconstructed so far. Every
+    client must receive every frame produced by the encoder for the mirror to
+    stay correct.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL, dt=1 / TICKS_PER_SECOND):
+        """Constructor
+
+        Arguments:
+            keyframe_interval: number of ticks between keyframes.
+            dt: simulated time between ticks, used to predict positions.
+        """
+        self.keyframe_interval = keyframe_interval
+        self.dt = dt
+        # For each key in OBJECT_KEYS, a dict mapping object ids to the json
+        # dict state that clients currently have for the object.
+        self.mirror = {key: {} for key in OBJECT_KEYS}
+        # Number of frames since the last keyframe. None forces a keyframe.
+        self.frames_since_keyframe = None
+
+    def request_keyframe(self):
+        """Makes the next frame a keyframe."""
+        self.frames_since_keyframe = None
+
+    def encode(self, agent_states, projectile_states, destroyed):
+        """Encodes the state of one tick.
+
+        Arguments:
+            agent_states: list of AgentStates.
+            projectile_states: list of ProjectileStates.
+            destroyed: list of destroyed objects (see Message.DESTROY).
+        Returns:
+            data for a TICK_STATE message.
+        """
+        keyframe = self.frames_since_keyframe is None or self.frames_since_keyframe + 1 >= self.keyframe_interval
+        data = {}
+        if keyframe:
+            data["keyframe"] = True
+            data["dt"] = self.dt
+            self.frames_since_keyframe = 0
+        else:
+            self.frames_since_keyframe += 1
+
+        for key, states in zip(OBJECT_KEYS, [agent_states, projectile_states]):
+            data[key] = self._encode_objects(self.mirror[key], states, keyframe)
+        data["destroyed"] = destroyed
+
+        if not keyframe:
+            # Most deltas are empty, so leave out empty lists entirely.
+            for key in OBJECT_KEYS + ["destroyed"]:
+                if not data[key]:
+                    del data[key]
+        return data
+
+    def get_keyframe(self, destroyed):
+        """Returns a keyframe of the state that clients have reconstructed
+        after the last frame, for clients that did not receive every frame
+        (e.g. spectators). Deltas encoded afterwards apply to it.
+
+        The keyframe shares dicts with the mirror, so it must be serialized
+        before the next frame is encoded.
+
+        Arguments:
+            destroyed: list of destroyed objects sent with the last frame.
+        Returns:
+            data for a TICK_STATE message.
+        """
+        data = {"keyframe": True, "dt": self.dt}
+        for key in OBJECT_KEYS:
+            data[key] = list(self.mirror[key].values())
+        data["destroyed"] = destroyed
+        return data
+
+    def _encode_objects(self, mirror, states, keyframe):
+        """Returns the list of full or partial json dicts to send for states
+        and updates the mirror to match.
+        """
+        encoded = []
+        live_ids = set()
+        for state in states:
+            current = _round_floats(state.to_json_dict())
+            live_ids.add(current["id"])
+            previous = mirror.get(current["id"])
+            if keyframe or previous is None:
+                mirror[current["id"]] = current
+                encoded.append(current)
+                continue
+
+            # Predict where the client thinks the object is now.
+            _advance(previous, self.dt)
+            delta = {}
+            for field, value in current.items():
+                if field == "position":
+                    if _distance(value, previous[field]) <= POSITION_TOLERANCE:
+                        continue
+                elif field == "velocity":
+                    if _distance(value, previous[field]) < VELOCITY_TOLERANCE:
+                        continue
+                elif field == "angle":
+                    if abs((value - previous[field] + 180) % 360 - 180) < ANGLE_TOLERANCE:
+                        continue
+                elif previous[field] == value:
+                    continue
+                delta[field] = value
+                previous[field] = value
+            if delta:
+                delta["id"] = current["id"]
+                encoded.append(delta)
+
+        # Forget objects that no longer exist.
+        for object_id in list(mirror):
+            if object_id not in live_ids:
+                del mirror[object_id]
+        return encoded
+
+
+class StateDecoder():
+    """Reconstructs full object states from keyframes and deltas. Mirrors the
+    logic in the JS client.
+    """
+
+    def __init__(self):
+        # For each key in OBJECT_KEYS, a dict mapping object ids to json dict states
+        self.states = {key: {} for key in OBJECT_KEYS}
+        self.dt = None
+
+    def decode(self, data):
+        """Applies the data of one TICK_STATE message.
+
+        Returns:
+            dict mapping each key in OBJECT_KEYS to the list of reconstructed
+            json dict states.
+        """
+        keyframe = data.get("keyframe", False)
+        if keyframe:
+            self.dt = data["dt"]
+            self.states = {key: {} for key in OBJECT_KEYS}
+        elif self.dt is None:
+            raise ValueError("Received a delta before the first keyframe")
+
+        for key in OBJECT_KEYS:
+            states = self.states[key]
+            if not keyframe:
+                for state in states.values():
+                    _advance(state, self.dt)
+            for update in data.get(key, []):
+                if update["id"] in states:
+                    states[update["id"]].update(update)
+                else:
+                    states[update["id"]] = dict(update)
+
+        # Destroyed agents are still sent by the game, only projectiles are
+        # removed.
+        for destroyed in data.get("destroyed", []):
+            if destroyed["type"] == "projectile":
+                self.states["projectiles"].pop(destroyed["id"], None)
+
+        return {key: list(self.states[key].values()) for key in OBJECT_KEYS}
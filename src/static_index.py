@@ -0,0 +1,191 @@
+"""
+Spatial index of the objects that never move.
+
+Obstacles and game boundaries are stored as rectangles. A boundary is a
+segment with a radius, stored as the rectangle of the segment and its radius.
+From these rectangles the index builds, on first use:
+- the rectangles grown by PROJECTILE_RADIUS, and a grid of the grown rectangles
+  that overlap each cell, used by ProjectileEngine to find what projectiles
+  hit.
+- for each scan distance, a grid of the objects that may be within that
+  distance of some point of each cell, used by agent scans.
+
+Building the grids is the expensive part, so a GameMap builds its indexes once
+and every game played on the map shares them. A frozen index is never changed;
+copy it to add or remove objects.
+
+Part of the implementation of the following requirements:
+FR8 - Agent.RangedAttack
+FR14 - Map.Walls
+"""
+
+from src.globals import *
+
+# Width and height in pixels of the cells of the grids
+CELL_SIZE = 64
+
+
+def _grid(entries, margin):
+    """Returns a dictionary mapping (column, row) of grid cells to the entries
+    whose rectangle, grown by margin plus the entry's radius, overlaps the
+    cell.
+
+    Arguments:
+        entries: iterable of (left, bottom, right, top, radius, ...) tuples.
+        margin: distance added to every side of the rectangles.
+    """
+    cells = {}
+    for entry in entries:
+        left, bottom, right, top, radius = entry[:5]
+        grow = margin + radius
+        for column in range(int((left - grow) // CELL_SIZE), int((right + grow) // CELL_SIZE) + 1):
+            for row in range(int((bottom - grow) // CELL_SIZE), int((top + grow) // CELL_SIZE) + 1):
+                cells.setdefault((column, row), []).append(entry)
+    return cells
+
+
+class StaticIndex():
+    """Rectangles of static objects and the grids used to find them."""
+
+    def __init__(self, entries=None, frozen=False):
+        """Constructor
+
+        Arguments:
+            entries (optional): dictionary mapping object ids to (left, bottom,
+                right, top, radius, obstacle) tuples.
+            frozen (optional): if True, the index can not be changed.
+        """
+        # Dictionary mapping ids of obstacles to (left, bottom, right, top,
+        # radius, obstacle) tuples
+        self.entries = dict(entries) if entries else {}
+        self.frozen = frozen
+        # Dictionary mapping ids of obstacles to pairs of the obstacle's
+        # rectangle grown by its radius and PROJECTILE_RADIUS and the obstacle
+        self.projectile_boxes = None
+        # Grid of the entries of projectile_boxes
+        self.projectile_cells = None
+        # Dictionary mapping scan distances to grids of entries
+        self.scan_cells = {}
+        # Thickness of the thinnest object
+        self.min_thickness = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, object_id):
+        return object_id in self.entries
+
+    def copy(self):
+        """Returns an index with the same objects that can be changed."""
+        return StaticIndex(self.entries)
+
+    def freeze(self, scan_distances=()):
+        """Builds the grid for projectiles and the grids for scan_distances
+        and prevents further changes, so the index can be shared.
+
+        Arguments:
+            scan_distances (optional): the scan distances to build grids for.
+        Returns:
+            The index.
+        """
+        self.get_projectile_cells()
+        self.get_min_thickness()
+        for distance in scan_distances:
+            self.get_scan_cells(distance)
+        self.frozen = True
+        return self
+
+    def add(self, obstacle, left, bottom, right, top, radius=0):
+        """Adds the rectangle of a static object.
+
+        Arguments:
+            obstacle: the Obstacle reported by scans and projectile hits.
+            left, bottom, right, top: edges of the rectangle.
+            radius (optional): distance around the rectangle that is part of
+                the object.
+        """
+        if self.frozen:
+            raise ValueError("Can not change a frozen StaticIndex")
+        self.entries[obstacle.id] = (left, bottom, right, top, radius, obstacle)
+        self._clear()
+
+    def remove(self, object_id):
+        """Returns True if the object was removed, False if it was not
+        found."""
+        if self.frozen:
+            raise ValueError("Can not change a frozen StaticIndex")
+        if self.entries.pop(object_id, None) is None:
+            return False
+        self._clear()
+        return True
+
+    def _clear(self):
+        self.projectile_boxes = None
+        self.projectile_cells = None
+        self.scan_cells = {}
+        self.min_thickness = None
+
+    def get_min_thickness(self):
+        """Returns the smallest width or height of any object, including its
+        radius, or infinity if the index is empty."""
+        if self.min_thickness is None:
+            self.min_thickness = min(
+                (min(right - left, top - bottom) + 2 * radius for left, bottom, right, top, radius, _ in self.entries.values()),
+                default=float("inf")
+            )
+        return self.min_thickness
+
+    def get_projectile_boxes(self):
+        """Returns the dictionary of rectangles that stop projectiles. Rounded
+        boundaries are treated as their bounding boxes."""
+        if self.projectile_boxes is None:
+            self.projectile_boxes = {
+                object_id: ((left - radius - PROJECTILE_RADIUS, bottom - radius - PROJECTILE_RADIUS, right + radius + PROJECTILE_RADIUS, top + radius + PROJECTILE_RADIUS), obstacle)
+                for object_id, (left, bottom, right, top, radius, obstacle) in self.entries.items()
+            }
+        return self.projectile_boxes
+
+    def get_projectile_cells(self):
+        """Returns the grid of the entries of get_projectile_boxes()."""
+        if self.projectile_cells is None:
+            self.projectile_cells = {}
+            for entry in self.get_projectile_boxes().values():
+                left, bottom, right, top = entry[0]
+                for column in range(int(left // CELL_SIZE), int(right // CELL_SIZE) + 1):
+                    for row in range(int(bottom // CELL_SIZE), int(top // CELL_SIZE) + 1):
+                        self.projectile_cells.setdefault((column, row), []).append(entry)
+        return self.projectile_cells
+
+    def get_scan_cells(self, distance):
+        """Returns a grid of the entries that may be within distance of a point
+        in each cell."""
+        cells = self.scan_cells.get(distance)
+        if cells is None:
+            cells = _grid(self.entries.values(), distance)
+            self.scan_cells[distance] = cells
+        return cells
+
+    def scan(self, x, y, distance):
+        """Returns the obstacles within distance of (x, y). The distance to a
+        rounded boundary is the distance to its segment minus its radius, the
+        same as pymunk's point queries.
+        """
+        hits = []
+        candidates = self.get_scan_cells(distance).get((int(x // CELL_SIZE), int(y // CELL_SIZE)), ())
+        for left, bottom, right, top, radius, obstacle in candidates:
+            if x < left:
+                offset_x = left - x
+            elif x > right:
+                offset_x = x - right
+            else:
+                offset_x = 0
+            if y < bottom:
+                offset_y = bottom - y
+            elif y > top:
+                offset_y = y - top
+            else:
+                offset_y = 0
+            reach = distance + radius
+            if offset_x * offset_x + offset_y * offset_y <= reach * reach:
+                hits.append(obstacle)
+        return hits
@@ -0,0 +1,131 @@
+"""
+Policies deciding how many substeps PhysicsEngine.step divides a tick into.
+
+pymunk detects collisions between agents and obstacles only at the end of each
+step it takes, so an agent that moves further than the size of the smallest
+collider in one step can pass through it. Splitting a tick into substeps costs
+one pymunk step per substep and makes this less likely:
+- FixedStepPolicy always uses the same number of substeps.
+- AdaptiveStepPolicy uses as many substeps as needed for the fastest agent to
+  move at most a fraction of the smallest collider per substep. Projectiles are
+  not taken into account since ProjectileEngine sweeps their whole path.
+
+The policy of a deployment can be chosen with the PHYSICS_STEP_POLICY
+environment variable, see parse_step_policy.
+
+Part of the implementation of the following requirements:
+FR11 - Agent.Movement
+FR14 - Map.Walls
+"""
+
+import os
+from math import ceil, sqrt
+
+# Largest number of substeps AdaptiveStepPolicy takes per step by default
+MAX_SUBSTEPS = 8
+# Default fraction of the smallest collider that the fastest agent may move in
+# one substep
+MAX_TRAVEL = 0.5
+
+
+class StepStats():
+    """Statistics about the substeps taken by a PhysicsEngine."""
+
+    def __init__(self):
+        # Number of calls to PhysicsEngine.step
+        self.steps = 0
+        # Total number of substeps taken
+        self.substeps = 0
+        self.max_substeps = 0
+
+    def record_step(self, substeps):
+        self.steps += 1
+        self.substeps += substeps
+        self.max_substeps = max(self.max_substeps, substeps)
+
+    def get_mean_substeps(self):
+        if self.steps == 0:
+            return 0
+        return self.substeps / self.steps
+
+    def to_json_dict(self):
+        json_dict = {
+            'steps': self.steps,
+            'substeps': self.substeps,
+            'mean_substeps': self.get_mean_substeps(),
+            'max_substeps': self.max_substeps,
+        }
+        return json_dict
+
+
+class FixedStepPolicy():
+    """Divides every step into the same number of substeps."""
+
+    def __init__(self, substeps=1):
+        """Constructor
+
+        Arguments:
+            substeps: number of substeps per step. At least 1.
+        """
+        if substeps < 1:
+            raise ValueError(f"Number of substeps must be at least 1, got {substeps}")
+        self.substeps = substeps
+
+    def get_substeps(self, physics_engine, time_increment):
+        return self.substeps
+
+
+class AdaptiveStepPolicy():
+    """Divides steps so that agents move at most a fraction of the smallest
+    collider per substep."""
+
+    def __init__(self, max_travel=MAX_TRAVEL, max_substeps=MAX_SUBSTEPS):
+        """Constructor
+
+        Arguments:
+            max_travel: fraction of the size of the smallest collider that the
+                fastest agent may move in one substep.
+            max_substeps: upper limit on the number of substeps per step, which
+                bounds the cost of a step.
+        """
+        self.max_travel = max_travel
+        self.max_substeps = max_substeps
+
+    def get_substeps(self, physics_engine, time_increment):
+        agents = physics_engine.dynamic_objects
+        max_speed_squared = 0
+        for velocity_x, velocity_y in zip(agents.velocity_x, agents.velocity_y):
+            speed_squared = velocity_x * velocity_x + velocity_y * velocity_y
+            if speed_squared > max_speed_squared:
+                max_speed_squared = speed_squared
+        if max_speed_squared == 0:
+            return 1
+        travel = sqrt(max_speed_squared) * time_increment
+        allowed_travel = self.max_travel * physics_engine.get_smallest_collider_size()
+        return max(1, min(self.max_substeps, ceil(travel / allowed_travel)))
+
+
+def parse_step_policy(spec):
+    """Returns the step policy described by spec.
+
+    Arguments:
+        spec: "<n>" for FixedStepPolicy(n), or "adaptive" or
+            "adaptive:<max substeps>" for an AdaptiveStepPolicy.
+    Raises:
+        ValueError: if spec is not valid.
+    """
+    name, _, argument = spec.strip().partition(":")
+    if name == "adaptive":
+        if argument:
+            return AdaptiveStepPolicy(max_substeps=int(argument))
+        return AdaptiveStepPolicy()
+    return FixedStepPolicy(int(name))
+
+
+def get_default_step_policy():
+    """Returns the policy set by the PHYSICS_STEP_POLICY environment variable,
+    or a single step per tick if it is not set."""
+    spec = os.environ.get("PHYSICS_STEP_POLICY", "")
+    if spec == "":
+        return FixedStepPolicy()
+    return parse_step_policy(spec)
@@ -0,0 +1,140 @@
+"""
+Runs a game loop at a fixed tick rate.
+
+Ticks are scheduled against absolute deadlines on the event loop clock instead
+of sleeping a fixed interval after each tick, so the time spent doing tick work
+does not slow the simulation down. When the loop falls behind (e.g. because a
+player's run() was slow), the missed ticks are simulated back-to-back and only
+the last of them is broadcast to clients. If the loop falls so far behind that
+more than max_catch_up_ticks would be needed, the extra ticks are dropped and
+the schedule is reset so that a single stall cannot cause a long burst of
+catch-up work.
+
+Part of the implementation of the following requirements:
+FR2 - UI.RunGame
+FR4 - UI.ConsistentState
+"""
+
+import asyncio
+from time import perf_counter
+
+import tornado.ioloop
+
+from src.globals import *
+
+# Maximum number of extra ticks simulated in one go to catch up with the schedule
+MAX_CATCH_UP_TICKS = 5
+
+
+class TickStats():
+    """Statistics about how well a TickScheduler kept to its schedule."""
+
+    def __init__(self):
+        # Number of ticks simulated
+        self.ticks = 0
+        # Number of ticks that were broadcast to clients
+        self.broadcasts = 0
+        # Number of ticks simulated without a broadcast to catch up
+        self.catch_up_ticks = 0
+        # Number of ticks that were skipped because the loop was too far behind
+        self.dropped_ticks = 0
+        # Number of times the loop woke up after the deadline of a later tick
+        self.late_wakeups = 0
+        # Lag in seconds between each tick's deadline and when it started
+        self.total_lag = 0
+        self.max_lag = 0
+        # Total time in seconds spent running the tick function
+        self.busy_time = 0
+
+    def record_tick(self, lag, broadcast):
+        self.ticks += 1
+        if broadcast:
+            self.broadcasts += 1
+        else:
+            self.catch_up_ticks += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def get_mean_lag(self):
+        if self.ticks == 0:
+            return 0
+        return self.total_lag / self.ticks
+
+    def to_json_dict(self):
+        json_dict = {
+            'ticks': self.ticks,
+            'broadcasts': self.broadcasts,
+            'catch_up_ticks': self.catch_up_ticks,
+            'dropped_ticks': self.dropped_ticks,
+            'late_wakeups': self.late_wakeups,
+            'mean_lag': self.get_mean_lag(),
+            'max_lag': self.max_lag,
+            'busy_time': self.busy_time,
+        }
+        return json_dict
+
+
+class TickScheduler():
+    """Calls a tick function at a fixed rate on the current event loop."""
+
+    def __init__(self, tick, tick_rate=TICKS_PER_SECOND, max_catch_up_ticks=MAX_CATCH_UP_TICKS, clock=None):
+        """Constructor
+
+        Arguments:
+            tick: function taking a bool argument broadcast which simulates
+                one tick and returns True when the loop should stop. broadcast
+                is False for catch-up ticks that clients will not see.
+            tick_rate: number of ticks per second.
+            max_catch_up_ticks: maximum number of extra ticks simulated
+                back-to-back when the loop is behind schedule.
+            clock: function returning the current time in seconds. Defaults to
+                the time of the current tornado IOLoop.
+        """
+        self.tick = tick
+        self.interval = 1 / tick_rate
+        self.max_catch_up_ticks = max_catch_up_ticks
+        self.clock = clock
+        self.stats = TickStats()
+        # Time at which the next tick should start
+        self.next_deadline = None
+
+    def get_time(self):
+        if self.clock is None:
+            return tornado.ioloop.IOLoop.current().time()
+        return self.clock()
+
+    def get_ticks_due(self, now):
+        """Returns the number of ticks that should be simulated at time now.
+
+        Ticks beyond max_catch_up_ticks are dropped by moving the schedule
+        forward.
+        """
+        if now < self.next_deadline:
+            return 0
+        due = int((now - self.next_deadline) / self.interval) + 1
+        if due > 1:
+            self.stats.late_wakeups += 1
+        max_due = self.max_catch_up_ticks + 1
+        if due > max_due:
+            dropped = due - max_due
+            self.stats.dropped_ticks += dropped
+            self.next_deadline += dropped * self.interval
+            due = max_due
+        return due
+
+    async def run(self):
+        """Runs the tick function until it returns True."""
+        self.next_deadline = self.get_time()
+        while True:
+            now = self.get_time()
+            due = self.get_ticks_due(now)
+            for i in range(due):
+                broadcast = i == due - 1
+                self.stats.record_tick(max(0, now - self.next_deadline), broadcast)
+                self.next_deadline += self.interval
+                start = perf_counter()
+                done = self.tick(broadcast)
+                self.stats.busy_time += perf_counter() - start
+                if done:
+                    return
+            await asyncio.sleep(max(0, self.next_deadline - self.get_time()))
@@ -0,0 +1,321 @@
+"""
+Runs tournaments between a pool of submitted Agent subclasses.
+
+Matches are simulated headlessly and farmed out to a pool of worker processes.
+Every match creates its own Game (and therefore its own physics engine) inside
+the worker process that plays it. With --physics-backend simple, workers never
+import pymunk or pygame.
+
+Usage:
+    python3 -m src.tournament test/agent_code/agent1.py test/agent_code/agent2.py test/agent_code/agent3.py
+    python3 -m src.tournament --format swiss --rounds 3 --workers 4 agents/*.py
+
+An agent file may contain more than one Agent subclass. In that case, the class
+to use can be given after a colon, e.g. my_agents.py:MyAgent
+
+Supports the implementation of the following requirements:
+FR15 - Agent.Elimination
+FR16 - Agent.Win
+"""
+
+import argparse
+import ast
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.globals import *
+from src.headless import DEFAULT_MAX_TICKS, run_match
+from src.physics_backend import PYMUNK_BACKEND, SIMPLE_BACKEND
+
+ROUND_ROBIN = "round-robin"
+SWISS = "swiss"
+
+POINTS_WIN = 1
+POINTS_TIE = 0.5
+POINTS_LOSS = 0
+
+
+class Entrant():
+    """A player agent taking part in a tournament."""
+
+    def __init__(self, name, code, class_name):
+        """Constructor
+
+        Arguments:
+            name: unique name used to identify the entrant in standings.
+            code: player code as string.
+            class_name: name of the Agent subclass defined in code.
+        """
+        self.name = name
+        self.code = code
+        self.class_name = class_name
+
+
+class Standing():
+    """Accumulated results for one entrant."""
+
+    def __init__(self, name):
+        self.name = name
+        self.wins = 0
+        self.ties = 0
+        self.losses = 0
+        self.errors = 0
+        self.byes = 0
+        self.points = 0
+        self.matches = 0
+        # Sum of the time survived in each match. Entrants that are never
+        # eliminated survive for the full length of the match.
+        self.total_survival_time = 0
+        # Names of entrants that have already been played
+        self.opponents = set()
+
+    def get_average_survival_time(self):
+        if self.matches == 0:
+            return None
+        return self.total_survival_time / self.matches
+
+    def to_json_dict(self):
+        json_dict = {
+            'name': self.name,
+            'points': self.points,
+            'wins': self.wins,
+            'ties': self.ties,
+            'losses': self.losses,
+            'errors': self.errors,
+            'byes': self.byes,
+            'matches': self.matches,
+            'average_survival_time': self.get_average_survival_time(),
+        }
+        return json_dict
+
+
+def load_entrant(spec):
+    """Creates an Entrant from a file path, optionally followed by
+    ':ClassName'. If no class name is given, the file must define exactly one
+    subclass of Agent.
+    """
+    path, _, class_name = spec.partition(":")
+    with open(path) as f:
+        code = f.read()
+
+    if class_name == "":
+        # Find the class without running player code in this process.
+        tree = ast.parse(code, path)
+        agent_classes = [
+            node.name for node in tree.body
+            if isinstance(node, ast.ClassDef)
+            and any(isinstance(base, ast.Name) and base.id == "Agent" for base in node.bases)
+        ]
+        if len(agent_classes) != 1:
+            raise ValueError(f"{path} must define exactly one Agent subclass. Use {path}:ClassName to choose one.")
+        class_name = agent_classes[0]
+
+    name = f"{os.path.splitext(os.path.basename(path))[0]}:{class_name}"
+    return Entrant(name, code, class_name)
+
+
+def play_match(pairing):
+    """Plays a single match. Runs in a worker process.
+
+    Arguments:
+        pairing: tuple (entrant_1, entrant_2, max_ticks, physics_backend)
+    Returns:
+        The match result as a dict (see MatchResult.to_json_dict)
+    """
+    entrant_1, entrant_2, max_ticks, physics_backend = pairing
+    result = run_match(
+        (entrant_1.code, entrant_1.class_name),
+        (entrant_2.code, entrant_2.class_name),
+        max_ticks=max_ticks,
+        physics_backend=physics_backend
+    )
+    return result.to_json_dict()
+
+
+class Tournament():
+    """Schedules matches between entrants and collects standings."""
+
+    def __init__(self, entrants, max_ticks=DEFAULT_MAX_TICKS, workers=None, physics_backend=None):
+        """Constructor
+
+        Arguments:
+            entrants: list of Entrant instances. Names must be unique.
+            max_ticks: maximum length of each match in ticks.
+            workers: number of worker processes. Defaults to the number of CPUs.
+            physics_backend: name of the physics backend used by every match.
+                Defaults to the PHYSICS_BACKEND environment variable.
+        """
+        names = [entrant.name for entrant in entrants]
+        if len(set(names)) != len(names):
+            raise ValueError("Entrant names must be unique")
+        self.entrants = entrants
+        self.max_ticks = max_ticks
+        self.workers = workers
+        self.physics_backend = physics_backend
+        self.standings = {entrant.name: Standing(entrant.name) for entrant in entrants}
+        # List of (entrant_1 name, entrant_2 name, result dict)
+        self.match_log = []
+
+    def run_round_robin(self, games_per_pair=2):
+        """Plays every entrant against every other entrant.
+
+        Arguments:
+            games_per_pair: number of matches per pair of entrants. Sides
+                alternate between matches so that neither entrant always
+                gets the same starting position.
+        """
+        pairings = []
+        for i in range(len(self.entrants)):
+            for j in range(i + 1, len(self.entrants)):
+                for game in range(games_per_pair):
+                    if game % 2 == 0:
+                        pairings.append((self.entrants[i], self.entrants[j]))
+                    else:
+                        pairings.append((self.entrants[j], self.entrants[i]))
+
+        with self._create_executor() as executor:
+            self._play(executor, pairings)
+
+    def run_swiss(self, rounds=None):
+        """Plays a Swiss-system tournament. Each round, entrants with similar
+        scores are paired against each other, avoiding rematches where possible.
+
+        Arguments:
+            rounds: number of rounds. Defaults to ceil(log2(number of entrants)).
+        """
+        if rounds is None:
+            rounds = max(1, math.ceil(math.log2(max(len(self.entrants), 2))))
+
+        with self._create_executor() as executor:
+            for _ in range(rounds):
+                pairings, bye = self.get_swiss_pairings()
+                if bye is not None:
+                    standing = self.standings[bye.name]
+                    standing.byes += 1
+                    standing.points += POINTS_WIN
+                self._play(executor, pairings)
+
+    def get_swiss_pairings(self):
+        """Pairs entrants for the next Swiss round.
+
+        Returns:
+            (pairings, bye) where pairings is a list of (entrant_1, entrant_2)
+            tuples and bye is the entrant without an opponent this round or
+            None.
+        """
+        # Sort by points. Ties keep the original entrant order so that
+        # pairings are deterministic.
+        order = {entrant.name: i for i, entrant in enumerate(self.entrants)}
+        unpaired = sorted(
+            self.entrants,
+            key=lambda entrant: (-self.standings[entrant.name].points, order[entrant.name])
+        )
+
+        bye = None
+        if len(unpaired) % 2 == 1:
+            # The lowest ranked entrant that has not had a bye yet sits out.
+            candidates = [entrant for entrant in unpaired if self.standings[entrant.name].byes == 0]
+            bye = (candidates or unpaired)[-1]
+            unpaired.remove(bye)
+
+        pairings = []
+        while unpaired:
+            entrant = unpaired.pop(0)
+            opponents = self.standings[entrant.name].opponents
+            # Closest ranked opponent that has not been played yet
+            opponent = next((other for other in unpaired if other.name not in opponents), unpaired[0])
+            unpaired.remove(opponent)
+            # Alternate sides based on how many matches have been played
+            if self.standings[entrant.name].matches % 2 == 0:
+                pairings.append((entrant, opponent))
+            else:
+                pairings.append((opponent, entrant))
+        return pairings, bye
+
+    def get_standings(self):
+        """Returns the list of standings sorted from first to last place."""
+        return sorted(
+            self.standings.values(),
+            key=lambda standing: (-standing.points, -standing.wins, -(standing.get_average_survival_time() or 0))
+        )
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _play(self, executor, pairings):
+        """Plays the given pairings in parallel and records the results."""
+        jobs = [(entrant_1, entrant_2, self.max_ticks, self.physics_backend) for entrant_1, entrant_2 in pairings]
+        # Send several matches to a worker at a time to amortize the IPC cost.
+        workers = self.workers or os.cpu_count() or 1
+        chunksize = max(1, len(jobs) // (4 * workers))
+        for (entrant_1, entrant_2), result in zip(pairings, executor.map(play_match, jobs, chunksize=chunksize)):
+            self.record_result(entrant_1.name, entrant_2.name, result)
+
+    def record_result(self, name_1, name_2, result):
+        """Updates standings with the result dict of a match between the
+        entrants with the given names.
+        """
+        self.match_log.append((name_1, name_2, result))
+        match_time = result["ticks"] / TICKS_PER_SECOND
+        for i, (name, opponent) in enumerate([(name_1, name_2), (name_2, name_1)]):
+            standing = self.standings[name]
+            standing.matches += 1
+            standing.opponents.add(opponent)
+            if result["error"] and result["winner"] != i:
+                standing.errors += 1
+            if result["tie"]:
+                standing.ties += 1
+                standing.points += POINTS_TIE
+            elif result["winner"] == i:
+                standing.wins += 1
+                standing.points += POINTS_WIN
+            else:
+                standing.losses += 1
+                standing.points += POINTS_LOSS
+            survival_time = result["survival_times"][i]
+            standing.total_survival_time += match_time if survival_time is None else survival_time
+
+
+def format_standings(standings):
+    """Returns the standings as a text table."""
+    lines = [f"{'#':>3} {'entrant':<30} {'points':>7} {'W':>4} {'T':>4} {'L':>4} {'err':>4} {'avg survival (s)':>17}"]
+    for place, standing in enumerate(standings, start=1):
+        survival = standing.get_average_survival_time()
+        survival = "-" if survival is None else f"{survival:.2f}"
+        lines.append(
+            f"{place:>3} {standing.name:<30} {standing.points:>7g} {standing.wins:>4} {standing.ties:>4} "
+            f"{standing.losses:>4} {standing.errors:>4} {survival:>17}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a tournament between player agents.")
+    parser.add_argument("agents", nargs="+", help="Agent code files, optionally followed by :ClassName")
+    parser.add_argument("--format", choices=[ROUND_ROBIN, SWISS], default=ROUND_ROBIN, help="Tournament format.")
+    parser.add_argument("--rounds", type=int, default=None, help="Number of Swiss rounds.")
+    parser.add_argument("--games-per-pair", type=int, default=2, help="Matches per pair in a round robin.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS, help="Maximum length of a match in ticks.")
+    parser.add_argument("--physics-backend", choices=[PYMUNK_BACKEND, SIMPLE_BACKEND], default=None, help="Physics backend of every match. Defaults to the PHYSICS_BACKEND environment variable, or pymunk.")
+    parser.add_argument("--json", action="store_true", help="Print standings as JSON instead of a table.")
+    args = parser.parse_args()
+
+    entrants = [load_entrant(spec) for spec in args.agents]
+    tournament = Tournament(entrants, max_ticks=args.max_ticks, workers=args.workers, physics_backend=args.physics_backend)
+    if args.format == SWISS:
+        tournament.run_swiss(args.rounds)
+    else:
+        tournament.run_round_robin(args.games_per_pair)
+
+    standings = tournament.get_standings()
+    if args.json:
+        print(json.dumps([standing.to_json_dict() for standing in standings]))
+    else:
+        print(format_standings(standings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.binary_frame import *
+from src.game import *
+from src.message import Message
+from src.vector2 import Vector2
+
+
+class TestBinaryFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.agents = [
+            AgentState(0, Vector2(100.3, 200.7), Vector2(-50.2, 10), 90, True, "MyAgent"),
+            AgentState(1, Vector2(1000, 20), Vector2(0, 0), 100, False, None),
+        ]
+        self.projectiles = [ProjectileState(2, Vector2(-5.5, 300), Vector2(-1000, 3), 0)]
+        self.destroyed = [{"id": 3, "type": "projectile"}]
+
+    def assertVectorAlmostEqual(self, json_vector, vector):
+        self.assertAlmostEqual(json_vector["x"], vector.x, delta=1 / VECTOR_SCALE)
+        self.assertAlmostEqual(json_vector["y"], vector.y, delta=1 / VECTOR_SCALE)
+
+    def test_round_trip(self):
+        frame = encode_tick_state(42, self.agents, self.projectiles, self.destroyed, include_names=True)
+        data = decode_tick_state(frame)
+        self.assertTrue(data["keyframe"])
+        self.assertEqual(data["tick"], 42)
+        for decoded, agent in zip(data["agents"], self.agents):
+            self.assertEqual(decoded["id"], agent.id)
+            self.assertVectorAlmostEqual(decoded["position"], agent.position)
+            self.assertVectorAlmostEqual(decoded["velocity"], agent.velocity)
+            self.assertAlmostEqual(decoded["angle"], agent.angle % 360, delta=1 / ANGLE_SCALE)
+            self.assertEqual(decoded["health"], agent.health)
+            self.assertEqual(decoded["shieldEnabled"], agent.shieldEnabled)
+            self.assertEqual(decoded["name"], agent.name or "")
+        decoded = data["projectiles"][0]
+        self.assertEqual(decoded["id"], 2)
+        self.assertEqual(decoded["attackerId"], 0)
+        self.assertVectorAlmostEqual(decoded["position"], self.projectiles[0].position)
+        self.assertAlmostEqual(decoded["angle"], self.projectiles[0].velocity.get_angle() % 360, delta=1 / ANGLE_SCALE)
+        self.assertEqual(data["destroyed"], self.destroyed)
+
+    def test_names_optional(self):
+        with_names = encode_tick_state(0, self.agents, [], [], include_names=True)
+        without_names = encode_tick_state(0, self.agents, [], [], include_names=False)
+        self.assertEqual(len(with_names) - len(without_names), 2 + len("MyAgent"))
+        self.assertNotIn("name", decode_tick_state(without_names)["agents"][0])
+
+    def test_smaller_than_json(self):
+        frame = encode_tick_state(0, self.agents, self.projectiles, self.destroyed, include_names=True)
+        json_str = Message(Message.TICK_STATE, {
+            "agents": [agent.to_json_dict() for agent in self.agents],
+            "projectiles": [projectile.to_json_dict() for projectile in self.projectiles],
+            "destroyed": self.destroyed,
+        }).to_json()
+        self.assertLess(len(frame) * 3, len(json_str))
+
+    def test_game_sends_binary_frames(self):
+        game = Game([])
+        json_client = MagicMock()
+        json_client.frame_format = FORMAT_JSON
+        binary_client = MagicMock()
+        binary_client.frame_format = FORMAT_BINARY
+        agent = Agent(game.gen_id(), game)
+        enemy = Agent(game.gen_id(), game)
+        game.agents = [[json_client, agent], [binary_client, enemy]]
+        game.prepare_to_start_simulation()
+        game.tick()
+
+        json_client.send_encoded.assert_called_once()
+        payload = json_client.send_encoded.call_args.args[0]
+        self.assertEqual(Message.from_json(payload).type, Message.TICK_STATE)
+
+        binary_client.send_encoded.assert_called_once()
+        call = binary_client.send_encoded.call_args
+        self.assertTrue(call.kwargs["binary"])
+        data = decode_tick_state(call.args[0])
+        self.assertEqual(data["tick"], 1)
+        self.assertEqual([state["id"] for state in data["agents"]], [agent.agent_state.id, enemy.agent_state.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+import json
+import unittest
+from collections import deque
+from concurrent.futures import Future
+
+import tornado.gen
+import tornado.testing
+import tornado.web
+import tornado.websocket
+
+from src.broadcast_channel import *
+from src.outbound_queue import TickFrame
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON, decode_tick_state, encode_tick_state
+from src.game import Game
+from src.gameserver import GameServer
+from src.message import Message
+from src.server import SpectatorConnection
+from src.state_encoder import StateDecoder, StateEncoder
+from src.agent_state import AgentState
+from src.vector2 import Vector2
+
+
+class FakeSpectator():
+    """Records payloads. Writes stay in progress until finish_writes is
+    called if the spectator is slow."""
+
+    def __init__(self, frame_format=FORMAT_JSON, slow=False):
+        self.frame_format = frame_format
+        self.slow = slow
+        self.payloads = []
+        self.pending = []
+        self.closed = False
+
+    def write_encoded(self, payload, binary=False):
+        self.payloads.append(payload)
+        if not self.slow:
+            return None
+        future = Future()
+        self.pending.append(future)
+        return future
+
+    def finish_writes(self, exception=None):
+        pending, self.pending = self.pending, []
+        for future in pending:
+            if exception is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exception)
+
+    def close(self, code=None, reason=None):
+        self.closed = True
+
+
+class TestBroadcastChannel(unittest.TestCase):
+
+    def setUp(self):
+        # Spectators are busy while a single write is in flight
+        self.channel = BroadcastChannel(max_in_flight_bytes=1)
+        self.encoder = StateEncoder(keyframe_interval=1000, dt=0.1)
+        self.agent = AgentState(0, Vector2(100, 100), Vector2(10, 0), 100, name="MyAgent")
+        # Decodes every frame, like a player
+        self.player = StateDecoder()
+        self.tick = 0
+
+    def publish(self):
+        """Moves the agent and publishes the next frame like Game does."""
+        self.tick += 1
+        self.agent.position = Vector2(self.agent.position.x + self.agent.velocity.x * 0.1, self.agent.position.y)
+        if self.tick % 3 == 0:
+            self.agent.velocity = Vector2(self.agent.velocity.x, -self.agent.velocity.y + 5)
+        data = self.encoder.encode([self.agent], [], [])
+        json_payload = Message(Message.TICK_STATE, data).to_json()
+        self.player_state = self.player.decode(json.loads(json_payload)["data"])
+        agent_states = [self.agent]
+        frame = TickFrame(
+            json_payload,
+            lambda: Message(Message.TICK_STATE, self.encoder.get_keyframe([])).to_json(),
+            lambda include_names: encode_tick_state(self.tick, agent_states, [], [], include_names)
+        )
+        self.channel.publish_frame(frame)
+        return frame
+
+    def decode(self, spectator):
+        decoder = StateDecoder()
+        for payload in spectator.payloads:
+            decoded = decoder.decode(Message.from_json(payload).data)
+        return decoded
+
+    def test_frames_are_shared(self):
+        spectators = [FakeSpectator() for _ in range(3)]
+        for spectator in spectators:
+            self.channel.add(spectator)
+        for _ in range(5):
+            frame = self.publish()
+        for spectator in spectators:
+            self.assertEqual(len(spectator.payloads), 5)
+            self.assertIs(spectator.payloads[-1], frame.json_payload)
+        self.assertEqual(self.channel.stats.frames_sent, 15)
+
+    def test_late_spectator_gets_keyframe(self):
+        for _ in range(5):
+            self.publish()
+        spectator = FakeSpectator()
+        self.channel.add(spectator)
+        for _ in range(5):
+            self.publish()
+        self.assertEqual(len(spectator.payloads), 6)
+        self.assertTrue(Message.from_json(spectator.payloads[0]).data["keyframe"])
+        self.assertEqual(self.decode(spectator), self.player_state)
+
+    def test_slow_spectator_frames_are_coalesced(self):
+        spectator = FakeSpectator(slow=True)
+        fast_spectator = FakeSpectator()
+        self.channel.add(spectator)
+        self.channel.add(fast_spectator)
+        self.publish()
+        for _ in range(10):
+            self.publish()
+        # Only the latest frame waits while the first write is in progress
+        self.assertEqual(len(spectator.payloads), 1)
+        self.assertEqual(self.channel.stats.frames_dropped, 9)
+
+        # The latest frame is sent as soon as the write finishes
+        spectator.finish_writes()
+        self.assertEqual(len(spectator.payloads), 2)
+        self.assertTrue(Message.from_json(spectator.payloads[1]).data["keyframe"])
+        spectator.finish_writes()
+        for _ in range(3):
+            self.publish()
+            spectator.finish_writes()
+        self.assertEqual(len(spectator.payloads), 5)
+        self.assertEqual(self.decode(spectator), self.player_state)
+        self.assertEqual(self.decode(fast_spectator), self.player_state)
+        self.assertEqual(len(fast_spectator.payloads), 14)
+
+    def test_binary_spectator(self):
+        spectator = FakeSpectator(FORMAT_BINARY, slow=True)
+        self.channel.add(spectator)
+        for _ in range(3):
+            self.publish()
+        spectator.finish_writes()
+        frames = [decode_tick_state(payload) for payload in spectator.payloads]
+        # Names are only sent in the first frame and frames are full snapshots
+        self.assertEqual([frame["agents"][0].get("name") for frame in frames], ["MyAgent", None])
+        self.assertEqual(frames[-1]["tick"], 3)
+
+    def test_messages(self):
+        spectator = FakeSpectator(slow=True)
+        self.channel.add(spectator)
+        self.publish()
+        self.channel.publish_message("start", replay=True)
+        self.channel.publish_message("results")
+        # Messages wait for busy spectators instead of being skipped
+        self.assertEqual(len(spectator.payloads), 1)
+        spectator.finish_writes()
+        spectator.finish_writes()
+        self.assertEqual(spectator.payloads[1:], ["start", "results"])
+        # Only replayed messages are sent to late spectators, before the latest frame
+        late_spectator = FakeSpectator()
+        self.channel.add(late_spectator)
+        self.assertEqual(late_spectator.payloads[0], "start")
+        self.assertEqual(len(late_spectator.payloads), 2)
+
+    def test_closed_spectator_is_removed(self):
+        spectator = FakeSpectator(slow=True)
+        self.channel.add(spectator)
+        self.publish()
+        self.publish()
+        spectator.finish_writes(ConnectionError())
+        self.assertEqual(len(self.channel), 0)
+        self.assertEqual(len(spectator.payloads), 1)
+
+    def test_close(self):
+        spectator = FakeSpectator()
+        self.channel.add(spectator)
+        self.channel.close()
+        self.assertTrue(spectator.closed)
+        late_spectator = FakeSpectator()
+        self.channel.add(late_spectator)
+        self.assertTrue(late_spectator.closed)
+        self.assertEqual(len(self.channel), 0)
+
+
+class TestFanOut(tornado.testing.AsyncTestCase):
+
+    def publish(self, channel, name):
+        channel.publish_frame(TickFrame(name, lambda: name + " keyframe", None))
+
+    @tornado.testing.gen_test
+    def test_fan_out_in_batches(self):
+        channel = BroadcastChannel()
+        spectators = [FakeSpectator() for _ in range(FAN_OUT_BATCH * 2 + 1)]
+        for spectator in spectators:
+            channel.add(spectator)
+            # Skip the keyframe
+            channel.subscriptions[spectator].synced = True
+
+        self.publish(channel, "frame 1")
+        self.assertEqual([len(spectator.payloads) for spectator in spectators], [1] * FAN_OUT_BATCH + [0] * (FAN_OUT_BATCH + 1))
+        yield tornado.gen.moment
+        self.assertEqual(sum(len(spectator.payloads) for spectator in spectators), FAN_OUT_BATCH * 2)
+
+        # Spectators that were not reached skip to a keyframe of the next frame
+        self.publish(channel, "frame 2")
+        self.assertEqual(spectators[-1].payloads, [])
+        for _ in range(3):
+            yield tornado.gen.moment
+        self.assertEqual(spectators[0].payloads, ["frame 1", "frame 2"])
+        self.assertEqual(spectators[-1].payloads, ["frame 2 keyframe"])
+        self.assertEqual(channel.stats.frames_dropped, 1)
+        self.assertEqual(channel.fan_out_queue, deque())
+
+
+class TestSpectatorConnection(tornado.testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.game_server = GameServer()
+        return tornado.web.Application([(r"/watch/([^/]+)", SpectatorConnection, {"game_server": self.game_server})])
+
+    def connect(self, match_id):
+        return tornado.websocket.websocket_connect(self.get_url(f"/watch/{match_id}").replace("http", "ws"))
+
+    @tornado.testing.gen_test
+    def test_unknown_match(self):
+        connection = yield self.connect("404")
+        self.assertIsNone((yield connection.read_message()))
+        self.assertEqual(connection.close_code, 4004)
+
+    @tornado.testing.gen_test
+    def test_watch_match(self):
+        game = Game([], realtime=False)
+        self.game_server.matches[str(game.match_id)] = game
+        connection = yield self.connect(game.match_id)
+        self.assertEqual(Message.from_json((yield connection.read_message())).type, Message.START_GAME)
+        game.tick()
+        message = Message.from_json((yield connection.read_message()))
+        self.assertEqual(message.type, Message.TICK_STATE)
+        self.assertTrue(message.data["keyframe"])
+
+        game.spectators.close()
+        self.assertIsNone((yield connection.read_message()))
+        game.player_executor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
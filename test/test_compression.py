@@ -0,0 +1,99 @@
+import unittest
+
+import tornado.testing
+import tornado.web
+import tornado.websocket
+
+from src.compression import *
+from src.gameserver import GameServer
+from src.server import WebSocketConnection
+
+
+class TestCompressionSettings(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertIsNone(parse_compression_settings("off"))
+        settings = parse_compression_settings("")
+        self.assertEqual((settings.level, settings.window_bits, settings.min_size), (DEFAULT_LEVEL, DEFAULT_WINDOW_BITS, DEFAULT_MIN_SIZE))
+        settings = parse_compression_settings("level=6, window_bits=15,min_size=0")
+        self.assertEqual((settings.level, settings.window_bits, settings.mem_level, settings.min_size), (6, 15, DEFAULT_MEM_LEVEL, 0))
+        self.assertEqual(
+            settings.get_compression_options(),
+            {"compression_level": 6, "mem_level": DEFAULT_MEM_LEVEL, "max_window_bits": 15, "min_size": 0},
+        )
+
+    def test_parse_invalid(self):
+        for spec in ["fast", "level=10", "window_bits=8", "level=x", "min_size=-1"]:
+            with self.assertRaises(ValueError):
+                parse_compression_settings(spec)
+
+    def test_limit_window_bits(self):
+        cases = [
+            ({}, {"server_max_window_bits": "12"}),
+            ({"client_max_window_bits": None}, {"client_max_window_bits": None, "server_max_window_bits": "12"}),
+            ({"server_max_window_bits": "15"}, {"server_max_window_bits": "12"}),
+            ({"server_max_window_bits": "10"}, {"server_max_window_bits": "10"}),
+        ]
+        for agreed_parameters, expected in cases:
+            limit_window_bits(agreed_parameters, 12)
+            self.assertEqual(agreed_parameters, expected)
+
+    def test_tornado_internals(self):
+        # CompressedWebSocketProtocol overrides these, so a tornado release
+        # that renames them must fail here rather than silently compress
+        # every message with the largest window
+        self.assertTrue(callable(tornado.websocket.WebSocketProtocol13._create_compressors))
+        protocol = CompressedWebSocketProtocol(None, False, tornado.websocket._WebSocketParams())
+        self.assertIsNone(protocol._compressor)
+
+
+class EchoConnection(WebSocketConnection):
+    """Echoes messages and records its instances."""
+
+    connections = []
+
+    def open(self):
+        EchoConnection.connections.append(self)
+
+    def on_message(self, message):
+        self.write_encoded(message)
+
+
+class TestCompressedConnection(tornado.testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        EchoConnection.connections = []
+        self.settings = CompressionSettings(window_bits=10, min_size=32)
+        return tornado.web.Application([(r"/echo", EchoConnection, {"game_server": GameServer(), "compression": self.settings})])
+
+    def connect(self, compression_options):
+        url = self.get_url("/echo").replace("http", "ws")
+        return tornado.websocket.websocket_connect(url, compression_options=compression_options)
+
+    @tornado.testing.gen_test
+    def test_small_messages_are_not_compressed(self):
+        client = yield self.connect({})
+        self.assertEqual(client.headers["Sec-WebSocket-Extensions"], "permessage-deflate; server_max_window_bits=10")
+        messages = ["tiny", "x" * 1000, "also tiny", "y" * 1000]
+        for message in messages:
+            client.write_message(message)
+            self.assertEqual((yield client.read_message()), message)
+        connection = EchoConnection.connections[0].ws_connection
+        self.assertIsInstance(connection, CompressedWebSocketProtocol)
+        self.assertEqual(connection._compressor._max_wbits, 10)
+        # Small messages are sent as is, with 2 bytes of framing
+        self.assertLess(connection._wire_bytes_out, len("tiny") + len("also tiny") + 4 + 100)
+        client.close()
+
+    @tornado.testing.gen_test
+    def test_client_without_compression(self):
+        client = yield self.connect(None)
+        self.assertNotIn("Sec-WebSocket-Extensions", client.headers)
+        client.write_message("x" * 1000)
+        self.assertEqual((yield client.read_message()), "x" * 1000)
+        self.assertEqual(EchoConnection.connections[0].ws_connection._wire_bytes_out, 1004)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.agent_state import *
+from src.dynamic_object_store import *
+from src.projectile_state import *
+from src.vector2 import *
+
+class TestDynamicObjectStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = DynamicObjectStore()
+        self.states = [ProjectileState(i, Vector2(i, 10 * i), Vector2(-i, 0), 0) for i in range(3)]
+        self.bodies = [MagicMock() for _ in self.states]
+        for state, body in zip(self.states, self.bodies):
+            self.store.add(state, body)
+
+    def test_states_are_views(self):
+        state = self.states[1]
+        self.assertEqual(state.position, Vector2(1, 10))
+        state.position = Vector2(5, 6)
+        slot = self.store.slots[1]
+        self.assertEqual((self.store.position_x[slot], self.store.position_y[slot]), (5, 6))
+        self.store.velocity_x[slot] = 7
+        self.assertEqual(state.velocity.x, 7)
+
+    def test_push_only_changed_velocities(self):
+        self.states[2].velocity.x = 3
+        self.states[0].velocity = Vector2(1, 2)
+        self.store.push_velocities()
+        self.assertEqual(self.bodies[0].velocity, (1, 2))
+        self.assertEqual(self.bodies[2].velocity, (3, 0))
+        self.assertIsInstance(self.bodies[1].velocity, MagicMock)
+        self.assertEqual(self.store.dirty_velocities, set())
+
+    def test_pull_positions(self):
+        for i, body in enumerate(self.bodies):
+            body.position = (100 + i, 200 + i)
+        self.store.pull_positions()
+        for i, state in enumerate(self.states):
+            self.assertEqual(state.position, Vector2(100 + i, 200 + i))
+
+    def test_remove_keeps_other_views(self):
+        removed = self.states[0]
+        position = removed.position
+        self.assertTrue(self.store.remove(0))
+        self.assertFalse(self.store.remove(0))
+        self.assertEqual(len(self.store), 2)
+
+        # The removed state keeps its last values and no longer writes to the store
+        self.assertEqual(position, Vector2(0, 0))
+        removed.velocity = Vector2(9, 9)
+        self.assertEqual(removed.velocity, Vector2(9, 9))
+        self.assertEqual(self.store.dirty_velocities, set())
+
+        # The last state was moved into the removed state's slot
+        self.assertEqual(self.states[1].position, Vector2(1, 10))
+        self.assertEqual(self.states[2].position, Vector2(2, 20))
+        self.states[2].velocity.y = 4
+        self.store.push_velocities()
+        self.assertEqual(self.bodies[2].velocity, (-2, 4))
+
+    def test_stop(self):
+        self.store.stop(1)
+        self.store.stop(100)
+        self.assertEqual(self.states[1].velocity, Vector2(0, 0))
+        self.assertEqual(self.store.dirty_velocities, set())
+
+    def test_agent_state_before_add(self):
+        velocity = Vector2(3, 4)
+        agent_state = AgentState(10, Vector2(0, 0), velocity, 100)
+        self.assertIs(agent_state.velocity, velocity)
+        self.store.add(agent_state, MagicMock())
+        self.assertIsNot(agent_state.velocity, velocity)
+        self.assertEqual(agent_state.velocity, velocity)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -162,7 +162,16 @@ improper syntax!!!
         wait = WebDriverWait(self.drivers[1], timeout=60 * 5)
         wait.until(EC.text_to_be_present_in_element((By.ID, "declareWinnerArea"), "It's a Tie!"))
 
-    
+    def test_opponent_leaves_while_coding(self):
+        WebDriverWait(self.drivers[0], timeout=TestFrontend.TIMEOUT).until(lambda d: d.find_element(By.ID, "codeArea").is_displayed())
+        # Leaving the page closes the websocket, which forfeits the game
+        self.drivers[1].get("about:blank")
+
+        wait = WebDriverWait(self.drivers[0], timeout=TestFrontend.TIMEOUT)
+        wait.until(EC.text_to_be_present_in_element((By.ID, "declareWinnerArea"), "You Win, Congratulations!"))
+        self.assertEqual(self.drivers[0].find_element(By.ID, "declareErrorArea").text, "Opponent forfeited.")
+        self.assertIn("A player left before submitting code.", self.drivers[0].find_element(By.ID, "individualResultsArea").text)
+        self.assertFalse(self.drivers[0].find_element(By.ID, "codeInputScreen").is_displayed())
 
 
 if __name__ == '__main__':
@@ -2,9 +2,14 @@ import unittest
 from unittest.mock import MagicMock
 import math
 from time import time
+import os
+import subprocess
 import sys
 
 from src.game import *
+from src.game_map import GameMap
+from src.binary_frame import FORMAT_JSON
+from src.state_encoder import StateDecoder
 from src.vector2 import Vector2
 
 class TestGame(unittest.TestCase):
@@ -14,7 +19,26 @@ class TestGame(unittest.TestCase):
         self.num_boundaries = 4
 
     def mock_agents(self):
-        self.game.agents = [MagicMock(), MagicMock()]
+        self.game.agents = [[MagicMock(), self.mock_agent()], [MagicMock(), self.mock_agent()]]
+
+    def mock_agent(self):
+        """Returns a mock agent whose state can be encoded as json."""
+        agent = MagicMock()
+        agent_state = AgentState(self.game.gen_id(), Vector2(0, 0), Vector2(0, 0), Agent.MAX_HEALTH)
+        agent.agent_state.to_json_dict.return_value = agent_state.to_json_dict()
+        agent.get_position.return_value = agent_state.position
+        return agent
+
+    def test_pygame_only_imported_for_debug_render(self):
+        code = (
+            "import sys\n"
+            "import src.server\n"
+            "from src.game import Game\n"
+            "Game([], physics_backend='pymunk').physics.step(1)\n"
+            "assert 'pygame' not in sys.modules\n"
+        )
+        env = {key: value for key, value in os.environ.items() if key != "GUI"}
+        subprocess.run([sys.executable, "-c", code], check=True, env=env)
 
     def test_exec_player_code_good(self):
         player_code = """
@@ -47,10 +71,57 @@ class MyAgent(Agent):
         self.game.tick()
         for agent_mock in self.game.agents:
             agent_mock[1]._tick.assert_called()
-            agent_mock[0].send_agent_states.assert_called()
-            agent_mock[0].send_projectile_states.assert_called()
+            agent_mock[0].send_encoded.assert_called()
         
-        self.game.physics.scan_area.assert_called()
+        self.game.physics.scan_agent.assert_called()
+
+    def test_broadcast_encodes_once(self):
+        agent = Agent(self.game.gen_id(), self.game)
+        enemy = Agent(self.game.gen_id(), self.game)
+        self.game.agents = [[MagicMock(), agent], [MagicMock(), enemy]]
+        self.game.prepare_to_start_simulation()
+        self.game.tick()
+
+        payloads = [client.send_encoded.call_args_list for client, _ in self.game.agents]
+        self.assertEqual(len(payloads[0]), 1)
+        # Both clients are sent the exact same encoded objects
+        for call_1, call_2 in zip(payloads[0], payloads[1]):
+            self.assertIs(call_1.args[0], call_2.args[0])
+        message = Message.from_json(payloads[0][0].args[0])
+        self.assertEqual(message.type, Message.TICK_STATE)
+        self.assertEqual([state["id"] for state in message.data["agents"]], [agent.agent_state.id, enemy.agent_state.id])
+        self.assertEqual(message.data["projectiles"], [])
+        self.assertEqual(message.data["destroyed"], [])
+
+    def test_custom_map(self):
+        game_map = GameMap.from_dict({
+            "width": 400,
+            "height": 300,
+            "boundaries": [{"start": [0, 0], "end": [0, 300], "radius": 10}],
+            "obstacles": [{"position": [200, 150], "width": 20, "height": 20}],
+            "spawn_points": [{"position": [50, 100], "direction": 90}, {"position": [350, 200], "direction": 270}],
+        })
+        self.game = Game([], game_map=game_map)
+        agent = Agent(self.game.gen_id(), self.game)
+        enemy = Agent(self.game.gen_id(), self.game)
+        self.game.agents = [[MagicMock(), agent], [MagicMock(), enemy]]
+        self.game.prepare_to_start_simulation()
+
+        self.assertEqual(agent.get_position(), Vector2(50, 100))
+        self.assertEqual(enemy.get_position(), Vector2(350, 200))
+        self.assertEqual(enemy.agent_state.angle, 270)
+        self.assertEqual(len(self.game.physics.space.bodies), 4)
+        self.assertIs(self.game.physics.static_index, game_map.static_index)
+
+    def get_destroyed_objects(self, client):
+        """Returns all destroyed objects sent to a mock client in TICK_STATE
+        messages."""
+        destroyed = []
+        for call in client.send_encoded.call_args_list:
+            message = Message.from_json(call.args[0])
+            if message.type == Message.TICK_STATE:
+                destroyed += message.data.get("destroyed", [])
+        return destroyed
 
     def test_obstacle_hit_callback(self):
         self.game.physics.add_on_collision_callback(self.game.collision_callback)
@@ -68,7 +139,7 @@ class MyAgent(Agent):
     def test_damage_taken_callback(self):
         self.game.physics.add_on_collision_callback(self.game.collision_callback)
         agent = Agent(self.game.gen_id(), self.game)
-        projectile = ProjectileState(self.game.gen_id(), Vector2(0, 100), Vector2(100, 0), self.game.gen_id())
+        projectile = ProjectileState(self.game.gen_id(), Vector2(50, 100), Vector2(100, 0), self.game.gen_id())
         agent.on_damage_taken = MagicMock()
         self.game.agents = [[MagicMock(), agent]]
         agent._set_position(Vector2(100, 100))
@@ -193,7 +264,7 @@ class MyAgent(Agent):
 
     def test_attack_movement_speed(self):
         attacker = Agent(self.game.gen_id(), self.game)
-        self.game.agents = [[MagicMock(), attacker], [MagicMock(), MagicMock()]]
+        self.game.agents = [[MagicMock(), attacker], [MagicMock(), self.mock_agent()]]
 
         self.game.prepare_to_start_simulation()
 
@@ -253,7 +324,15 @@ class MyAgent(Agent):
             self.game.tick()
 
         for agent in self.game.agents:
-            agent[0].send_destroy_message.assert_called_with(2, "projectile")
+            self.assertEqual(self.get_destroyed_objects(agent[0]), [{"id": 2, "type": "projectile"}])
+
+    def test_destroy_projectile_twice(self):
+        self.game.create_projectile(Vector2(100, 100), 0, 0)
+        projectile = self.game.projectiles[0]
+        self.game.destroy_projectile(projectile)
+        self.game.destroy_projectile(projectile)
+        self.assertEqual(self.game.projectiles, {})
+        self.assertEqual(self.game.destroyed_objects, [{"id": 0, "type": "projectile"}])
 
     def test_destroy_agent_message(self):
         attacker = Agent(self.game.gen_id(), self.game)
@@ -277,7 +356,89 @@ class MyAgent(Agent):
                 self.game.tick()
 
         for agent in self.game.agents:
-            agent[0].send_destroy_message.assert_called_with(1, "agent")
+            destroyed = self.get_destroyed_objects(agent[0])
+            self.assertEqual(destroyed[-1], {"id": 1, "type": "agent"})
+
+    def test_tick_state_message(self):
+        attacker = Agent(self.game.gen_id(), self.game)
+        attackee = Agent(self.game.gen_id(), self.game)
+        attacker._set_position(Vector2(100, 800))
+        attackee._set_position(Vector2(200, 800))
+
+        self.game.agents = [[MagicMock(), attacker], [MagicMock(), attackee]]
+        for agent in self.game.agents:
+            self.game.physics.add_agent(agent[1].agent_state)
+
+        attacker.attack_ranged(0)
+        for _ in range(TICKS_PER_SECOND):
+            self.game.tick()
+
+        client = self.game.agents[0][0]
+        # Exactly one message is sent per tick
+        self.assertEqual(client.send_encoded.call_count, TICKS_PER_SECOND)
+        messages = [Message.from_json(call.args[0]) for call in client.send_encoded.call_args_list]
+        self.assertEqual(messages[0].data["projectiles"][0]["id"], 2)
+        destroyed = [message.data["destroyed"] for message in messages if message.data.get("destroyed")]
+        self.assertEqual(destroyed, [[{"id": 2, "type": "projectile"}]])
+
+    def test_spectators(self):
+        agent = Agent(self.game.gen_id(), self.game)
+        enemy = Agent(self.game.gen_id(), self.game)
+        self.game.agents = [[MagicMock(), agent], [MagicMock(), enemy]]
+        self.game.prepare_to_start_simulation()
+        agent.set_movement_speed(Agent.MAX_SPEED)
+        enemy.attack_ranged(0)
+        for _ in range(10):
+            self.game.tick()
+
+        # A spectator that joins late decodes the same state as the players
+        spectator = MagicMock()
+        spectator.frame_format = FORMAT_JSON
+        spectator.write_encoded.return_value = None
+        self.game.add_spectator(spectator)
+        for _ in range(10):
+            self.game.tick()
+        player_decoder = StateDecoder()
+        for call in self.game.agents[0][0].send_encoded.call_args_list:
+            expected = player_decoder.decode(Message.from_json(call.args[0]).data)
+        spectator_decoder = StateDecoder()
+        for call in spectator.write_encoded.call_args_list:
+            decoded = spectator_decoder.decode(Message.from_json(call.args[0]).data)
+        self.assertEqual(spectator.write_encoded.call_count, 11)
+        self.assertEqual(decoded, expected)
+
+        self.game.remove_spectator(spectator)
+        self.game.tick()
+        self.assertEqual(spectator.write_encoded.call_count, 11)
+
+    def test_catch_up_ticks_are_not_broadcast(self):
+        attacker = Agent(self.game.gen_id(), self.game)
+        attackee = Agent(self.game.gen_id(), self.game)
+        attacker._set_position(Vector2(100, 800))
+        attackee._set_position(Vector2(200, 800))
+
+        self.game.agents = [[MagicMock(), attacker], [MagicMock(), attackee]]
+        for agent in self.game.agents:
+            self.game.physics.add_agent(agent[1].agent_state)
+
+        attacker.attack_ranged(0)
+        for _ in range(TICKS_PER_SECOND):
+            self.game.tick(broadcast=False)
+        client = self.game.agents[0][0]
+        client.send_encoded.assert_not_called()
+
+        # The projectile was destroyed during a catch-up tick and is reported
+        # with the next broadcast.
+        self.game.tick()
+        self.assertEqual(self.get_destroyed_objects(client), [{"id": 2, "type": "projectile"}])
+
+    def test_scheduled_tick_broadcasts_final_state(self):
+        self.mock_agents()
+        self.game.physics = MagicMock()
+        self.game.tick = MagicMock(return_value=True)
+        self.assertTrue(self.game.scheduled_tick(False))
+        for client, _ in self.game.agents:
+            client.send_encoded.assert_called_once()
 
     def test_player_exception_handling(self):
         exception = Exception()
@@ -287,7 +448,7 @@ class MyAgent(Agent):
         player = MyAgent(self.game.gen_id(), self.game)
 
         client = MagicMock()
-        self.game.agents = [[client, player], [MagicMock(), MagicMock()]]
+        self.game.agents = [[client, player], [MagicMock(), self.mock_agent()]]
 
         self.game.prepare_to_start_simulation()
 
@@ -297,6 +458,60 @@ class MyAgent(Agent):
 
         client.send_python_error.assert_called()
 
+    def test_forfeit_while_coding(self):
+        clients = [MagicMock(), MagicMock()]
+        game = Game(clients)
+        ended_games = []
+        game.on_game_end = ended_games.append
+        game.start_coding()
+        self.assertEqual(game.state, GAME_CODING)
+        game.exec_player_code(clients[0], "class Idle(Agent):\n    pass", "Idle")
+
+        # The game ends at once, and the client that left gets no results
+        game.forfeit(clients[1])
+        self.assertEqual(game.state, GAME_FINISHED)
+        self.assertEqual(ended_games, [game])
+        clients[0].send_results.assert_called_once_with(True, False, game.agents, error=False, forfeit=True)
+        clients[1].send_results.assert_not_called()
+        self.assertEqual(game.get_client_results(), [(clients[0], True), (clients[1], False)])
+
+        # Code sent after the game ended does not start it
+        self.assertFalse(game.exec_player_code(clients[1], "class Idle(Agent):\n    pass", "Idle"))
+        self.assertFalse(game.simulation_started)
+        game.forfeit(clients[0])
+        self.assertEqual(ended_games, [game])
+
+    def test_forfeit_while_running(self):
+        clients = [MagicMock(), MagicMock()]
+        self.game.agents = [[client, Agent(self.game.gen_id(), self.game)] for client in clients]
+        self.game.prepare_to_start_simulation()
+        self.game.state = GAME_RUNNING
+
+        # The game ends at its next tick
+        self.game.forfeit(clients[0])
+        self.assertEqual(self.game.state, GAME_RUNNING)
+        self.assertTrue(self.game.scheduled_tick(True))
+        results = self.game.get_results()
+        self.assertEqual(results["winners"], [False, True])
+        self.assertTrue(results["forfeit"])
+        self.assertFalse(results["tie"])
+
+    def test_reap(self):
+        clients = [MagicMock(), MagicMock()]
+        game = Game(clients, physics_backend="pymunk")
+        for client in clients:
+            game.exec_player_code(client, "class Idle(Agent):\n    pass", "Idle")
+        game.forfeit(clients[0])
+        game.finish()
+        game.reap()
+        self.assertEqual(game.state, GAME_REAPED)
+        self.assertEqual(game.agents, [])
+        self.assertEqual(game.physics.object_states, {})
+        self.assertIsNone(game.physics.space)
+        self.assertIsNone(game.physics.collision_callback)
+        for client in clients:
+            self.assertIsNone(client.on_receive_player_code)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import random
+import unittest
+
+import pymunk
+
+from src.agent import *
+from src.game_map import *
+from src.obstacle import *
+from src.physics_engine import *
+from src.static_index import *
+from src.vector2 import *
+
+class TestGameMap(unittest.TestCase):
+
+    def setUp(self):
+        self.game_map = load_map()
+
+    def test_default_map(self):
+        self.assertEqual(len(self.game_map.boundaries), 4)
+        self.assertEqual(len(self.game_map.obstacles), 5)
+        self.assertEqual(self.game_map.spawn_points, [((137, 350), 0), ((887, 350), 180)])
+        ids = [boundary[0].id for boundary in self.game_map.boundaries] + [obstacle.id for obstacle in self.game_map.obstacles]
+        self.assertEqual(ids, [-1, -2, -3, -4, -5, -6, -7, -8, -9])
+        self.assertEqual(self.game_map.obstacles[0].position, Vector2(240, 200))
+        self.assertEqual((self.game_map.obstacles[0].width, self.game_map.obstacles[0].height), (50, 150))
+
+    def test_compiled_once(self):
+        self.assertIs(load_map(), self.game_map)
+        self.assertTrue(self.game_map.static_index.frozen)
+        self.assertIn(Agent.SCAN_DISTANCE, self.game_map.static_index.scan_cells)
+        with self.assertRaises(ValueError):
+            self.game_map.static_index.add(Obstacle(1, Vector2(0, 0), 1, 1), 0, 0, 1, 1)
+
+    def test_from_dict(self):
+        game_map = GameMap.from_dict({
+            "width": 200,
+            "height": 100,
+            "obstacles": [{"position": [50, 50], "width": 10, "height": 20}],
+            "spawn_points": [{"position": [20, 20], "direction": 90}],
+        })
+        self.assertEqual(game_map.boundaries, [])
+        self.assertEqual(game_map.obstacles[0].id, -1)
+        self.assertEqual(game_map.static_index.entries[-1][:5], (45, 40, 55, 60, 0))
+        self.assertEqual(game_map.spawn_points, [((20, 20), 90)])
+
+    def test_engine_shares_map_index(self):
+        pe = PhysicsEngine(self.game_map)
+        self.assertIs(pe.static_index, self.game_map.boundary_index)
+        pe.add_map_obstacles()
+        self.assertIs(pe.static_index, self.game_map.static_index)
+        self.assertIs(pe.projectile_engine.static_index, self.game_map.static_index)
+        self.assertEqual(len(pe.space.bodies), 9)
+
+        # Changes are made to a copy
+        pe.add_obstacle(Obstacle(1, Vector2(100, 100), 10, 10))
+        self.assertIsNot(pe.static_index, self.game_map.static_index)
+        self.assertNotIn(1, self.game_map.static_index)
+        self.assertTrue(pe.remove_object(-5))
+        self.assertIn(-5, self.game_map.static_index)
+        self.assertNotIn(-5, pe.static_index)
+
+    def test_map_obstacles_after_other_obstacles(self):
+        pe = PhysicsEngine(self.game_map)
+        pe.add_obstacle(Obstacle(1, Vector2(100, 100), 10, 10))
+        pe.add_map_obstacles()
+        self.assertEqual(len(pe.static_index), 10)
+        self.assertEqual(len(self.game_map.static_index), 9)
+
+    def test_scan_matches_pymunk(self):
+        pe = PhysicsEngine(self.game_map)
+        pe.add_map_obstacles()
+        rng = random.Random(0)
+        for _ in range(200):
+            x = rng.uniform(-50, self.game_map.width + 50)
+            y = rng.uniform(-50, self.game_map.height + 50)
+            expected = [
+                pe._get_object_state_from_body(hit.shape.body).id
+                for hit in pe.space.point_query((x, y), Agent.SCAN_DISTANCE, pymunk.ShapeFilter())
+            ]
+            actual = [obstacle.id for obstacle in pe.static_index.scan(x, y, Agent.SCAN_DISTANCE)]
+            self.assertCountEqual(actual, expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from src.headless import *
+from src.agent import Agent
+
+
+def load_agent_code(file_name, class_name):
+    path = os.path.join(os.path.dirname(__file__), "agent_code", file_name)
+    with open(path) as f:
+        return (f.read(), class_name)
+
+
+class TestHeadless(unittest.TestCase):
+
+    def test_run_match_player_code(self):
+        result = run_match(load_agent_code("agent1.py", "Agent1"), load_agent_code("agent2.py", "Agent2"))
+        self.assertFalse(result.error)
+        self.assertFalse(result.timed_out)
+        self.assertEqual(result.class_names, ["Agent1", "Agent2"])
+        self.assertEqual(result.winner, 1)
+        self.assertEqual(result.healths[0], 0)
+        # survival time is simulated, not wall clock time
+        self.assertAlmostEqual(result.survival_times[0], result.ticks / TICKS_PER_SECOND)
+        self.assertIsNone(result.survival_times[1])
+
+    def test_run_match_classes_time_out(self):
+        class Idle(Agent):
+            pass
+
+        result = run_match(Idle, Idle, max_ticks=10)
+        self.assertTrue(result.timed_out)
+        self.assertTrue(result.tie)
+        self.assertIsNone(result.winner)
+        self.assertEqual(result.ticks, 10)
+
+    def test_run_match_bad_code_forfeits(self):
+        class Idle(Agent):
+            pass
+
+        result = run_match(("1 + 1", "MyAgent"), Idle)
+        self.assertTrue(result.error)
+        self.assertEqual(result.winner, 1)
+        self.assertEqual(len(result.python_errors[0]), 1)
+
+    def test_run_match_runtime_error(self):
+        class Broken(Agent):
+            def run(self):
+                raise Exception()
+
+        class Idle(Agent):
+            pass
+
+        result = run_match(Broken, Idle)
+        self.assertTrue(result.error)
+        self.assertEqual(result.winner, 1)
+        self.assertEqual(result.ticks, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+import unittest
+from unittest.mock import MagicMock
+
+from src.agent_state import *
+from src.game import *
+from src.log import *
+from src.vector2 import *
+
+class TestLog(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def tearDown(self):
+        stop_logging()
+        root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        root_logger.setLevel(logging.NOTSET)
+        root_logger.propagate = True
+
+    def get_lines(self):
+        stop_logging()
+        return self.stream.getvalue().splitlines()
+
+    def collide_agents(self):
+        game = Game([], realtime=False, match_id="m1")
+        game.physics.add_agent(AgentState(1, Vector2(100, 200), Vector2(100, 0), 10))
+        game.physics.add_agent(AgentState(2, Vector2(200, 200), Vector2(0, 0), 10))
+        game.physics.step(1)
+
+    def test_match_context(self):
+        configure_logging("INFO", self.stream)
+        get_logger("src.test", "m1").info("hello %s", "world")
+        get_logger("src.test").warning("no match")
+        lines = self.get_lines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("INFO src.test match=m1 hello world"))
+        self.assertTrue(lines[1].endswith("WARNING src.test match=- no match"))
+
+    def test_json_format(self):
+        configure_logging("INFO", self.stream, log_format="json")
+        get_logger("src.test", 3).info("hello")
+        record = json.loads(self.get_lines()[0])
+        self.assertEqual(record["match"], 3)
+        self.assertEqual(record["level"], "INFO")
+        self.assertEqual(record["message"], "hello")
+
+    def test_debug_messages_gated(self):
+        configure_logging("INFO", self.stream)
+        self.collide_agents()
+        self.assertEqual(self.get_lines(), [])
+
+        self.stream = io.StringIO()
+        configure_logging("DEBUG", self.stream)
+        self.collide_agents()
+        lines = self.get_lines()
+        self.assertTrue(any("src.physics_engine match=m1 added agent 1" in line for line in lines))
+        self.assertTrue(any("match=m1 collision between" in line for line in lines))
+
+if __name__ == '__main__':
+    unittest.main()
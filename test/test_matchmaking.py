@@ -0,0 +1,179 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.matchmaking import *
+from src.gameserver import GameServer
+
+
+class TestRatingTable(unittest.TestCase):
+
+    def test_record_match(self):
+        ratings = RatingTable()
+        ratings.record_match("alice", "bob", 1)
+        self.assertEqual(ratings.get("alice"), DEFAULT_RATING + K_FACTOR / 2)
+        self.assertEqual(ratings.get("bob"), DEFAULT_RATING - K_FACTOR / 2)
+        # An upset moves ratings further than an expected result
+        ratings.record_match("alice", "bob", 0)
+        self.assertLess(ratings.get("alice"), DEFAULT_RATING)
+        ratings.record_match("alice", "bob", 0.5)
+        self.assertLess(ratings.get("alice"), ratings.get("bob"))
+        self.assertAlmostEqual(ratings.get("alice") + ratings.get("bob"), 2 * DEFAULT_RATING)
+
+    def test_unnamed_players(self):
+        ratings = RatingTable()
+        ratings.record_match(None, "bob", 1)
+        self.assertEqual(ratings.get(None), DEFAULT_RATING)
+        self.assertEqual(ratings.ratings, {"bob": DEFAULT_RATING - K_FACTOR / 2})
+
+
+class TestMatchmaker(unittest.TestCase):
+
+    def setUp(self):
+        self.matchmaker = Matchmaker()
+
+    def test_remove(self):
+        self.matchmaker.add("a", now=0)
+        self.matchmaker.add("b", now=0)
+        self.assertTrue(self.matchmaker.remove("a"))
+        self.assertFalse(self.matchmaker.remove("a"))
+        self.assertFalse(self.matchmaker.remove("c"))
+        self.assertEqual(len(self.matchmaker), 1)
+        self.assertEqual(self.matchmaker.match(now=0), [])
+        self.assertEqual(self.matchmaker.stats.cancelled, 1)
+
+    def test_matches_many_pairs_per_pass(self):
+        for i in range(10):
+            self.matchmaker.add(i, DEFAULT_RATING + i * 10, now=0)
+        pairs = self.matchmaker.match(now=0)
+        self.assertEqual(pairs, [(0, 1), (2, 3), (4, 5), (6, 7), (8, 9)])
+        self.assertEqual(len(self.matchmaker), 0)
+        self.assertEqual(self.matchmaker.buckets, {})
+        self.assertEqual(self.matchmaker.stats.matches, 5)
+
+    def test_similar_ratings_are_preferred(self):
+        self.matchmaker.add("strong", 2000, now=0)
+        self.matchmaker.add("weak", 1000, now=0)
+        self.matchmaker.add("strong 2", 2050, now=1)
+        self.matchmaker.add("weak 2", 1020, now=1)
+        self.assertEqual(self.matchmaker.match(now=1), [("strong", "strong 2"), ("weak", "weak 2")])
+
+    def test_window_widens(self):
+        self.matchmaker.add("a", 1500, now=0)
+        self.matchmaker.add("b", 1800, now=0)
+        self.assertEqual(self.matchmaker.match(now=1), [])
+        # Both windows have to include the other player
+        self.matchmaker.add("c", 1300, now=1.5)
+        self.assertEqual(self.matchmaker.match(now=1.5), [])
+        self.assertEqual(self.matchmaker.match(now=2), [("a", "b")])
+        self.assertIn("c", self.matchmaker)
+        self.assertEqual(self.matchmaker.stats.get_mean_wait_time(), 2)
+
+    def test_window_is_limited(self):
+        self.matchmaker.add("a", 0, now=0)
+        self.matchmaker.add("b", MAX_WINDOW + 1, now=0)
+        self.assertEqual(self.matchmaker.match(now=1000), [])
+
+
+class TestGameServerQueue(unittest.TestCase):
+
+    def create_client(self, player_id=None):
+        client = MagicMock()
+        client.player_id = player_id
+        return client
+
+    def test_remove_client_that_is_not_queued(self):
+        game_server = GameServer()
+        game_server.remove_from_queue(self.create_client())
+
+    def test_match_players(self):
+        game_server = GameServer()
+        game_server.match_callback = MagicMock()
+        game_server.start_game = MagicMock()
+        game_server.ratings.ratings["pro"] = 2500
+        clients = [self.create_client(), self.create_client("pro"), self.create_client()]
+        for client in clients:
+            game_server.enqueue(client)
+        game_server.match_players()
+        game_server.start_game.assert_called_once_with([clients[0], clients[2]])
+        # A client that disconnects after it was matched is not in the queue
+        game_server.remove_from_queue(clients[0])
+        self.assertEqual(len(game_server.matchmaker), 1)
+
+    def test_player_name_in_use(self):
+        game_server = GameServer()
+        game_server.match_callback = MagicMock()
+        game_server.start_game = MagicMock()
+        alice = self.create_client("alice")
+        impostor = self.create_client("alice")
+        game_server.enqueue(alice)
+        game_server.enqueue(impostor)
+        # The second connection plays unrated
+        self.assertIsNone(impostor.player_id)
+        self.assertEqual(game_server.player_clients, {"alice": alice})
+        game_server.match_players()
+        game_server.start_game.assert_called_once_with([alice, impostor])
+        game = MagicMock()
+        game.clients = [alice, impostor]
+        game.get_client_results.return_value = [(alice, False), (impostor, True)]
+        game_server.end_match(game)
+        self.assertEqual(list(game_server.ratings.ratings), ["alice"])
+        # The name is free once the game has been reaped
+        self.assertEqual(game_server.player_clients, {})
+        newcomer = self.create_client("alice")
+        game_server.enqueue(newcomer)
+        self.assertEqual(newcomer.player_id, "alice")
+        game_server.disconnect(newcomer)
+        self.assertEqual(game_server.player_clients, {})
+
+    def test_end_match_records_ratings(self):
+        game_server = GameServer()
+        winner = self.create_client("alice")
+        loser = self.create_client("bob")
+        game = MagicMock()
+        game.get_client_results.return_value = [(loser, False), (winner, True)]
+        game_server.end_match(game)
+        self.assertGreater(game_server.ratings.get("alice"), game_server.ratings.get("bob"))
+        game.get_client_results.return_value = [(loser, False)]
+        game_server.end_match(game)
+        self.assertEqual(len(game_server.ratings.ratings), 2)
+
+
+class TestGameServerLifecycle(unittest.TestCase):
+
+    def create_client(self, player_id=None):
+        client = MagicMock()
+        client.player_id = player_id
+        return client
+
+    def test_disconnect_forfeits_game(self):
+        game_server = GameServer()
+        clients = [self.create_client("alice"), self.create_client("bob")]
+        game_server.start_game(clients)
+        self.assertEqual(len(game_server.matches), 1)
+        for client in clients:
+            client.send_start_game_message.assert_called_once()
+
+        game_server.disconnect(clients[0])
+        _, kwargs = clients[1].send_results.call_args
+        self.assertTrue(kwargs["forfeit"])
+        self.assertLess(game_server.ratings.get("alice"), game_server.ratings.get("bob"))
+        # The finished game has been reaped
+        self.assertEqual(game_server.matches, {})
+        self.assertEqual(game_server.client_games, {})
+        self.assertEqual((game_server.games_started, game_server.games_reaped), (1, 1))
+        self.assertIsNone(clients[1].on_receive_player_code)
+
+        game_server.disconnect(clients[1])
+        clients[1].send_results.assert_called_once()
+
+    def test_disconnect_queued_client(self):
+        game_server = GameServer()
+        game_server.match_callback = MagicMock()
+        client = self.create_client()
+        game_server.enqueue(client)
+        game_server.disconnect(client)
+        self.assertEqual(len(game_server.matchmaker), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
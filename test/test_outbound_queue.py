@@ -0,0 +1,150 @@
+import unittest
+from concurrent.futures import Future
+from unittest.mock import patch
+
+from src.outbound_queue import *
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON
+
+
+class FakeConnection():
+    """Records writes. Writes stay in progress until finish_writes is
+    called."""
+
+    def __init__(self, frame_format=FORMAT_JSON):
+        self.frame_format = frame_format
+        self.payloads = []
+        self.pending = []
+        self.close_code = None
+
+    def write_encoded(self, payload, binary=False):
+        self.payloads.append(payload)
+        future = Future()
+        self.pending.append(future)
+        return future
+
+    def finish_writes(self, exception=None):
+        pending, self.pending = self.pending, []
+        for future in pending:
+            if exception is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exception)
+
+    def close(self, code=None, reason=None):
+        self.close_code = code
+
+
+def create_frame(name, keyframe=False):
+    return TickFrame(name, lambda: name + " keyframe", lambda include_names: (name + (" names" if include_names else "")).encode(), keyframe=keyframe)
+
+
+class TestOutboundQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.closed = []
+        self.queue = OutboundQueue(self.connection, max_in_flight_bytes=1, on_closed=lambda: self.closed.append(True))
+
+    def test_first_frame_is_keyframe(self):
+        self.queue.send_frame(create_frame("a"))
+        self.connection.finish_writes()
+        self.queue.send_frame(create_frame("b"))
+        self.assertEqual(self.connection.payloads, ["a keyframe", "b"])
+        self.assertEqual(self.queue.stats.resyncs, 1)
+        self.assertEqual(self.queue.stats.frames_sent, 2)
+
+    def test_frames_are_coalesced(self):
+        self.queue.synced = True
+        self.queue.send_frame(create_frame("frame 1"))
+        self.queue.send_message("message 1")
+        self.queue.send_frame(create_frame("frame 2"))
+        self.queue.send_message("message 2")
+        self.queue.send_frame(create_frame("frame 3"))
+        self.assertEqual(self.connection.payloads, ["frame 1"])
+        self.assertEqual(self.queue.stats.frames_dropped, 1)
+
+        # Messages keep their order and only the latest frame is sent, as a
+        # keyframe since a frame was skipped
+        self.connection.finish_writes()
+        self.assertEqual(self.connection.payloads, ["frame 1", "message 1"])
+        self.connection.finish_writes()
+        self.connection.finish_writes()
+        self.assertEqual(self.connection.payloads, ["frame 1", "message 1", "message 2", "frame 3 keyframe"])
+        self.assertEqual(self.queue.in_flight_bytes, len("frame 3 keyframe"))
+        self.connection.finish_writes()
+        self.assertEqual(self.queue.in_flight_bytes, 0)
+
+    def test_keyframe_is_sent_as_is(self):
+        self.queue.send_frame(create_frame("a", keyframe=True))
+        self.assertEqual(self.connection.payloads, ["a"])
+        self.assertEqual(self.queue.stats.resyncs, 0)
+
+    def test_binary_frames(self):
+        connection = FakeConnection(FORMAT_BINARY)
+        queue = OutboundQueue(connection, max_in_flight_bytes=1)
+        for name in ["a", "b", "c"]:
+            queue.send_frame(create_frame(name))
+        connection.finish_writes()
+        connection.finish_writes()
+        # Binary frames are snapshots, so skipping one does not need a resync
+        self.assertEqual(connection.payloads, [b"a names", b"c"])
+        self.assertTrue(queue.synced)
+
+    def test_missing_keyframe_is_skipped(self):
+        requested = []
+        frame = TickFrame("a", lambda: requested.append(True), None)
+        self.queue.send_frame(frame)
+        self.assertEqual(self.connection.payloads, [])
+        self.assertEqual(requested, [True])
+        self.assertFalse(self.queue.synced)
+        self.queue.send_frame(create_frame("b", keyframe=True))
+        self.assertEqual(self.connection.payloads, ["b"])
+
+    def test_too_many_queued_bytes(self):
+        queue = OutboundQueue(self.connection, max_in_flight_bytes=1, max_queued_bytes=100)
+        for _ in range(11):
+            queue.send_message("x" * 10)
+        self.assertIsNone(self.connection.close_code)
+        queue.send_message("x" * 10)
+        self.assertEqual(self.connection.close_code, TOO_SLOW_CLOSE_CODE)
+        self.assertEqual(queue.stats.disconnects, 1)
+        self.assertEqual(queue.queued_bytes, 0)
+        queue.send_message("x")
+        self.assertEqual(len(self.connection.payloads), 1)
+
+    def test_behind_for_too_long(self):
+        with patch("src.outbound_queue.perf_counter", return_value=0):
+            self.queue.send_frame(create_frame("frame 1"))
+            self.queue.send_frame(create_frame("frame 2"))
+        with patch("src.outbound_queue.perf_counter", return_value=MAX_BEHIND_TIME / 2):
+            self.queue.send_frame(create_frame("frame 3"))
+        self.assertIsNone(self.connection.close_code)
+        with patch("src.outbound_queue.perf_counter", return_value=MAX_BEHIND_TIME + 1):
+            self.queue.send_frame(create_frame("frame 4"))
+        self.assertEqual(self.connection.close_code, TOO_SLOW_CLOSE_CODE)
+        self.assertEqual(self.closed, [True])
+
+    def test_catching_up_resets_behind_time(self):
+        with patch("src.outbound_queue.perf_counter", return_value=0):
+            self.queue.send_frame(create_frame("frame 1"))
+            self.queue.send_frame(create_frame("frame 2"))
+            self.connection.finish_writes()
+            self.connection.finish_writes()
+        with patch("src.outbound_queue.perf_counter", return_value=MAX_BEHIND_TIME + 1):
+            self.queue.send_frame(create_frame("frame 3"))
+            self.queue.send_frame(create_frame("frame 4"))
+        self.assertIsNone(self.connection.close_code)
+
+    def test_failed_write(self):
+        self.queue.send_frame(create_frame("frame 1"))
+        self.queue.send_message("message")
+        self.connection.finish_writes(ConnectionError())
+        self.assertTrue(self.queue.closed)
+        self.assertEqual(self.closed, [True])
+        self.queue.send_frame(create_frame("frame 2"))
+        self.assertEqual(self.connection.payloads, ["frame 1 keyframe"])
+        self.assertIsNone(self.connection.close_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
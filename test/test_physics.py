@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from src.message import *
 from src.physics_engine import *
@@ -10,6 +10,7 @@ from src.projectile_state import *
 from src.vector2 import *
 from src.agent import *
 from src.globals import *
+from src.step_policy import *
 
 class TestPhysicsEngine(unittest.TestCase):
 
@@ -39,7 +40,9 @@ class TestPhysicsEngine(unittest.TestCase):
         projectile_state = ProjectileState(1, Vector2(100, 200), Vector2(10, 20), 1)
         self.pe.add_projectile(projectile_state)
         self.pe.step(1)
-        assert(len(self.pe.space.bodies) == 1 + self.num_boundaries)
+        # Projectiles are moved without pymunk bodies
+        assert(len(self.pe.space.bodies) == 0 + self.num_boundaries)
+        assert(len(self.pe.projectile_engine) == 1)
         assert(projectile_state.position.x == 110)
         assert(projectile_state.position.y == 220)
 
@@ -75,6 +78,162 @@ class TestPhysicsEngine(unittest.TestCase):
         assert(agent_state.position.x == 100)
         assert(agent_state.position.y == 200)
 
+    def test_object_lookup_index(self):
+        agent_state = AgentState(1, Vector2(100, 200), Vector2(0, 0), 10)
+        projectile_state = ProjectileState(2, Vector2(100, 210), Vector2(0, 0), 1)
+        self.pe.add_agent(agent_state)
+        self.pe.add_projectile(projectile_state)
+        assert(self.pe._get_object_state_from_id(1) is agent_state)
+        assert(self.pe._get_object_state_from_id(2) is projectile_state)
+        assert(self.pe._get_object_state_from_body(self.pe.bodies[1]) is agent_state)
+        self.pe.remove_object(projectile_state.id)
+        assert(self.pe._get_object_state_from_id(2) is None)
+        assert(self.pe.scan_area(Vector2(100, 200), 10) == [agent_state])
+        body = self.pe.bodies[1]
+        self.pe.remove_object(agent_state.id)
+        assert(self.pe._get_object_state_from_body(body) is None)
+
+    def test_projectile_hits_obstacle(self):
+        obstacle = Obstacle(0, Vector2(500, 300), 50, 50)
+        self.pe.add_obstacle(obstacle)
+        projectile_state = ProjectileState(1, Vector2(400, 300), Vector2(Agent.PROJECTILE_SPEED, 0), 100)
+        self.pe.add_projectile(projectile_state)
+        for _ in range(TICKS_PER_SECOND):
+            self.pe.step(1 / TICKS_PER_SECOND)
+
+        # The projectile stops where it touched the obstacle and only hits it once
+        self.callback.assert_called_once()
+        self.assertIs(self.callback.call_args[0][0], projectile_state)
+        self.assertIs(self.callback.call_args[0][1], obstacle)
+        self.assertAlmostEqual(projectile_state.position.x, 475 - PROJECTILE_RADIUS)
+        self.assertEqual(projectile_state.velocity, Vector2(0, 0))
+
+    def test_projectile_ignores_attacker(self):
+        attacker = AgentState(1, Vector2(300, 300), Vector2(0, 0), 10)
+        target = AgentState(2, Vector2(400, 300), Vector2(0, 0), 10)
+        self.pe.add_agent(attacker)
+        self.pe.add_agent(target)
+        projectile_state = ProjectileState(3, Vector2(300, 300), Vector2(Agent.PROJECTILE_SPEED, 0), attacker.id)
+        self.pe.add_projectile(projectile_state)
+        for _ in range(3):
+            self.pe.step(1 / TICKS_PER_SECOND)
+
+        # The projectile passes through the target and hits it once
+        self.callback.assert_called_once()
+        self.assertIs(self.callback.call_args[0][1], target)
+        self.assertAlmostEqual(self.callback.call_args[0][2].x, 400 - AGENT_RADIUS - PROJECTILE_RADIUS)
+        self.assertAlmostEqual(projectile_state.position.x, 400)
+
+    def test_remove_objects_during_step(self):
+        obstacle = Obstacle(0, Vector2(500, 300), 200, 200)
+        self.pe.add_obstacle(obstacle)
+        projectile_states = [ProjectileState(i, Vector2(450 + i, 300), Vector2(0, 0), 1000) for i in range(1, 101)]
+        for projectile_state in projectile_states:
+            self.pe.add_projectile(projectile_state)
+
+        hits = []
+        def remove_projectile(object_state_1, object_state_2, contact_point):
+            projectile_state = object_state_1 if isinstance(object_state_1, ProjectileState) else object_state_2
+            hits.append(projectile_state.id)
+            self.pe.remove_object(projectile_state.id)
+        self.pe.add_on_collision_callback(remove_projectile)
+        self.pe.step(1 / TICKS_PER_SECOND)
+
+        # Every projectile collides exactly once and none are skipped
+        self.assertEqual(sorted(hits), [state.id for state in projectile_states])
+        self.assertEqual(len(self.pe.dynamic_objects), 0)
+        self.assertEqual(len(self.pe.space.bodies), 1 + self.num_boundaries)
+
+    def test_removed_object_ignored_in_collisions(self):
+        self.pe.add_obstacle(Obstacle(0, Vector2(500, 300), 50, 50))
+        self.pe.add_obstacle(Obstacle(1, Vector2(550, 300), 50, 50))
+        self.pe.add_projectile(ProjectileState(2, Vector2(525, 300), Vector2(0, 0), 1000))
+
+        callback = MagicMock(side_effect=lambda *args: self.pe.remove_object(2))
+        self.pe.add_on_collision_callback(callback)
+        self.pe.step(1 / TICKS_PER_SECOND)
+        self.assertEqual(callback.call_count, 1)
+        self.assertFalse(self.pe.remove_object(2))
+
+    def test_projectile_hits_independent_of_tick_rate(self):
+        hits = {}
+        for ticks_per_second in [60, 30, 10, 2]:
+            pe = PhysicsEngine()
+            # Remove projectiles when they hit something, like Game does
+            callback = MagicMock(side_effect=lambda projectile_state, object_state, contact_point: pe.remove_object(projectile_state.id))
+            pe.add_on_collision_callback(callback)
+            # A wall thinner than the distance a projectile moves in one step
+            wall = Obstacle(0, Vector2(600, 500), 100, 2)
+            pe.add_obstacle(wall)
+            wall_projectile = ProjectileState(1, Vector2(100, 500), Vector2(Agent.PROJECTILE_SPEED, 0), 100)
+            pe.add_projectile(wall_projectile)
+            # An agent that crosses the path of a projectile between steps
+            agent_state = AgentState(2, Vector2(400, 180), Vector2(0, 400), 10)
+            pe.add_agent(agent_state)
+            pe.add_projectile(ProjectileState(3, Vector2(100, 300), Vector2(Agent.PROJECTILE_SPEED, 0), 100))
+
+            for _ in range(ticks_per_second):
+                pe.step(1 / ticks_per_second)
+
+            hits[ticks_per_second] = {
+                call[0][0].id: (call[0][1], call[0][2].x, call[0][2].y) for call in callback.call_args_list
+            }
+            self.assertEqual(wall_projectile.position.x, 599 - PROJECTILE_RADIUS)
+
+        for ticks_per_second, tick_hits in hits.items():
+            self.assertEqual(tick_hits[1][0].id, 0)
+            self.assertEqual(tick_hits[3][0].id, 2)
+            for projectile_id in [1, 3]:
+                self.assertAlmostEqual(tick_hits[projectile_id][1], hits[60][projectile_id][1])
+                self.assertAlmostEqual(tick_hits[projectile_id][2], hits[60][projectile_id][2])
+
+    def test_projectile_hits_reported_in_order(self):
+        agent_state = AgentState(1, Vector2(500, 300), Vector2(0, 0), 10)
+        self.pe.add_agent(agent_state)
+        # The projectile added last reaches the agent first
+        self.pe.add_projectile(ProjectileState(2, Vector2(300, 300), Vector2(Agent.PROJECTILE_SPEED, 0), 100))
+        self.pe.add_projectile(ProjectileState(3, Vector2(500, 450), Vector2(0, -Agent.PROJECTILE_SPEED), 100))
+        self.pe.step(0.2)
+        self.assertEqual([call[0][0].id for call in self.callback.call_args_list], [3, 2])
+
+    def test_scan_agent_matches_scan_area(self):
+        agent_states = [
+            AgentState(1, Vector2(300, 300), Vector2(0, 0), 10),
+            AgentState(2, Vector2(520, 300), Vector2(0, 0), 10),
+            AgentState(3, Vector2(760, 300), Vector2(0, 0), 10),
+            AgentState(4, Vector2(100, 600), Vector2(0, 0), 10),
+        ]
+        for agent_state in agent_states:
+            self.pe.add_agent(agent_state)
+        self.pe.add_obstacle(Obstacle(5, Vector2(420, 450), 50, 50))
+        self.pe.add_obstacle(Obstacle(6, Vector2(900, 100), 50, 50))
+        self.pe.add_projectile(ProjectileState(7, Vector2(310, 300), Vector2(0, 0), 1))
+
+        for agent_state in agent_states:
+            expected = [
+                object_state.id for object_state in self.pe.scan_area(agent_state.position, Agent.SCAN_DISTANCE)
+                if not isinstance(object_state, ProjectileState)
+            ]
+            actual = [object_state.id for object_state in self.pe.scan_agent(agent_state, Agent.SCAN_DISTANCE)]
+            self.assertCountEqual(actual, expected)
+        self.assertEqual(self.pe.scan_agent(AgentState(8, Vector2(300, 300), Vector2(0, 0), 10), Agent.SCAN_DISTANCE), [])
+
+    def test_scan_agent_cached_until_step(self):
+        agent_state_1 = AgentState(1, Vector2(300, 300), Vector2(0, 0), 10)
+        agent_state_2 = AgentState(2, Vector2(400, 300), Vector2(100, 0), 10)
+        self.pe.add_agent(agent_state_1)
+        self.pe.add_agent(agent_state_2)
+
+        with patch.object(self.pe, "_scan_all_agents", wraps=self.pe._scan_all_agents) as scan_all_agents:
+            for _ in range(10):
+                self.assertEqual(self.pe.scan_agent(agent_state_1, 100), [agent_state_1, agent_state_2])
+                self.pe.scan_agent(agent_state_2, 100)
+            self.assertEqual(scan_all_agents.call_count, 1)
+
+            self.pe.step(1)
+            self.assertEqual(self.pe.scan_agent(agent_state_1, 100), [agent_state_1])
+            self.assertEqual(scan_all_agents.call_count, 2)
+
     def test_upper_boundary(self):
         agent_state = AgentState(1, Vector2(50, PhysicsEngine.SPACE_HEIGHT), Vector2(0, 1), 10)
         self.pe.add_agent(agent_state)
@@ -121,5 +280,53 @@ class TestPhysicsEngine(unittest.TestCase):
         self.assertAlmostEqual(expected_position.x, actual_position.x)
         self.assertAlmostEqual(expected_position.y, actual_position.y)
 
+    def add_fast_agent_and_thin_wall(self):
+        """Adds an agent that moves 100 pixels per tick towards a wall 4 pixels
+        thick, which it passes through without substeps."""
+        agent_state = AgentState(1, Vector2(150, 300), Vector2(3000, 0), 10)
+        self.pe.add_agent(agent_state)
+        self.pe.add_obstacle(Obstacle(2, Vector2(300, 300), 100, 4))
+        return agent_state
+
+    def test_fast_agent_tunnels_without_substeps(self):
+        agent_state = self.add_fast_agent_and_thin_wall()
+        for _ in range(3):
+            self.pe.step(1 / TICKS_PER_SECOND)
+        self.callback.assert_not_called()
+        self.assertAlmostEqual(agent_state.position.x, 450)
+        self.assertEqual(self.pe.step_stats.substeps, 3)
+
+    def test_fixed_substeps(self):
+        self.pe.step_policy = FixedStepPolicy(4)
+        agent_state = self.add_fast_agent_and_thin_wall()
+        with patch.object(self.pe.space, "step", wraps=self.pe.space.step) as space_step:
+            for _ in range(3):
+                self.pe.step(1 / TICKS_PER_SECOND)
+        self.assertEqual(space_step.call_count, 12)
+        space_step.assert_called_with(1 / TICKS_PER_SECOND / 4)
+        self.callback.assert_called()
+        self.assertLess(agent_state.position.x, 300)
+        self.assertEqual(self.pe.step_stats.to_json_dict(), {
+            "steps": 3,
+            "substeps": 12,
+            "mean_substeps": 4,
+            "max_substeps": 4,
+        })
+
+    def test_adaptive_substeps(self):
+        self.pe.step_policy = AdaptiveStepPolicy(max_travel=0.5, max_substeps=8)
+        agent_state = self.add_fast_agent_and_thin_wall()
+        # The wall is the smallest collider
+        self.assertEqual(self.pe.get_smallest_collider_size(), 4)
+        self.pe.step(1 / TICKS_PER_SECOND)
+        self.assertEqual(self.pe.step_stats.max_substeps, 8)
+        self.pe.step(1 / TICKS_PER_SECOND)
+        self.callback.assert_called()
+        self.assertLess(agent_state.position.x, 300)
+        # Stopped agents need a single step
+        self.pe.step(1 / TICKS_PER_SECOND)
+        self.assertEqual(self.pe.step_stats.substeps, 17)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import os
+import unittest
+from time import perf_counter
+
+import tornado.gen
+import tornado.testing
+
+from src.game import *
+from src.headless import HeadlessClient, run_match
+from src.player_executor import *
+
+
+def load_agent_code(file_name):
+    path = os.path.join(os.path.dirname(__file__), "agent_code", file_name)
+    with open(path) as f:
+        return f.read()
+
+
+IDLE_CODE = """
+class Idle(Agent):
+    pass
+"""
+
+INFINITE_LOOP_CODE = """
+class Looper(Agent):
+    def run(self):
+        while True:
+            pass
+"""
+
+RAISE_CODE = """
+class Raiser(Agent):
+    def run(self):
+        raise ValueError("bad agent")
+"""
+
+
+class TestProcessPlayerExecutor(unittest.TestCase):
+
+    def create_game(self, player_codes, time_budget=PLAYER_TIME_BUDGET, max_skipped_ticks=MAX_SKIPPED_TICKS):
+        clients = [HeadlessClient(), HeadlessClient()]
+        game = Game(clients, realtime=False, isolate_players=True)
+        game.player_executor.time_budget = time_budget
+        game.player_executor.max_skipped_ticks = max_skipped_ticks
+        self.addCleanup(game.player_executor.close)
+        for client, (code, class_name) in zip(clients, player_codes):
+            game.exec_player_code(client, code, class_name)
+        return game, clients
+
+    def test_same_result_as_local(self):
+        players = [(load_agent_code("agent1.py"), "Agent1"), (load_agent_code("agent2.py"), "Agent2")]
+        local = run_match(*players)
+
+        # Generous time budget so that no ticks are skipped
+        game, clients = self.create_game(players, time_budget=5)
+        self.assertTrue(all(isinstance(agent[1], RemoteAgent) for agent in game.agents))
+        ended = game.run_headless(local.ticks)
+
+        self.assertTrue(ended)
+        self.assertEqual(game.tick_count, local.ticks)
+        self.assertEqual([agent[1].get_health() for agent in game.agents], local.healths)
+        self.assertEqual([client.python_errors for client in clients], [[], []])
+
+    def test_bad_code(self):
+        clients = [HeadlessClient()]
+        game = Game(clients, realtime=False, isolate_players=True)
+        self.addCleanup(game.player_executor.close)
+        self.assertFalse(game.exec_player_code(clients[0], "class Broken(Agent", "Broken"))
+        self.assertIn("SyntaxError", clients[0].python_errors[0])
+        self.assertFalse(game.exec_player_code(clients[0], IDLE_CODE, "Missing"))
+        self.assertIn("NameError", clients[0].python_errors[1])
+        self.assertEqual(game.player_executor.agents, [])
+
+    def test_infinite_loop_forfeits(self):
+        game, clients = self.create_game(
+            [(INFINITE_LOOP_CODE, "Looper"), (IDLE_CODE, "Idle")],
+            time_budget=0.005,
+            max_skipped_ticks=3
+        )
+        looper = game.agents[0][1]
+        self.assertTrue(game.run_headless(20))
+
+        # Skips are counted from the tick after the request was sent
+        self.assertEqual(game.tick_count, 5)
+        self.assertTrue(looper.had_error)
+        self.assertIn("TimeoutError", clients[0].python_errors[0])
+        self.assertEqual(game.get_results()["winners"], [False, True])
+        self.assertFalse(looper.process.is_alive())
+
+    def test_player_exception(self):
+        game, clients = self.create_game([(RAISE_CODE, "Raiser"), (IDLE_CODE, "Idle")], time_budget=5)
+        self.assertTrue(game.run_headless(20))
+
+        self.assertEqual(game.tick_count, 1)
+        self.assertIn("ValueError: bad agent", clients[0].python_errors[0])
+        self.assertEqual(game.get_results()["winners"], [False, True])
+
+
+class TestRealtimeProcessPlayerExecutor(tornado.testing.AsyncTestCase):
+
+    def create_game(self):
+        clients = [HeadlessClient(), HeadlessClient()]
+        game = Game(clients, isolate_players=True)
+        self.addCleanup(game.player_executor.close)
+        ended_games = []
+        game.on_game_end = ended_games.append
+        return game, clients, ended_games
+
+    @tornado.testing.gen_test(timeout=30)
+    def test_slow_player_does_not_block(self):
+        game, clients, ended_games = self.create_game()
+        start = perf_counter()
+        for client, code, class_name in zip(clients, [INFINITE_LOOP_CODE, IDLE_CODE], ["Looper", "Idle"]):
+            self.assertIsNone(game.exec_player_code(client, code, class_name))
+        self.assertLess(perf_counter() - start, 0.1)
+        self.assertFalse(game.simulation_started)
+
+        while not ended_games:
+            yield tornado.gen.sleep(0.05)
+        self.assertIn("TimeoutError", clients[0].python_errors[0])
+        self.assertEqual(clients[1].results["winner"], True)
+        # Ticks never wait for the looping worker
+        stats = game.tick_scheduler.stats
+        self.assertLess(stats.busy_time / stats.ticks, PLAYER_TIME_BUDGET / 2)
+
+    @tornado.testing.gen_test(timeout=30)
+    def test_load_errors(self):
+        game, clients, ended_games = self.create_game()
+        game.exec_player_code(clients[0], "class Broken(Agent", "Broken")
+        while not clients[0].python_errors:
+            yield tornado.gen.sleep(0.05)
+        self.assertIn("SyntaxError", clients[0].python_errors[0])
+
+        # Loads that have not finished when the game ends are cancelled
+        game.exec_player_code(clients[0], IDLE_CODE, "Idle")
+        future = game.pending_loads[clients[0]]
+        game.forfeit(clients[1])
+        while not future.done():
+            yield tornado.gen.sleep(0.01)
+        self.assertTrue(future.cancelled())
+        self.assertEqual(game.player_executor.loading, set())
+        self.assertEqual(game.agents, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import urllib.parse
+from unittest.mock import MagicMock
+
+import tornado.testing
+import tornado.web
+import tornado.websocket
+
+from src.binary_frame import FORMAT_BINARY
+from src.server import ServerToClientConnection
+
+
+class TestServerToClientConnection(tornado.testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.game_server = MagicMock()
+        return tornado.web.Application([(r"/websocket", ServerToClientConnection, {"game_server": self.game_server})])
+
+    def connect(self, query):
+        url = self.get_url("/websocket").replace("http", "ws") + query
+        return tornado.websocket.websocket_connect(url)
+
+    def get_enqueued_client(self):
+        self.game_server.enqueue.assert_called_once()
+        (client,), _ = self.game_server.enqueue.call_args
+        return client
+
+    @tornado.testing.gen_test
+    def test_rated_connection(self):
+        # The query string that ClientToServerConnection builds for a page
+        # opened with ?player=<name>
+        name = "alice & bob"
+        client = yield self.connect(f"?format={FORMAT_BINARY}&player={urllib.parse.quote(name, safe='')}")
+        yield client.read_message()
+        connection = self.get_enqueued_client()
+        self.assertEqual(connection.player_id, name)
+        self.assertEqual(connection.frame_format, FORMAT_BINARY)
+        client.close()
+
+    @tornado.testing.gen_test
+    def test_unrated_connection(self):
+        client = yield self.connect("?format=json")
+        yield client.read_message()
+        self.assertIsNone(self.get_enqueued_client().player_id)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
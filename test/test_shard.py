@@ -0,0 +1,230 @@
+import multiprocessing
+import unittest
+from unittest.mock import MagicMock
+
+import tornado.gen
+import tornado.testing
+
+from src.binary_frame import FORMAT_BINARY, FORMAT_JSON, decode_tick_state
+from src.client_messages import ClientMessageSender
+from src.message import Message
+from src.shard import *
+
+IDLE_CODE = """
+class Idle(Agent):
+    pass
+"""
+
+RAISE_CODE = """
+class Raiser(Agent):
+    def run(self):
+        if self.get_agents_health():
+            raise ValueError("bad agent")
+"""
+
+
+class RecordingClient(ClientMessageSender):
+    """Records messages that are relayed to it."""
+
+    def __init__(self, frame_format=FORMAT_JSON):
+        self.frame_format = frame_format
+        self.on_receive_player_code = None
+        self.messages = []
+
+    def send_encoded(self, payload, binary=False, frame=None):
+        if binary:
+            self.messages.append(Message(Message.TICK_STATE, decode_tick_state(payload)))
+        else:
+            self.messages.append(Message.from_json(payload))
+
+    def get_message_types(self):
+        return [message.type for message in self.messages]
+
+
+class RecordingSpectator(RecordingClient):
+    """Records messages that are broadcast to it as a spectator."""
+
+    def __init__(self, frame_format=FORMAT_JSON):
+        super().__init__(frame_format)
+        self.closed = False
+
+    def write_encoded(self, payload, binary=False):
+        self.send_encoded(payload, binary)
+        return None
+
+    def close(self, code=None, reason=None):
+        self.closed = True
+
+
+class TestShardPlacement(unittest.TestCase):
+
+    def create_shard(self, games, reported_games, busy):
+        shard = Shard(None, None)
+        shard.games = {i: None for i in range(games)}
+        shard.reported_games = reported_games
+        shard.busy = busy
+        return shard
+
+    def test_load_estimate(self):
+        self.assertEqual(self.create_shard(0, 0, 0).get_load(), 0)
+        self.assertAlmostEqual(self.create_shard(2, 0, 0).get_load(), 2 * DEFAULT_GAME_LOAD)
+        # New games are assumed to cost as much as the reported games
+        self.assertAlmostEqual(self.create_shard(3, 2, 0.5).get_load(), 0.75)
+
+    def test_choose_least_loaded_shard(self):
+        pool = ShardPool(0)
+        self.addCleanup(pool.close)
+        busy = self.create_shard(2, 2, 0.6)
+        idle = self.create_shard(4, 4, 0.1)
+        pool.shards = [busy, idle]
+        self.assertIs(pool.choose_shard(), idle)
+        idle.alive = False
+        self.assertIs(pool.choose_shard(), busy)
+        pool.shards = []
+
+
+class TestShardPool(tornado.testing.AsyncTestCase):
+
+    @tornado.testing.gen_test(timeout=60)
+    def test_relay_game(self):
+        pool = ShardPool(1)
+        shard = pool.shards[0]
+        ended_games = []
+        try:
+            clients = [RecordingClient(), RecordingClient(FORMAT_BINARY)]
+            game = pool.start_game(clients)
+            game.on_game_end = ended_games.append
+            self.assertIs(shard.games[game.game_id], game)
+
+            for client, code, class_name in zip(clients, [RAISE_CODE, IDLE_CODE], ["Raiser", "Idle"]):
+                client.on_receive_player_code(client, code, class_name)
+
+            while not ended_games:
+                yield tornado.gen.sleep(0.05)
+        finally:
+            pool.close()
+
+        self.assertEqual(ended_games, [game])
+        self.assertEqual(shard.games, {})
+        for client in clients:
+            message_types = client.get_message_types()
+            self.assertIn(Message.START_SIMULATION, message_types)
+            self.assertIn(Message.TICK_STATE, message_types)
+            self.assertEqual(message_types[-1], Message.RESULTS)
+        self.assertIn(Message.PYTHON_ERROR, clients[0].get_message_types())
+        results = [client.messages[-1].data for client in clients]
+        self.assertEqual([result["winner"] for result in results], [False, True])
+        # Agents are in the order their code finished loading
+        self.assertIn("Raiser", [player["class_name"] for player in results[0]["players"]])
+        self.assertEqual(game.get_client_results(), [(clients[0], False), (clients[1], True)])
+
+    @tornado.testing.gen_test(timeout=60)
+    def test_forfeit_relay_game(self):
+        pool = ShardPool(1)
+        ended_games = []
+        try:
+            clients = [RecordingClient(), RecordingClient()]
+            game = pool.start_game(clients)
+            game.on_game_end = ended_games.append
+            clients[1].on_receive_player_code(clients[1], IDLE_CODE, "Idle")
+            game.forfeit(clients[0])
+
+            while not ended_games:
+                yield tornado.gen.sleep(0.05)
+        finally:
+            pool.close()
+
+        self.assertEqual(game.state, GAME_FINISHED)
+        self.assertEqual(clients[0].messages, [])
+        result = clients[1].messages[-1]
+        self.assertEqual(result.type, Message.RESULTS)
+        self.assertTrue(result.data["winner"])
+        self.assertTrue(result.data["forfeit"])
+        self.assertEqual(game.get_client_results(), [(clients[0], False), (clients[1], True)])
+        game.reap()
+        self.assertIsNone(clients[1].on_receive_player_code)
+
+    @tornado.testing.gen_test(timeout=60)
+    def test_shard_exit_aborts_games(self):
+        pool = ShardPool(1)
+        shard = pool.shards[0]
+        ended_games = []
+        try:
+            clients = [RecordingClient(), RecordingClient()]
+            game = pool.start_game(clients)
+            game.on_game_end = ended_games.append
+            spectator = RecordingSpectator()
+            game.add_spectator(spectator)
+            clients[0].on_receive_player_code(clients[0], IDLE_CODE, "Idle")
+            shard.process.kill()
+
+            while not ended_games:
+                yield tornado.gen.sleep(0.05)
+
+            # Commands for the exited shard are dropped
+            clients[1].on_receive_player_code(clients[1], IDLE_CODE, "Idle")
+            game.request_keyframe()
+            self.assertFalse(shard.send((KEYFRAME, game.game_id)))
+            with self.assertRaises(RuntimeError):
+                pool.start_game([RecordingClient(), RecordingClient()])
+        finally:
+            pool.close()
+
+        self.assertFalse(shard.alive)
+        self.assertEqual(shard.games, {})
+        self.assertEqual(ended_games, [game])
+        self.assertEqual(game.get_client_results(), [])
+        for recorder in clients + [spectator]:
+            result = recorder.messages[-1]
+            self.assertEqual(result.type, Message.RESULTS)
+            self.assertTrue(result.data["error"])
+        self.assertTrue(spectator.closed)
+
+    def test_send_to_exited_shard(self):
+        connection, shard_connection = multiprocessing.Pipe()
+        shard = Shard(MagicMock(), connection)
+        game = ShardedGame(shard, 0, [RecordingClient(), RecordingClient()])
+        shard.games[0] = game
+        ended_games = []
+        game.on_game_end = ended_games.append
+        shard_connection.close()
+
+        self.assertFalse(shard.send((KEYFRAME, 0)))
+        self.assertFalse(shard.alive)
+        self.assertEqual(ended_games, [game])
+        game.forfeit(game.clients[0])
+        connection.close()
+
+    @tornado.testing.gen_test(timeout=60)
+    def test_spectate_relay_game(self):
+        pool = ShardPool(1)
+        ended_games = []
+        try:
+            clients = [RecordingClient(), RecordingClient()]
+            game = pool.start_game(clients)
+            game.on_game_end = ended_games.append
+            spectators = [RecordingSpectator(), RecordingSpectator(FORMAT_BINARY)]
+            for spectator in spectators:
+                game.add_spectator(spectator)
+            self.assertTrue(game.watched)
+
+            for client, code, class_name in zip(clients, [RAISE_CODE, IDLE_CODE], ["Raiser", "Idle"]):
+                client.on_receive_player_code(client, code, class_name)
+
+            while not ended_games:
+                yield tornado.gen.sleep(0.05)
+        finally:
+            pool.close()
+
+        for spectator in spectators:
+            self.assertTrue(spectator.closed)
+            message_types = spectator.get_message_types()
+            self.assertEqual(message_types[0], Message.START_SIMULATION)
+            self.assertIn(Message.TICK_STATE, message_types)
+            self.assertEqual(message_types[-1], Message.RESULTS)
+            self.assertIsNone(spectator.messages[-1].data["winner"])
+        self.assertTrue(spectators[0].messages[1].data["keyframe"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+from src.simple_physics_engine import *
+from src.physics_backend import *
+from src.physics_engine import PhysicsEngine
+from src.agent_state import *
+from src.obstacle import *
+from src.projectile_state import *
+from src.vector2 import *
+from src.headless import run_match
+
+class TestSimplePhysicsEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.pe = SimplePhysicsEngine()
+        self.callback = MagicMock()
+        self.pe.add_on_collision_callback(self.callback)
+
+    def record_events(self, backend, agent_states, obstacles=(), steps=1, time_increment=1/30):
+        """Returns the collision and separate callbacks of a backend as tuples
+        of step, ids and exact contact coordinates. Callbacks in the same step
+        are sorted, since their order depends on the backend."""
+        pe = create_physics_engine(backend)
+        events = []
+        step = [0]
+        pe.add_on_collision_callback(lambda a, b, point: events.append((step[0], "collision", a.id, b.id, point.x, point.y)))
+        pe.add_on_separate_callback(lambda a, b: events.append((step[0], "separate", a.id, b.id)))
+        pe.add_map_obstacles()
+        for obstacle in obstacles:
+            pe.add_obstacle(obstacle)
+        for agent_state in agent_states:
+            pe.add_agent(agent_state)
+        for step[0] in range(steps):
+            pe.step(time_increment)
+        return sorted(events)
+
+    def test_moving_agent(self):
+        agent_state = AgentState(1, Vector2(100, 200), Vector2(0, 5), 10)
+        self.pe.add_agent(agent_state)
+        self.pe.step(1)
+        assert(agent_state.position.x == 100)
+        assert(agent_state.position.y == 205)
+        assert(not self.callback.called)
+
+    def test_agent_collision_stops_agents(self):
+        agent_state_1 = AgentState(1, Vector2(100, 200), Vector2(5, 0), 10)
+        agent_state_2 = AgentState(2, Vector2(300, 200), Vector2(0, 0), 10)
+        self.pe.add_agent(agent_state_1)
+        self.pe.add_agent(agent_state_2)
+        self.pe.step(40)
+        self.callback.assert_called_once()
+        assert(agent_state_1.velocity.x == 0)
+        assert(agent_state_1.position.x == 300)
+
+    def test_agent_id_exception(self):
+        self.pe.add_agent(AgentState(1, Vector2(100, 200), Vector2(0, 100), 10))
+        with self.assertRaises(ValueError):
+            self.pe.add_agent(AgentState(1, Vector2(100, 200), Vector2(0, 100), 10))
+
+    def test_removing_object(self):
+        agent_state = AgentState(1, Vector2(100, 200), Vector2(0, 100), 10)
+        self.pe.add_agent(agent_state)
+        assert(self.pe.remove_object(agent_state.id))
+        assert(not self.pe.remove_object(agent_state.id))
+        self.pe.step(1)
+        assert(agent_state.position.y == 200)
+
+    def test_scan_matches_pymunk(self):
+        pymunk_engine = PhysicsEngine()
+        for pe in (pymunk_engine, self.pe):
+            pe.add_map_obstacles()
+            pe.add_agent(AgentState(1, Vector2(300, 300), Vector2(0, 0), 10))
+            pe.add_agent(AgentState(2, Vector2(380, 320), Vector2(0, 0), 10))
+        for position in (Vector2(300, 300), Vector2(100, 100), Vector2(470, 300)):
+            expected = sorted(state.id for state in pymunk_engine.scan_area(position, 100))
+            assert(sorted(state.id for state in self.pe.scan_area(position, 100)) == expected)
+
+    def test_projectile_hits_agent(self):
+        agent_state = AgentState(1, Vector2(300, 200), Vector2(0, 0), 10)
+        projectile_state = ProjectileState(2, Vector2(100, 200), Vector2(400, 0), 3)
+        self.pe.add_agent(agent_state)
+        self.pe.add_projectile(projectile_state)
+        self.pe.step(1)
+        self.callback.assert_called_once()
+        assert(self.callback.call_args[0][:2] == (projectile_state, agent_state))
+
+    def test_contacts_match_pymunk(self):
+        obstacle_positions = [(300, 300, 80, 40), (700.5, 450.25, 33.3, 61.7)]
+        for x, y, height, width in obstacle_positions:
+            for dx in range(-60, 61, 5):
+                for dy in range(-75, 76, 5):
+                    def agents():
+                        return [AgentState(1, Vector2(x + dx, y + dy), Vector2(3, 7), 10)]
+                    def obstacles():
+                        return [Obstacle(-100, Vector2(x, y), height, width)]
+                    self.assertEqual(
+                        self.record_events(SIMPLE_BACKEND, agents(), obstacles()),
+                        self.record_events(PYMUNK_BACKEND, agents(), obstacles()),
+                        (x, y, dx, dy)
+                    )
+
+    def test_boundary_contacts_match_pymunk(self):
+        for position in [(40, 350), (69.5, 120), (1000, 650.5), (500, 10), (20, 690)]:
+            def agents():
+                return [AgentState(1, Vector2(*position), Vector2(0, 0), 10)]
+            self.assertEqual(self.record_events(SIMPLE_BACKEND, agents()), self.record_events(PYMUNK_BACKEND, agents()))
+
+    def test_separate_matches_pymunk(self):
+        # An agent that drives into a wall, then away from it, and two agents
+        # that meet
+        def agents():
+            return [
+                AgentState(1, Vector2(100, 350), Vector2(-200, 0), 10),
+                AgentState(2, Vector2(600, 600), Vector2(100, 0), 10),
+                AgentState(3, Vector2(680, 600), Vector2(0, 0), 10),
+            ]
+        for steps in range(1, 6):
+            events = self.record_events(SIMPLE_BACKEND, agents(), steps=steps)
+            self.assertEqual(events, self.record_events(PYMUNK_BACKEND, agents(), steps=steps))
+
+        pe = SimplePhysicsEngine()
+        separate_callback = MagicMock()
+        pe.add_on_separate_callback(separate_callback)
+        agent_state = AgentState(1, Vector2(70, 350), Vector2(-30, 0), 10)
+        pe.add_agent(agent_state)
+        pe.step(1/30)
+        assert(not separate_callback.called)
+        agent_state.velocity = Vector2(300, 0)
+        pe.step(1/30)
+        separate_callback.assert_called_once()
+
+    def test_headless_match_outcome_matches_pymunk(self):
+        with open("test/agent_code/agent1.py") as f:
+            code_1 = f.read()
+        with open("test/agent_code/agent2.py") as f:
+            code_2 = f.read()
+        results = [
+            run_match((code_1, "Agent1"), (code_2, "Agent2"), max_ticks=600, physics_backend=backend).to_json_dict()
+            for backend in (PYMUNK_BACKEND, SIMPLE_BACKEND)
+        ]
+        self.assertEqual(results[0], results[1])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_physics_engine("box2d")
+
+    def test_does_not_import_pymunk(self):
+        code = (
+            "import sys\n"
+            "from src.game import Game\n"
+            "Game([], realtime=False, physics_backend='simple').physics.step(1)\n"
+            "assert 'pymunk' not in sys.modules and 'pygame' not in sys.modules\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
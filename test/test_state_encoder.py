@@ -0,0 +1,102 @@
+import json
+import unittest
+
+from src.state_encoder import *
+from src.agent_state import AgentState
+from src.projectile_state import ProjectileState
+from src.vector2 import Vector2
+
+
+class TestStateEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = StateEncoder(keyframe_interval=10, dt=0.1)
+        self.decoder = StateDecoder()
+        self.agent = AgentState(0, Vector2(100, 100), Vector2(10, 0), 100, name="MyAgent")
+        self.projectile = ProjectileState(1, Vector2(200, 200), Vector2(0, -100), 0)
+
+    def move(self, dt=0.1):
+        for state in [self.agent, self.projectile]:
+            state.position = Vector2(state.position.x + state.velocity.x * dt, state.position.y + state.velocity.y * dt)
+
+    def assertDecodedMatches(self, decoded):
+        for decoded_state, state in zip(decoded["agents"] + decoded["projectiles"], [self.agent, self.projectile]):
+            expected = state.to_json_dict()
+            self.assertAlmostEqual(decoded_state["position"]["x"], expected["position"]["x"], delta=POSITION_TOLERANCE)
+            self.assertAlmostEqual(decoded_state["position"]["y"], expected["position"]["y"], delta=POSITION_TOLERANCE)
+            for field in expected:
+                if field not in ["position", "velocity", "angle"]:
+                    self.assertEqual(decoded_state[field], expected[field])
+
+    def test_first_frame_is_keyframe(self):
+        data = self.encoder.encode([self.agent], [self.projectile], [])
+        self.assertTrue(data["keyframe"])
+        self.assertEqual(data["agents"], [self.agent.to_json_dict()])
+        self.assertEqual(data["projectiles"], [self.projectile.to_json_dict()])
+
+    def test_straight_line_motion_sends_nothing(self):
+        self.encoder.encode([self.agent], [self.projectile], [])
+        for _ in range(5):
+            self.move()
+            data = self.encoder.encode([self.agent], [self.projectile], [])
+            self.assertEqual(data, {})
+
+    def test_only_changed_fields_sent(self):
+        self.encoder.encode([self.agent], [self.projectile], [])
+        self.move()
+        self.agent.health -= 10
+        data = self.encoder.encode([self.agent], [self.projectile], [])
+        self.assertEqual(data["agents"], [{"id": 0, "health": 90}])
+
+    def test_keyframe_interval(self):
+        keyframes = []
+        for _ in range(25):
+            keyframes.append(self.encoder.encode([self.agent], [self.projectile], []).get("keyframe", False))
+        self.assertEqual([i for i, keyframe in enumerate(keyframes) if keyframe], [0, 10, 20])
+        self.encoder.request_keyframe()
+        self.assertTrue(self.encoder.encode([self.agent], [self.projectile], []).get("keyframe"))
+
+    def test_decoder_reconstructs_state(self):
+        self.assertDecodedMatches(self.decoder.decode(self.encoder.encode([self.agent], [self.projectile], [])))
+        for i in range(30):
+            self.move()
+            if i % 7 == 0:
+                # change direction so that dead reckoning is wrong
+                self.agent.velocity = Vector2(-self.agent.velocity.y, self.agent.velocity.x)
+                self.agent.angle = self.agent.velocity.get_angle()
+            if i == 12:
+                self.agent.shieldEnabled = True
+            decoded = self.decoder.decode(self.encoder.encode([self.agent], [self.projectile], []))
+            self.assertDecodedMatches(decoded)
+
+    def test_destroyed_projectile(self):
+        self.decoder.decode(self.encoder.encode([self.agent], [self.projectile], []))
+        destroyed = [{"id": self.projectile.id, "type": "projectile"}]
+        decoded = self.decoder.decode(self.encoder.encode([self.agent], [], destroyed))
+        self.assertEqual(decoded["projectiles"], [])
+        self.assertEqual(self.encoder.mirror["projectiles"], {})
+
+    def test_delta_before_keyframe(self):
+        self.encoder.encode([self.agent], [self.projectile], [])
+        data = self.encoder.encode([self.agent], [self.projectile], [])
+        with self.assertRaises(ValueError):
+            self.decoder.decode(data)
+
+    def test_late_keyframe(self):
+        # A decoder that joins late starts from get_keyframe and then decodes
+        # the same deltas as every other client.
+        self.encoder.encode([self.agent], [self.projectile], [])
+        for i in range(5):
+            self.move()
+            if i == 2:
+                self.agent.velocity = Vector2(0, 10)
+            self.encoder.encode([self.agent], [self.projectile], [])
+        keyframe = json.loads(json.dumps(self.encoder.get_keyframe([])))
+        self.assertDecodedMatches(self.decoder.decode(keyframe))
+        for _ in range(5):
+            self.move()
+            self.assertDecodedMatches(self.decoder.decode(self.encoder.encode([self.agent], [self.projectile], [])))
+
+
+if __name__ == '__main__':
+    unittest.main()
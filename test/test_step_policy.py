@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import patch
+
+from src.agent_state import *
+from src.physics_engine import *
+from src.step_policy import *
+from src.vector2 import *
+
+class TestStepPolicy(unittest.TestCase):
+
+    def test_parse_step_policy(self):
+        policy = parse_step_policy("3")
+        self.assertIsInstance(policy, FixedStepPolicy)
+        self.assertEqual(policy.substeps, 3)
+        policy = parse_step_policy("adaptive")
+        self.assertIsInstance(policy, AdaptiveStepPolicy)
+        self.assertEqual(policy.max_substeps, MAX_SUBSTEPS)
+        self.assertEqual(parse_step_policy("adaptive:4").max_substeps, 4)
+        with self.assertRaises(ValueError):
+            parse_step_policy("0")
+        with self.assertRaises(ValueError):
+            parse_step_policy("fast")
+
+    def test_default_step_policy(self):
+        with patch.dict("os.environ", {"PHYSICS_STEP_POLICY": ""}):
+            self.assertEqual(get_default_step_policy().substeps, 1)
+        with patch.dict("os.environ", {"PHYSICS_STEP_POLICY": "adaptive:2"}):
+            self.assertEqual(PhysicsEngine().step_policy.max_substeps, 2)
+
+    def test_adaptive_substeps_follow_fastest_agent(self):
+        pe = PhysicsEngine()
+        policy = AdaptiveStepPolicy(max_travel=0.5, max_substeps=100)
+        self.assertEqual(policy.get_substeps(pe, 1), 1)
+        pe.add_agent(AgentState(1, Vector2(300, 300), Vector2(0, 0), 10))
+        self.assertEqual(policy.get_substeps(pe, 1), 1)
+        # The thinnest boundary is 40 pixels thick, so agents may move 20
+        # pixels per substep.
+        pe.add_agent(AgentState(2, Vector2(500, 300), Vector2(30, 40), 10))
+        self.assertEqual(pe.get_smallest_collider_size(), 40)
+        self.assertEqual(policy.get_substeps(pe, 1), 3)
+        self.assertEqual(policy.get_substeps(pe, 0.1), 1)
+        policy.max_substeps = 2
+        self.assertEqual(policy.get_substeps(pe, 1), 2)
+
+if __name__ == '__main__':
+    unittest.main()
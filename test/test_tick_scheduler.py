@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+from src.tick_scheduler import *
+
+
+class FakeClock():
+    """Clock that moves forward a little every time it is read, so that the
+    scheduler always makes progress.
+    """
+
+    def __init__(self, step=0):
+        self.now = 0
+        self.step = step
+
+    def __call__(self):
+        now = self.now
+        self.now += self.step
+        return now
+
+
+class TestTickScheduler(unittest.TestCase):
+    def setUp(self):
+        # A high tick rate keeps the real sleeps in run() short.
+        self.scheduler = TickScheduler(lambda broadcast: True, tick_rate=1000, max_catch_up_ticks=3, clock=FakeClock())
+        self.scheduler.next_deadline = 0
+
+    def test_ticks_due(self):
+        self.assertEqual(self.scheduler.get_ticks_due(-0.0005), 0)
+        self.assertEqual(self.scheduler.get_ticks_due(0), 1)
+        self.assertEqual(self.scheduler.get_ticks_due(0.0009), 1)
+        self.assertEqual(self.scheduler.get_ticks_due(0.0025), 3)
+        self.assertEqual(self.scheduler.stats.late_wakeups, 1)
+        self.assertEqual(self.scheduler.stats.dropped_ticks, 0)
+
+    def test_drop_ticks_when_too_far_behind(self):
+        self.assertEqual(self.scheduler.get_ticks_due(0.0095), 4)
+        self.assertEqual(self.scheduler.stats.dropped_ticks, 6)
+        # The schedule moves forward past the dropped ticks
+        self.assertAlmostEqual(self.scheduler.next_deadline, 0.006)
+
+    def test_catch_up_after_slow_tick(self):
+        broadcasts = []
+        clock = FakeClock(step=0.0001)
+
+        def tick(broadcast):
+            broadcasts.append(broadcast)
+            if len(broadcasts) == 2:
+                # A slow tick that takes 3 tick intervals
+                clock.now += 0.003
+            return len(broadcasts) == 8
+
+        scheduler = TickScheduler(tick, tick_rate=1000, clock=clock)
+        asyncio.run(scheduler.run())
+
+        # The ticks after the slow one are late, so three ticks are simulated
+        # back-to-back and only the last is broadcast.
+        self.assertEqual(broadcasts[:5], [True, True, False, False, True])
+        stats = scheduler.stats.to_json_dict()
+        self.assertEqual(stats["ticks"], 8)
+        self.assertEqual(stats["catch_up_ticks"], 2)
+        self.assertEqual(stats["broadcasts"], 6)
+        self.assertEqual(stats["dropped_ticks"], 0)
+        self.assertGreater(stats["max_lag"], 0.002)
+        self.assertLess(stats["max_lag"], 0.003)
+
+    def test_real_time_rate(self):
+        ticks = []
+
+        def tick(broadcast):
+            ticks.append(broadcast)
+            return len(ticks) == 20
+
+        loop = asyncio.new_event_loop()
+        scheduler = TickScheduler(tick, tick_rate=100, clock=loop.time)
+        start = loop.time()
+        loop.run_until_complete(scheduler.run())
+        duration = loop.time() - start
+        loop.close()
+        # 20 ticks at 100 ticks per second start over 0.19s
+        self.assertGreaterEqual(duration, 0.185)
+        self.assertLess(duration, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
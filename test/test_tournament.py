@@ -0,0 +1,63 @@
+import os
+import unittest
+
+from src.tournament import *
+
+AGENT_CODE_DIR = os.path.join(os.path.dirname(__file__), "agent_code")
+
+
+def agent_path(file_name):
+    return os.path.join(AGENT_CODE_DIR, file_name)
+
+
+class TestTournament(unittest.TestCase):
+
+    def setUp(self):
+        self.entrants = [load_entrant(agent_path(f"agent{i}.py")) for i in range(1, 4)]
+
+    def test_load_entrant(self):
+        entrant = self.entrants[0]
+        self.assertEqual(entrant.class_name, "Agent1")
+        self.assertEqual(entrant.name, "agent1:Agent1")
+        entrant = load_entrant(agent_path("agent2.py") + ":Agent2")
+        self.assertEqual(entrant.class_name, "Agent2")
+
+    def test_round_robin(self):
+        tournament = Tournament(self.entrants, workers=2)
+        tournament.run_round_robin(games_per_pair=2)
+        # 3 pairs with 2 matches each
+        self.assertEqual(len(tournament.match_log), 6)
+        standings = tournament.get_standings()
+        for standing in standings:
+            self.assertEqual(standing.matches, 4)
+            self.assertEqual(standing.wins + standing.ties + standing.losses, 4)
+        total_points = sum(standing.points for standing in standings)
+        self.assertEqual(total_points, 6 * POINTS_WIN)
+        self.assertGreaterEqual(standings[0].points, standings[-1].points)
+
+    def test_swiss_pairings(self):
+        tournament = Tournament(self.entrants, workers=1)
+        pairings, bye = tournament.get_swiss_pairings()
+        self.assertEqual(len(pairings), 1)
+        self.assertIsNotNone(bye)
+        tournament.record_result(pairings[0][0].name, pairings[0][1].name, {
+            "winner": 0, "tie": False, "error": False, "ticks": 30, "survival_times": [None, 1.0]
+        })
+        tournament.standings[bye.name].byes += 1
+        pairings, second_bye = tournament.get_swiss_pairings()
+        # Entrants who have had a bye don't get another one
+        self.assertNotEqual(second_bye.name, bye.name)
+        # Rematches are avoided
+        names = {pairings[0][0].name, pairings[0][1].name}
+        self.assertIn(bye.name, names)
+
+    def test_swiss(self):
+        tournament = Tournament(self.entrants, workers=1)
+        tournament.run_swiss(rounds=2)
+        standings = tournament.get_standings()
+        self.assertEqual(sum(standing.byes for standing in standings), 2)
+        self.assertEqual(sum(standing.matches for standing in standings), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()